@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Controle de admissão da API
+
+Cada grupo de rotas (análise, listagem, escrita) tem um limite de
+requisições em atendimento; as excedentes esperam numa fila limitada, por
+ordem de chegada, até uma vaga ou até a espera máxima. Com a fila cheia, ou
+vencida a espera, a requisição recebe 503 com Retry-After na hora, sem
+abrir conexão nem ocupar o banco: quando o MySQL fica lento, a carga que
+chega a ele fica limitada em vez de crescer com a fila.
+
+Cada requisição admitida recebe um prazo (o timeout do grupo, contado da
+chegada), guardado num ContextVar que as threads do banco herdam
+(database.executar_db). O prazo limita a espera por conexão no pool, vira
+MAX_EXECUTION_TIME nas consultas de leitura e faz o agendador de micro-lotes
+descartar, antes da inferência, as requisições que já venceram.
+"""
+
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+import asyncio
+import time
+
+import metricas
+
+
+class SobrecargaError(Exception):
+    """A requisição não pode ser atendida agora; o cliente deve tentar de novo"""
+
+    motivo = "fila_cheia"
+
+
+class PrazoEsgotadoError(SobrecargaError):
+    """O prazo da requisição venceu antes de uma etapa (fila, pool, consulta, inferência)"""
+
+    motivo = "prazo"
+
+
+REJEITADAS = metricas.Contador(
+    "creditai_admissao_rejeitadas_total",
+    "Requisições recusadas com 503 por grupo e motivo (fila_cheia ou prazo)",
+    ("grupo", "motivo"),
+)
+ESPERA = metricas.Histograma(
+    "creditai_admissao_espera_segundos", "Espera na fila de admissão por grupo", ("grupo",)
+)
+
+# Prazo (time.monotonic) e grupo da requisição em andamento
+_prazo: ContextVar[Optional[float]] = ContextVar("prazo", default=None)
+_grupo: ContextVar[Optional[str]] = ContextVar("grupo_admissao", default=None)
+
+
+# ==============================================
+# PRAZO DA REQUISIÇÃO
+# ==============================================
+
+def prazo() -> Optional[float]:
+    """Instante (time.monotonic) em que a requisição atual vence; None sem prazo"""
+    return _prazo.get()
+
+
+def definir_prazo(instante: Optional[float]):
+    _prazo.set(instante)
+
+
+def restante() -> Optional[float]:
+    """Segundos até o prazo da requisição atual (negativo se venceu); None sem prazo"""
+    instante = _prazo.get()
+    return None if instante is None else instante - time.monotonic()
+
+
+def verificar_prazo(etapa: str):
+    """Levanta PrazoEsgotadoError se o prazo da requisição atual já venceu"""
+    segundos = restante()
+    if segundos is not None and segundos <= 0:
+        raise PrazoEsgotadoError(f"Prazo da requisição esgotado antes de: {etapa}")
+
+
+def registrar_rejeicao(erro: SobrecargaError):
+    """Conta a recusa no grupo da requisição atual"""
+    REJEITADAS.incrementar(_grupo.get() or "sem_grupo", erro.motivo)
+
+
+# ==============================================
+# GRUPOS DE ROTAS
+# ==============================================
+
+class GrupoAdmissao:
+    """
+    Até `limite` requisições em atendimento; as seguintes esperam numa fila
+    de até `fila_max` posições por no máximo `espera_max` segundos (menos, se
+    o prazo vencer antes). Uma vaga liberada passa direto para a primeira da
+    fila. O prazo de cada requisição é `timeout` segundos após a chegada.
+    """
+
+    def __init__(self, nome: str, limite: int, fila_max: int, espera_max: float, timeout: float):
+        self.nome = nome
+        self.limite = limite
+        self.fila_max = fila_max
+        self.espera_max = espera_max
+        self.timeout = timeout
+
+        self._ativas = 0
+        self._fila: deque = deque()
+        self._admitidas = 0
+        self._fila_cheia = 0
+        self._espera_vencida = 0
+        self._espera_total = 0.0
+
+    async def entrar(self, prazo: float):
+        """Ocupa uma vaga, esperando na fila se preciso; SobrecargaError se não der"""
+        if self._ativas < self.limite and not self._fila:
+            self._ativas += 1
+            self._admitidas += 1
+            ESPERA.observar(0.0, self.nome)
+            return
+        if len(self._fila) >= self.fila_max:
+            self._fila_cheia += 1
+            raise SobrecargaError(f"Fila de {self.nome} cheia ({self.fila_max} aguardando)")
+
+        inicio = time.monotonic()
+        vaga = asyncio.get_running_loop().create_future()
+        self._fila.append(vaga)
+        try:
+            await asyncio.wait_for(vaga, max(0.0, min(self.espera_max, prazo - inicio)))
+        except asyncio.TimeoutError:
+            self._espera_vencida += 1
+            raise PrazoEsgotadoError(
+                f"Sem vaga em {self.nome} após {time.monotonic() - inicio:.2f}s de espera"
+            ) from None
+        except BaseException:
+            # Cancelada (cliente desconectou) depois de receber a vaga: devolve
+            if vaga.done() and not vaga.cancelled():
+                self.sair()
+            raise
+        finally:
+            if not vaga.done() or vaga.cancelled():
+                try:
+                    self._fila.remove(vaga)
+                except ValueError:
+                    pass
+
+        espera = time.monotonic() - inicio
+        self._admitidas += 1
+        self._espera_total += espera
+        ESPERA.observar(espera, self.nome)
+
+    def sair(self):
+        """Libera a vaga, entregando-a à primeira requisição ainda à espera"""
+        while self._fila:
+            vaga = self._fila.popleft()
+            if not vaga.done():
+                vaga.set_result(None)
+                return
+        self._ativas -= 1
+
+    def estatisticas(self) -> Dict:
+        return {
+            "limite": self.limite,
+            "fila_max": self.fila_max,
+            "espera_max_ms": 1000 * self.espera_max,
+            "timeout_ms": 1000 * self.timeout,
+            "ativas": self._ativas,
+            "fila": len(self._fila),
+            "admitidas": self._admitidas,
+            "rejeitadas_fila_cheia": self._fila_cheia,
+            "rejeitadas_espera": self._espera_vencida,
+            "espera_media_ms": round(
+                1000 * self._espera_total / self._admitidas, 3
+            ) if self._admitidas else 0.0,
+        }
+
+
+# ==============================================
+# MIDDLEWARE
+# ==============================================
+
+def resposta_sobrecarga(erro: SobrecargaError, retry_after: int):
+    """503 com Retry-After, no formato de erro da API ({"detail": ...})"""
+    from respostas import RespostaJSON
+
+    return RespostaJSON(
+        {"detail": str(erro)},
+        status_code=503,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class MiddlewareAdmissao:
+    """
+    Middleware ASGI: `classificar(metodo, caminho)` devolve o grupo da
+    requisição (None para rotas sem limite, como monitoramento). A vaga é
+    ocupada até o fim da resposta, inclusive das transmitidas em fluxo.
+    """
+
+    def __init__(self, app, grupos: Dict[str, GrupoAdmissao],
+                 classificar: Callable[[str, str], Optional[str]], retry_after: int = 1):
+        self.app = app
+        self.grupos = grupos
+        self.classificar = classificar
+        self.retry_after = retry_after
+
+    def _rota(self, scope):
+        """Rota da requisição recusada, para as métricas por rota (o roteador não chegou a rodar)"""
+        from starlette.routing import Match
+
+        for rota in getattr(scope.get("app"), "routes", ()):
+            if rota.matches(scope)[0] == Match.FULL:
+                return rota
+        return None
+
+    async def __call__(self, scope, receive, send):
+        grupo = self.grupos.get(self.classificar(scope["method"], scope["path"])) \
+            if scope["type"] == "http" else None
+        if grupo is None:
+            await self.app(scope, receive, send)
+            return
+
+        chegada = time.monotonic()
+        _grupo.set(grupo.nome)
+        _prazo.set(chegada + grupo.timeout)
+        try:
+            await grupo.entrar(chegada + grupo.timeout)
+        except SobrecargaError as e:
+            registrar_rejeicao(e)
+            scope["route"] = self._rota(scope)
+            await resposta_sobrecarga(e, self.retry_after)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            grupo.sair()
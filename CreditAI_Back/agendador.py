@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Agendador de micro-lotes para análises de crédito individuais
+Agrupa requisições concorrentes em uma consulta e uma inferência
+"""
+
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+import admissao
+import database
+import metricas
+from admissao import PrazoEsgotadoError
+from database import executar_db
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores dos baldes do histograma de tamanho de lote
+BALDES_LOTE = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class AgendadorAnalise:
+    """
+    Coleta análises concorrentes dentro de uma janela de até `janela_ms`
+    milissegundos ou `lote_max` CPFs, busca todos os clientes com uma única
+    consulta e executa uma única inferência sobre a matriz empilhada.
+
+    No modo adaptativo a janela encolhe com o tráfego: sem lote em
+    processamento a requisição segue imediatamente (sem custo de latência
+    com tráfego leve) e, com lotes em andamento, a espera é limitada ao
+    tempo estimado para encher o lote pelo intervalo médio entre chegadas.
+
+    `analisar` recebe as linhas do banco e devolve os resultados na mesma
+    ordem (analise.analisar_lote com o modelo em serviço); `buscar` recebe
+    os CPFs do lote e devolve as linhas por CPF.
+
+    Cada requisição leva o seu prazo (admissao.py): as vencidas saem do lote
+    com PrazoEsgotadoError antes da consulta e antes da inferência, e a
+    consulta do lote vale até o prazo mais distante entre as restantes.
+
+    A inferência roda numa thread (asyncio.to_thread), como no lote da
+    rota /analise-credito/lote: o laço de eventos segue atendendo as demais
+    rotas enquanto o modelo avalia a matriz. Os prazos são conferidos de
+    novo já na thread, pois o lote pode esperar por uma thread livre.
+    """
+
+    def __init__(
+        self,
+        analisar: Callable[[List[Dict]], List[Dict]],
+        janela_ms: float = 2.0,
+        lote_max: int = 64,
+        adaptativo: bool = True,
+        buscar: Callable[[List[str]], Dict[str, Dict]] = database.buscar_clientes_por_cpfs,
+    ):
+        self.analisar_lote = analisar
+        self.buscar = buscar
+        self.janela = janela_ms / 1000
+        self.lote_max = lote_max
+        self.adaptativo = adaptativo
+
+        self._loop = None
+        self._fila: Optional[asyncio.Queue] = None
+        self._coletor: Optional[asyncio.Task] = None
+        self._tarefas = set()
+        self._em_voo = 0
+
+        # Intervalo médio entre chegadas (média móvel exponencial)
+        self._ultima_chegada = None
+        self._intervalo_medio = None
+
+        self._requisicoes = 0
+        self._lotes = 0
+        self._histograma = [0] * (len(BALDES_LOTE) + 1)
+        self._atrasos = deque(maxlen=1000)
+        self._atraso_total = 0.0
+        self._vencidas = 0
+
+    # ---------- ciclo de vida ----------
+
+    def _garantir_iniciado(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._coletor and not self._coletor.done():
+            return
+        self._loop = loop
+        self._fila = asyncio.Queue()
+        self._coletor = loop.create_task(self._coletar())
+
+    async def parar(self):
+        """Encerra o coletor e aguarda os lotes em processamento"""
+        if self._coletor:
+            self._coletor.cancel()
+        if self._tarefas:
+            await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._coletor = None
+
+    # ---------- API ----------
+
+    async def analisar(self, cpf: str) -> Optional[Tuple[Dict, Dict]]:
+        """
+        Enfileira um CPF e aguarda o resultado do seu lote.
+
+        Retorna (cliente_db, resultado) ou None se o CPF não existir; erros
+        de banco do lote são propagados para todas as requisições dele.
+        """
+        self._garantir_iniciado()
+        agora = time.monotonic()
+        if self._ultima_chegada is not None:
+            intervalo = agora - self._ultima_chegada
+            self._intervalo_medio = intervalo if self._intervalo_medio is None \
+                else 0.9 * self._intervalo_medio + 0.1 * intervalo
+        self._ultima_chegada = agora
+
+        futuro = self._loop.create_future()
+        self._fila.put_nowait((cpf, futuro, agora, admissao.prazo()))
+        resultado, etapas = await futuro
+        # As etapas do lote valem para cada requisição dele (Server-Timing)
+        metricas.somar_etapas(etapas)
+        return resultado
+
+    def _janela_atual(self, pendentes: int) -> float:
+        if not self.adaptativo:
+            return self.janela
+        if self._em_voo == 0 or self._intervalo_medio is None:
+            return 0.0
+        estimada = self._intervalo_medio * (self.lote_max - pendentes)
+        return min(self.janela, estimada)
+
+    # ---------- coleta e processamento ----------
+
+    async def _coletar(self):
+        while True:
+            lote = [await self._fila.get()]
+            limite = self._loop.time() + self._janela_atual(1)
+            while len(lote) < self.lote_max:
+                # Primeiro esvazia o que já está na fila, sem esperar
+                try:
+                    lote.append(self._fila.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                restante = limite - self._loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self._fila.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            tarefa = self._loop.create_task(self._processar(lote))
+            self._tarefas.add(tarefa)
+            tarefa.add_done_callback(self._tarefas.discard)
+
+    def _descartar_vencidas(self, lote: List[Tuple], etapa: str) -> List[Tuple]:
+        """Falha as requisições com prazo vencido (ou já canceladas) e devolve as demais"""
+        agora = time.monotonic()
+        restantes = []
+        for item in lote:
+            _, futuro, _, prazo = item
+            if futuro.done():
+                continue
+            if prazo is not None and prazo <= agora:
+                self._vencidas += 1
+                futuro.set_exception(PrazoEsgotadoError(f"Prazo da requisição esgotado antes de: {etapa}"))
+                continue
+            restantes.append(item)
+        return restantes
+
+    async def _processar(self, lote: List[Tuple]):
+        self._em_voo += 1
+        inicio = time.monotonic()
+        self._registrar(lote, inicio)
+        # O lote roda no contexto do coletor: as etapas são acumuladas à parte
+        etapas = metricas.iniciar_etapas()
+        try:
+            lote = self._descartar_vencidas(lote, "consulta")
+            if not lote:
+                return
+            prazos = [prazo for _, _, _, prazo in lote]
+            admissao.definir_prazo(None if None in prazos else max(prazos))
+            cpfs = list(dict.fromkeys(cpf for cpf, _, _, _ in lote))
+            encontrados = await executar_db(self.buscar, cpfs)
+
+            lote = self._descartar_vencidas(lote, "inferência")
+            prazos: Dict[str, Optional[float]] = {}
+            for cpf, _, _, prazo in lote:
+                # O CPF vale até o prazo mais distante das suas requisições
+                anterior = prazos.get(cpf, 0.0)
+                prazos[cpf] = None if prazo is None or anterior is None else max(prazo, anterior)
+            clientes_db = [encontrados[cpf] for cpf in prazos if cpf in encontrados]
+            resultados, vencidos = await asyncio.to_thread(self._inferir, clientes_db, prazos)
+            for cpf, futuro, _, _ in lote:
+                if futuro.done():
+                    continue
+                if cpf in vencidos:
+                    self._vencidas += 1
+                    futuro.set_exception(PrazoEsgotadoError("Prazo da requisição esgotado antes de: inferência"))
+                else:
+                    futuro.set_result((resultados.get(cpf), etapas))
+        except Exception as e:
+            for _, futuro, _, _ in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+        finally:
+            self._em_voo -= 1
+
+    def _inferir(self, clientes_db: List[Dict], prazos: Dict[str, Optional[float]]):
+        """
+        Na thread de inferência: descarta os CPFs cujo prazo venceu enquanto
+        o lote esperava a thread e analisa os demais. Devolve os resultados
+        por CPF, com a linha do banco, e o conjunto de CPFs descartados.
+        """
+        agora = time.monotonic()
+        vencidos = {cpf for cpf, prazo in prazos.items() if prazo is not None and prazo <= agora}
+        clientes_db = [cliente_db for cliente_db in clientes_db if cliente_db['cpf'] not in vencidos]
+        resultados = dict(zip(
+            (cliente_db['cpf'] for cliente_db in clientes_db),
+            zip(clientes_db, self.analisar_lote(clientes_db)),
+        ))
+        return resultados, vencidos
+
+    def _registrar(self, lote: List[Tuple], inicio: float):
+        self._lotes += 1
+        self._requisicoes += len(lote)
+        balde = next(
+            (i for i, limite in enumerate(BALDES_LOTE) if len(lote) <= limite),
+            len(BALDES_LOTE),
+        )
+        self._histograma[balde] += 1
+        for _, _, enfileirado_em, _ in lote:
+            atraso = inicio - enfileirado_em
+            self._atrasos.append(atraso)
+            self._atraso_total += atraso
+
+    def estatisticas(self) -> Dict:
+        """Tamanho de lote e atraso de fila para monitoramento"""
+        atrasos = sorted(self._atrasos)
+
+        def percentil(p: float) -> float:
+            if not atrasos:
+                return 0.0
+            return round(1000 * atrasos[min(len(atrasos) - 1, int(p * len(atrasos)))], 3)
+
+        rotulos = [f"<={limite}" for limite in BALDES_LOTE] + [f">{BALDES_LOTE[-1]}"]
+        return {
+            "janela_max_ms": 1000 * self.janela,
+            "lote_max": self.lote_max,
+            "adaptativo": self.adaptativo,
+            "janela_atual_ms": round(1000 * self._janela_atual(1), 3),
+            "requisicoes": self._requisicoes,
+            "lotes": self._lotes,
+            "lote_medio": round(self._requisicoes / self._lotes, 2) if self._lotes else 0.0,
+            "histograma_lotes": dict(zip(rotulos, self._histograma)),
+            "lotes_em_processamento": self._em_voo,
+            "prazo_vencido": self._vencidas,
+            "fila": self._fila.qsize() if self._fila else 0,
+            "atraso_fila_medio_ms": round(
+                1000 * self._atraso_total / self._requisicoes, 3
+            ) if self._requisicoes else 0.0,
+            "atraso_fila_p50_ms": percentil(0.50),
+            "atraso_fila_p99_ms": percentil(0.99),
+        }
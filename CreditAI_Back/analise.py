@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Análise de crédito aplicada em lote
+Uma única chamada ao modelo e as regras declarativas (regras.py) compiladas
+em máscaras NumPy para N clientes
+"""
+
+from typing import Dict, List, Sequence
+import logging
+import time
+
+import numpy as np
+
+from metricas import registrar_etapa
+import regras
+
+logger = logging.getLogger(__name__)
+
+# Ordem das colunas esperada pelo modelo
+FEATURES = (
+    "score",
+    "possui_restricoes",
+    "atrasos_30_dias",
+    "atrasos_60_dias",
+    "atrasos_90_dias",
+    "renda_mensal",
+)
+
+# Regras em serviço (regras.json); a versão marca cache e decisões pré-calculadas
+REGRAS = regras.carregar(FEATURES)
+VERSAO_REGRAS = REGRAS.versao
+
+MOTIVO_ERRO_MODELO = REGRAS.motivo_modelo("erro")
+MOTIVO_SEM_MODELO = REGRAS.motivo_modelo("indisponivel")
+
+
+def montar_matriz(clientes_db: Sequence[Dict]) -> np.ndarray:
+    """Monta a matriz N×6 de features a partir das linhas do banco"""
+    matriz = np.empty((len(clientes_db), len(FEATURES)), dtype=np.float64)
+    for i, cliente_db in enumerate(clientes_db):
+        matriz[i] = [float(cliente_db[coluna]) for coluna in FEATURES]
+    return matriz
+
+
+def analisar_lote(clientes_db: Sequence[Dict], modelo, medir: bool = True) -> List[Dict]:
+    """
+    Analisa uma lista de clientes com uma única chamada predict_proba.
+
+    Retorna, na mesma ordem da entrada, dicionários com aprovado, limite,
+    probabilidade, motivos e os códigos dos motivos, seguindo as mesmas
+    regras da análise individual. Com `medir` falso (o modelo candidato em
+    sombra) os tempos não entram nas etapas de inferência e regras.
+    """
+    if len(clientes_db) == 0:
+        return []
+    inicio = time.perf_counter()
+    return _analisar(montar_matriz(clientes_db), modelo, inicio, medir)
+
+
+def analisar_matriz(X: np.ndarray, modelo) -> List[Dict]:
+    """
+    analisar_lote sobre a matriz N×6 já montada (colunas na ordem de
+    FEATURES, renda em float64), como a lida do snapshot de features
+    """
+    if len(X) == 0:
+        return []
+    return _analisar(X, modelo, time.perf_counter())
+
+
+def _analisar(X: np.ndarray, modelo, inicio: float, medir: bool = True) -> List[Dict]:
+    n = len(X)
+    inferencia = 0.0
+    falha = None
+    if modelo is not None:
+        try:
+            etapa = time.perf_counter()
+            proba = modelo.predict_proba(X)
+            inferencia = time.perf_counter() - etapa
+            if medir:
+                registrar_etapa("inferencia", inferencia)
+            # Mesmo critério de predict(): a classe de maior probabilidade
+            aprovado = modelo.classes_[np.argmax(proba, axis=1)].astype(bool)
+            probabilidade = proba[:, 1].astype(np.float64)
+        except Exception as e:
+            logger.error(f"Erro no modelo de ML: {str(e)}")
+            falha = "erro"
+    else:
+        logger.warning("Modelo de ML não carregado, usando fallback")
+        falha = "indisponivel"
+    if falha is not None:
+        aprovado = np.zeros(n, dtype=bool)
+        probabilidade = np.zeros(n)
+
+    resultados = REGRAS.resultados(X, REGRAS.avaliar(X, aprovado, probabilidade, falha))
+    # Regras: tudo além da chamada ao modelo (matriz, critérios e motivos)
+    if medir:
+        registrar_etapa("regras", time.perf_counter() - inicio - inferencia)
+    return resultados
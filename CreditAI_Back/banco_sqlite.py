@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Backend SQLite embutido (DB_BACKEND=sqlite)
+
+Um arquivo local em modo WAL no lugar do servidor MySQL, para implantações
+de um nó só, testes e benchmarks sem servidor. As conexões têm a interface
+do mysql.connector que o resto da API usa (cursores comuns e de dicionário,
+marcadores %s, lastrowid, rowcount, commit, ping) e os erros do SQLite
+chegam como os erros do mysql.connector que a API já trata.
+
+O SQL da API continua no dialeto do MySQL e é traduzido uma vez por texto
+de comando (cache), e o sqlite3 reaproveita o comando preparado a cada
+execução (DB_SQLITE_SENTENCAS em cache por conexão):
+- ON DUPLICATE KEY UPDATE vira ON CONFLICT pela chave única da tabela;
+- um INSERT multi-linha vira um único comando de uma linha executado com
+  executemany, sem o limite de marcadores por comando do SQLite;
+- /*+ MAX_EXECUTION_TIME(ms) */ vira um prazo verificado durante a
+  execução (erro 3024, como no MySQL);
+- SELECT ... FOR UPDATE e LOCK TABLES abrem uma transação de escrita
+  (BEGIN IMMEDIATE), pois o SQLite serializa as escritas no banco inteiro;
+- o estado de replicação é o de uma instância que não é réplica.
+
+O esquema é o mesmo do MySQL (migrations/, ver migracoes.py), aplicado
+automaticamente na primeira conexão do processo.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+import mysql.connector
+
+import migracoes
+from busca import escapar_like, expressao_fts5
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DB_SQLITE_PATH = os.getenv("DB_SQLITE_PATH", "dados/creditai.db")
+DB_SQLITE_BUSY_MS = int(os.getenv("DB_SQLITE_BUSY_MS", 5000))
+DB_SQLITE_CACHE_MB = int(os.getenv("DB_SQLITE_CACHE_MB", 64))
+DB_SQLITE_MMAP_MB = int(os.getenv("DB_SQLITE_MMAP_MB", 256))
+DB_SQLITE_SENTENCAS = int(os.getenv("DB_SQLITE_SENTENCAS", 256))
+
+# Mesmo formato do TIMESTAMP(6) do MySQL, com 6 casas (o SQLite mede milissegundos)
+INSTANTE_SQL = "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+# Erros do MySQL equivalentes, que a API já trata
+_ERRO_DUPLICADO = 1062
+_ERRO_NULO = 1048
+_ERRO_CHAVE_ESTRANGEIRA = 1452
+_ERRO_ESPERA_TRAVA = 1205
+_ERRO_TEMPO_EXCEDIDO = 3024
+
+
+# ==============================================
+# TIPOS
+# ==============================================
+
+def _gravar_instante(valor: datetime) -> str:
+    return valor.isoformat(" ", "microseconds")
+
+
+def _ler_instante(valor: bytes) -> datetime:
+    return datetime.fromisoformat(valor.decode())
+
+
+sqlite3.register_adapter(datetime, _gravar_instante)
+sqlite3.register_converter("TIMESTAMP", _ler_instante)
+
+
+def _menor(*valores):
+    return None if None in valores else min(valores)
+
+
+def _maior(*valores):
+    return None if None in valores else max(valores)
+
+
+# ==============================================
+# TRADUÇÃO DO SQL
+# ==============================================
+
+class _Traducao(NamedTuple):
+    sql: Optional[str]        # None: nada a executar no SQLite
+    tabela: Optional[str]     # upsert: tabela cuja chave única entra em {alvo}
+    por_linha: int            # INSERT multi-linha: marcadores por linha (0 se não for)
+    travar: bool              # abre a transação de escrita antes de executar
+
+
+_PRAZO = re.compile(r"/\*\+ MAX_EXECUTION_TIME\((\d+)\) \*/ ?")
+_MULTI_LINHA = re.compile(r"VALUES\s*(\((?:\s*%s\s*,)*\s*%s\s*\))(?:\s*,\s*\1)+")
+_DUPLICADA = re.compile(r"\bON DUPLICATE KEY UPDATE\s+(.*)$", re.S)
+_FUNCAO_VALUES = re.compile(r"\bVALUES\((\w+)\)")
+_INSERIR = re.compile(r"\s*INSERT INTO (\w+)")
+_AGORA = re.compile(r"\b(?:NOW|CURRENT_TIMESTAMP)\(6\)")
+
+
+@lru_cache(maxsize=512)
+def _traduzir(operacao: str) -> _Traducao:
+    comando = operacao.strip()
+    if comando.startswith(("SHOW REPLICA STATUS", "SHOW SLAVE STATUS")):
+        return _Traducao("SELECT 1 WHERE 0", None, 0, False)
+    if comando.startswith("LOCK TABLES"):
+        return _Traducao(None, None, 0, True)
+    if comando.startswith("UNLOCK TABLES"):
+        return _Traducao(None, None, 0, False)
+    if comando == "SELECT NOW(6)":
+        return _Traducao(f'SELECT {INSTANTE_SQL} AS "agora [TIMESTAMP]"', None, 0, False)
+
+    por_linha = 0
+    multi = _MULTI_LINHA.search(operacao)
+    if multi and operacao.count("%s") == operacao.count("%s", multi.start(), multi.end()):
+        por_linha = multi.group(1).count("%s")
+        operacao = f"{operacao[:multi.start()]}VALUES {multi.group(1)}{operacao[multi.end():]}"
+
+    tabela = None
+    duplicada = _DUPLICADA.search(operacao)
+    if duplicada:
+        tabela = _INSERIR.match(operacao).group(1)
+        atribuicoes = duplicada.group(1).strip()
+        if atribuicoes == "id = id":
+            clausula = "ON CONFLICT ({alvo}) DO NOTHING"
+        else:
+            clausula = "ON CONFLICT ({alvo}) DO UPDATE SET " + _FUNCAO_VALUES.sub(r"excluded.\1", atribuicoes)
+        operacao = operacao[:duplicada.start()] + clausula
+
+    travar = operacao.rstrip().endswith(" FOR UPDATE")
+    if travar:
+        operacao = operacao.rstrip()[:-len(" FOR UPDATE")]
+    operacao = operacao.replace("LIKE %s", "LIKE %s ESCAPE '\\'").replace("%s", "?")
+    operacao = _AGORA.sub(INSTANTE_SQL, operacao)
+    return _Traducao(operacao, tabela, por_linha, travar)
+
+
+def _preparar(operacao: str) -> Tuple[_Traducao, Optional[float]]:
+    """Tradução do comando e o prazo da dica MAX_EXECUTION_TIME, em segundos"""
+    prazo = None
+    if "MAX_EXECUTION_TIME" in operacao:
+        dica = _PRAZO.search(operacao)
+        if dica:
+            prazo = int(dica.group(1)) / 1000
+            operacao = operacao[:dica.start()] + operacao[dica.end():]
+    return _traduzir(operacao), prazo
+
+
+# Chave de conflito de cada tabela (o mesmo esquema em todos os bancos do processo)
+_ALVOS: Dict[str, str] = {}
+
+
+def _alvo_conflito(conexao: sqlite3.Connection, tabela: str) -> str:
+    """
+    Colunas da chave que um ON DUPLICATE KEY UPDATE encontraria: a chave
+    primária declarada ou, se ela for o rowid, a primeira restrição UNIQUE
+    """
+    alvo = _ALVOS.get(tabela)
+    if alvo is None:
+        indices = {origem: nome for _, nome, unico, origem, _ in
+                   reversed(conexao.execute(f"PRAGMA index_list({tabela})").fetchall()) if unico}
+        nome = indices.get("pk") or indices.get("u")
+        if nome:
+            colunas = [linha[2] for linha in conexao.execute(f"PRAGMA index_info({nome})")]
+        else:
+            colunas = [linha[1] for linha in conexao.execute(f"PRAGMA table_info({tabela})") if linha[5]]
+        alvo = _ALVOS[tabela] = ", ".join(colunas)
+    return alvo
+
+
+def _erro_mysql(erro: sqlite3.Error, prazo_vencido: bool = False) -> mysql.connector.Error:
+    mensagem = str(erro)
+    if isinstance(erro, sqlite3.IntegrityError):
+        if "NOT NULL" in mensagem:
+            errno = _ERRO_NULO
+        elif "FOREIGN KEY" in mensagem:
+            errno = _ERRO_CHAVE_ESTRANGEIRA
+        else:
+            errno = _ERRO_DUPLICADO
+        return mysql.connector.IntegrityError(msg=mensagem, errno=errno)
+    if prazo_vencido and "interrupted" in mensagem:
+        return mysql.connector.DatabaseError(msg="Prazo da consulta esgotado", errno=_ERRO_TEMPO_EXCEDIDO)
+    if "locked" in mensagem or "busy" in mensagem:
+        return mysql.connector.OperationalError(msg=mensagem, errno=_ERRO_ESPERA_TRAVA)
+    return mysql.connector.DatabaseError(msg=mensagem)
+
+
+# ==============================================
+# CONEXÃO E CURSOR
+# ==============================================
+
+class Cursor:
+    def __init__(self, conexao: "Conexao", dictionary: bool = False):
+        self._conexao = conexao
+        self._cursor = conexao._sqlite.cursor()
+        self._dicionario = dictionary
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def execute(self, operacao: str, parametros=()):
+        traducao, prazo = _preparar(operacao)
+        self._conexao._prazo = time.monotonic() + prazo if prazo is not None else None
+        try:
+            if traducao.travar and not self._conexao._sqlite.in_transaction:
+                self._cursor.execute("BEGIN IMMEDIATE")
+            if traducao.sql is None:
+                self.rowcount = 0
+                return
+            sql = traducao.sql
+            if traducao.tabela:
+                sql = sql.replace("{alvo}", _alvo_conflito(self._conexao._sqlite, traducao.tabela))
+            if traducao.por_linha:
+                parametros = list(parametros)
+                passo = traducao.por_linha
+                self._cursor.executemany(
+                    sql, (parametros[i:i + passo] for i in range(0, len(parametros), passo))
+                )
+            else:
+                self._cursor.execute(sql, tuple(parametros))
+        except sqlite3.Error as e:
+            raise _erro_mysql(e, self._conexao._vencido()) from e
+        self.lastrowid = self._cursor.lastrowid
+        self.rowcount = self._cursor.rowcount
+
+    def executemany(self, operacao: str, sequencia):
+        traducao, _ = _preparar(operacao)
+        sql = traducao.sql
+        if traducao.tabela:
+            sql = sql.replace("{alvo}", _alvo_conflito(self._conexao._sqlite, traducao.tabela))
+        try:
+            self._cursor.executemany(sql, sequencia)
+        except sqlite3.Error as e:
+            raise _erro_mysql(e) from e
+        self.rowcount = self._cursor.rowcount
+
+    def _linha(self, linha):
+        if linha is None or not self._dicionario:
+            return linha
+        return {coluna[0]: valor for coluna, valor in zip(self._cursor.description, linha)}
+
+    def _ler(self, leitura):
+        try:
+            return leitura()
+        except sqlite3.Error as e:
+            raise _erro_mysql(e, self._conexao._vencido()) from e
+
+    def fetchone(self):
+        return self._linha(self._ler(self._cursor.fetchone))
+
+    def fetchmany(self, tamanho: int = 1):
+        return [self._linha(linha) for linha in self._ler(lambda: self._cursor.fetchmany(tamanho))]
+
+    def fetchall(self):
+        return [self._linha(linha) for linha in self._ler(self._cursor.fetchall)]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class Conexao:
+    """
+    Conexão SQLite com a interface do mysql.connector. Escritas abrem
+    BEGIN IMMEDIATE (a trava de escrita é pedida já no início da transação,
+    sem o impasse de duas leituras que tentam virar escrita) e esperam até
+    DB_SQLITE_BUSY_MS por outra escrita em andamento.
+    """
+
+    def __init__(self, caminho: str):
+        self._sqlite = sqlite3.connect(
+            caminho,
+            timeout=DB_SQLITE_BUSY_MS / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            isolation_level="IMMEDIATE",
+            check_same_thread=False,
+            cached_statements=DB_SQLITE_SENTENCAS,
+        )
+        self._prazo: Optional[float] = None
+        self._aberta = True
+        for pragma in (
+            "journal_mode=WAL",
+            "synchronous=NORMAL",
+            "foreign_keys=ON",
+            "temp_store=MEMORY",
+            f"cache_size=-{DB_SQLITE_CACHE_MB * 1024}",
+            f"mmap_size={DB_SQLITE_MMAP_MB << 20}",
+        ):
+            self._sqlite.execute(f"PRAGMA {pragma}")
+        self._sqlite.create_function("LEAST", -1, _menor, deterministic=True)
+        self._sqlite.create_function("GREATEST", -1, _maior, deterministic=True)
+        # Consultas com prazo são interrompidas ao vencer, a cada ~10 mil instruções
+        self._sqlite.set_progress_handler(self._vencido, 10000)
+
+    def _vencido(self) -> bool:
+        return self._prazo is not None and time.monotonic() > self._prazo
+
+    def cursor(self, dictionary: bool = False, buffered: bool = True, **_opcoes):
+        return Cursor(self, dictionary)
+
+    def commit(self):
+        self._sqlite.commit()
+
+    def rollback(self):
+        self._sqlite.rollback()
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._sqlite.in_transaction
+
+    def ping(self, reconnect: bool = False):
+        try:
+            self._sqlite.execute("SELECT 1")
+        except sqlite3.Error as e:
+            raise _erro_mysql(e) from e
+
+    def is_connected(self) -> bool:
+        return self._aberta
+
+    def close(self):
+        self._aberta = False
+        self._sqlite.close()
+
+
+# ==============================================
+# BACKEND
+# ==============================================
+
+class BackendSQLite:
+    """
+    Banco em um arquivo local (DB_SQLITE_PATH). Sem réplicas nem LOAD DATA;
+    a busca por nome usa a tabela FTS5 da migração 001.
+    """
+
+    nome = "sqlite"
+    # O upsert do SQLite conta 1 linha afetada por linha existente atualizada
+    afetadas_por_atualizacao = 1
+    replicas = False
+
+    def __init__(self, caminho: str = DB_SQLITE_PATH, migrar: bool = True):
+        self.caminho = str(caminho)
+        self._migrar = migrar
+        self._trava = threading.Lock()
+
+    def conectar(self, **_opcoes) -> Conexao:
+        """Nova conexão; as opções do mysql.connector (host, porta, ...) não se aplicam"""
+        if self.caminho != ":memory:":
+            Path(self.caminho).parent.mkdir(parents=True, exist_ok=True)
+        conexao = Conexao(self.caminho)
+        if self._migrar:
+            with self._trava:
+                if self._migrar:
+                    aplicadas = migracoes.aplicar(conexao, "sqlite")
+                    if aplicadas:
+                        logger.info(f"Migrações aplicadas em {self.caminho}: {', '.join(aplicadas)}")
+                    self._migrar = False
+        return conexao
+
+    def filtro_nome(self, nome: str):
+        """
+        Condição indexada para o nome: todos os termos por prefixo na tabela
+        FTS5 (tokenizador unicode61 sem acentos) ou, sem nenhum termo,
+        prefixo do nome inteiro
+        """
+        expressao = expressao_fts5(nome)
+        if expressao:
+            return "id IN (SELECT rowid FROM clientes_nome_fts WHERE clientes_nome_fts MATCH %s)", expressao
+        return "nome LIKE %s", escapar_like(nome.strip()) + "%"
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Banco local para os benchmarks: o backend SQLite da API (banco_sqlite.py),
+com o esquema das migrações e clientes sintéticos. Os bancos semeados
+ficam em cache em benchmarks/.dados/, um arquivo por tamanho.
+"""
+
+from pathlib import Path
+import time
+
+from banco_sqlite import BackendSQLite
+from benchmarks.sintetico import gerar_features, gerar_nomes
+
+PASTA_DADOS = Path(__file__).parent / ".dados"
+
+
+def fabrica(caminho):
+    """Fábrica de conexões para database.criar_pool"""
+    return BackendSQLite(caminho).conectar
+
+
+def criar_banco(clientes: int, bloco: int = 50000) -> Path:
+    """
+    Banco com `clientes` clientes sintéticos (CPFs 00000000000 em diante),
+    reaproveitado entre execuções. Retorna o caminho do arquivo.
+    """
+    caminho = PASTA_DADOS / f"clientes_{clientes}.sqlite3"
+    if caminho.exists():
+        return caminho
+    PASTA_DADOS.mkdir(exist_ok=True)
+    temporario = caminho.with_suffix(".tmp")
+    temporario.unlink(missing_ok=True)
+
+    inicio = time.perf_counter()
+    conexao = BackendSQLite(temporario).conectar()
+    cursor = conexao.cursor()
+    for parte, primeiro in enumerate(range(0, clientes, bloco)):
+        n = min(bloco, clientes - primeiro)
+        X = gerar_features(n, semente=parte)
+        nomes = gerar_nomes(n, semente=parte)
+        cursor.executemany(
+            "INSERT INTO clientes (cpf, nome, score, possui_restricoes, renda_mensal, "
+            "atrasos_30_dias, atrasos_60_dias, atrasos_90_dias) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            [(f"{primeiro + i:011d}", nomes[i], int(X[i, 0]), bool(X[i, 1]), float(X[i, 5]),
+              int(X[i, 2]), int(X[i, 3]), int(X[i, 4])) for i in range(n)]
+        )
+        conexao.commit()
+    # Sem comandos pendentes, o fechamento leva o WAL para o arquivo antes de renomeá-lo
+    cursor.close()
+    conexao.close()
+    temporario.rename(caminho)
+    print(f"Banco local com {clientes} clientes criado em {time.perf_counter() - inicio:.1f}s")
+    return caminho
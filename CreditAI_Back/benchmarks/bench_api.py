@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Suíte de benchmarks das rotas quentes da API, sem rede nem MySQL
+
+Para cada tamanho de base, semeia um banco local (benchmarks/banco_local.py)
+com clientes sintéticos, sobe a aplicação no próprio processo e exercita
+POST /analise-credito, GET /analise-credito/{cpf}, GET /clientes e
+POST /clientes por ASGI, em níveis fixos de concorrência, medindo vazão e
+latência p50/p95/p99. Micro-benchmarks medem a inferência,
+formatar_cliente_db e a serialização da resposta.
+
+O modelo é uma floresta sintética com semente fixa e o banco parte sempre
+do mesmo estado (cópia do banco semeado), então duas execuções na mesma
+máquina são comparáveis. --saida grava os resultados em JSON; --comparar
+compara com uma execução de referência e termina com código 1 se algum
+cenário piorar além de --tolerancia.
+
+Uso (a partir de CreditAI_Back/):
+    python -m benchmarks.bench_api                          # 1 mil, 100 mil e 1 milhão
+    python -m benchmarks.bench_api --tamanhos 1000 --concorrencia 1,16 --duracao 3
+    python -m benchmarks.bench_api --saida referencia.json
+    python -m benchmarks.bench_api --comparar referencia.json --tolerancia 0.15
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+from benchmarks import banco_local  # noqa: E402
+from benchmarks.medicao import cronometrar, importar_app  # noqa: E402
+from benchmarks.sintetico import gerar_features, gerar_rotulos  # noqa: E402
+
+TAMANHOS = (1000, 100000, 1000000)
+CONCORRENCIAS = (1, 8, 32)
+
+
+# ==============================================
+# AMBIENTE
+# ==============================================
+
+def preparar_ambiente(pasta: Path, modelo: str = None, cache: bool = False):
+    """
+    Modelo e configuração da API isolados em `pasta`, antes de importar
+    main: o .env do projeto não sobrescreve variáveis já definidas.
+    """
+    if modelo:
+        shutil.copy(modelo, pasta / "credit_model.joblib")
+    else:
+        import joblib
+        from sklearn.ensemble import RandomForestClassifier
+
+        X = gerar_features(20000, semente=0)
+        floresta = RandomForestClassifier(n_estimators=100, random_state=0, n_jobs=-1)
+        floresta.fit(X, gerar_rotulos(X, semente=0))
+        joblib.dump(floresta, pasta / "credit_model.joblib")
+
+    os.chdir(pasta)
+    os.environ.update({
+        "MODELO_COMPILADO": str(pasta / "credit_model.compilado"),
+        "MODELOS_DIR": str(pasta / "modelos"),
+        "MODELO_PRECARREGAR": "True",
+        "CACHE_ATIVO": str(cache),
+        "CACHE_BACKEND": "memoria",
+        "DECISOES_ATIVO": "False",
+        "BUSCA_BACKEND": "fulltext",
+        "DB_BACKEND": "sqlite",
+        "DB_SQLITE_PATH": str(pasta / "creditai.db"),
+    })
+
+
+# ==============================================
+# CARGA SOBRE AS ROTAS
+# ==============================================
+
+def rotas(clientes: int, novos_cpfs) -> Dict[str, Callable[[random.Random], Tuple]]:
+    """Geradores de requisição por rota: (método, url, corpo)"""
+    def cpf(rng: random.Random) -> str:
+        return f"{rng.randrange(clientes):011d}"
+
+    def cadastro(rng: random.Random) -> Dict:
+        return {
+            "cpf": f"9{next(novos_cpfs):010d}",
+            "nome": "Cliente Benchmark",
+            "score": rng.randint(300, 1000),
+            "possuiRestricoes": rng.random() < 0.2,
+            "rendaMensal": round(rng.uniform(1000, 20000), 2),
+            "historicoPagamentos": {"atrasos30Dias": 0, "atrasos60Dias": 0, "atrasos90Dias": 0},
+        }
+
+    return {
+        "POST /analise-credito": lambda rng: ("POST", "/analise-credito", {"cpf": cpf(rng)}),
+        "GET /analise-credito/{cpf}": lambda rng: ("GET", f"/analise-credito/{cpf(rng)}", None),
+        "GET /clientes": lambda rng: (
+            "GET", f"/clientes?limit=100&after={rng.randrange(max(1, clientes - 100))}", None
+        ),
+        "POST /clientes": lambda rng: ("POST", "/clientes", cadastro(rng)),
+    }
+
+
+def resumir(latencias: List[float], erros: int, duracao: float) -> Dict:
+    if not latencias:
+        return {"requisicoes": 0, "erros": erros, "vazao_rps": 0.0,
+                "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(np.asarray(latencias) * 1000, [50, 95, 99])
+    return {
+        "requisicoes": len(latencias),
+        "erros": erros,
+        "vazao_rps": round(len(latencias) / duracao, 1),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+async def medir_rota(cliente, gerar: Callable, concorrencia: int,
+                     duracao: float, aquecimento: float) -> Dict:
+    """`concorrencia` clientes em laço fechado; mede só depois do aquecimento"""
+    latencias: List[float] = []
+    erros = 0
+    inicio_medicao = time.perf_counter() + aquecimento
+    fim = inicio_medicao + duracao
+
+    async def usuario(semente: int):
+        nonlocal erros
+        rng = random.Random(semente)
+        while time.perf_counter() < fim:
+            metodo, url, corpo = gerar(rng)
+            inicio = time.perf_counter()
+            resposta = await cliente.request(metodo, url, json=corpo)
+            decorrido = time.perf_counter() - inicio
+            if inicio < inicio_medicao:
+                continue
+            if resposta.status_code >= 400:
+                erros += 1
+            else:
+                latencias.append(decorrido)
+
+    await asyncio.gather(*(usuario(semente) for semente in range(concorrencia)))
+    return resumir(latencias, erros, duracao)
+
+
+async def executar_carga(args, pasta: Path) -> Dict:
+    import httpx
+
+    import database
+
+    main = importar_app()
+    cenarios = {}
+    novos_cpfs = itertools.count()
+    async with main.app.router.lifespan_context(main.app):
+        await asyncio.to_thread(main.modelos.obter)
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+            for tamanho in args.tamanhos:
+                # Cada tamanho parte de uma cópia do banco semeado: POST /clientes o altera
+                copia = pasta / f"clientes_{tamanho}.sqlite3"
+                shutil.copy(banco_local.criar_banco(tamanho), copia)
+                database.pool.fechar()
+                database.pool = database.criar_pool(banco_local.fabrica(copia))
+
+                for rota, gerar in rotas(tamanho, novos_cpfs).items():
+                    for concorrencia in args.concorrencia:
+                        resultado = await medir_rota(
+                            cliente, gerar, concorrencia, args.duracao, args.aquecimento
+                        )
+                        chave = f"{tamanho}|{rota}|c{concorrencia}"
+                        cenarios[chave] = {"tamanho": tamanho, "rota": rota,
+                                           "concorrencia": concorrencia, **resultado}
+                        imprimir_cenario(cenarios[chave])
+    return cenarios
+
+
+def imprimir_cenario(c: Dict):
+    def ms(valor):
+        return f"{valor:9.2f}" if valor is not None else f"{'-':>9}"
+    print(f"{c['tamanho']:>9} {c['rota']:<28} {c['concorrencia']:>4} {c['vazao_rps']:>9.1f} "
+          f"{ms(c['p50_ms'])} {ms(c['p95_ms'])} {ms(c['p99_ms'])} {c['erros']:>6}")
+
+
+# ==============================================
+# MICRO-BENCHMARKS
+# ==============================================
+
+def executar_micro(repeticoes: int) -> Dict:
+    from analise import analisar_lote
+    from benchmarks.sintetico import gerar_clientes
+    from respostas import RespostaJSON
+
+    main = importar_app()
+    modelo = main.modelos.obter()
+    clientes_db = gerar_clientes(1000, semente=7)
+    resultado = analisar_lote(clientes_db[:1], modelo)[0]
+    resposta = main.formatar_analise(resultado, clientes_db[0])
+
+    medidas = {
+        "inferencia_1": lambda: analisar_lote(clientes_db[:1], modelo),
+        "inferencia_64": lambda: analisar_lote(clientes_db[:64], modelo),
+        "inferencia_1000": lambda: analisar_lote(clientes_db, modelo),
+        "formatar_cliente_db": lambda: main.formatar_cliente_db(clientes_db[0]),
+        "construcao_resposta": lambda: main.formatar_analise(resultado, clientes_db[0]),
+        # O que a rota devolve (ver benchmarks/bench_serializacao.py)
+        "serializacao_resposta": lambda: RespostaJSON(resposta).body,
+    }
+    micro = {}
+    for nome, func in medidas.items():
+        micro[nome] = {"us_por_operacao": round(cronometrar(func, repeticoes, unidade="us"), 3)}
+        print(f"  {nome:<24} {micro[nome]['us_por_operacao']:>12.2f} µs")
+    return micro
+
+
+# ==============================================
+# COMPARAÇÃO COM A REFERÊNCIA
+# ==============================================
+
+def comparar(atual: Dict, referencia: Dict, tolerancia: float) -> List[str]:
+    """Cenários que pioraram além da tolerância (vazão, p99 ou tempo por operação)"""
+    regressoes = []
+
+    def variacao(novo, antigo) -> str:
+        return f"{100 * (novo - antigo) / antigo:+.1f}%"
+
+    for chave, base in referencia.get("cenarios", {}).items():
+        novo = atual.get("cenarios", {}).get(chave)
+        if not novo or not base.get("vazao_rps") or novo["p99_ms"] is None:
+            continue
+        if novo["vazao_rps"] < base["vazao_rps"] * (1 - tolerancia):
+            regressoes.append(f"{chave}: vazão {base['vazao_rps']} -> {novo['vazao_rps']} req/s "
+                              f"({variacao(novo['vazao_rps'], base['vazao_rps'])})")
+        if base.get("p99_ms") and novo["p99_ms"] > base["p99_ms"] * (1 + tolerancia):
+            regressoes.append(f"{chave}: p99 {base['p99_ms']} -> {novo['p99_ms']} ms "
+                              f"({variacao(novo['p99_ms'], base['p99_ms'])})")
+
+    for nome, base in referencia.get("micro", {}).items():
+        novo = atual.get("micro", {}).get(nome)
+        if novo and novo["us_por_operacao"] > base["us_por_operacao"] * (1 + tolerancia):
+            regressoes.append(f"micro {nome}: {base['us_por_operacao']} -> "
+                              f"{novo['us_por_operacao']} µs "
+                              f"({variacao(novo['us_por_operacao'], base['us_por_operacao'])})")
+    return regressoes
+
+
+def _lista_int(texto: str) -> List[int]:
+    return [int(parte) for parte in texto.split(",") if parte.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=_lista_int, default=list(TAMANHOS),
+                        help="Clientes na base, separados por vírgula")
+    parser.add_argument("--concorrencia", type=_lista_int, default=list(CONCORRENCIAS),
+                        help="Requisições simultâneas, separadas por vírgula")
+    parser.add_argument("--duracao", type=float, default=5.0, help="Segundos medidos por cenário")
+    parser.add_argument("--aquecimento", type=float, default=1.0, help="Segundos descartados por cenário")
+    parser.add_argument("--repeticoes", type=int, default=2000, help="Repetições dos micro-benchmarks")
+    parser.add_argument("--modelo", help="Artefato joblib; por padrão treina uma floresta sintética")
+    parser.add_argument("--cache", action="store_true", help="Mede com o cache de análises ligado")
+    parser.add_argument("--somente-micro", action="store_true")
+    parser.add_argument("--saida", help="Grava os resultados em JSON")
+    parser.add_argument("--comparar", help="JSON de referência gerado com --saida")
+    parser.add_argument("--tolerancia", type=float, default=0.10,
+                        help="Piora relativa aceita na comparação (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    saida = Path(args.saida).resolve() if args.saida else None
+    referencia = json.loads(Path(args.comparar).read_text(encoding="utf-8")) if args.comparar else None
+
+    with tempfile.TemporaryDirectory(prefix="bench_api_") as temporario:
+        pasta = Path(temporario)
+        preparar_ambiente(pasta, Path(args.modelo).resolve() if args.modelo else None, args.cache)
+
+        resultados = {
+            "ambiente": {
+                "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "nucleos": os.cpu_count(),
+                "cache": args.cache,
+                "duracao_s": args.duracao,
+            },
+            "cenarios": {},
+            "micro": {},
+        }
+        if not args.somente_micro:
+            print(f"{'clientes':>9} {'rota':<28} {'conc':>4} {'req/s':>9} "
+                  f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'erros':>6}")
+            resultados["cenarios"] = asyncio.run(executar_carga(args, pasta))
+        print("Micro-benchmarks (mediana por operação):")
+        resultados["micro"] = executar_micro(args.repeticoes)
+        os.chdir(RAIZ)
+
+    if saida:
+        saida.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Resultados gravados em {saida}")
+
+    if referencia is not None:
+        regressoes = comparar(resultados, referencia, args.tolerancia)
+        if regressoes:
+            print(f"\n❌ {len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}:")
+            for regressao in regressoes:
+                print(f"- {regressao}")
+            sys.exit(1)
+        print(f"\n✅ Nenhuma regressão acima de {args.tolerancia:.0%} em relação a {args.comparar}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark da busca por nome: varredura (LIKE '%nome%') x índice
+
+Sem banco, compara uma varredura equivalente ao LIKE '%nome%' com o índice
+de palavras em memória. Com --mysql, compara também LIKE e FULLTEXT no
+MySQL do .env, sobre a tabela clientes existente (aplique antes
+migrations/001_busca_nome.sql).
+
+Uso (a partir de CreditAI_Back/):
+    python -m benchmarks.bench_busca
+    python -m benchmarks.bench_busca --tamanhos 10000 1000000 --mysql
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.medicao import cronometrar
+from benchmarks.sintetico import gerar_nomes
+from busca import IndiceNomes, normalizar
+
+CONSULTAS = ("joao", "silva", "mar sou", "Gonçalves Lima", "hel", "paula ribeiro")
+
+
+def varredura(nomes, consulta: str):
+    """O que o LIKE '%consulta%' faz: comparar todas as linhas"""
+    termo = consulta.lower()
+    return [i for i, nome in enumerate(nomes) if termo in nome.lower()]
+
+
+def em_memoria(tamanho: int, repeticoes: int):
+    nomes = gerar_nomes(tamanho)
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    indice = IndiceNomes()
+    indice.adicionar_muitos(enumerate(nomes, start=1))
+    construcao = time.perf_counter() - inicio
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"\n{tamanho} clientes — índice construído em {construcao:.1f} s, "
+          f"{memoria / 2 ** 20:.0f} MiB")
+    print(f"  {'consulta':<16} {'varredura':>12} {'índice':>12} {'ganho':>8} {'casam':>8}")
+    for consulta in CONSULTAS:
+        tempo_varredura = cronometrar(lambda: varredura(nomes, normalizar(consulta)), repeticoes // 10, unidade="ms")
+        tempo_indice = cronometrar(lambda: indice.buscar(consulta, 20), repeticoes, unidade="ms")
+        casam = len(indice.filtrar(consulta))
+        print(f"  {consulta:<16} {tempo_varredura:>10.2f}ms {tempo_indice:>10.2f}ms "
+              f"{tempo_varredura / tempo_indice:>7.1f}x {casam:>8}")
+
+
+def no_mysql(repeticoes: int):
+    import database
+
+    def executar(sql, params):
+        with database.get_db_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    total = executar("SELECT COUNT(*) FROM clientes", ())[0][0]
+    print(f"\nMySQL ({total} clientes na tabela clientes)")
+    print(f"  {'consulta':<16} {'LIKE %q%':>12} {'FULLTEXT':>12} {'ganho':>8}")
+    for consulta in CONSULTAS:
+        tempo_like = cronometrar(lambda: executar(
+            "SELECT * FROM clientes WHERE nome LIKE %s LIMIT 20", (f"%{consulta}%",)
+        ), repeticoes, unidade="ms")
+        tempo_fulltext = cronometrar(lambda: database.buscar_clientes_por_nome(consulta, 20), repeticoes, unidade="ms")
+        print(f"  {consulta:<16} {tempo_like:>10.2f}ms {tempo_fulltext:>10.2f}ms "
+              f"{tempo_like / tempo_fulltext:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--mysql", action="store_true", help="Compara também LIKE e FULLTEXT no MySQL")
+    args = parser.parse_args()
+
+    for tamanho in args.tamanhos:
+        em_memoria(tamanho, args.repeticoes)
+    if args.mysql:
+        no_mysql(args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
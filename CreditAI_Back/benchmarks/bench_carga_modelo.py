@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark da carga do modelo por worker: joblib x artefato compilado (mmap)
+
+Sobe N processos, como N workers do uvicorn/gunicorn, e em cada um mede o
+tempo de carga e a memória depois de avaliar um lote. No Linux, informa
+também o PSS (memória proporcional: páginas compartilhadas divididas entre
+os processos que as mapeiam), que mostra a cópia única do artefato mapeado.
+
+Uso (a partir de CreditAI_Back/):
+    python -m benchmarks.bench_carga_modelo
+    python -m benchmarks.bench_carga_modelo --workers 8 --arvores 300
+"""
+
+from multiprocessing import get_context
+from pathlib import Path
+import argparse
+import tempfile
+import time
+
+import joblib
+from sklearn.ensemble import RandomForestClassifier
+
+from benchmarks.sintetico import gerar_features, gerar_rotulos
+from modelo import exportar_modelo
+from scoring import FlorestaCompilada
+
+
+def _memoria_kb(campo: str):
+    for arquivo in ("/proc/self/smaps_rollup", "/proc/self/status"):
+        try:
+            with open(arquivo) as dados:
+                for linha in dados:
+                    if linha.startswith(campo + ":"):
+                        return int(linha.split()[1])
+        except OSError:
+            continue
+    return None
+
+
+def _worker(formato: str, pasta: str, inicio, fim, fila):
+    X = gerar_features(64, semente=7)
+    antes = time.perf_counter()
+    if formato == "joblib":
+        modelo = joblib.load(Path(pasta) / "modelo.joblib")
+    else:
+        modelo, _ = FlorestaCompilada.carregar(Path(pasta) / "compilado", mmap=True)
+    carga = time.perf_counter() - antes
+    modelo.predict_proba(X)
+    if formato == "mmap":
+        # Toca todas as páginas, como um worker depois de muitas requisições
+        for nome in ("feature", "threshold", "filhos", "valores"):
+            getattr(modelo, nome).sum()
+    inicio.wait()  # todos carregados: a medição de PSS vê o compartilhamento
+    fila.put((carga, _memoria_kb("Rss"), _memoria_kb("Pss")))
+    fim.wait()
+
+
+def medir(formato: str, pasta: str, workers: int):
+    contexto = get_context("spawn")
+    inicio, fim, fila = contexto.Barrier(workers), contexto.Barrier(workers + 1), contexto.Queue()
+    processos = [contexto.Process(target=_worker, args=(formato, pasta, inicio, fim, fila))
+                 for _ in range(workers)]
+    for processo in processos:
+        processo.start()
+    resultados = [fila.get() for _ in processos]
+    fim.wait()
+    for processo in processos:
+        processo.join()
+
+    cargas = sorted(carga for carga, _, _ in resultados)
+    rss = sum(r or 0 for _, r, _ in resultados) / 1024
+    pss = [p for _, _, p in resultados if p is not None]
+    print(f"  {formato:<8} carga mediana {1000 * cargas[len(cargas) // 2]:8.1f} ms   "
+          f"RSS somado {rss:8.1f} MiB   "
+          + (f"PSS somado {sum(pss) / 1024:8.1f} MiB" if pss else "PSS indisponível"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--arvores", type=int, default=100)
+    parser.add_argument("--treino", type=int, default=50000)
+    args = parser.parse_args()
+
+    X = gerar_features(args.treino)
+    modelo = RandomForestClassifier(n_estimators=args.arvores, random_state=0, n_jobs=-1)
+    modelo.fit(X, gerar_rotulos(X))
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = Path(pasta) / "modelo.joblib"
+        joblib.dump(modelo, caminho)
+        compilado = exportar_modelo(modelo, caminho, Path(pasta) / "compilado")
+        print(f"{args.arvores} árvores, {compilado.n_nos} nós: joblib "
+              f"{caminho.stat().st_size / 2 ** 20:.1f} MiB, vetores {compilado.bytes / 2 ** 20:.1f} MiB; "
+              f"{args.workers} workers")
+        for formato in ("joblib", "mmap"):
+            medir(formato, pasta, args.workers)
+
+
+if __name__ == "__main__":
+    main()
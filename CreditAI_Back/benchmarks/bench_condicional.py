@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark das requisições condicionais e da compressão
+
+Sobe a aplicação no próprio processo, com o banco local semeado
+(benchmarks/banco_local.py), e repete GET /clientes (páginas de 100 e
+1000) e GET /analise-credito/{cpf} nos modos em que o frontend pode
+chegar: sem compressão e sem ETag (como antes), com gzip ou brotli
+negociados, e revalidando com If-None-Match (304). As requisições vão
+direto à aplicação ASGI, sem cliente HTTP no meio, então o tempo de CPU
+do processo é o do servidor: rota, banco, serialização e compressão.
+
+Por modo, a tabela traz os bytes do corpo enviado, a latência p50 e o
+CPU por requisição, e a economia de cada um em relação ao modo completo.
+O cache de análises fica desligado, para que o modo completo da análise
+rode a inferência como para um CPF ainda não analisado (--cache para ligá-lo).
+
+Uso (a partir de CreditAI_Back/):
+    python -m benchmarks.bench_condicional
+    python -m benchmarks.bench_condicional --clientes 100000 --requisicoes 500
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks import banco_local
+from benchmarks.bench_api import RAIZ, preparar_ambiente
+from benchmarks.medicao import importar_app
+from condicional import CODIFICACOES
+
+
+async def requisitar(app, caminho: str, cabecalhos: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+    """GET direto na aplicação ASGI: status, cabeçalhos e o corpo como enviado"""
+    caminho, _, consulta = caminho.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": caminho, "raw_path": caminho.encode(),
+        "query_string": consulta.encode(), "root_path": "",
+        "headers": [(nome.lower().encode("latin-1"), valor.encode("latin-1")) for nome, valor in cabecalhos.items()],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    resposta = {"status": 0, "cabecalhos": {}, "corpo": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensagem):
+        if mensagem["type"] == "http.response.start":
+            resposta["status"] = mensagem["status"]
+            resposta["cabecalhos"] = {nome.decode("latin-1"): valor.decode("latin-1")
+                                      for nome, valor in mensagem.get("headers", [])}
+        elif mensagem["type"] == "http.response.body":
+            resposta["corpo"].append(mensagem.get("body", b""))
+
+    await app(scope, receive, send)
+    return resposta["status"], resposta["cabecalhos"], b"".join(resposta["corpo"])
+
+
+async def medir_modo(app, caminhos: List[str], cabecalhos: Dict[str, str],
+                     etags: Optional[Dict[str, str]]) -> Dict:
+    """Uma requisição por caminho, em sequência; com `etags`, revalida cada uma"""
+    latencias, enviados, status = [], 0, {}
+    cpu = time.process_time()
+    for caminho in caminhos:
+        extras = {"If-None-Match": etags[caminho]} if etags else {}
+        inicio = time.perf_counter()
+        codigo, _, corpo = await requisitar(app, caminho, {**cabecalhos, **extras})
+        latencias.append(time.perf_counter() - inicio)
+        enviados += len(corpo)
+        status[codigo] = status.get(codigo, 0) + 1
+    cpu = time.process_time() - cpu
+    return {
+        "bytes": enviados / len(caminhos),
+        "p50_ms": 1000 * statistics.median(latencias),
+        "cpu_ms": 1000 * cpu / len(caminhos),
+        "status": status,
+    }
+
+
+async def executar(args, pasta: Path):
+    import database
+
+    main = importar_app()
+    copia = pasta / "clientes.sqlite3"
+    shutil.copy(banco_local.criar_banco(args.clientes), copia)
+    database.pool.fechar()
+    database.pool = database.criar_pool(banco_local.fabrica(copia))
+
+    rng = random.Random(3)
+    rotas = {
+        "GET /clientes limit=100": [
+            f"/clientes?limit=100&after={rng.randrange(args.clientes - 100)}" for _ in range(args.requisicoes)
+        ],
+        "GET /clientes limit=1000": [
+            f"/clientes?limit=1000&after={rng.randrange(args.clientes - 1000)}" for _ in range(args.requisicoes // 10)
+        ],
+        "GET /analise-credito/{cpf}": [
+            f"/analise-credito/{rng.randrange(args.clientes):011d}" for _ in range(args.requisicoes)
+        ],
+    }
+    modos = [("completo", {}), ("gzip", {"Accept-Encoding": "gzip"})]
+    if "br" in CODIFICACOES:
+        modos.append(("br", {"Accept-Encoding": "br"}))
+
+    async with main.app.router.lifespan_context(main.app):
+        await asyncio.to_thread(main.modelos.obter)
+        print(f"{'rota':<28} {'modo':<9} {'bytes/resp':>11} {'p50 ms':>8} {'CPU ms':>8} "
+              f"{'bytes':>7} {'CPU':>7}  status")
+        for rota, caminhos in rotas.items():
+            # Aquecimento: mesmas páginas e CPFs, já com o ETag que o cliente guardaria
+            etags = {}
+            for caminho in caminhos:
+                _, cabecalhos, _ = await requisitar(main.app, caminho, {"Accept-Encoding": "gzip"})
+                etags[caminho] = cabecalhos.get("etag", '""')
+
+            base = None
+            for nome, cabecalhos in modos + [("304", {"Accept-Encoding": "gzip"})]:
+                medida = await medir_modo(main.app, caminhos, cabecalhos, etags if nome == "304" else None)
+                base = base or medida
+                print(f"{rota:<28} {nome:<9} {medida['bytes']:>11.0f} {medida['p50_ms']:>8.2f} "
+                      f"{medida['cpu_ms']:>8.3f} {1 - medida['bytes'] / base['bytes']:>7.1%} "
+                      f"{1 - medida['cpu_ms'] / base['cpu_ms']:>7.1%}  {medida['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=10000, help="Clientes na base semeada")
+    parser.add_argument("--requisicoes", type=int, default=300, help="Requisições por rota e modo")
+    parser.add_argument("--modelo", help="Artefato joblib; por padrão treina uma floresta sintética")
+    parser.add_argument("--cache", action="store_true", help="Mede com o cache de análises ligado")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_condicional_") as temporario:
+        pasta = Path(temporario)
+        preparar_ambiente(pasta, Path(args.modelo).resolve() if args.modelo else None, args.cache)
+        asyncio.run(executar(args, pasta))
+        os.chdir(RAIZ)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark das regras de decisão: laço por cliente x regras declarativas
+
+Compara, sobre clientes sintéticos, as regras codificadas à mão da versão
+anterior (máscaras para os critérios e um laço Python que monta os
+motivos de cada cliente) com as regras de regras.json compiladas em
+máscaras (analise.REGRAS): critérios e limite sobre o lote inteiro e
+textos montados uma vez por combinação de códigos. As probabilidades do
+modelo são fixas e calculadas antes, então só as regras são medidas, e a
+saída dos dois caminhos é conferida linha a linha.
+
+Uso (a partir de CreditAI_Back/):
+    python -m benchmarks.bench_regras
+    python -m benchmarks.bench_regras --linhas 10000 1000000 --repeticoes 3
+"""
+
+from typing import Dict, List
+import argparse
+
+import numpy as np
+
+from analise import REGRAS
+from benchmarks.medicao import cronometrar
+from benchmarks.sintetico import gerar_features
+
+
+def probabilidades(X: np.ndarray, semente: int = 5) -> np.ndarray:
+    """Probabilidade de aprovação próxima da regra de rótulo, com ruído"""
+    rng = np.random.default_rng(semente)
+    base = np.where((X[:, 0] >= 400) & (X[:, 1] == 0), 0.8, 0.2)
+    return np.clip(base + rng.normal(0, 0.25, len(X)), 0, 1).round(2)
+
+
+def regras_legado(X: np.ndarray, aprovado: np.ndarray, probabilidade: np.ndarray) -> List[Dict]:
+    """analise._analisar anterior às regras declarativas, a partir da saída do modelo"""
+    n = len(X)
+    score = X[:, 0]
+    restricoes = X[:, 1] != 0
+    atrasos_90 = X[:, 4]
+    renda = X[:, 5]
+
+    reprovado_modelo = ~aprovado
+    score_baixo = score < 400
+    atrasos_graves = atrasos_90 > 0
+    sem_motivos = ~(reprovado_modelo | score_baixo | restricoes | atrasos_graves)
+    aprovado = aprovado | sem_motivos
+    probabilidade = np.where(sem_motivos & (probabilidade == 0), 0.95, probabilidade)
+    limites = np.where(aprovado, renda * 0.5 * (score / 1000), 0.0)
+
+    resultados = []
+    for i in range(n):
+        motivos = []
+        if reprovado_modelo[i]:
+            motivos.append("Reprovado pelo modelo de análise")
+        if score_baixo[i]:
+            motivos.append("Score abaixo do mínimo (400)")
+        if restricoes[i]:
+            motivos.append("Possui restrições cadastrais")
+        if atrasos_graves[i]:
+            motivos.append(f"{int(atrasos_90[i])} atrasos graves")
+        resultados.append({
+            "aprovado": bool(aprovado[i]),
+            "limite": round(float(limites[i]), 2),
+            "probabilidade": float(probabilidade[i]),
+            "motivos": motivos,
+        })
+    return resultados
+
+
+def regras_declarativas(X: np.ndarray, aprovado: np.ndarray, probabilidade: np.ndarray) -> List[Dict]:
+    return REGRAS.resultados(X, REGRAS.avaliar(X, aprovado, probabilidade))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Regras versão {REGRAS.versao}: {len(REGRAS.criterios)} códigos de motivo")
+    print(f"\n{'linhas':>9} {'legado':>10} {'máscaras':>10} {'motivos':>10} {'declarativo':>12} "
+          f"{'ganho':>7} {'µs/linha':>9} idêntico")
+    for n in args.linhas:
+        X = gerar_features(n)
+        proba = probabilidades(X)
+        aprovado = proba >= 0.5
+
+        legado = cronometrar(lambda: regras_legado(X, aprovado, proba), args.repeticoes, unidade="ms")
+        mascaras = cronometrar(lambda: REGRAS.avaliar(X, aprovado, proba), args.repeticoes, unidade="ms")
+        avaliacao = REGRAS.avaliar(X, aprovado, proba)
+        motivos = cronometrar(lambda: REGRAS.agrupar(X, avaliacao.codigos), args.repeticoes, unidade="ms")
+        declarativo = cronometrar(lambda: regras_declarativas(X, aprovado, proba), args.repeticoes, unidade="ms")
+
+        novos = regras_declarativas(X, aprovado, proba)
+        identico = all(
+            {chave: valor for chave, valor in novo.items() if chave != "codigos"} == antigo
+            for novo, antigo in zip(novos, regras_legado(X, aprovado, proba))
+        )
+        print(f"{n:>9} {legado:>8.1f}ms {mascaras:>8.1f}ms {motivos:>8.1f}ms {declarativo:>10.1f}ms "
+              f"{legado / declarativo:>6.1f}x {1000 * declarativo / n:>9.3f} {'sim' if identico else 'NÃO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark do scoring: scikit-learn (caminho atual) x motor compilado
+
+Uso (a partir de CreditAI_Back/):
+    python -m benchmarks.bench_scoring
+    python -m benchmarks.bench_scoring --modelo credit_model.joblib
+"""
+
+import argparse
+import time
+
+import joblib
+from sklearn.ensemble import RandomForestClassifier
+
+from benchmarks.medicao import cronometrar
+from benchmarks.sintetico import gerar_features, gerar_rotulos
+from scoring import FlorestaCompilada, verificar_paridade
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modelo", help="Artefato joblib; por padrão treina uma floresta sintética")
+    parser.add_argument("--treino", type=int, default=20000, help="Linhas do treino sintético")
+    parser.add_argument("--lote", type=int, default=10000, help="Tamanho do lote avaliado")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.modelo:
+        modelo = joblib.load(args.modelo)
+    else:
+        X_treino = gerar_features(args.treino, semente=1)
+        modelo = RandomForestClassifier(n_estimators=100, random_state=42)
+        modelo.fit(X_treino, gerar_rotulos(X_treino, semente=1))
+
+    inicio = time.perf_counter()
+    compilado = FlorestaCompilada.compilar(modelo)
+    tempo_compilacao = time.perf_counter() - inicio
+
+    X = gerar_features(args.lote, semente=7)[:, :modelo.n_features_in_]
+    diferenca = verificar_paridade(modelo, compilado, X)
+
+    linha = X[:1]
+    atual = cronometrar(lambda: (modelo.predict(linha), modelo.predict_proba(linha)), args.repeticoes, unidade="us")
+    so_proba = cronometrar(lambda: modelo.predict_proba(linha), args.repeticoes, unidade="us")
+    motor = cronometrar(lambda: compilado.avaliar(linha), args.repeticoes, unidade="us")
+
+    print(f"Floresta: {compilado.n_arvores} árvores, {compilado.n_nos} nós, "
+          f"profundidade {compilado.profundidade} (compilada em {1000 * tempo_compilacao:.1f} ms)")
+    print(f"Paridade com scikit-learn em {len(X)} linhas: OK (máx |Δp| = {diferenca:.2e})")
+    print()
+    print("Linha única (mediana por chamada):")
+    print(f"  predict + predict_proba (atual)  {atual:10.1f} µs")
+    print(f"  predict_proba                    {so_proba:10.1f} µs")
+    print(f"  FlorestaCompilada.avaliar        {motor:10.1f} µs   ({atual / motor:.1f}x)")
+
+    # Sem o estimador de origem o motor usa a travessia árvore a árvore em lotes grandes
+    so_numpy = FlorestaCompilada.compilar(modelo, limiar_lote=compilado.limiar_lote)
+    so_numpy.origem = None
+
+    print()
+    print(f"Lotes (µs por linha; travessia simultânea até {compilado.limiar_lote} linhas):")
+    print(f"  {'linhas':>7} {'predict_proba':>14} {'compilado':>12} {'só NumPy':>12}")
+    for tamanho in (16, compilado.limiar_lote, 1000, len(X)):
+        lote = X[:tamanho]
+        repeticoes_lote = max(3, args.repeticoes * 16 // tamanho)
+        tempos = [
+            cronometrar(lambda: func(lote), repeticoes_lote, unidade="us") / tamanho
+            for func in (modelo.predict_proba, compilado.avaliar, so_numpy.avaliar)
+        ]
+        print(f"  {tamanho:>7} " + " ".join(f"{t:>12.2f}" for t in tempos))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark da serialização das respostas: caminho antigo x caminho rápido
+
+Compara, para listagens de clientes e respostas de análise em lote, o
+caminho antigo (dicionário com os valores crus do banco, revalidado pelo
+response_model da rota, jsonable_encoder e json da biblioteca padrão) com o
+caminho rápido (formatar_cliente_db já nos tipos finais e RespostaJSON
+devolvido pela rota). As linhas imitam o que o mysql.connector devolve
+(TINYINT e DECIMAL) e a saída dos dois caminhos é conferida byte a byte.
+
+Uso (a partir de CreditAI_Back/):
+    python -m benchmarks.bench_serializacao
+    python -m benchmarks.bench_serializacao --linhas 1000 10000 --repeticoes 20
+"""
+
+from decimal import Decimal
+from typing import Dict, List
+import argparse
+import asyncio
+
+from benchmarks.medicao import cronometrar, importar_app
+from benchmarks.sintetico import gerar_clientes
+
+
+def linhas_do_banco(n: int) -> List[Dict]:
+    """Clientes sintéticos com os tipos do mysql.connector"""
+    linhas = gerar_clientes(n, semente=3)
+    for i, linha in enumerate(linhas, start=1):
+        linha["id"] = i
+        linha["possui_restricoes"] = int(linha["possui_restricoes"])
+        linha["renda_mensal"] = Decimal(f"{linha['renda_mensal']:.2f}")
+    return linhas
+
+
+def resultados_sinteticos(linhas: List[Dict]) -> List[Dict]:
+    """Resultados de análise no formato de analise.analisar_lote, sem modelo"""
+    return [
+        {
+            "aprovado": linha["score"] >= 600,
+            "limite": round(float(linha["renda_mensal"]) * 2.5, 2) if linha["score"] >= 600 else 0.0,
+            "probabilidade": linha["score"] / 1000,
+            "motivos": [] if linha["score"] >= 600 else ["Score de crédito abaixo do mínimo (600)"],
+            "codigos": [] if linha["score"] >= 600 else ["SCORE_BAIXO"],
+        }
+        for linha in linhas
+    ]
+
+
+def formatar_legado(cliente_db: Dict) -> Dict:
+    """formatar_cliente_db anterior: valores crus, tipos ajustados pela validação"""
+    return {
+        "cpf": cliente_db['cpf'],
+        "nome": cliente_db['nome'],
+        "score": cliente_db['score'],
+        "possuiRestricoes": cliente_db['possui_restricoes'],
+        "rendaMensal": cliente_db['renda_mensal'],
+        "historicoPagamentos": {
+            'atrasos30Dias': cliente_db['atrasos_30_dias'],
+            'atrasos60Dias': cliente_db['atrasos_60_dias'],
+            'atrasos90Dias': cliente_db['atrasos_90_dias']
+        }
+    }
+
+
+def campo_resposta(main, caminho: str, metodo: str):
+    for rota in main.app.routes:
+        if getattr(rota, "path", None) == caminho and metodo in rota.methods:
+            return rota.response_field
+    raise LookupError(f"Rota {metodo} {caminho} não encontrada")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+
+    app = importar_app(isolado=True)
+    import respostas
+
+    campo_lista = campo_resposta(app, "/clientes", "GET")
+    campo_lote = campo_resposta(app, "/analise-credito/lote", "POST")
+
+    def antigo(campo, conteudo):
+        # O que o FastAPI faz com o dicionário retornado por uma rota com response_model
+        return JSONResponse(asyncio.run(serialize_response(field=campo, response_content=conteudo))).body
+
+    def sem_orjson(conteudo):
+        original, respostas.orjson = respostas.orjson, None
+        try:
+            return respostas.RespostaJSON(conteudo).body
+        finally:
+            respostas.orjson = original
+
+    print(f"orjson: {'instalado' if respostas.orjson else 'ausente (só o json padrão)'}")
+    print(f"\n{'cenário':<22} {'linhas':>7} {'antigo':>10} {'rápido/json':>12} {'rápido':>10} {'ganho':>7} idêntico")
+    for n in args.linhas:
+        linhas = linhas_do_banco(n)
+        resultados = resultados_sinteticos(linhas)
+
+        def lista_antiga():
+            return antigo(campo_lista, {
+                "clientes": [formatar_legado(linha) for linha in linhas],
+                "total": len(linhas),
+                "proximo": None,
+            })
+
+        def lista_conteudo():
+            return {
+                "clientes": [app.formatar_cliente_db(linha) for linha in linhas],
+                "total": len(linhas),
+                "proximo": None,
+            }
+
+        def lote_antigo():
+            return antigo(campo_lote, {
+                "resultados": [
+                    {**resultado, "cliente": formatar_legado(linha)}
+                    for resultado, linha in zip(resultados, linhas)
+                ],
+                "nao_encontrados": [],
+            })
+
+        def lote_conteudo():
+            return {
+                "resultados": [
+                    app.formatar_analise(resultado, linha)
+                    for resultado, linha in zip(resultados, linhas)
+                ],
+                "nao_encontrados": [],
+            }
+
+        cenarios = {
+            "GET /clientes": (lista_antiga, lista_conteudo),
+            "POST /analise/lote": (lote_antigo, lote_conteudo),
+        }
+        for nome, (legado, conteudo) in cenarios.items():
+            tempo_antigo = cronometrar(legado, args.repeticoes, unidade="ms")
+            tempo_json = cronometrar(lambda: sem_orjson(conteudo()), args.repeticoes, unidade="ms")
+            tempo_rapido = cronometrar(lambda: respostas.RespostaJSON(conteudo()).body, args.repeticoes, unidade="ms")
+            identico = legado() == respostas.RespostaJSON(conteudo()).body == sem_orjson(conteudo())
+            print(f"{nome:<22} {n:>7} {tempo_antigo:>8.1f}ms {tempo_json:>10.1f}ms {tempo_rapido:>8.1f}ms "
+                  f"{tempo_antigo / tempo_rapido:>6.1f}x {'sim' if identico else 'NÃO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Utilitários de medição comuns aos benchmarks
+Cronômetro de chamadas repetidas e importação da aplicação
+"""
+
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+UNIDADES = {"s": 1.0, "ms": 1e3, "us": 1e6}
+
+
+def cronometrar(func, repeticoes: int, *, unidade: str) -> float:
+    """
+    Mediana do tempo de uma chamada de `func` em `repeticoes` chamadas, na
+    `unidade` pedida (s, ms ou us). Uma chamada de aquecimento, fora da
+    medida, carrega caches e importações preguiçosas antes de cronometrar.
+    """
+    escala = UNIDADES[unidade]
+    func()  # aquecimento
+    tempos = []
+    for _ in range(max(1, repeticoes)):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    return escala * statistics.median(tempos)
+
+
+def importar_app(isolado: bool = False):
+    """
+    Importa main sem o log INFO por requisição. Sem `isolado`, o ambiente
+    já foi preparado por quem chama (bench_api.preparar_ambiente); com ele,
+    main sobe em uma pasta temporária sem pré-carregar o modelo, só com as
+    rotas e as funções de formatação.
+    """
+    if isolado:
+        os.chdir(tempfile.mkdtemp(prefix="creditai-bench-"))
+        os.environ.setdefault("MODELO_PRECARREGAR", "False")
+    import main
+
+    logging.getLogger().setLevel(logging.WARNING)
+    return main
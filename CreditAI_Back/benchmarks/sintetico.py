@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Geração de clientes sintéticos para os benchmarks
+Distribuições aproximadas da base real, reprodutíveis pela semente
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+NOMES = ("Ana", "Bruno", "Carla", "Diego", "Élida", "Fábio", "Gisele", "Hélio",
+         "Iara", "João", "Kátia", "Luís", "Márcia", "Nélson", "Otávio", "Paula")
+SOBRENOMES = ("Silva", "Souza", "Oliveira", "Santos", "Conceição", "Pereira",
+              "Araújo", "Gonçalves", "Lima", "Ribeiro", "Sá", "Magalhães")
+
+
+def gerar_features(n: int, semente: int = 42) -> np.ndarray:
+    """Matriz N×6 na ordem de analise.FEATURES"""
+    rng = np.random.default_rng(semente)
+    return np.column_stack([
+        rng.integers(300, 1001, n),
+        rng.random(n) < 0.2,
+        rng.poisson(0.8, n),
+        rng.poisson(0.3, n),
+        rng.poisson(0.1, n),
+        np.round(rng.lognormal(8.2, 0.6, n) + 500, 2),
+    ]).astype(np.float64)
+
+
+def gerar_rotulos(X: np.ndarray, semente: int = 42) -> np.ndarray:
+    """Rótulos de aprovação com ruído, próximos da regra usada em credit_model.py"""
+    rng = np.random.default_rng(semente + 1)
+    regra = (X[:, 0] >= 400) & (X[:, 1] == 0) & (X[:, 4] == 0)
+    ruido = rng.random(len(X)) < 0.05
+    return (regra ^ ruido).astype(int)
+
+
+def gerar_nomes(n: int, semente: int = 42) -> List[str]:
+    """Nomes completos com acentos, combinando prenome e dois sobrenomes"""
+    rng = np.random.default_rng(semente + 2)
+    nomes = rng.integers(0, len(NOMES), n)
+    sobrenomes = rng.integers(0, len(SOBRENOMES), (n, 2))
+    return [
+        f"{NOMES[nomes[i]]} {SOBRENOMES[sobrenomes[i, 0]]} {SOBRENOMES[sobrenomes[i, 1]]}"
+        for i in range(n)
+    ]
+
+
+def gerar_clientes(n: int, semente: int = 42) -> List[Dict]:
+    """Linhas no formato da tabela clientes, com CPFs sequenciais"""
+    X = gerar_features(n, semente)
+    nomes = gerar_nomes(n, semente)
+    return [
+        {
+            "cpf": f"{i:011d}",
+            "nome": nomes[i],
+            "score": int(X[i, 0]),
+            "possui_restricoes": bool(X[i, 1]),
+            "atrasos_30_dias": int(X[i, 2]),
+            "atrasos_60_dias": int(X[i, 3]),
+            "atrasos_90_dias": int(X[i, 4]),
+            "renda_mensal": float(X[i, 5]),
+        }
+        for i in range(n)
+    ]
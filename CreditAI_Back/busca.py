@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Busca de clientes por nome
+Normalização sem acentos/maiúsculas, expressões FULLTEXT para o MySQL e
+FTS5 para o SQLite e um índice de palavras em memória para bancos sem índice textual
+"""
+
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+# Tamanho mínimo de termo indexado pelo FULLTEXT do InnoDB (innodb_ft_min_token_size)
+TOKEN_MINIMO_FULLTEXT = 3
+
+_NAO_ALFANUMERICO = re.compile(r"[^0-9a-z]+")
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples: 'João  Sá' -> 'joao sa'"""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return _NAO_ALFANUMERICO.sub(" ", sem_acentos.lower()).strip()
+
+
+def tokens(texto: str) -> List[str]:
+    return normalizar(texto).split()
+
+
+def expressao_fulltext(consulta: str) -> Optional[str]:
+    """
+    Expressão BOOLEAN MODE em que todo termo é obrigatório e casa por prefixo
+    ('jo sil' -> '+sil*'). Termos menores que o mínimo do FULLTEXT são
+    ignorados; retorna None se nenhum termo sobrar.
+    """
+    termos = [t for t in tokens(consulta) if len(t) >= TOKEN_MINIMO_FULLTEXT]
+    if not termos:
+        return None
+    return " ".join(f"+{termo}*" for termo in termos)
+
+
+def expressao_fts5(consulta: str) -> Optional[str]:
+    """
+    Consulta FTS5 equivalente, com todos os termos (o FTS5 não tem tamanho
+    mínimo): 'jo sil' -> '"jo"* "sil"*'. None se a consulta não tiver termos.
+    """
+    termos = tokens(consulta)
+    if not termos:
+        return None
+    return " ".join(f'"{termo}"*' for termo in termos)
+
+
+def escapar_like(texto: str) -> str:
+    """Texto literal para um padrão LIKE com a barra invertida como escape"""
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def pontuar(nome_normalizado: str, consulta_tokens: List[str]) -> float:
+    """
+    Relevância de um nome para a consulta, ou 0 se algum termo não casar.
+    Termo igual a uma palavra vale mais que prefixo, e nomes que começam
+    pela consulta inteira recebem bônus.
+    """
+    palavras = nome_normalizado.split()
+    pontos = 0.0
+    for termo in consulta_tokens:
+        if termo in palavras:
+            pontos += 2.0
+        elif any(palavra.startswith(termo) for palavra in palavras):
+            pontos += 1.0
+        else:
+            return 0.0
+    if nome_normalizado.startswith(" ".join(consulta_tokens)):
+        pontos += 1.5
+    return pontos
+
+
+class IndiceNomes:
+    """
+    Índice invertido em memória das palavras normalizadas de cada nome.
+
+    Cada palavra aponta para um vetor compacto de ids (int32) e o vocabulário
+    ordenado permite achar por bisseção todas as palavras com um prefixo; a
+    consulta é a interseção, termo a termo, da união dessas listas, feita com
+    NumPy sobre os próprios vetores, sem comparar strings. Nomes alterados ou
+    removidos deixam entradas antigas, conferidas contra o nome atual só para
+    esses ids, então atualizar é só reindexar.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, array] = defaultdict(lambda: array("i"))
+        self._iniciais: Dict[str, array] = defaultdict(lambda: array("i"))
+        self._nomes: Dict[int, str] = {}
+        self._alterados: Set[int] = set()
+        self._vocabulario: List[str] = []
+        self._vocabulario_valido = True
+        self._lock = threading.Lock()
+        self.maior_id = 0
+        self.pronto = False
+
+    def __len__(self):
+        return len(self._nomes)
+
+    def adicionar(self, id_cliente: int, nome: str):
+        normalizado = normalizar(nome)
+        palavras = normalizado.split()
+        with self._lock:
+            if id_cliente in self._nomes or id_cliente <= self.maior_id:
+                # Reindexação: as listas deixam de estar ordenadas e sem repetição
+                self._alterados.add(id_cliente)
+            self._nomes[id_cliente] = normalizado
+            for palavra in set(palavras):
+                if palavra not in self._postings:
+                    self._vocabulario_valido = False
+                self._postings[palavra].append(id_cliente)
+            if palavras:
+                self._iniciais[palavras[0]].append(id_cliente)
+            self.maior_id = max(self.maior_id, id_cliente)
+
+    def adicionar_muitos(self, linhas: Iterable[Tuple[int, str]]):
+        for id_cliente, nome in linhas:
+            self.adicionar(id_cliente, nome)
+
+    def remover(self, id_cliente: int):
+        with self._lock:
+            if self._nomes.pop(id_cliente, None) is not None:
+                self._alterados.add(id_cliente)
+
+    # ---------- consulta ----------
+
+    def _com_prefixo(self, termo: str) -> List[str]:
+        if not self._vocabulario_valido:
+            self._vocabulario = sorted(self._postings)
+            self._vocabulario_valido = True
+        inicio = bisect_left(self._vocabulario, termo)
+        fim = bisect_left(self._vocabulario, termo + "\uffff", inicio)
+        return self._vocabulario[inicio:fim]
+
+    def _ids(self, listas: Dict[str, array], palavras: List[str]) -> np.ndarray:
+        vetores = [np.frombuffer(listas[p], dtype=np.int32) for p in palavras if p in listas]
+        if not vetores:
+            return np.empty(0, dtype=np.int32)
+        if len(vetores) == 1 and not self._alterados:
+            return vetores[0]
+        return np.unique(np.concatenate(vetores))
+
+    def _casamentos(self, consulta: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids em ordem crescente que casam com a consulta e suas pontuações"""
+        consulta_tokens = tokens(consulta)
+        vazio = np.empty(0, dtype=np.int32), np.empty(0)
+        if not consulta_tokens:
+            return vazio
+        with self._lock:
+            ids = None
+            exatos = []
+            for termo in consulta_tokens:
+                candidatos = self._ids(self._postings, self._com_prefixo(termo))
+                ids = candidatos if ids is None else np.intersect1d(ids, candidatos, assume_unique=True)
+                if not len(ids):
+                    return vazio
+                exatos.append(self._ids(self._postings, [termo]))
+
+            # Mesma pontuação de pontuar(): 2 por palavra exata, 1 por prefixo
+            pontos = np.full(len(ids), float(len(consulta_tokens)))
+            for lista in exatos:
+                pontos += np.isin(ids, lista)
+            iniciais = self._ids(self._iniciais, self._com_prefixo(consulta_tokens[0]))
+            comeca = np.isin(ids, iniciais)
+            if len(consulta_tokens) > 1:
+                frase = " ".join(consulta_tokens)
+                for i in np.flatnonzero(comeca):
+                    comeca[i] = self._nomes.get(int(ids[i]), "").startswith(frase)
+            pontos += 1.5 * comeca
+
+            for i in np.flatnonzero(np.isin(ids, list(self._alterados))) if self._alterados else ():
+                nome = self._nomes.get(int(ids[i]))
+                pontos[i] = pontuar(nome, consulta_tokens) if nome is not None else 0.0
+        validos = pontos > 0
+        return ids[validos], pontos[validos]
+
+    def buscar(self, consulta: str, limite: int = 20) -> List[Tuple[int, float]]:
+        """Ids mais relevantes para a consulta, com a pontuação: [(id, pontos)]"""
+        ids, pontos = self._casamentos(consulta)
+        ranking = []
+        # Poucos níveis de pontuação: percorre do maior para o menor, por id
+        for nivel in np.unique(pontos)[::-1]:
+            for id_cliente in ids[pontos == nivel][:limite - len(ranking)]:
+                ranking.append((int(id_cliente), float(nivel)))
+            if len(ranking) >= limite:
+                break
+        return ranking
+
+    def filtrar(self, consulta: str, apos: Optional[int] = None) -> List[int]:
+        """Ids que casam com a consulta em ordem crescente, a partir de `apos`"""
+        ids, _ = self._casamentos(consulta)
+        if apos is not None:
+            ids = ids[np.searchsorted(ids, apos, side="right"):]
+        return ids.tolist()
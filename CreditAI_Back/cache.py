@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de resultados de análise de crédito
+Entradas por CPF, marcadas com as versões do modelo e das regras
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+from database import env_bool
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================
+# BACKENDS
+# ==============================================
+
+class BackendLocal:
+    """LRU em memória do processo, com limite de itens e TTL por entrada"""
+
+    def __init__(self, max_itens: int = 10000):
+        self.max_itens = max_itens
+        self._itens: OrderedDict = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def obter(self, chave: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                self.evictions += 1
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def gravar(self, chave: str, valor: Dict, ttl: float):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.evictions += 1
+
+    def remover(self, chaves: Iterable[str]):
+        with self._lock:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class BackendCompartilhado:
+    """
+    Cache compartilhado entre workers e processos sobre um cliente no
+    formato do redis-py (get, set com ex=, delete). Os valores trafegam
+    como JSON e o limite de memória/LRU fica a cargo do servidor.
+    """
+
+    def __init__(self, cliente, prefixo: str = "creditai:analise:"):
+        self.cliente = cliente
+        self.prefixo = prefixo
+        self.evictions = 0  # controladas pelo servidor (maxmemory-policy)
+
+    def obter(self, chave: str) -> Optional[Dict]:
+        bruto = self.cliente.get(self.prefixo + chave)
+        return json.loads(bruto) if bruto is not None else None
+
+    def gravar(self, chave: str, valor: Dict, ttl: float):
+        self.cliente.set(self.prefixo + chave, json.dumps(valor, default=float), ex=max(1, int(ttl)))
+
+    def remover(self, chaves: Iterable[str]):
+        chaves = [self.prefixo + chave for chave in chaves]
+        if chaves:
+            self.cliente.delete(*chaves)
+
+    def limpar(self):
+        # As entradas antigas deixam de valer pela versão; o TTL as remove
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class ClienteMemoria:
+    """
+    Substituto local de um servidor Redis para testes e desenvolvimento:
+    implementa apenas get/set/delete com expiração, guardando bytes.
+    """
+
+    def __init__(self):
+        self._dados: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, chave: str):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em is not None and expira_em < time.monotonic():
+                del self._dados[chave]
+                return None
+            return valor
+
+    def set(self, chave: str, valor, ex: Optional[int] = None):
+        if isinstance(valor, str):
+            valor = valor.encode("utf-8")
+        with self._lock:
+            self._dados[chave] = (time.monotonic() + ex if ex else None, valor)
+        return True
+
+    def delete(self, *chaves: str) -> int:
+        with self._lock:
+            return sum(self._dados.pop(chave, None) is not None for chave in chaves)
+
+
+# ==============================================
+# CACHE DE RESULTADOS
+# ==============================================
+
+class CacheResultados:
+    """
+    Cache de respostas de análise por CPF.
+
+    Cada entrada guarda as versões do modelo e das regras que a produziram
+    e o atualizado_em da linha do cliente analisada. Uma leitura só é
+    acerto se as versões coincidirem com as atuais (trocar o modelo torna
+    todas as entradas antigas obsoletas de uma vez) e se confirmar() achar
+    o mesmo atualizado_em no banco: escritas que não passam por este
+    processo (carga em lote, outros workers com o backend `memoria`) não
+    chegam a invalidar() e seriam servidas até o TTL.
+    """
+
+    def __init__(self, backend, ttl: float = 300.0, versao_modelo: str = "",
+                 versao_regras: str = "", ativo: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.versao_modelo = versao_modelo
+        self.versao_regras = versao_regras
+        self.ativo = ativo
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidacoes = 0
+        self.obsoletas = 0
+
+    def obter_entrada(self, cpf: str) -> Optional[Dict]:
+        """
+        Entrada das versões atuais (resposta, etag, atualizado_em), ainda a
+        confirmar contra o atualizado_em do banco; None conta como miss
+        """
+        if not self.ativo:
+            return None
+        try:
+            entrada = self.backend.obter(cpf)
+        except Exception as e:
+            logger.warning(f"Falha ao ler o cache de análises: {e}")
+            entrada = None
+        if (
+            entrada is not None
+            and entrada.get("modelo") == self.versao_modelo
+            and entrada.get("regras") == self.versao_regras
+        ):
+            return entrada
+        self.misses += 1
+        return None
+
+    def confirmar(self, cpf: str, entrada: Dict, atualizado_em) -> Optional[Dict]:
+        """A entrada, se foi gravada para a linha com este atualizado_em; senão a descarta"""
+        if atualizado_em is not None and entrada.get("atualizado_em") == str(atualizado_em):
+            self.hits += 1
+            return entrada
+        self.misses += 1
+        self.obsoletas += 1
+        try:
+            self.backend.remover([cpf])
+        except Exception as e:
+            logger.warning(f"Falha ao invalidar o cache de análises: {e}")
+        return None
+
+    def gravar(self, cpf: str, resposta: Dict, atualizado_em, etag: Optional[str] = None):
+        if not self.ativo:
+            return
+        entrada = {
+            "modelo": self.versao_modelo,
+            "regras": self.versao_regras,
+            "atualizado_em": str(atualizado_em),
+            "resposta": resposta,
+            "etag": etag,
+        }
+        try:
+            self.backend.gravar(cpf, entrada, self.ttl)
+        except Exception as e:
+            logger.warning(f"Falha ao gravar no cache de análises: {e}")
+
+    def invalidar(self, *cpfs: str):
+        """Remove as entradas dos CPFs gravados (cadastro, carga em lote)"""
+        if not cpfs:
+            return
+        self.invalidacoes += len(cpfs)
+        try:
+            self.backend.remover(cpfs)
+        except Exception as e:
+            logger.warning(f"Falha ao invalidar o cache de análises: {e}")
+
+    def definir_versao_modelo(self, versao: str):
+        """Chamado ao recarregar o modelo: descarta tudo o que veio do anterior"""
+        if versao != self.versao_modelo:
+            self.versao_modelo = versao
+            self.backend.limpar()
+
+    def estatisticas(self) -> Dict:
+        consultas = self.hits + self.misses
+        return {
+            "ativo": self.ativo,
+            "backend": type(self.backend).__name__,
+            "itens": len(self.backend),
+            "ttl_s": self.ttl,
+            "versao_modelo": self.versao_modelo,
+            "versao_regras": self.versao_regras,
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / consultas, 4) if consultas else 0.0,
+            "evictions": self.backend.evictions,
+            "invalidacoes": self.invalidacoes,
+            "obsoletas": self.obsoletas,
+        }
+
+
+def criar_backend():
+    """
+    Backend escolhido por CACHE_BACKEND no .env:
+    `memoria` (padrão, por processo), `redis` (CACHE_REDIS_URL) ou
+    `memoria_compartilhada` (substituto local do Redis, para testes).
+    """
+    tipo = os.getenv("CACHE_BACKEND", "memoria").lower()
+    if tipo == "redis":
+        try:
+            import redis
+        except ImportError:
+            logger.warning("Pacote redis não instalado; usando cache em memória")
+        else:
+            return BackendCompartilhado(redis.Redis.from_url(
+                os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+            ))
+    elif tipo == "memoria_compartilhada":
+        return BackendCompartilhado(ClienteMemoria())
+    return BackendLocal(max_itens=int(os.getenv("CACHE_MAX_ITENS", 10000)))
+
+
+def criar_cache(versao_modelo: str = "", versao_regras: str = "") -> CacheResultados:
+    """Cria o cache com os parâmetros CACHE_* do .env"""
+    return CacheResultados(
+        criar_backend(),
+        ttl=float(os.getenv("CACHE_TTL", 300)),
+        versao_modelo=versao_modelo,
+        versao_regras=versao_regras,
+        ativo=env_bool("CACHE_ATIVO", True),
+    )
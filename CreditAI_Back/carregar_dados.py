@@ -1,82 +1,421 @@
 # carregar_dados.py
-import mysql.connector
-import json
+"""
+Carga em lote de clientes a partir de arquivos JSON, NDJSON ou CSV
+
+Os registros são lidos em fluxo (memória constante, qualquer tamanho de
+arquivo), validados com as mesmas regras do modelo Cliente da API e
+gravados em lotes, cada um com seu próprio commit. Após cada commit o
+progresso vai para um checkpoint ao lado do arquivo; se a carga for
+interrompida, executá-la de novo continua do último lote confirmado.
+Registros rejeitados vão para <arquivo>.rejeitados.ndjson com o motivo.
+
+Uso:
+    python carregar_dados.py                              # data/clientes.json
+    python carregar_dados.py bureau.csv --lote 20000
+    python carregar_dados.py bureau.ndjson --metodo load_data
+"""
+
+from itertools import islice
 from pathlib import Path
-from collections import Counter
-
-def carregar_clientes():
-    try: 
-        # 1. Conecta ao banco
-        conn = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='Gbk@2027',
-            database='creditaidb',
-            port=3306
+from typing import Dict, Iterable, Iterator, List, Optional
+import argparse
+import csv
+import json
+import os
+import re
+import tempfile
+import time
+
+import database
+from cache import criar_cache
+from schemas import COLUNAS_CLIENTE, validar_cliente
+
+ARQUIVO_PADRAO = 'data/clientes.json'
+FORMATOS = ("json", "ndjson", "csv")
+METODOS = ("upsert", "load_data")
+
+# Um objeto JSON maior que isso indica arquivo corrompido, não registro grande
+REGISTRO_MAX = 1 << 24
+
+# ==============================================
+# LEITURA EM FLUXO
+# ==============================================
+
+_SEPARADORES = re.compile(r"[\s,]*")
+
+
+def iterar_json(arquivo, tamanho_bloco: int = 1 << 20) -> Iterator[Dict]:
+    """
+    Gera os clientes de {"clientes": [...]} (ou de uma lista no topo do
+    arquivo) decodificando um objeto por vez de um buffer de `tamanho_bloco`
+    caracteres, sem carregar o arquivo inteiro.
+    """
+    decoder = json.JSONDecoder()
+    buffer = arquivo.read(tamanho_bloco)
+
+    # Posiciona logo após o '[' da lista de clientes
+    while True:
+        inicio = buffer.lstrip()[:1]
+        chave = buffer.find('"clientes"') if inicio == "{" else 0
+        abre = buffer.find("[", chave) if chave >= 0 else -1
+        if abre >= 0:
+            break
+        bloco = arquivo.read(tamanho_bloco)
+        if not bloco:
+            raise ValueError("Lista de clientes não encontrada no arquivo JSON")
+        buffer += bloco
+    pos = abre + 1
+
+    while True:
+        pos = _SEPARADORES.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("Fim do buffer", buffer, pos)
+            registro, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Objeto incompleto no fim do buffer: lê mais e tenta de novo
+            bloco = arquivo.read(tamanho_bloco)
+            if not bloco:
+                raise ValueError("Arquivo JSON terminou antes do fim da lista de clientes")
+            if len(buffer) - pos > REGISTRO_MAX:
+                raise ValueError(f"Registro JSON inválido próximo ao caractere {pos}")
+            buffer = buffer[pos:] + bloco
+            pos = 0
+            continue
+        yield registro
+
+
+def iterar_ndjson(arquivo) -> Iterator:
+    """Um cliente por linha; linhas inválidas viram rejeições, não erros fatais"""
+    for linha in arquivo:
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            yield json.loads(linha)
+        except json.JSONDecodeError as e:
+            yield RegistroInvalido(linha, f"JSON inválido: {e.msg}")
+
+
+def iterar_csv(arquivo, delimitador: str = ",") -> Iterator[Dict]:
+    """
+    Uma linha por cliente, com cabeçalho. As colunas podem ter os nomes da
+    API (possuiRestricoes, atrasos30Dias) ou do banco (possui_restricoes,
+    atrasos_30_dias); células vazias contam como ausentes.
+    """
+    for linha in csv.DictReader(arquivo, delimiter=delimitador):
+        registro = {}
+        historico = {}
+        for coluna, valor in linha.items():
+            if coluna is None or valor is None or valor.strip() == "":
+                continue
+            destino = historico if coluna.lower().startswith("atrasos") else registro
+            destino[coluna.strip()] = valor.strip()
+        registro["historicoPagamentos"] = historico
+        yield registro
+
+
+class RegistroInvalido:
+    """Registro que nem chegou a ser lido (ex.: linha NDJSON malformada)"""
+
+    def __init__(self, dados: str, erro: str):
+        self.dados = dados
+        self.erro = erro
+
+
+def detectar_formato(caminho: Path) -> str:
+    sufixo = caminho.suffix.lower()
+    if sufixo in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if sufixo in (".csv", ".tsv", ".txt"):
+        return "csv"
+    return "json"
+
+
+def ler_registros(arquivo, formato: str, delimitador: str = ",") -> Iterator:
+    if formato == "ndjson":
+        return iterar_ndjson(arquivo)
+    if formato == "csv":
+        return iterar_csv(arquivo, delimitador)
+    return iterar_json(arquivo)
+
+
+def validar(registro) -> tuple:
+    """Valores prontos para o banco; ValueError com o motivo se inválido"""
+    if isinstance(registro, RegistroInvalido):
+        raise ValueError(registro.erro)
+    return validar_cliente(registro)
+
+
+# ==============================================
+# ESCRITA NO BANCO
+# ==============================================
+
+_COLUNAS = ", ".join(COLUNAS_CLIENTE)
+_MARCADORES = "(" + ", ".join(["%s"] * len(COLUNAS_CLIENTE)) + ")"
+_ATUALIZACAO = ",\n    ".join(f"{coluna} = VALUES({coluna})" for coluna in COLUNAS_CLIENTE[1:])
+
+
+def cpfs_existentes(cursor, cpfs: List[str]) -> set:
+    """CPFs do lote que já estão no banco, para separar novos de atualizados"""
+    if not cpfs:
+        return set()
+    cursor.execute(
+        f"SELECT cpf FROM clientes WHERE cpf IN ({', '.join(['%s'] * len(cpfs))})",
+        tuple(cpfs)
+    )
+    return {cpf for (cpf,) in cursor.fetchall()}
+
+
+def gravar_upsert(cursor, linhas: List[tuple]):
+    """Um único INSERT multi-linha com ON DUPLICATE KEY UPDATE para o lote"""
+    cursor.execute(
+        f"INSERT INTO clientes ({_COLUNAS})\nVALUES {', '.join([_MARCADORES] * len(linhas))}\n"
+        f"ON DUPLICATE KEY UPDATE\n    {_ATUALIZACAO}",
+        [valor for linha in linhas for valor in linha]
+    )
+
+
+def _campo_tsv(valor) -> str:
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    return str(valor).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def preparar_load_data(cursor):
+    """Tabela temporária (sem índices) que recebe cada lote antes do upsert"""
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE IF NOT EXISTS clientes_carga "
+        f"SELECT {_COLUNAS} FROM clientes WHERE FALSE"
+    )
+
+
+def gravar_load_data(cursor, linhas: List[tuple]):
+    """
+    LOAD DATA LOCAL INFILE do lote para a tabela temporária e um único
+    INSERT ... SELECT ... ON DUPLICATE KEY UPDATE dela para clientes.
+    Requer local_infile=ON no servidor.
+    """
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".tsv", delete=False) as tsv:
+        for linha in linhas:
+            tsv.write("\t".join(_campo_tsv(valor) for valor in linha) + "\n")
+    try:
+        cursor.execute("DELETE FROM clientes_carga")
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE clientes_carga "
+            f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+            f"({_COLUNAS})",
+            (tsv.name,)
+        )
+        atualizacao = ", ".join(f"{coluna} = c.{coluna}" for coluna in COLUNAS_CLIENTE[1:])
+        cursor.execute(
+            f"INSERT INTO clientes ({_COLUNAS}) "
+            f"SELECT * FROM (SELECT {_COLUNAS} FROM clientes_carga) AS c "
+            f"ON DUPLICATE KEY UPDATE {atualizacao}"
         )
+    finally:
+        os.unlink(tsv.name)
+
+
+GRAVADORES = {"upsert": gravar_upsert, "load_data": gravar_load_data}
+
+
+# ==============================================
+# CHECKPOINT
+# ==============================================
+
+class Checkpoint:
+    """
+    Progresso confirmado da carga de um arquivo, gravado após cada commit.
+    Só vale para o mesmo arquivo (caminho, tamanho e data de modificação).
+    """
+
+    def __init__(self, caminho: Path):
+        self.caminho = caminho.with_name(caminho.name + ".checkpoint.json")
+        info = caminho.stat()
+        self.identidade = {
+            "arquivo": str(caminho.resolve()),
+            "tamanho": info.st_size,
+            "modificado_em": info.st_mtime_ns,
+        }
+
+    def carregar(self) -> Optional[Dict]:
+        try:
+            dados = json.loads(self.caminho.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        if dados.get("identidade") != self.identidade:
+            print("⚠️ Checkpoint de outra versão do arquivo ignorado; recomeçando do início")
+            return None
+        return dados["estado"]
+
+    def salvar(self, estado: Dict):
+        temporario = self.caminho.with_suffix(".tmp")
+        temporario.write_text(
+            json.dumps({"identidade": self.identidade, "estado": estado}), encoding="utf-8"
+        )
+        os.replace(temporario, self.caminho)
+
+    def remover(self):
+        self.caminho.unlink(missing_ok=True)
+
+
+# ==============================================
+# CARGA
+# ==============================================
+
+def _lotes(registros: Iterable, tamanho: int) -> Iterator[List]:
+    while True:
+        lote = list(islice(registros, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def carregar_clientes(
+    caminho=ARQUIVO_PADRAO,
+    formato: Optional[str] = None,
+    tamanho_lote: int = 5000,
+    metodo: str = "upsert",
+    retomar: bool = True,
+    delimitador: str = ",",
+) -> Dict:
+    """
+    Carrega o arquivo em lotes de `tamanho_lote` registros e retorna o
+    resumo (lidos, novos, atualizados, rejeitados, tempo). Com `retomar`,
+    continua de um checkpoint válido do mesmo arquivo. Repetir um lote já
+    gravado é inofensivo, pois a escrita é um upsert pelo CPF.
+    """
+    caminho = Path(caminho)
+    formato = formato or detectar_formato(caminho)
+    checkpoint = Checkpoint(caminho)
+    caminho_rejeitados = caminho.with_name(caminho.name + ".rejeitados.ndjson")
+
+    estado = checkpoint.carregar() if retomar else None
+    if estado:
+        print(f"↩️ Retomando após {estado['lidos']} registros já confirmados")
+    else:
+        estado = {"lidos": 0, "novos": 0, "atualizados": 0, "rejeitados": 0,
+                  "duplicados_no_lote": 0, "lotes": 0, "segundos": 0.0}
+    ja_lidos = estado["lidos"]
+    if ja_lidos and "bytes_rejeitados" in estado and caminho_rejeitados.exists():
+        # Rejeições escritas depois do último checkpoint serão escritas de novo ao refazer o lote
+        os.truncate(caminho_rejeitados, estado["bytes_rejeitados"])
+
+    cache = criar_cache()
+    gravar = GRAVADORES[metodo]
+    conn = None
+    try:
+        if metodo == "load_data" and database.backend.nome != "mysql":
+            raise ValueError("LOAD DATA LOCAL INFILE requer DB_BACKEND=mysql; use --metodo upsert")
+        conn = database.abrir_conexao(allow_local_infile=metodo == "load_data")
         cursor = conn.cursor()
+        if metodo == "load_data":
+            preparar_load_data(cursor)
+
+        with open(caminho, 'r', encoding='utf-8', newline='') as arquivo, \
+                open(caminho_rejeitados, 'a' if ja_lidos else 'w', encoding='utf-8') as saida_rejeitados:
+            registros = enumerate(ler_registros(arquivo, formato, delimitador), start=1)
+            for _ in islice(registros, ja_lidos):
+                pass
+
+            inicio = time.perf_counter()
+            for lote in _lotes(registros, tamanho_lote):
+                inicio_lote = time.perf_counter()
+                validos: Dict[str, tuple] = {}
+                rejeitados = []
+                for numero, registro in lote:
+                    try:
+                        valores = validar(registro)
+                    except ValueError as e:
+                        dados = registro.dados if isinstance(registro, RegistroInvalido) else registro
+                        rejeitados.append({"registro": numero, "erro": str(e), "dados": dados})
+                        continue
+                    if valores[0] in validos:
+                        estado["duplicados_no_lote"] += 1
+                    validos[valores[0]] = valores  # o último do lote prevalece
+
+                existentes = cpfs_existentes(cursor, list(validos))
+                if validos:
+                    gravar(cursor, list(validos.values()))
+                conn.commit()
+
+                for rejeitado in rejeitados:
+                    saida_rejeitados.write(json.dumps(rejeitado, ensure_ascii=False, default=str) + "\n")
+                saida_rejeitados.flush()
+                estado["bytes_rejeitados"] = os.fstat(saida_rejeitados.fileno()).st_size
+
+                duracao = time.perf_counter() - inicio_lote
+                estado["lidos"] += len(lote)
+                estado["novos"] += len(validos) - len(existentes)
+                estado["atualizados"] += len(existentes)
+                estado["rejeitados"] += len(rejeitados)
+                estado["lotes"] += 1
+                estado["segundos"] += duracao
+                checkpoint.salvar(estado)
+
+                # Com CACHE_BACKEND compartilhado já remove as entradas; com `memoria`, a API as
+                # descarta ao conferir o atualizado_em na próxima consulta
+                cache.invalidar(*validos)
+
+                print(f"  lote {estado['lotes']}: {len(lote)} registros "
+                      f"({len(rejeitados)} rejeitados) em {duracao:.2f}s - "
+                      f"{len(lote) / duracao:,.0f} registros/s")
 
-        # 2. Carrega dados do JSON
-        caminho_json = Path('data/clientes.json')
-        with open(caminho_json, 'r', encoding='utf-8') as file:
-            dados = json.load(file)
-
-        # Verifica duplicados no JSON
-        cpfs = [cli['cpf'] for cli in dados['clientes']]
-        duplicados = [cpf for cpf, count in Counter(cpfs).items() if count > 1]
-        if duplicados:
-            print(f"⚠️ Aviso: CPFs duplicados no arquivo JSON: {duplicados}")
-
-        # 3. Insere cada cliente com tratamento de duplicados
-        inseridos = 0
-        duplicados_db = 0
-        
-        for cliente in dados['clientes']:
-            try:
-                cursor.execute("""
-                    INSERT INTO clientes (
-                        cpf, nome, score, possui_restricoes, renda_mensal,
-                        atrasos_30_dias, atrasos_60_dias, atrasos_90_dias
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        nome = VALUES(nome),
-                        score = VALUES(score),
-                        possui_restricoes = VALUES(possui_restricoes),
-                        renda_mensal = VALUES(renda_mensal),
-                        atrasos_30_dias = VALUES(atrasos_30_dias),
-                        atrasos_60_dias = VALUES(atrasos_60_dias),
-                        atrasos_90_dias = VALUES(atrasos_90_dias)
-                """, (
-                    cliente['cpf'],
-                    cliente['nome'],
-                    cliente['score'],
-                    cliente['possuiRestricoes'],
-                    cliente['rendaMensal'],
-                    cliente['historicoPagamentos']['atrasos30Dias'],
-                    cliente['historicoPagamentos']['atrasos60Dias'],
-                    cliente['historicoPagamentos']['atrasos90Dias']
-                ))
-                inseridos += 1
-            except mysql.connector.Error as err:
-                if err.errno == 1062:  # Código do erro de duplicata
-                    duplicados_db += 1
-                    print(f"⚠️ CPF {cliente['cpf']} já existe no banco. Atualizando registro...")
-                else:
-                    raise
-        
-        conn.commit()
+        decorrido = time.perf_counter() - inicio
+        checkpoint.remover()
+
+        lidos_agora = estado["lidos"] - ja_lidos
         print(f"\n✅ Resultado:")
-        print(f"- Total de registros no JSON: {len(dados['clientes'])}")
-        print(f"- Registros inseridos: {inseridos}")
-        print(f"- Registros atualizados: {duplicados_db}")
-    
+        print(f"- Total de registros lidos: {estado['lidos']}")
+        print(f"- Registros inseridos: {estado['novos']}")
+        print(f"- Registros atualizados: {estado['atualizados']}")
+        print(f"- Registros rejeitados: {estado['rejeitados']}"
+              + (f" (detalhes em {caminho_rejeitados})" if estado["rejeitados"] else ""))
+        if estado["duplicados_no_lote"]:
+            print(f"- CPFs repetidos no mesmo lote (vale o último): {estado['duplicados_no_lote']}")
+        print(f"- Vazão: {lidos_agora / decorrido if decorrido else 0:,.0f} registros/s "
+              f"({lidos_agora} registros em {decorrido:.1f}s)")
+        return estado
+
     except Exception as e:
         print(f"\n❌ Erro grave: {e}")
+        if estado["lidos"]:
+            print(f"   {estado['lidos']} registros confirmados; execute novamente para continuar")
+        raise
     finally:
         if conn:
             conn.close()
 
-if __name__ == "__main__":
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga em lote de clientes")
+    parser.add_argument("arquivo", nargs="?", default=ARQUIVO_PADRAO)
+    parser.add_argument("--formato", choices=FORMATOS, help="Padrão: pela extensão do arquivo")
+    parser.add_argument("--lote", type=int, default=int(os.getenv("CARGA_LOTE", 5000)),
+                        help="Registros por lote/commit")
+    parser.add_argument("--metodo", choices=METODOS, default=os.getenv("CARGA_METODO", "upsert"),
+                        help="upsert multi-linha ou LOAD DATA LOCAL INFILE")
+    parser.add_argument("--delimitador", default=",", help="Separador do CSV")
+    parser.add_argument("--do-inicio", action="store_true", help="Ignora o checkpoint existente")
+    args = parser.parse_args()
+
     print("Iniciando carga de clientes...")
-    carregar_clientes()
-    print("Processo concluído.")
\ No newline at end of file
+    try:
+        carregar_clientes(
+            args.arquivo,
+            formato=args.formato,
+            tamanho_lote=args.lote,
+            metodo=args.metodo,
+            retomar=not args.do_inicio,
+            delimitador=args.delimitador,
+        )
+    except Exception:
+        raise SystemExit(1)
+    print("Processo concluído.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+Compactação da floresta: candidatas menores e o custo de cada uma
+
+O RandomForest é treinado sem limite de profundidade; em bases grandes o
+artefato chega a centenas de MB e cada análise percorre todas as árvores
+até o fim. Este comando parte de um modelo treinado e gera candidatas
+combinando três reduções, sem retreinar:
+- subconjunto de árvores: seleção gulosa, que a cada passo acrescenta a
+  árvore que mais reduz o erro quadrático (Brier) da média das
+  probabilidades na metade de seleção do holdout;
+- poda por profundidade: nós no nível `profundidade` viram folhas;
+- poda por folha: divisões com um filho de menos de `amostras_folha`
+  amostras (ponderadas pelo bootstrap) deixam de existir.
+A poda reaproveita a distribuição de classes que o scikit-learn guarda em
+todos os nós, então a folha nova prevê o que o nó interno já previa.
+Limiares em float32 não geram candidatas à parte: o artefato compilado
+(scoring.FlorestaCompilada) já os grava assim, e o relatório traz o
+tamanho do joblib e do compilado lado a lado.
+
+Para cada candidata o relatório mostra tamanho do artefato, tempo de
+carga (compilado mapeado e joblib), latência de uma linha e de um lote e
+AUC/acurácia na metade de avaliação do holdout, com a diferença para o
+original e a concordância das decisões. O holdout são os 20% de clientes
+mais recentes, como em credit_model.py. A escolhida (pelo nome, ou `auto`:
+a de menor artefato compilado dentro da tolerância de AUC) entra no
+registro de versões (registro.py) como qualquer modelo treinado.
+
+Uso (a partir de CreditAI_Back/):
+    python compactacao.py                                  # relatório do modelo ativo
+    python compactacao.py --arvores 10,25,50 --profundidades 8,12 --amostras-folha 0,50
+    python compactacao.py --registrar a25-p12 --candidato 0.1
+    python compactacao.py --registrar auto --tolerancia 0.002 --promover
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import argparse
+import copy
+import itertools
+import json
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.tree._tree import Tree
+
+from credit_model import avaliar, dados_sinteticos, load_data, load_snapshot
+from modelo import MODEL_FILE
+from registro import RegistroModelos
+from scoring import FlorestaCompilada, compilar_modelo
+
+_FOLHA = -1
+_INDEFINIDO = -2
+
+
+# ==============================================
+# CANDIDATAS
+# ==============================================
+
+def ordem_gulosa(modelo, X: np.ndarray, y: np.ndarray, maximo: int) -> List[int]:
+    """
+    Índices das árvores na ordem da seleção gulosa sobre (X, y): cada passo
+    escolhe, sem repetição, a árvore cuja inclusão deixa a média das
+    probabilidades com o menor erro quadrático em relação a y.
+    """
+    proba = np.stack([arvore.predict_proba(X)[:, -1] for arvore in modelo.estimators_])
+    alvo = (y == modelo.classes_[-1]).astype(np.float64)
+
+    escolhidas: List[int] = []
+    soma = np.zeros(len(y))
+    livres = np.ones(len(proba), dtype=bool)
+    for passo in range(min(maximo, len(proba))):
+        media = (soma + proba) / (passo + 1)
+        erro = np.mean((media - alvo) ** 2, axis=1)
+        erro[~livres] = np.inf
+        melhor = int(np.argmin(erro))
+        escolhidas.append(melhor)
+        livres[melhor] = False
+        soma += proba[melhor]
+    return escolhidas
+
+
+def podar_arvore(arvore: Tree, profundidade: Optional[int] = None,
+                 amostras_folha: float = 0) -> Tree:
+    """
+    Cópia da árvore com os nós abaixo de `profundidade` removidos e sem as
+    divisões em que um dos filhos tem menos de `amostras_folha` amostras.
+    A ordem dos nós (pré-ordem, pai antes dos filhos) é mantida.
+    """
+    estado = arvore.__getstate__()
+    nos, valores = estado["nodes"], estado["values"]
+    esquerda, direita = nos["left_child"], nos["right_child"]
+    amostras = nos["weighted_n_node_samples"]
+
+    manter = np.zeros(len(nos), dtype=bool)
+    cortar = np.zeros(len(nos), dtype=bool)
+    nivel, altura = np.array([0]), 0
+    while nivel.size:
+        manter[nivel] = True
+        internos = nivel[esquerda[nivel] != _FOLHA]
+        corte = np.zeros(internos.size, dtype=bool)
+        if profundidade is not None and altura >= profundidade:
+            corte[:] = True
+        if amostras_folha:
+            corte |= np.minimum(amostras[esquerda[internos]], amostras[direita[internos]]) < amostras_folha
+        cortar[internos[corte]] = True
+        internos = internos[~corte]
+        if internos.size:
+            altura += 1
+        nivel = np.concatenate([esquerda[internos], direita[internos]])
+
+    indices = np.flatnonzero(manter)
+    novo_indice = np.full(len(nos), _FOLHA, dtype=np.int64)
+    novo_indice[indices] = np.arange(len(indices))
+    podados = nos[indices].copy()
+    for campo in ("left_child", "right_child"):
+        filhos = podados[campo]
+        podados[campo] = np.where(filhos == _FOLHA, _FOLHA, novo_indice[np.maximum(filhos, 0)])
+    folhas = cortar[indices]
+    podados["left_child"][folhas] = _FOLHA
+    podados["right_child"][folhas] = _FOLHA
+    podados["feature"][folhas] = _INDEFINIDO
+    podados["threshold"][folhas] = _INDEFINIDO
+    podados["missing_go_to_left"][folhas] = 0
+
+    nova = Tree(arvore.n_features, np.asarray(arvore.n_classes, dtype=np.intp), arvore.n_outputs)
+    nova.__setstate__({
+        "max_depth": altura,
+        "node_count": len(indices),
+        "nodes": podados,
+        "values": np.ascontiguousarray(valores[indices]),
+    })
+    return nova
+
+
+def montar_candidata(modelo, arvores: Sequence[int], profundidade: Optional[int] = None,
+                     amostras_folha: float = 0):
+    """RandomForestClassifier com as árvores `arvores` do modelo, podadas se pedido"""
+    candidata = copy.copy(modelo)
+    estimadores = []
+    for indice in arvores:
+        estimador = modelo.estimators_[indice]
+        if profundidade is not None or amostras_folha:
+            estimador = copy.copy(estimador)
+            estimador.tree_ = podar_arvore(estimador.tree_, profundidade, amostras_folha)
+        estimadores.append(estimador)
+    candidata.estimators_ = estimadores
+    candidata.n_estimators = len(estimadores)
+    return candidata
+
+
+def nome_candidata(arvores: Optional[int], profundidade: Optional[int], amostras_folha: float) -> str:
+    partes = []
+    if arvores:
+        partes.append(f"a{arvores}")
+    if profundidade is not None:
+        partes.append(f"p{profundidade}")
+    if amostras_folha:
+        partes.append(f"f{amostras_folha:g}")
+    return "-".join(partes) or "original"
+
+
+def gerar_candidatas(modelo, X_selecao: np.ndarray, y_selecao: np.ndarray,
+                     arvores: Sequence[int] = (), profundidades: Sequence[int] = (),
+                     amostras_folha: Sequence[float] = ()) -> Dict[str, Dict]:
+    """
+    Todas as combinações de subconjunto × profundidade × amostras por
+    folha (mais o original), por nome: {"modelo", "parametros"}.
+    """
+    total = len(modelo.estimators_)
+    tamanhos = sorted({k for k in arvores if 0 < k < total})
+    ordem = ordem_gulosa(modelo, X_selecao, y_selecao, max(tamanhos)) if tamanhos else []
+
+    candidatas = {}
+    for k, profundidade, folha in itertools.product(
+        [None] + tamanhos, [None] + sorted(set(profundidades)), sorted({0, *amostras_folha})
+    ):
+        nome = nome_candidata(k, profundidade, folha)
+        candidatas[nome] = {
+            "modelo": montar_candidata(
+                modelo, ordem[:k] if k else range(total), profundidade, folha
+            ) if nome != "original" else modelo,
+            "parametros": {"arvores": k or total, "profundidade": profundidade, "amostras_folha": folha},
+        }
+    return candidatas
+
+
+# ==============================================
+# MEDIÇÃO
+# ==============================================
+
+def _tamanho(caminho: Path) -> int:
+    if caminho.is_dir():
+        return sum(arquivo.stat().st_size for arquivo in caminho.iterdir())
+    return caminho.stat().st_size
+
+
+def _ms(inicio: float) -> float:
+    return 1000 * (time.perf_counter() - inicio)
+
+
+def medir(modelo, X_avaliacao: np.ndarray, y_avaliacao: np.ndarray,
+          referencia: Optional[Dict] = None, lote: int = 1000, repeticoes: int = 200) -> Dict:
+    """
+    Tamanho, carga, latência e métricas de holdout de um modelo. Com
+    `referencia` (o resultado do original), acrescenta as diferenças de
+    AUC/acurácia e a concordância das decisões.
+    """
+    with tempfile.TemporaryDirectory(prefix="compactacao") as pasta:
+        caminho = Path(pasta) / "modelo.joblib"
+        joblib.dump(modelo, caminho)
+        compilado = compilar_modelo(modelo)
+        if not isinstance(compilado, FlorestaCompilada):
+            raise ValueError("Candidata não pôde ser compilada com paridade exata")
+        compilado.salvar(Path(pasta) / "compilado")
+
+        inicio = time.perf_counter()
+        floresta, _ = FlorestaCompilada.carregar(Path(pasta) / "compilado", mmap=True)
+        floresta.predict_proba(X_avaliacao[:1])
+        carga_ms = _ms(inicio)
+        inicio = time.perf_counter()
+        joblib.load(caminho)
+        carga_joblib_ms = _ms(inicio)
+        tamanhos = {"joblib": _tamanho(caminho), "compilado": _tamanho(Path(pasta) / "compilado")}
+
+    # Uma linha pela travessia compilada; lotes acima de limiar_lote vão ao scikit-learn, como na API
+    linhas = X_avaliacao[np.arange(repeticoes) % len(X_avaliacao)]
+    tempos = []
+    for linha in linhas:
+        inicio = time.perf_counter()
+        compilado.predict_proba(linha.reshape(1, -1))
+        tempos.append(_ms(inicio))
+    bloco = X_avaliacao[:lote]
+    tempos_lote = []
+    for _ in range(5):
+        inicio = time.perf_counter()
+        compilado.predict_proba(bloco)
+        tempos_lote.append(_ms(inicio))
+
+    resultado = {
+        "arvores": compilado.n_arvores,
+        "nos": compilado.n_nos,
+        "profundidade_max": compilado.profundidade,
+        "joblib_mb": round(tamanhos["joblib"] / 2 ** 20, 2),
+        "compilado_mb": round(tamanhos["compilado"] / 2 ** 20, 2),
+        "carga_ms": round(carga_ms, 2),
+        "carga_joblib_ms": round(carga_joblib_ms, 1),
+        "linha_p50_ms": round(float(np.percentile(tempos, 50)), 3),
+        "linha_p95_ms": round(float(np.percentile(tempos, 95)), 3),
+        "lote_linhas": len(bloco),
+        "lote_ms": round(float(np.median(tempos_lote)), 2),
+        "holdout": avaliar(modelo, X_avaliacao, y_avaliacao),
+    }
+    decisoes = modelo.predict(X_avaliacao)
+    if referencia is not None:
+        original = referencia["holdout"]
+        resultado["delta"] = {
+            nome: round(valor - original[nome], 4)
+            for nome, valor in resultado["holdout"].items() if nome in original
+        }
+        resultado["concordancia"] = round(float(np.mean(decisoes == referencia["_decisoes"])), 4)
+    resultado["_decisoes"] = decisoes
+    return resultado
+
+
+# ==============================================
+# RELATÓRIO E ESCOLHA
+# ==============================================
+
+def imprimir(relatorio: Dict[str, Dict]):
+    print(f"{'candidata':<16}{'árvores':>8}{'nós':>10}{'prof':>6}{'joblib MB':>11}{'comp MB':>9}"
+          f"{'carga ms':>10}{'1 linha ms':>12}{'lote ms':>9}{'AUC':>8}{'ΔAUC':>8}{'acur':>8}{'concord':>9}")
+    for nome, r in relatorio.items():
+        holdout, delta = r["holdout"], r.get("delta", {})
+        print(f"{nome:<16}{r['arvores']:>8}{r['nos']:>10}{r['profundidade_max']:>6}"
+              f"{r['joblib_mb']:>11.2f}{r['compilado_mb']:>9.2f}{r['carga_ms']:>10.2f}"
+              f"{r['linha_p50_ms']:>12.3f}{r['lote_ms']:>9.2f}"
+              f"{holdout.get('roc_auc', float('nan')):>8.4f}{delta.get('roc_auc', 0):>+8.4f}"
+              f"{holdout.get('acuracia', float('nan')):>8.4f}{r.get('concordancia', 1):>9.4f}")
+
+
+def escolher(relatorio: Dict[str, Dict], tolerancia: float) -> str:
+    """A candidata de menor artefato compilado com perda de AUC (ou acurácia) até `tolerancia`"""
+    def dentro(resultado: Dict) -> bool:
+        delta = resultado.get("delta", {})
+        metrica = "roc_auc" if "roc_auc" in delta else "acuracia"
+        return delta.get(metrica, 0) >= -tolerancia
+
+    aceitas = [nome for nome, resultado in relatorio.items() if dentro(resultado)]
+    return min(aceitas, key=lambda nome: (relatorio[nome]["compilado_mb"], relatorio[nome]["linha_p50_ms"]))
+
+
+def _lista(texto: str, tipo=int) -> List:
+    return [tipo(valor) for valor in texto.split(",") if valor.strip()] if texto else []
+
+
+def _carregar_modelo(registro: RegistroModelos, versao: Optional[str],
+                     caminho: Optional[str]) -> Tuple[object, str]:
+    if caminho:
+        return joblib.load(caminho), Path(caminho).name
+    versao = versao or registro.manifesto().get("ativo")
+    if versao:
+        return joblib.load(registro.pasta / versao / "modelo.joblib"), versao
+    return joblib.load(MODEL_FILE), MODEL_FILE
+
+
+def compactar(
+    versao: Optional[str] = None,
+    caminho: Optional[str] = None,
+    arvores: Sequence[int] = (),
+    profundidades: Sequence[int] = (),
+    amostras_folha: Sequence[float] = (),
+    snapshot: Optional[str] = None,
+    sintetico: Optional[int] = None,
+    max_holdout: int = 200000,
+    lote: int = 1000,
+    registrar: Optional[str] = None,
+    tolerancia: float = 0.005,
+    candidato: Optional[float] = None,
+    promover: bool = False,
+    saida: Optional[str] = None,
+) -> Dict:
+    """
+    Gera e mede as candidatas do modelo (`caminho`, a `versao` do registro
+    ou a ativa) e, com `registrar`, registra a escolhida. Retorna o
+    relatório por candidata.
+    """
+    registro = RegistroModelos()
+    modelo, base = _carregar_modelo(registro, versao, caminho)
+
+    if sintetico:
+        X, y, _ = dados_sinteticos(sintetico)
+    else:
+        X, y, _ = load_snapshot(0, snapshot or None) if snapshot is not None else load_data()
+    # Holdout de credit_model.py (os clientes mais recentes), limitado aos últimos max_holdout
+    corte = max(int(len(y) * 0.8), len(y) - max_holdout)
+    X_holdout, y_holdout = np.asarray(X[corte:]), np.asarray(y[corte:])
+    if len(np.unique(y_holdout)) < 2:
+        raise ValueError("Holdout sem as duas classes; não há como comparar as candidatas")
+    # Linhas alternadas: a seleção de árvores não vê as linhas em que é avaliada
+    X_selecao, y_selecao = X_holdout[0::2], y_holdout[0::2]
+    X_avaliacao, y_avaliacao = X_holdout[1::2], y_holdout[1::2]
+
+    inicio = time.perf_counter()
+    candidatas = gerar_candidatas(modelo, X_selecao, y_selecao, arvores, profundidades, amostras_folha)
+    print(f"{len(candidatas)} candidatas de {base} ({len(modelo.estimators_)} árvores) "
+          f"em {time.perf_counter() - inicio:.1f}s; holdout de {len(y_holdout)} linhas")
+
+    relatorio = {"original": medir(modelo, X_avaliacao, y_avaliacao, lote=lote)}
+    for nome, candidata in candidatas.items():
+        if nome != "original":
+            relatorio[nome] = medir(candidata["modelo"], X_avaliacao, y_avaliacao,
+                                    referencia=relatorio["original"], lote=lote)
+    for nome, resultado in relatorio.items():
+        resultado.pop("_decisoes")
+        resultado["parametros"] = candidatas[nome]["parametros"]
+    imprimir(relatorio)
+
+    if saida:
+        Path(saida).write_text(json.dumps(
+            {"base": base, "linhas_holdout": len(y_holdout), "candidatas": relatorio},
+            indent=2, ensure_ascii=False,
+        ), encoding="utf-8")
+        print(f"Relatório gravado em {saida}")
+
+    if registrar:
+        nome = escolher(relatorio, tolerancia) if registrar == "auto" else registrar
+        if nome not in candidatas:
+            raise KeyError(f"Candidata {nome} não existe; opções: {', '.join(candidatas)}")
+        escolhida = relatorio[nome]
+        metricas = {
+            **escolhida["holdout"],
+            "compactacao": {"base": base, "candidata": nome, **escolhida["parametros"],
+                            "compilado_mb": escolhida["compilado_mb"],
+                            "linha_p50_ms": escolhida["linha_p50_ms"]},
+        }
+        # Mesmas linhas de treino da base: o incremental sobre a compactada parte do mesmo id
+        ultimo_id = registro.manifesto()["versoes"].get(base, {}).get("ultimo_id")
+        nova = registro.registrar(candidatas[nome]["modelo"], metricas, origem="compactado",
+                                  ultimo_id=ultimo_id)
+        if candidato:
+            registro.definir_candidato(nova, candidato)
+        elif promover:
+            registro.promover(nova)
+        estado = (f"em sombra ({candidato:.0%} das análises)" if candidato
+                  else "promovida" if promover else "registrada, sem promover")
+        print(f"✅ Candidata {nome} {estado}: versão {nova}")
+    return relatorio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compactação do modelo de crédito")
+    parser.add_argument("--versao", help="Versão do registro a compactar (padrão: a ativa)")
+    parser.add_argument("--modelo", help="Caminho de um joblib, em vez do registro")
+    parser.add_argument("--arvores", default="10,25,50",
+                        help="Tamanhos do subconjunto de árvores, separados por vírgula")
+    parser.add_argument("--profundidades", default="8,12",
+                        help="Profundidades máximas da poda, separadas por vírgula")
+    parser.add_argument("--amostras-folha", default="0",
+                        help="Mínimo de amostras por folha na poda, separados por vírgula")
+    parser.add_argument("--snapshot", nargs="?", const="", metavar="PASTA",
+                        help="Holdout lido do snapshot de features (padrão SNAPSHOT_DIR)")
+    parser.add_argument("--sintetico", type=int, help="Holdout de N linhas sintéticas, sem banco")
+    parser.add_argument("--max-holdout", type=int, default=200000,
+                        help="Máximo de linhas de holdout (as mais recentes)")
+    parser.add_argument("--lote", type=int, default=1000, help="Linhas do lote na medição de latência")
+    parser.add_argument("--saida", help="Grava o relatório em JSON")
+    parser.add_argument("--registrar", metavar="CANDIDATA",
+                        help="Registra a candidata (nome do relatório, ou auto)")
+    parser.add_argument("--tolerancia", type=float, default=0.005,
+                        help="Perda de AUC aceita na escolha auto")
+    parser.add_argument("--promover", action="store_true", help="Promove a candidata registrada")
+    parser.add_argument("--candidato", type=float, metavar="FRACAO",
+                        help="Avalia a candidata registrada em sombra nessa fração das análises")
+    args = parser.parse_args()
+
+    compactar(
+        versao=args.versao,
+        caminho=args.modelo,
+        arvores=_lista(args.arvores),
+        profundidades=_lista(args.profundidades),
+        amostras_folha=_lista(args.amostras_folha, float),
+        snapshot=args.snapshot,
+        sintetico=args.sintetico,
+        max_holdout=args.max_holdout,
+        lote=args.lote,
+        registrar=args.registrar,
+        tolerancia=args.tolerancia,
+        candidato=args.candidato,
+        promover=args.promover,
+        saida=args.saida,
+    )
+
+
+if __name__ == "__main__":
+    main()
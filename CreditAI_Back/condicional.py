@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Requisições condicionais (ETag) e compressão das respostas
+
+As leituras que o frontend repete (GET /clientes e GET
+/analise-credito/{cpf}) recebem um ETag forte calculado a partir do que
+determina a resposta, e não do corpo: o atualizado_em das linhas
+(migrations/002), os parâmetros da consulta e, na análise, as versões do
+modelo e das regras. Por isso um If-None-Match que coincide é respondido
+com 304 antes da inferência e da serialização.
+
+MiddlewareCompressao comprime as respostas textuais a partir de
+COMPRESSAO_MINIMO_BYTES com brotli (se o pacote estiver instalado) ou
+gzip, conforme o Accept-Encoding. As respostas em fluxo (NDJSON) são
+comprimidas bloco a bloco. O ETag de uma resposta comprimida ganha o
+sufixo da codificação, pois a RFC 9110 pede validadores fortes distintos
+para representações distintas; a comparação do If-None-Match ignora esse
+sufixo.
+"""
+
+from typing import Iterable, Optional
+import gzip
+import hashlib
+import logging
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+import metricas
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+    logger.warning("Pacote brotli não instalado; comprimindo respostas apenas com gzip")
+
+# Dados de clientes: o navegador pode guardar, mas revalida a cada uso
+CACHE_CONTROL = "private, no-cache"
+
+# Em ordem de preferência do servidor, para pesos iguais no Accept-Encoding
+CODIFICACOES = ("br", "gzip") if brotli is not None else ("gzip",)
+_SUFIXOS = tuple(f'-{codificacao}"' for codificacao in ("br", "gzip"))
+
+_TIPOS_COMPRIMIVEIS = ("application/json", "application/x-ndjson", "text/")
+
+
+# ==============================================
+# ETAG E IF-NONE-MATCH
+# ==============================================
+
+def calcular_etag(*partes, linhas: Iterable = ()) -> str:
+    """
+    ETag forte (entre aspas) das `partes` e, em `linhas`, de pares
+    (id, atualizado_em) lidos do banco, na ordem dada
+    """
+    resumo = hashlib.blake2b(digest_size=16)
+    resumo.update("\x1f".join(map(str, partes)).encode("utf-8"))
+    for id_linha, atualizado_em in linhas:
+        resumo.update(f"\x1e{id_linha}\x1f{atualizado_em}".encode("utf-8"))
+    return f'"{resumo.hexdigest()}"'
+
+
+def _sem_codificacao(etag: str) -> str:
+    for sufixo in _SUFIXOS:
+        if etag.endswith(sufixo):
+            return etag[:-len(sufixo)] + '"'
+    return etag
+
+
+def etag_correspondente(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    O valor de If-None-Match que corresponde a `etag` (comparação fraca,
+    como a RFC 9110 pede para este cabeçalho), ou None. É ele que volta no
+    304, para o cliente manter a representação que já guardou.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if _sem_codificacao(candidato.removeprefix("W/")) == etag:
+            return candidato
+    return None
+
+
+def nao_modificado(etag: str) -> Response:
+    """304 sem corpo, com os mesmos cabeçalhos de cache da resposta completa"""
+    return Response(status_code=304, headers={
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    })
+
+
+def marcar(resposta: Response, etag: str) -> Response:
+    resposta.headers["ETag"] = etag
+    resposta.headers["Cache-Control"] = CACHE_CONTROL
+    return resposta
+
+
+# ==============================================
+# COMPRESSÃO
+# ==============================================
+
+def negociar(accept_encoding: str, codificacoes: Iterable[str] = CODIFICACOES) -> Optional[str]:
+    """Codificação de maior peso q aceita pelo cliente; None para enviar sem compressão"""
+    pesos = {}
+    for item in accept_encoding.lower().split(","):
+        nome, _, parametros = item.partition(";")
+        peso = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                peso = 0.0
+        pesos[nome.strip()] = peso
+
+    escolhida, maior = None, 0.0
+    for codificacao in codificacoes:
+        peso = pesos.get(codificacao, pesos.get("*", 0.0))
+        if peso > maior:
+            escolhida, maior = codificacao, peso
+    return escolhida
+
+
+class _Compressor:
+    """Compressão incremental: cada bloco sai descarregado, para quem lê em fluxo"""
+
+    def __init__(self, codificacao: str, nivel_gzip: int, qualidade_brotli: int):
+        self.brotli = codificacao == "br"
+        if self.brotli:
+            self._objeto = brotli.Compressor(quality=qualidade_brotli)
+        else:
+            self._objeto = zlib.compressobj(nivel_gzip, zlib.DEFLATED, 31)
+
+    def bloco(self, dados: bytes) -> bytes:
+        if self.brotli:
+            return self._objeto.process(dados) + self._objeto.flush()
+        return self._objeto.compress(dados) + self._objeto.flush(zlib.Z_SYNC_FLUSH)
+
+    def fim(self) -> bytes:
+        return self._objeto.finish() if self.brotli else self._objeto.flush()
+
+
+class MiddlewareCompressao:
+    """
+    Middleware ASGI: comprime o corpo das respostas textuais de pelo menos
+    `minimo` bytes (ou transmitidas em fluxo) na codificação negociada e
+    acrescenta Vary: Accept-Encoding. Respostas já codificadas e sem corpo
+    passam intactas.
+    """
+
+    def __init__(self, app, minimo: int = 1024, nivel_gzip: int = 1, qualidade_brotli: int = 4):
+        self.app = app
+        self.minimo = minimo
+        self.nivel_gzip = nivel_gzip
+        self.qualidade_brotli = qualidade_brotli
+
+    def _comprimir(self, codificacao: str, corpo: bytes) -> bytes:
+        if codificacao == "br":
+            return brotli.compress(corpo, quality=self.qualidade_brotli)
+        return gzip.compress(corpo, compresslevel=self.nivel_gzip, mtime=0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codificacao = negociar(Headers(scope=scope).get("accept-encoding", ""))
+        inicio = None
+        compressor = None
+        direto = False
+
+        async def enviar(mensagem):
+            nonlocal inicio, compressor, direto
+            if mensagem["type"] == "http.response.start":
+                # Retida até o primeiro bloco do corpo, que decide a compressão
+                inicio = mensagem
+                return
+            if mensagem["type"] != "http.response.body" or direto:
+                await send(mensagem)
+                return
+
+            corpo = mensagem.get("body", b"")
+            mais = mensagem.get("more_body", False)
+            if compressor is not None:
+                with metricas.etapa("compressao"):
+                    dados = compressor.bloco(corpo) if mais else compressor.bloco(corpo) + compressor.fim()
+                await send({"type": "http.response.body", "body": dados, "more_body": mais})
+                return
+
+            cabecalhos = MutableHeaders(scope=inicio)
+            comprimivel = (
+                inicio["status"] not in (204, 304)
+                and cabecalhos.get("content-type", "").startswith(_TIPOS_COMPRIMIVEIS)
+                and "content-encoding" not in cabecalhos
+            )
+            if comprimivel:
+                cabecalhos.add_vary_header("Accept-Encoding")
+            if not comprimivel or codificacao is None or (not mais and len(corpo) < self.minimo):
+                direto = True
+                await send(inicio)
+                await send(mensagem)
+                return
+
+            cabecalhos["Content-Encoding"] = codificacao
+            etag = cabecalhos.get("etag")
+            if etag and etag.startswith('"'):
+                cabecalhos["ETag"] = f'{etag[:-1]}-{codificacao}"'
+            with metricas.etapa("compressao"):
+                if mais:
+                    del cabecalhos["content-length"]
+                    compressor = _Compressor(codificacao, self.nivel_gzip, self.qualidade_brotli)
+                    dados = compressor.bloco(corpo)
+                else:
+                    dados = self._comprimir(codificacao, corpo)
+                    cabecalhos["Content-Length"] = str(len(dados))
+            await send(inicio)
+            await send({"type": "http.response.body", "body": dados, "more_body": mais})
+
+        await self.app(scope, receive, enviar)
@@ -1,60 +1,337 @@
 #credit_model.py
 # -*- coding: utf-8 -*-
+"""
+Treinamento do modelo de crédito
+
+A tabela clientes é lida em blocos por um cursor não bufferizado direto
+para uma matriz float32 pré-alocada, o formato que o RandomForest usa
+internamente, então o treino não faz cópias. Com --snapshot, a matriz é
+o snapshot colunar de features (snapshot.py), atualizado só com os
+clientes alterados e mapeado em memória sem passar pelo driver. As árvores são treinadas em todos os núcleos e,
+com --incremental, apenas as linhas novas desde o último treino geram
+árvores adicionais (warm start). Cada execução registra tempos, pico de
+memória e métricas de holdout em TREINO_LOG.
+
+Cada modelo treinado entra no registro de versões (registro.py) e é
+promovido, ou, com --candidato, fica em avaliação em sombra na API.
+
+O holdout são os clientes mais recentes (validação fora do tempo), o que
+mantém treino e teste como fatias contíguas da matriz.
+
+Uso:
+    python credit_model.py                         # treino completo
+    python credit_model.py --incremental           # só clientes novos
+    python credit_model.py --snapshot              # lê do snapshot de features
+    python credit_model.py --sintetico 1000000     # sem banco, só mede o custo
+    python credit_model.py --candidato 0.1         # sombra em 10% das análises
+"""
+
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import argparse
+import json
+import os
+import time
 
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
 import joblib
-import mysql.connector
-
-# Carregar dados do MySQL
-def load_data():
-    connection = mysql.connector.connect(
-        host='localhost',
-        database='creditaidb',
-        user='seu_usuario',
-        password='sua_senha'
-    )
-    
-    query = """
-        SELECT 
-            score, 
-            possui_restricoes, 
-            atrasos_30_dias,
-            atrasos_60_dias,
-            atrasos_90_dias,
-            renda_mensal,
-            CASE WHEN score >= 400 AND possui_restricoes = 0 THEN 1 ELSE 0 END as aprovado
-        FROM clientes
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+
+from analise import FEATURES
+from modelo import MODEL_FILE, exportar_modelo
+from registro import RegistroModelos
+
+TREINO_LOG = os.getenv("TREINO_LOG", 'treinos.ndjson')
+
+# Rótulo de aprovação usado no treino
+ROTULO_SQL = "CASE WHEN score >= 400 AND possui_restricoes = 0 THEN 1 ELSE 0 END"
+
+
+def rotulos(X: np.ndarray) -> np.ndarray:
+    """A regra de ROTULO_SQL sobre a matriz de features"""
+    return ((X[:, 0] >= 400) & (X[:, 1] == 0)).astype(np.int8)
+
+
+# ==============================================
+# LEITURA DOS DADOS
+# ==============================================
+
+def load_data(apos_id: int = 0, bloco: int = 50000) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Lê features e rótulos dos clientes com id > `apos_id`, `bloco` linhas
+    por vez. Retorna (X float32 N×6 na ordem de analise.FEATURES, y int8,
+    maior id lido).
+    """
+    import database
+
+    connection = database.abrir_conexao()
+    try:
+        cursor = connection.cursor()
+        # Fixa o intervalo de ids para que a contagem e a leitura coincidam
+        cursor.execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM clientes WHERE id > %s", (apos_id,)
+        )
+        linhas, ultimo_id = cursor.fetchone()
+        X = np.empty((linhas, len(FEATURES)), dtype=np.float32)
+        y = np.empty(linhas, dtype=np.int8)
+
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(f"""
+            SELECT {', '.join(FEATURES)}, {ROTULO_SQL} AS aprovado
+            FROM clientes
+            WHERE id > %s AND id <= %s
+            ORDER BY id
+        """, (apos_id, ultimo_id))
+        inicio = 0
+        while True:
+            dados = cursor.fetchmany(bloco)
+            if not dados:
+                break
+            matriz = np.asarray(dados, dtype=np.float32)
+            fim = inicio + len(matriz)
+            X[inicio:fim] = matriz[:, :-1]
+            y[inicio:fim] = matriz[:, -1]
+            inicio = fim
+        cursor.close()
+    finally:
+        connection.close()
+    return X[:inicio], y[:inicio], ultimo_id
+
+
+def load_snapshot(apos_id: int = 0, pasta: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    load_data a partir do snapshot de features, atualizado antes com os
+    clientes alterados. X é uma visão do arquivo mapeado (as linhas com id
+    > `apos_id` são um trecho contíguo), sem cópia; y sai de X pela regra
+    de ROTULO_SQL.
+    """
+    import snapshot
+
+    pasta = pasta or snapshot.SNAPSHOT_DIR
+    resumo = snapshot.atualizar(pasta)
+    dados = snapshot.abrir(resumo["pasta"])
+    X = dados.X[dados.faixa(apos_id)]
+    return X, rotulos(X), dados.meta["ultimo_id_cliente"]
+
+
+def dados_sinteticos(linhas: int) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Matriz sintética do mesmo formato, para medir o custo do treino sem banco"""
+    from benchmarks.sintetico import gerar_features, gerar_rotulos
+
+    X = gerar_features(linhas)
+    return X.astype(np.float32), gerar_rotulos(X).astype(np.int8), linhas
+
+
+# ==============================================
+# TREINO E AVALIAÇÃO
+# ==============================================
+
+def pico_memoria_mb() -> Optional[float]:
+    """Pico de memória residente do processo (None se a plataforma não informar)"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 2 ** 20, 1)
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def avaliar(model: RandomForestClassifier, X: np.ndarray, y: np.ndarray) -> Dict:
+    if len(y) == 0:
+        return {}
+    proba = model.predict_proba(X)
+    previsto = model.classes_[np.argmax(proba, axis=1)]
+    metricas = {
+        "acuracia": accuracy_score(y, previsto),
+        "precisao": precision_score(y, previsto, zero_division=0),
+        "recall": recall_score(y, previsto, zero_division=0),
+        "f1": f1_score(y, previsto, zero_division=0),
+    }
+    if len(np.unique(y)) == 2 and proba.shape[1] == 2:
+        metricas["roc_auc"] = roc_auc_score(y, proba[:, 1])
+    return {nome: round(float(valor), 4) for nome, valor in metricas.items()}
+
+
+def _ultimo_treino() -> Optional[Dict]:
+    """Último treino promovido (candidatas em sombra e medições sintéticas não valem como base)"""
+    try:
+        with open(TREINO_LOG, encoding='utf-8') as log:
+            linhas = [json.loads(linha) for linha in log if linha.strip()]
+    except FileNotFoundError:
+        return None
+    promovidos = [linha for linha in linhas
+                  if linha.get("promovido", True) and linha.get("origem") != "sintetico"]
+    return promovidos[-1] if promovidos else None
+
+
+def _salvar_modelo(model: RandomForestClassifier):
+    # Grava ao lado e troca de uma vez: a API nunca lê um artefato pela metade
+    temporario = MODEL_FILE + ".tmp"
+    joblib.dump(model, temporario)
+    os.replace(temporario, MODEL_FILE)
+    # Artefato compilado mapeável, que é o que os workers da API carregam
+    if exportar_modelo(model, MODEL_FILE) is None:
+        print("⚠️ Modelo não pôde ser compilado; a API usará o joblib")
+
+
+def train_and_save_model(
+    incremental: bool = False,
+    arvores: int = 100,
+    arvores_incrementais: int = 20,
+    amostras_por_arvore: Optional[float] = None,
+    bloco: int = 50000,
+    snapshot: Optional[str] = None,
+    sintetico: Optional[int] = None,
+    candidato: Optional[float] = None,
+) -> Optional[Dict]:
+    """
+    Treina (ou, com `incremental`, estende com árvores treinadas só nas
+    linhas novas) o modelo, salva o artefato e registra a execução.
+    `amostras_por_arvore` (fração) limita o bootstrap de cada árvore,
+    reduzindo tempo e memória do treino em bases grandes. Com `snapshot`
+    (a pasta, ou "" para SNAPSHOT_DIR) os dados vêm do snapshot de features.
+    A nova versão é promovida no registro, ou, com `candidato` (fração),
+    avaliada em sombra; só a promovida substitui credit_model.joblib, o
+    modelo servido quando o registro não tem versão ativa. Com `sintetico`
+    o treino só é medido: o modelo não é registrado nem salvo.
     """
-    
-    df = pd.read_sql(query, connection)
-    connection.close()
-    return df
-
-# Treinar e salvar o modelo
-def train_and_save_model():
-    data = load_data()
-    
-    if len(data) < 50:
+    tempos = {}
+    inicio = time.perf_counter()
+
+    registro = RegistroModelos()
+    model = None
+    apos_id = 0
+    if incremental:
+        # Estende a versão em serviço (a ativa do registro, se houver), a
+        # partir do último id que ela própria viu no treino
+        manifesto = registro.manifesto()
+        ativo = manifesto.get("ativo")
+        if ativo:
+            base = registro.pasta / ativo / "modelo.joblib"
+            marca = manifesto["versoes"].get(ativo, {}).get("ultimo_id")
+        else:
+            base = Path(MODEL_FILE)
+            anterior = _ultimo_treino()
+            marca = anterior["ultimo_id"] if anterior else None
+        if marca is None or not base.exists():
+            print("Nenhum treino anterior registrado para o modelo em serviço; fazendo treino completo.")
+            incremental = False
+        else:
+            model = joblib.load(base)
+            apos_id = marca
+
+    if sintetico:
+        X, y, ultimo_id = dados_sinteticos(sintetico)
+    else:
+        X, y, ultimo_id = load_snapshot(apos_id, snapshot or None) if snapshot is not None \
+            else load_data(apos_id, bloco)
+        ultimo_id = max(ultimo_id, apos_id)
+    tempos["leitura_s"] = time.perf_counter() - inicio
+
+    minimo = 2 if incremental else 50
+    if len(y) < minimo or (incremental and len(np.unique(y)) < 2):
         print("Dados insuficientes para treinamento. Coletando mais dados...")
-        return
-    
-    X = data.drop('aprovado', axis=1)
-    y = data['aprovado']
-    
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    
-    # Avaliar o modelo
-    accuracy = model.score(X_test, y_test)
-    print(f"Acurácia do modelo: {accuracy:.2f}")
-    
-    # Salvar o modelo
-    joblib.dump(model, 'credit_model.joblib')
-    print("Modelo treinado e salvo com sucesso!")
+        return None
+
+    # Holdout temporal: os 20% de clientes mais recentes (maiores ids). Treino
+    # e teste são fatias contíguas, sem cópia da matriz (nem do memmap)
+    corte = int(len(y) * 0.8)
+    X_treino, y_treino = X[:corte], y[:corte]
+    X_teste, y_teste = X[corte:], y[corte:]
+
+    etapa = time.perf_counter()
+    if incremental:
+        # Novas árvores veem apenas as linhas novas; as antigas são mantidas
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + arvores_incrementais,
+                         n_jobs=-1)
+    else:
+        model = RandomForestClassifier(
+            n_estimators=arvores,
+            n_jobs=-1,
+            max_samples=amostras_por_arvore,
+            random_state=42,
+        )
+    model.fit(X_treino, y_treino)
+    tempos["treino_s"] = time.perf_counter() - etapa
+
+    etapa = time.perf_counter()
+    metricas = avaliar(model, X_teste, y_teste)
+    tempos["avaliacao_s"] = time.perf_counter() - etapa
+
+    # Dados aleatórios nunca chegam ao registro nem ao credit_model.joblib
+    versao = None
+    if not sintetico:
+        versao = registro.registrar(model, metricas, origem="incremental" if incremental else "completo",
+                                    ultimo_id=ultimo_id)
+        if candidato:
+            registro.definir_candidato(versao, candidato)
+        else:
+            _salvar_modelo(model)
+            registro.promover(versao)
+    tempos["total_s"] = time.perf_counter() - inicio
+
+    execucao = {
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "modo": "incremental" if incremental else "completo",
+        "versao": versao,
+        "promovido": not candidato and not sintetico,
+        "origem": "sintetico" if sintetico else "snapshot" if snapshot is not None else "mysql",
+        "linhas_treino": int(len(y_treino)),
+        "linhas_teste": int(len(y_teste)),
+        "ultimo_id": int(ultimo_id),
+        "arvores": int(model.n_estimators),
+        "nucleos": os.cpu_count(),
+        **{nome: round(valor, 3) for nome, valor in tempos.items()},
+        "pico_memoria_mb": pico_memoria_mb(),
+        "metricas_holdout": metricas,
+    }
+    with open(TREINO_LOG, 'a', encoding='utf-8') as log:
+        log.write(json.dumps(execucao) + "\n")
+
+    print(f"Acurácia do modelo: {metricas.get('acuracia', 0):.2f}")
+    print(f"Treino {execucao['modo']}: {execucao['linhas_treino']} linhas, "
+          f"{execucao['arvores']} árvores, {execucao['total_s']:.1f}s, "
+          f"pico de memória {execucao['pico_memoria_mb']} MB")
+    if sintetico:
+        print("Treino sintético apenas medido; modelo descartado, registro inalterado")
+    else:
+        print(f"Modelo treinado e salvo com sucesso! Versão {versao} "
+              + (f"em sombra ({candidato:.0%} das análises)" if candidato else "promovida"))
+    return execucao
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Treinamento do modelo de crédito")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Acrescenta árvores treinadas apenas com os clientes novos")
+    parser.add_argument("--arvores", type=int, default=100)
+    parser.add_argument("--arvores-incrementais", type=int, default=20)
+    parser.add_argument("--amostras-por-arvore", type=float, default=None,
+                        help="Fração das linhas no bootstrap de cada árvore (ex.: 0.2)")
+    parser.add_argument("--bloco", type=int, default=50000, help="Linhas lidas por vez")
+    parser.add_argument("--snapshot", nargs="?", const="", metavar="PASTA",
+                        help="Lê do snapshot de features (padrão SNAPSHOT_DIR), atualizando-o antes")
+    parser.add_argument("--sintetico", type=int,
+                        help="Mede o treino com N linhas sintéticas, sem banco; não registra o modelo")
+    parser.add_argument("--candidato", type=float, metavar="FRACAO",
+                        help="Não promove: avalia a nova versão em sombra nessa fração das análises")
+    args = parser.parse_args()
+
+    train_and_save_model(
+        incremental=args.incremental,
+        arvores=args.arvores,
+        arvores_incrementais=args.arvores_incrementais,
+        amostras_por_arvore=args.amostras_por_arvore,
+        bloco=args.bloco,
+        snapshot=args.snapshot,
+        sintetico=args.sintetico,
+        candidato=args.candidato,
+    )
+
 
 if __name__ == "__main__":
-    train_and_save_model()
\ No newline at end of file
+    main()
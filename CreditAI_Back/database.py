@@ -0,0 +1,814 @@
+# -*- coding: utf-8 -*-
+"""
+Camada de acesso a dados da API Credit.AI
+Pool de conexões limitado e execução das consultas fora do event loop;
+escritas no primário e leituras nas réplicas, quando houver (ver replicas.py)
+
+As funções de CONSULTAS e CADASTRO EM LOTE são a interface de leitura e
+escrita de clientes da API, da carga, do treino e dos jobs. Por trás delas,
+DB_BACKEND escolhe o banco: mysql (servidor MySQL) ou sqlite (arquivo local
+em modo WAL, ver banco_sqlite.py), com o mesmo esquema (migracoes.py).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import deque
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+import mysql.connector
+
+from admissao import PrazoEsgotadoError, restante
+from busca import escapar_like, expressao_fulltext
+from metricas import etapa, registrar_etapa
+from replicas import Replica, RoteadorLeituras
+from schemas import COLUNAS_CLIENTE
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+def env_bool(nome: str, padrao: bool) -> bool:
+    """Lê uma variável de ambiente booleana (True/False, 1/0)"""
+    valor = os.getenv(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() in ("1", "true", "sim", "yes")
+
+
+# ==============================================
+# POOL DE CONEXÕES
+# ==============================================
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo limite de aquisição"""
+
+
+# ER_QUERY_TIMEOUT: consulta interrompida pelo MAX_EXECUTION_TIME
+_ERRO_TEMPO_EXCEDIDO = 3024
+
+
+class PoolConexoes:
+    """
+    Pool de conexões limitado e thread-safe.
+
+    Mantém até `tamanho` conexões ociosas e permite abrir mais `max_overflow`
+    conexões temporárias em picos. Quem não consegue uma conexão em
+    `timeout` segundos recebe PoolEsgotadoError. Conexões mais antigas que
+    `recycle` segundos são descartadas, e conexões ociosas há mais de
+    `ping_apos` segundos são verificadas antes de serem entregues.
+    """
+
+    def __init__(
+        self,
+        factory: Callable,
+        tamanho: int = 10,
+        max_overflow: int = 10,
+        timeout: float = 5.0,
+        recycle: float = 1800.0,
+        pre_ping: bool = True,
+        ping_apos: float = 30.0,
+    ):
+        self.factory = factory
+        self.tamanho = tamanho
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.ping_apos = ping_apos
+
+        self._cond = threading.Condition()
+        self._livres = deque()  # (conexao, criada_em, devolvida_em)
+        self._criadas_em: Dict[int, float] = {}
+        self._abertas = 0
+        self._em_uso = 0
+        self._aguardando = 0
+        self._fechado = False
+
+        self._aquisicoes = 0
+        self._timeouts = 0
+        self._descartadas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    # ---------- ciclo de vida das conexões ----------
+
+    def _abrir(self):
+        conexao = self.factory()
+        self._criadas_em[id(conexao)] = time.monotonic()
+        logger.debug("Nova conexão aberta no pool (%d abertas)", self._abertas)
+        return conexao
+
+    def _descartar(self, conexao):
+        self._criadas_em.pop(id(conexao), None)
+        self._descartadas += 1
+        try:
+            conexao.close()
+        except Exception:
+            pass
+
+    def _saudavel(self, conexao, criada_em: float, devolvida_em: float) -> bool:
+        agora = time.monotonic()
+        if self.recycle and agora - criada_em > self.recycle:
+            return False
+        if self.pre_ping and agora - devolvida_em > self.ping_apos:
+            try:
+                conexao.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def adquirir(self, timeout: Optional[float] = None):
+        """
+        Retira uma conexão do pool, aguardando no máximo `timeout` segundos,
+        ou até o prazo da requisição (ver admissao.py), se vencer antes
+        """
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + timeout
+        prazo = restante()
+        pelo_prazo = prazo is not None and prazo < timeout
+        if pelo_prazo:
+            limite = inicio + max(prazo, 0.0)
+
+        with self._cond:
+            while True:
+                if self._fechado:
+                    raise PoolEsgotadoError("Pool de conexões encerrado")
+                if self._livres:
+                    conexao, criada_em, devolvida_em = self._livres.pop()
+                    self._em_uso += 1
+                    break
+                if self._abertas < self.tamanho + self.max_overflow:
+                    self._abertas += 1
+                    self._em_uso += 1
+                    conexao = None
+                    break
+                espera = limite - time.monotonic()
+                if espera <= 0:
+                    if pelo_prazo:
+                        raise PrazoEsgotadoError(
+                            f"Prazo da requisição esgotado aguardando conexão "
+                            f"({self._em_uso} em uso, {self._aguardando} aguardando)"
+                        )
+                    self._timeouts += 1
+                    raise PoolEsgotadoError(
+                        f"Nenhuma conexão disponível em {timeout:.1f}s "
+                        f"({self._em_uso} em uso, {self._aguardando} aguardando)"
+                    )
+                self._aguardando += 1
+                try:
+                    self._cond.wait(espera)
+                finally:
+                    self._aguardando -= 1
+
+        # Abertura e verificação acontecem fora do lock
+        try:
+            if conexao is not None and not self._saudavel(conexao, criada_em, devolvida_em):
+                with self._cond:
+                    self._descartar(conexao)
+                conexao = None
+            if conexao is None:
+                conexao = self._abrir()
+        except Exception:
+            with self._cond:
+                self._abertas -= 1
+                self._em_uso -= 1
+                self._cond.notify()
+            raise
+
+        espera = time.monotonic() - inicio
+        with self._cond:
+            self._aquisicoes += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+        registrar_etapa("pool", espera)
+        return conexao
+
+    def devolver(self, conexao, descartar: bool = False):
+        """Devolve uma conexão ao pool, encerrando transações pendentes"""
+        if not descartar:
+            try:
+                # Evita que um snapshot REPEATABLE READ sobreviva entre requisições
+                if conexao.in_transaction:
+                    conexao.rollback()
+            except Exception:
+                descartar = True
+
+        with self._cond:
+            self._em_uso -= 1
+            if descartar or self._fechado or len(self._livres) >= self.tamanho:
+                self._abertas -= 1
+                self._descartar(conexao)
+            else:
+                criada_em = self._criadas_em.get(id(conexao), time.monotonic())
+                self._livres.append((conexao, criada_em, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def conexao(self, timeout: Optional[float] = None):
+        """Context manager que adquire e sempre devolve uma conexão"""
+        with self.emprestar(self.adquirir(timeout)) as conexao:
+            yield conexao
+
+    @contextmanager
+    def emprestar(self, conexao):
+        """Context manager para uma conexão já adquirida deste pool, sempre devolvida"""
+        descartar = False
+        try:
+            with etapa("consulta"):
+                yield conexao
+        except mysql.connector.Error as e:
+            descartar = not _conectada(conexao)
+            if e.errno == _ERRO_TEMPO_EXCEDIDO:
+                raise PrazoEsgotadoError("Prazo da requisição esgotado durante a consulta") from e
+            raise
+        finally:
+            self.devolver(conexao, descartar=descartar)
+
+    def fechar(self):
+        """Fecha todas as conexões ociosas e impede novas aquisições"""
+        with self._cond:
+            self._fechado = True
+            while self._livres:
+                conexao, _, _ = self._livres.pop()
+                self._abertas -= 1
+                self._descartar(conexao)
+            self._cond.notify_all()
+
+    def estatisticas(self) -> Dict:
+        """Retorna um retrato do estado do pool para monitoramento"""
+        with self._cond:
+            return {
+                "tamanho": self.tamanho,
+                "max_overflow": self.max_overflow,
+                "abertas": self._abertas,
+                "em_uso": self._em_uso,
+                "livres": len(self._livres),
+                "aguardando": self._aguardando,
+                "aquisicoes": self._aquisicoes,
+                "timeouts": self._timeouts,
+                "descartadas": self._descartadas,
+                "espera_media_ms": round(
+                    1000 * self._espera_total / self._aquisicoes, 3
+                ) if self._aquisicoes else 0.0,
+                "espera_max_ms": round(1000 * self._espera_max, 3),
+            }
+
+
+def _conectada(conexao) -> bool:
+    try:
+        return conexao.is_connected()
+    except Exception:
+        return False
+
+
+# ==============================================
+# CONFIGURAÇÃO A PARTIR DO .env
+# ==============================================
+
+class BackendMySQL:
+    """Servidor MySQL: DB_HOST, DB_PORT, DB_NAME, DB_USER e DB_PASSWORD"""
+
+    nome = "mysql"
+    # ON DUPLICATE KEY UPDATE conta 2 linhas afetadas por linha existente atualizada
+    afetadas_por_atualizacao = 2
+    replicas = True
+
+    def conectar(self, host: Optional[str] = None, port: Optional[int] = None, **opcoes):
+        return mysql.connector.connect(
+            host=host or os.getenv("DB_HOST", "localhost"),
+            database=os.getenv("DB_NAME", "creditaidb"),
+            user=os.getenv("DB_USER", "root"),
+            password=os.getenv("DB_PASSWORD", ""),
+            port=port or int(os.getenv("DB_PORT", 3306)),
+            **opcoes,
+        )
+
+    def filtro_nome(self, nome: str):
+        """
+        Condição indexada para o nome: FULLTEXT em BOOLEAN MODE com todos os
+        termos por prefixo ou, se a consulta só tiver termos curtos demais para
+        o FULLTEXT, prefixo do nome inteiro (faixa no índice idx_clientes_nome).
+        A collation utf8mb4_0900_ai_ci ignora acentos e maiúsculas.
+        """
+        expressao = expressao_fulltext(nome)
+        if expressao:
+            return "MATCH(nome) AGAINST (%s IN BOOLEAN MODE)", expressao
+        return "nome LIKE %s", escapar_like(nome.strip()) + "%"
+
+
+def criar_backend():
+    """Backend de DB_BACKEND: mysql (padrão) ou sqlite (DB_SQLITE_PATH)"""
+    nome = os.getenv("DB_BACKEND", "mysql").strip().lower()
+    if nome == "sqlite":
+        from banco_sqlite import BackendSQLite
+        return BackendSQLite()
+    if nome != "mysql":
+        raise ValueError(f"DB_BACKEND inválido: {nome} (use mysql ou sqlite)")
+    return BackendMySQL()
+
+
+backend = criar_backend()
+
+
+def abrir_conexao(**opcoes):
+    """Conexão avulsa, fora do pool, para processos longos como a carga em lote"""
+    return backend.conectar(**opcoes)
+
+
+def criar_pool(factory: Optional[Callable] = None) -> PoolConexoes:
+    """Cria um pool com os parâmetros DB_POOL_* do .env"""
+    return PoolConexoes(
+        factory or backend.conectar,
+        tamanho=int(os.getenv("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.getenv("DB_POOL_MAX_OVERFLOW", 10)),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", 5)),
+        recycle=float(os.getenv("DB_POOL_RECYCLE", 1800)),
+        pre_ping=env_bool("DB_POOL_PRE_PING", True),
+        ping_apos=float(os.getenv("DB_POOL_PING_APOS", 30)),
+    )
+
+
+def criar_roteador(factory: Optional[Callable] = None) -> RoteadorLeituras:
+    """
+    Réplicas de DB_REPLICAS ("host[:porta],..."; mesmas credenciais e banco
+    do primário), cada uma com um pool DB_POOL_*
+    """
+    factory = factory or backend.conectar
+    enderecos = [item.strip() for item in os.getenv("DB_REPLICAS", "").split(",") if item.strip()]
+    if enderecos and not backend.replicas:
+        logger.warning(f"DB_REPLICAS ignorado: o backend {backend.nome} não tem réplicas")
+        enderecos = []
+    replicas = []
+    for endereco in enderecos:
+        host, _, porta = endereco.partition(":")
+        replicas.append(Replica(endereco, criar_pool(partial(factory, host=host, port=int(porta or 3306)))))
+    return RoteadorLeituras(
+        replicas,
+        janela=float(os.getenv("DB_LEITURA_APOS_ESCRITA_S", 5)),
+        atraso_max=float(os.getenv("DB_REPLICA_ATRASO_MAX_S", 5)),
+    )
+
+
+pool = criar_pool()
+leituras = criar_roteador()
+
+# Threads dedicadas ao driver: uma por conexão possível, para que nenhuma
+# thread fique parada esperando conexão enquanto outra poderia trabalhar
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_THREADS", (pool.tamanho + pool.max_overflow) * (1 + len(leituras.replicas)))),
+    thread_name_prefix="db",
+)
+
+
+def get_db_connection(timeout: Optional[float] = None):
+    """Context manager com uma conexão do primário emprestada do pool"""
+    return pool.conexao(timeout)
+
+
+def adquirir_leitura(chaves: Optional[List[str]] = None,
+                     timeout: Optional[float] = None) -> Tuple[PoolConexoes, object]:
+    """
+    Pool e conexão para uma leitura: a réplica escolhida pelo roteador ou,
+    sem réplica disponível, o primário. Uma réplica que recusa a conexão
+    sai de circulação e a leitura segue no primário; uma réplica com o pool
+    esgotado só cede esta leitura ao primário.
+    """
+    replica = leituras.escolher(chaves)
+    if replica is not None:
+        try:
+            return replica.pool, replica.pool.adquirir(timeout)
+        except mysql.connector.Error as e:
+            leituras.falhou(replica, e)
+        except PoolEsgotadoError as e:
+            logger.warning(f"Réplica {replica.nome} sem conexão livre, lendo do primário: {e}")
+    return pool, pool.adquirir(timeout)
+
+
+@contextmanager
+def conexao_leitura(chaves: Optional[List[str]] = None, timeout: Optional[float] = None):
+    """Context manager com uma conexão de leitura (ver adquirir_leitura)"""
+    origem, conexao = adquirir_leitura(chaves, timeout)
+    with origem.emprestar(conexao) as conexao:
+        yield conexao
+
+
+async def executar_db(func: Callable, *args, **kwargs):
+    """Executa uma função bloqueante de banco no pool de threads dedicado"""
+    loop = asyncio.get_running_loop()
+    # A thread herda o contexto da requisição (etapas medidas, ver metricas.py)
+    contexto = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, partial(contexto.run, func, *args, **kwargs))
+
+
+def encerrar():
+    """Libera conexões e threads no desligamento da aplicação"""
+    pool.fechar()
+    for replica in leituras.replicas:
+        replica.pool.fechar()
+    _executor.shutdown(wait=False)
+
+
+# ==============================================
+# CONSULTAS
+# ==============================================
+
+def ping(timeout: float = 1.0):
+    """Verificação de prontidão: uma conexão do pool responde a SELECT 1"""
+    with get_db_connection(timeout) as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+
+def inserir_cliente(valores: tuple) -> Optional[int]:
+    """Insere um cliente e retorna seu id; None se o CPF já estiver cadastrado"""
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        # CPF existente não altera a linha (0 linhas afetadas): uma ida ao banco só
+        _inserir_clientes(cursor, [valores], "ignorar")
+        connection.commit()
+        leituras.registrar_escrita([valores[0]])
+        return cursor.lastrowid if cursor.rowcount == 1 else None
+
+
+def select_com_prazo() -> str:
+    """
+    SELECT limitado ao prazo restante da requisição: o MySQL interrompe a
+    leitura ao vencer (erro 3024, vira PrazoEsgotadoError em conexao()) em
+    vez de continuar trabalhando para uma resposta que ninguém vai esperar
+    """
+    segundos = restante()
+    if segundos is None:
+        return "SELECT"
+    return f"SELECT /*+ MAX_EXECUTION_TIME({max(1, int(1000 * segundos))}) */"
+
+
+def _filtros_clientes(nome: Optional[str], cpf: Optional[str], after: Optional[int],
+                      ids: Optional[List[int]] = None):
+    filters = []
+    params = []
+    if nome:
+        condicao, valor = backend.filtro_nome(nome)
+        filters.append(condicao)
+        params.append(valor)
+    if cpf:
+        filters.append("cpf = %s")
+        params.append(cpf)
+    if ids is not None:
+        filters.append(f"id IN ({', '.join(['%s'] * len(ids))})" if ids else "FALSE")
+        params.extend(ids)
+    if after is not None:
+        filters.append("id > %s")
+        params.append(after)
+    where = " WHERE " + " AND ".join(filters) if filters else ""
+    return where, params
+
+
+def listar_pagina_clientes(colunas: List[str], nome: Optional[str] = None,
+                           cpf: Optional[str] = None, after: Optional[int] = None,
+                           limit: int = 100, ids: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Página por chave (keyset) ordenada pelo id: `after` é o último id da
+    página anterior. Lê limit + 1 linhas para saber se há próxima página.
+    `ids` restringe a ids já resolvidos por um índice de busca externo.
+    """
+    where, params = _filtros_clientes(nome, cpf, after, ids)
+    with conexao_leitura([cpf] if cpf else None) as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(
+            f"{select_com_prazo()} id, {', '.join(colunas)} FROM clientes{where} ORDER BY id LIMIT %s",
+            tuple(params) + (limit + 1,)
+        )
+        return cursor.fetchall()
+
+
+def iterar_clientes(colunas: List[str], nome: Optional[str] = None,
+                    cpf: Optional[str] = None, after: Optional[int] = None,
+                    limit: Optional[int] = None, bloco: int = 1000,
+                    ids: Optional[List[int]] = None):
+    """
+    Gera os clientes em blocos de `bloco` linhas a partir de um cursor não
+    bufferizado, mantendo a memória constante independentemente do tamanho
+    da tabela. A conexão fica emprestada até o gerador terminar ou ser
+    fechado; se for fechado no meio, ela é descartada, pois ainda há linhas
+    pendentes no protocolo.
+    """
+    where, params = _filtros_clientes(nome, cpf, after, ids)
+    query = f"SELECT id, {', '.join(colunas)} FROM clientes{where} ORDER BY id"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+
+    origem, connection = adquirir_leitura([cpf] if cpf else None)
+    completo = False
+    try:
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, tuple(params))
+        while True:
+            linhas = cursor.fetchmany(bloco)
+            if not linhas:
+                completo = True
+                break
+            yield linhas
+        cursor.close()
+    finally:
+        origem.devolver(connection, descartar=not completo)
+
+
+def buscar_cliente(cpf: str) -> Optional[Dict]:
+    with conexao_leitura([cpf]) as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM clientes WHERE cpf = %s", (cpf,))
+        return cursor.fetchone()
+
+
+def buscar_atualizado_em(cpf: str):
+    """Só o atualizado_em do cliente (None se não existir), para validar um ETag sem ler a linha"""
+    with conexao_leitura([cpf]) as connection:
+        cursor = connection.cursor()
+        cursor.execute(f"{select_com_prazo()} atualizado_em FROM clientes WHERE cpf = %s", (cpf,))
+        linha = cursor.fetchone()
+        return linha[0] if linha else None
+
+
+# Decisão pré-calculada válida para a linha atual do cliente e as versões pedidas
+# (ver migrations/002_decisoes.sql e decisoes.py): uma leitura pela chave primária.
+# Sem o SELECT, que vem de select_com_prazo() com o prazo da requisição
+_JUNCAO_DECISAO = """
+    c.*, d.aprovado AS decisao_aprovado, d.probabilidade AS decisao_probabilidade,
+    d.limite AS decisao_limite, d.motivos AS decisao_motivos, d.codigos AS decisao_codigos
+    FROM clientes c
+    LEFT JOIN decisoes d ON d.cliente_id = c.id
+        AND d.versao_modelo = %s AND d.versao_regras = %s
+        AND d.cliente_atualizado_em = c.atualizado_em
+"""
+
+
+def buscar_clientes_por_cpfs(cpfs: List[str], tamanho_bloco: int = 1000,
+                             versoes: Optional[Tuple[str, str]] = None) -> Dict[str, Dict]:
+    """
+    Busca vários clientes em uma conexão, com listas IN de até `tamanho_bloco`
+    CPFs. Com `versoes` (modelo, regras), cada linha traz também as colunas
+    decisao_* da decisão pré-calculada, NULL se não houver uma válida.
+
+    Lida numa réplica, a busca confirma no primário os CPFs não encontrados:
+    um cadastro feito por outro worker pode ainda não ter sido replicado.
+    """
+    encontrados = {}
+    origem, connection = adquirir_leitura(cpfs)
+    with origem.emprestar(connection):
+        _ler_clientes_por_cpfs(connection, cpfs, tamanho_bloco, versoes, encontrados)
+    faltantes = [cpf for cpf in cpfs if cpf not in encontrados]
+    if faltantes and origem is not pool:
+        with get_db_connection() as connection:
+            _ler_clientes_por_cpfs(connection, faltantes, tamanho_bloco, versoes, encontrados)
+    return encontrados
+
+
+def _ler_clientes_por_cpfs(connection, cpfs: List[str], tamanho_bloco: int,
+                           versoes: Optional[Tuple[str, str]], encontrados: Dict[str, Dict]):
+    cursor = connection.cursor(dictionary=True)
+    for inicio in range(0, len(cpfs), tamanho_bloco):
+        bloco = cpfs[inicio:inicio + tamanho_bloco]
+        marcadores = ", ".join(["%s"] * len(bloco))
+        if versoes is None:
+            cursor.execute(
+                f"{select_com_prazo()} * FROM clientes WHERE cpf IN ({marcadores})", tuple(bloco)
+            )
+        else:
+            cursor.execute(
+                f"{select_com_prazo()} {_JUNCAO_DECISAO} WHERE c.cpf IN ({marcadores})", tuple(versoes) + tuple(bloco)
+            )
+        for cliente_db in cursor.fetchall():
+            encontrados[cliente_db['cpf']] = cliente_db
+
+
+def buscar_clientes_por_nome(consulta: str, limite: int = 20) -> List[Dict]:
+    """
+    Busca ranqueada pelo índice textual do backend: nomes que começam pela
+    consulta primeiro, depois pela relevância do MATCH (só no MySQL) e pelo nome.
+    """
+    condicao, valor = backend.filtro_nome(consulta)
+    prefixo = escapar_like(consulta.strip()) + "%"
+    relevancia = "MATCH(nome) AGAINST (%s IN BOOLEAN MODE)" if condicao.startswith("MATCH") else "0"
+    params = ((valor,) if relevancia != "0" else ()) + (valor, prefixo, limite)
+    with conexao_leitura() as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(f"""
+            {select_com_prazo()} *, {relevancia} AS relevancia
+            FROM clientes
+            WHERE {condicao}
+            ORDER BY (nome LIKE %s) DESC, relevancia DESC, nome
+            LIMIT %s
+        """, params)
+        return cursor.fetchall()
+
+
+def buscar_clientes_por_ids(ids: List[int], tamanho_bloco: int = 1000) -> Dict[int, Dict]:
+    """Busca clientes pelo id em listas IN de até `tamanho_bloco` ids"""
+    encontrados = {}
+    with conexao_leitura() as connection:
+        cursor = connection.cursor(dictionary=True)
+        for inicio in range(0, len(ids), tamanho_bloco):
+            bloco = ids[inicio:inicio + tamanho_bloco]
+            cursor.execute(
+                f"{select_com_prazo()} * FROM clientes WHERE id IN ({', '.join(['%s'] * len(bloco))})",
+                tuple(bloco)
+            )
+            for cliente_db in cursor.fetchall():
+                encontrados[cliente_db['id']] = cliente_db
+    return encontrados
+
+
+def novos_nomes(apos_id: int, bloco: int = 10000) -> List[tuple]:
+    """(id, nome) dos clientes com id maior que `apos_id`, para índices em memória"""
+    with conexao_leitura() as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT id, nome FROM clientes WHERE id > %s ORDER BY id LIMIT %s",
+            (apos_id, bloco)
+        )
+        return cursor.fetchall()
+
+
+# ==============================================
+# CADASTRO EM LOTE
+# ==============================================
+
+class IdempotenciaError(Exception):
+    """Chave de idempotência já usada com outro conteúdo"""
+
+
+_COLUNAS_CLIENTE = ", ".join(COLUNAS_CLIENTE)
+_MARCADORES_CLIENTE = "(" + ", ".join(["%s"] * len(COLUNAS_CLIENTE)) + ")"
+
+# O que acontece com um CPF já cadastrado, por política de conflito. Com
+# `id = id` a linha não muda e conta 0 linhas afetadas; a atualização força
+# atualizado_em (migrations/002) para que todo CPF existente conte
+# backend.afetadas_por_atualizacao linhas afetadas (2 no MySQL) mesmo sem
+# mudar nenhum valor. Uma linha nova conta sempre 1.
+_EM_CONFLITO = {
+    "rejeitar": "id = id",
+    "ignorar": "id = id",
+    "atualizar": ", ".join(f"{coluna} = VALUES({coluna})" for coluna in COLUNAS_CLIENTE[1:])
+                 + ", atualizado_em = CURRENT_TIMESTAMP(6)",
+}
+POLITICAS_CONFLITO = tuple(_EM_CONFLITO)
+_STATUS_EXISTENTE = {"rejeitar": "rejeitado", "ignorar": "ignorado", "atualizar": "atualizado"}
+
+_ERRO_DEADLOCK = 1213
+_TENTATIVAS_BLOCO = 3
+
+
+def _inserir_clientes(cursor, linhas: List[tuple], conflito: str):
+    """Um único INSERT multi-linha com ON DUPLICATE KEY UPDATE conforme a política"""
+    cursor.execute(
+        f"INSERT INTO clientes ({_COLUNAS_CLIENTE})\n"
+        f"VALUES {', '.join([_MARCADORES_CLIENTE] * len(linhas))}\n"
+        f"ON DUPLICATE KEY UPDATE {_EM_CONFLITO[conflito]}",
+        [valor for linha in linhas for valor in linha]
+    )
+
+
+def _resultados_pelo_total(afetadas: int, n: int, conflito: str) -> Optional[List[str]]:
+    """
+    Resultado de cada linha deduzido das linhas afetadas, quando o bloco é
+    homogêneo (só CPFs novos ou só existentes); None se for misto
+    """
+    if conflito == "atualizar":
+        existentes = (afetadas - n) // (backend.afetadas_por_atualizacao - 1)
+    else:
+        existentes = n - afetadas
+    if existentes == 0:
+        return ["inserido"] * n
+    if existentes == n:
+        return [_STATUS_EXISTENTE[conflito]] * n
+    return None
+
+
+def _gravar_bloco_misto(connection, cursor, linhas: List[tuple], conflito: str) -> Optional[List[str]]:
+    """
+    Refaz um bloco misto sabendo quais CPFs existem: a leitura com FOR UPDATE
+    trava as linhas (e, em REPEATABLE READ, os intervalos dos CPFs ausentes)
+    até o commit. None se um cadastro concorrente criou algum dos CPFs
+    entre a leitura e a escrita (possível em READ COMMITTED).
+    """
+    connection.rollback()
+    cpfs = [linha[0] for linha in linhas]
+    cursor.execute(
+        f"SELECT cpf FROM clientes WHERE cpf IN ({', '.join(['%s'] * len(cpfs))}) FOR UPDATE",
+        cpfs
+    )
+    existentes = {cpf for (cpf,) in cursor.fetchall()}
+
+    if conflito == "atualizar":
+        gravar, esperado = linhas, len(linhas) + (backend.afetadas_por_atualizacao - 1) * len(existentes)
+    else:
+        gravar = [linha for linha in linhas if linha[0] not in existentes]
+        esperado = len(gravar)
+    afetadas = 0
+    if gravar:
+        _inserir_clientes(cursor, gravar, conflito)
+        afetadas = cursor.rowcount
+    if afetadas != esperado:
+        connection.rollback()
+        return None
+    return [_STATUS_EXISTENTE[conflito] if cpf in existentes else "inserido" for cpf in cpfs]
+
+
+def _registrar_idempotencia(connection, cursor, chave: str, bloco: int,
+                            hash_corpo: str, resultados: List[str]) -> Optional[List[str]]:
+    """
+    Registra o resultado do bloco na mesma transação da escrita. Se a chave
+    já tem esse bloco confirmado, desfaz a escrita e retorna o resultado
+    guardado (a única leitura, feita só em repetições).
+    """
+    try:
+        cursor.execute(
+            "INSERT INTO clientes_lote_idempotencia (chave, bloco, hash_corpo, resultados) "
+            "VALUES (%s, %s, %s, %s)",
+            (chave, bloco, hash_corpo, json.dumps(resultados))
+        )
+        return None
+    except mysql.connector.IntegrityError as e:
+        if e.errno != 1062:
+            raise
+    connection.rollback()
+    cursor.execute(
+        "SELECT hash_corpo, resultados FROM clientes_lote_idempotencia "
+        "WHERE chave = %s AND bloco = %s",
+        (chave, bloco)
+    )
+    hash_guardado, guardados = cursor.fetchone()
+    if hash_guardado != hash_corpo:
+        raise IdempotenciaError(f"Chave de idempotência {chave} já usada com outro conteúdo")
+    return json.loads(guardados)
+
+
+def cadastrar_clientes(linhas: List[tuple], conflito: str = "rejeitar",
+                       tamanho_bloco: int = 500, chave: Optional[str] = None,
+                       hash_corpo: Optional[str] = None) -> Tuple[List[str], int]:
+    """
+    Grava clientes já validados (CPFs distintos, valores na ordem de
+    COLUNAS_CLIENTE) em blocos de `tamanho_bloco`, cada um com um INSERT
+    multi-linha e seu próprio commit. Retorna o resultado de cada linha
+    ('inserido', 'atualizado', 'ignorado' ou 'rejeitado') e quantos blocos
+    vieram do registro de idempotência.
+
+    Em blocos só de CPFs novos ou só de existentes, o número de linhas
+    afetadas basta para o resultado de cada linha: uma ida ao banco por
+    bloco, sem consulta prévia. Blocos mistos são refeitos após uma leitura
+    travada dos CPFs existentes. Quando as linhas afetadas não distinguem
+    atualização de inserção (upsert do SQLite), a leitura vem antes.
+
+    Com `chave`, cada bloco registra seu resultado na mesma transação; ao
+    repetir a requisição, os blocos já confirmados devolvem o resultado
+    original e os demais são gravados, sem duplicar nem reclassificar nada.
+    """
+    resultados: List[str] = []
+    repetidos = 0
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        for bloco, inicio in enumerate(range(0, len(linhas), tamanho_bloco)):
+            parte = linhas[inicio:inicio + tamanho_bloco]
+            for tentativa in range(1, _TENTATIVAS_BLOCO + 1):
+                try:
+                    do_bloco = None
+                    if conflito != "atualizar" or backend.afetadas_por_atualizacao > 1:
+                        _inserir_clientes(cursor, parte, conflito)
+                        do_bloco = _resultados_pelo_total(cursor.rowcount, len(parte), conflito)
+                    if do_bloco is None:
+                        do_bloco = _gravar_bloco_misto(connection, cursor, parte, conflito)
+                    if do_bloco is not None:
+                        break
+                except mysql.connector.Error as e:
+                    if e.errno != _ERRO_DEADLOCK or tentativa == _TENTATIVAS_BLOCO:
+                        raise
+                    connection.rollback()
+                logger.warning(f"Bloco {bloco} do cadastro em lote refeito "
+                               f"(tentativa {tentativa}): concorrência nos mesmos CPFs")
+            else:
+                raise mysql.connector.DatabaseError(
+                    msg=f"Bloco {bloco} do cadastro em lote não convergiu após "
+                        f"{_TENTATIVAS_BLOCO} tentativas"
+                )
+
+            if chave:
+                guardados = _registrar_idempotencia(connection, cursor, chave, bloco, hash_corpo, do_bloco)
+                if guardados is not None:
+                    do_bloco = guardados
+                    repetidos += 1
+            connection.commit()
+            leituras.registrar_escrita(valores[0] for valores in parte)
+            resultados.extend(do_bloco)
+    return resultados, repetidos
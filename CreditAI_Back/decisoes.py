@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Decisões de crédito pré-calculadas
+
+Um processo em segundo plano analisa os clientes e grava o resultado na
+tabela decisoes, marcado com as versões do modelo e das regras e com o
+atualizado_em da linha do cliente (migrations/002_decisoes.sql). Cada
+ciclo reanalisa só os clientes alterados desde o anterior; depois de uma
+promoção de modelo (ou mudança de regras) a tabela inteira é
+reprocessada em faixas de id, em vários processos.
+
+A API lê a decisão na mesma consulta que lê o cliente e só a usa se ela
+ainda valer para a linha atual e para as versões em serviço; senão
+analisa na hora. Um reprocessamento atrasado custa latência, nunca uma
+decisão desatualizada.
+
+Uso (a partir de CreditAI_Back/):
+    python decisoes.py                 # um ciclo
+    python decisoes.py --continuo      # um ciclo a cada DECISOES_INTERVALO_S segundos
+    python decisoes.py --processos 8   # reprocessamento completo em 8 processos
+"""
+
+from datetime import timedelta
+from multiprocessing import get_context
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import warnings
+
+import database
+from analise import MOTIVO_ERRO_MODELO, MOTIVO_SEM_MODELO, VERSAO_REGRAS, analisar_lote
+from modelo import ModeloCredito
+from registro import RegistroModelos
+
+logger = logging.getLogger(__name__)
+
+DECISOES_BLOCO = int(os.getenv("DECISOES_BLOCO", 5000))
+DECISOES_INTERVALO_S = float(os.getenv("DECISOES_INTERVALO_S", 60))
+# Alterações mais novas que isso ficam para o próximo ciclo: uma transação
+# ainda aberta pode confirmar um atualizado_em anterior ao último processado
+DECISOES_ATRASO_S = float(os.getenv("DECISOES_ATRASO_S", 2))
+
+_COLUNAS = (
+    "cliente_id", "versao_modelo", "versao_regras", "cliente_atualizado_em",
+    "aprovado", "probabilidade", "limite", "motivos", "codigos",
+)
+
+# Falhas transitórias do modelo não viram decisão gravada
+_FALHAS = {MOTIVO_ERRO_MODELO, MOTIVO_SEM_MODELO}
+
+
+# ==============================================
+# LEITURA PELA API
+# ==============================================
+
+def _lista_json(valor) -> list:
+    if valor is None:
+        return []
+    if isinstance(valor, (bytes, bytearray)):
+        valor = valor.decode("utf-8")
+    if isinstance(valor, str):
+        valor = json.loads(valor)
+    return list(valor)
+
+
+def decisao_precalculada(cliente_db: Dict) -> Optional[Dict]:
+    """Resultado gravado (colunas decisao_* da consulta), ou None se não houver um válido"""
+    if cliente_db.get("decisao_aprovado") is None:
+        return None
+    return {
+        "aprovado": bool(cliente_db["decisao_aprovado"]),
+        "limite": float(cliente_db["decisao_limite"]),
+        "probabilidade": float(cliente_db["decisao_probabilidade"]),
+        "motivos": _lista_json(cliente_db["decisao_motivos"]),
+        "codigos": _lista_json(cliente_db["decisao_codigos"]),
+    }
+
+
+class DecisoesPrecalculadas:
+    """
+    Busca e análise usadas pela API com DECISOES_ATIVO: a consulta dos
+    clientes traz a decisão válida para o modelo em serviço, e só as
+    linhas sem ela passam por `analisar`.
+    """
+
+    def __init__(self, analisar: Callable[[List[Dict]], List[Dict]],
+                 versao_modelo: Callable[[], str]):
+        self._analisar = analisar
+        self.versao_modelo = versao_modelo
+        self._lock = threading.Lock()
+        self.precalculadas = 0
+        self.ao_vivo = 0
+
+    def buscar(self, cpfs: List[str], tamanho_bloco: int = 1000) -> Dict[str, Dict]:
+        return database.buscar_clientes_por_cpfs(
+            cpfs, tamanho_bloco, versoes=(self.versao_modelo(), VERSAO_REGRAS)
+        )
+
+    def analisar(self, clientes_db: List[Dict]) -> List[Dict]:
+        resultados = [decisao_precalculada(cliente_db) for cliente_db in clientes_db]
+        pendentes = [i for i, resultado in enumerate(resultados) if resultado is None]
+        if pendentes:
+            analisados = self._analisar([clientes_db[i] for i in pendentes])
+            for i, resultado in zip(pendentes, analisados):
+                resultados[i] = resultado
+        with self._lock:
+            self.precalculadas += len(resultados) - len(pendentes)
+            self.ao_vivo += len(pendentes)
+        return resultados
+
+    def estatisticas(self) -> Dict:
+        with self._lock:
+            total = self.precalculadas + self.ao_vivo
+            return {
+                "versao_modelo": self.versao_modelo(),
+                "versao_regras": VERSAO_REGRAS,
+                "precalculadas": self.precalculadas,
+                "ao_vivo": self.ao_vivo,
+                "taxa_precalculadas": round(self.precalculadas / total, 4) if total else 0.0,
+            }
+
+
+# ==============================================
+# GRAVAÇÃO
+# ==============================================
+
+def gravar_decisoes(cursor, clientes_db: List[Dict], resultados: List[Dict], versao_modelo: str):
+    """Um único INSERT multi-linha com ON DUPLICATE KEY UPDATE para o bloco"""
+    linhas = [
+        (cliente_db["id"], versao_modelo, VERSAO_REGRAS, cliente_db["atualizado_em"],
+         resultado["aprovado"], resultado["probabilidade"], resultado["limite"],
+         json.dumps(resultado["motivos"], ensure_ascii=False), json.dumps(resultado["codigos"]))
+        for cliente_db, resultado in zip(clientes_db, resultados)
+        if not _FALHAS & set(resultado["motivos"])
+    ]
+    if not linhas:
+        return
+    marcadores = "(" + ", ".join(["%s"] * len(_COLUNAS)) + ")"
+    atualizacao = ", ".join(f"{coluna} = VALUES({coluna})" for coluna in _COLUNAS[1:])
+    cursor.execute(
+        f"INSERT INTO decisoes ({', '.join(_COLUNAS)})\n"
+        f"VALUES {', '.join([marcadores] * len(linhas))}\n"
+        f"ON DUPLICATE KEY UPDATE {atualizacao}",
+        [valor for linha in linhas for valor in linha]
+    )
+
+
+def _progresso(cursor, versao_modelo: str) -> Optional[Tuple]:
+    cursor.execute(
+        "SELECT ultimo_atualizado_em, ultimo_id FROM decisoes_progresso "
+        "WHERE versao_modelo = %s AND versao_regras = %s",
+        (versao_modelo, VERSAO_REGRAS)
+    )
+    return cursor.fetchone()
+
+
+def _salvar_progresso(cursor, versao_modelo: str, ultimo_em, ultimo_id: int):
+    cursor.execute(
+        "INSERT INTO decisoes_progresso (versao_modelo, versao_regras, ultimo_atualizado_em, ultimo_id) "
+        "VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE ultimo_atualizado_em = VALUES(ultimo_atualizado_em), "
+        "ultimo_id = VALUES(ultimo_id)",
+        (versao_modelo, VERSAO_REGRAS, ultimo_em, ultimo_id)
+    )
+
+
+def _agora_banco(cursor):
+    # Relógio do banco, o mesmo que preenche atualizado_em
+    cursor.execute("SELECT NOW(6)")
+    return cursor.fetchone()[0]
+
+
+# ==============================================
+# REPROCESSAMENTO
+# ==============================================
+
+def carregar_modelo_ativo() -> ModeloCredito:
+    """A versão ativa do registro (ou credit_model.joblib), já carregada"""
+    registro = RegistroModelos()
+    ativo = registro.manifesto().get("ativo")
+    modelo = registro.modelo(ativo) if ativo else ModeloCredito()
+    modelo.obter()
+    return modelo
+
+
+def _iniciar_processo():
+    # Cada processo já é um dos trabalhadores paralelos: o predict_proba do
+    # scikit-learn roda em uma thread, como ele mesmo decide ao avisar isto
+    warnings.filterwarnings("ignore", message="Loky-backed parallel loops")
+
+
+def _reprocessar_faixa(faixa: Tuple[int, int, str, int]) -> int:
+    """Processo filho: analisa e grava os clientes com id em (inicio, fim]"""
+    inicio, fim, versao_modelo, bloco = faixa
+    modelo = carregar_modelo_ativo()
+    if modelo.versao != versao_modelo:
+        raise RuntimeError(
+            f"Modelo ativo mudou durante o reprocessamento ({versao_modelo} -> {modelo.versao})"
+        )
+
+    total = 0
+    connection = database.abrir_conexao()
+    try:
+        leitura = connection.cursor(dictionary=True)
+        escrita = connection.cursor()
+        while True:
+            leitura.execute(
+                "SELECT * FROM clientes WHERE id > %s AND id <= %s ORDER BY id LIMIT %s",
+                (inicio, fim, bloco)
+            )
+            clientes_db = leitura.fetchall()
+            if not clientes_db:
+                break
+            gravar_decisoes(escrita, clientes_db, analisar_lote(clientes_db, modelo.obter()),
+                            versao_modelo)
+            connection.commit()
+            total += len(clientes_db)
+            inicio = clientes_db[-1]["id"]
+    finally:
+        connection.close()
+    return total
+
+
+def reprocessar_tudo(connection, versao_modelo: str, processos: int,
+                     bloco: int = DECISOES_BLOCO, atraso: float = DECISOES_ATRASO_S) -> int:
+    """
+    Reanalisa todos os clientes, com as faixas de id divididas entre
+    `processos` processos (cada um mapeia o mesmo artefato do modelo). As
+    alterações feitas durante a execução ficam para o ciclo incremental.
+    """
+    cursor = connection.cursor()
+    inicio_em = _agora_banco(cursor) - timedelta(seconds=atraso)
+    cursor.execute("SELECT COALESCE(MIN(id), 1) - 1, COALESCE(MAX(id), 0) FROM clientes")
+    primeiro, ultimo = cursor.fetchone()
+
+    # Mais faixas que processos, para equilibrar faixas com ids esparsos
+    partes = max(1, processos * 4)
+    passo = max(bloco, -(-(ultimo - primeiro) // partes))
+    faixas = [(inicio, min(inicio + passo, ultimo), versao_modelo, bloco)
+              for inicio in range(primeiro, ultimo, passo)]
+    if processos > 1 and len(faixas) > 1:
+        with get_context("spawn").Pool(min(processos, len(faixas)), _iniciar_processo) as grupo:
+            total = sum(grupo.imap_unordered(_reprocessar_faixa, faixas))
+    else:
+        total = sum(map(_reprocessar_faixa, faixas))
+
+    # Só agora as versões atuais ganham progresso; as anteriores não voltam a valer
+    cursor.execute(
+        "DELETE FROM decisoes_progresso WHERE versao_modelo <> %s OR versao_regras <> %s",
+        (versao_modelo, VERSAO_REGRAS)
+    )
+    _salvar_progresso(cursor, versao_modelo, inicio_em, 0)
+    connection.commit()
+    return total
+
+
+def reprocessar_alterados(connection, modelo, versao_modelo: str, progresso: Tuple,
+                          bloco: int = DECISOES_BLOCO, atraso: float = DECISOES_ATRASO_S) -> int:
+    """
+    Reanalisa os clientes alterados desde `progresso` (atualizado_em, id),
+    em ordem pelo índice (atualizado_em, id). O progresso é gravado na
+    mesma transação de cada bloco, então um ciclo interrompido continua de
+    onde parou.
+    """
+    ultimo_em, ultimo_id = progresso
+    escrita = connection.cursor()
+    limite_em = _agora_banco(escrita) - timedelta(seconds=atraso)
+    leitura = connection.cursor(dictionary=True)
+    total = 0
+    while True:
+        leitura.execute("""
+            SELECT * FROM clientes
+            WHERE (atualizado_em > %s OR (atualizado_em = %s AND id > %s))
+              AND atualizado_em < %s
+            ORDER BY atualizado_em, id
+            LIMIT %s
+        """, (ultimo_em, ultimo_em, ultimo_id, limite_em, bloco))
+        clientes_db = leitura.fetchall()
+        if not clientes_db:
+            break
+        gravar_decisoes(escrita, clientes_db, analisar_lote(clientes_db, modelo), versao_modelo)
+        ultimo_em, ultimo_id = clientes_db[-1]["atualizado_em"], clientes_db[-1]["id"]
+        _salvar_progresso(escrita, versao_modelo, ultimo_em, ultimo_id)
+        connection.commit()
+        total += len(clientes_db)
+    return total
+
+
+def executar_ciclo(processos: int = 1, bloco: int = DECISOES_BLOCO,
+                   atraso: float = DECISOES_ATRASO_S) -> Optional[Dict]:
+    """
+    Um ciclo: reprocessamento completo se as versões em serviço ainda não
+    tiverem decisões gravadas, seguido do incremental. Retorna o resumo.
+    """
+    inicio = time.perf_counter()
+    modelo = carregar_modelo_ativo()
+    if modelo.obter() is None:
+        logger.error("Nenhum modelo disponível; decisões não reprocessadas")
+        return None
+    versao_modelo = modelo.versao
+
+    connection = database.abrir_conexao()
+    try:
+        progresso = _progresso(connection.cursor(), versao_modelo)
+        completo = progresso is None
+        total = 0
+        if completo:
+            print(f"Reprocessamento completo para o modelo {versao_modelo} "
+                  f"(regras {VERSAO_REGRAS}) em {processos} processo(s)")
+            total = reprocessar_tudo(connection, versao_modelo, processos, bloco, atraso)
+            progresso = _progresso(connection.cursor(), versao_modelo)
+        total += reprocessar_alterados(connection, modelo.obter(), versao_modelo, progresso,
+                                       bloco, atraso)
+    finally:
+        connection.close()
+
+    resumo = {
+        "versao_modelo": versao_modelo,
+        "versao_regras": VERSAO_REGRAS,
+        "modo": "completo" if completo else "incremental",
+        "clientes": total,
+        "duracao_s": round(time.perf_counter() - inicio, 3),
+    }
+    print(f"Decisões {resumo['modo']}: {total} clientes em {resumo['duracao_s']}s "
+          f"(modelo {versao_modelo})")
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocessamento das decisões pré-calculadas")
+    parser.add_argument("--processos", type=int,
+                        default=int(os.getenv("DECISOES_PROCESSOS", os.cpu_count() or 1)),
+                        help="Processos no reprocessamento completo")
+    parser.add_argument("--bloco", type=int, default=DECISOES_BLOCO, help="Clientes por transação")
+    parser.add_argument("--continuo", action="store_true", help="Repete o ciclo indefinidamente")
+    parser.add_argument("--intervalo", type=float, default=DECISOES_INTERVALO_S,
+                        help="Segundos entre ciclos com --continuo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    while True:
+        try:
+            executar_ciclo(args.processos, args.bloco)
+        except Exception as e:
+            if not args.continuo:
+                raise
+            logger.error(f"Erro no reprocessamento das decisões: {e}")
+        if not args.continuo:
+            break
+        time.sleep(args.intervalo)
+
+
+if __name__ == "__main__":
+    main()
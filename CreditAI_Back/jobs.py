@@ -0,0 +1,539 @@
+# -*- coding: utf-8 -*-
+"""
+Jobs de reanálise da carteira (POST /analise-credito/jobs)
+
+Um job analisa uma lista de CPFs ou os clientes que atendem a um filtro,
+dividida em partes: fatias de JOBS_PARTE CPFs da lista ou faixas de
+JOBS_PARTE ids da tabela clientes. As partes rodam num pool de processos
+(cada um mapeia o mesmo artefato do modelo, como no reprocessamento das
+decisões) e cada uma grava o seu resultado em CSV num arquivo próprio,
+trocado por inteiro ao terminar.
+
+Cada job é uma pasta em JOBS_DIR:
+    manifesto.json        estado, partes concluídas (na ordem em que
+                          terminaram) e contadores de progresso
+    cpfs.txt              a lista de CPFs, um por linha, largura fixa
+    parte_000012.csv      resultado de uma parte, sem cabeçalho
+    .trava                travada pelo processo da API que executa o job
+
+Com JOBS_SNAPSHOT, o job atualiza o snapshot de features (snapshot.py)
+ao começar e fixa a geração no manifesto: as partes leem as features dos
+arquivos mapeados em vez do banco, e só os CPFs cadastrados depois da
+geração são buscados no MySQL.
+
+O manifesto é o checkpoint: uma parte só conta depois de registrada nele.
+Se o processo que executava o job cair, a trava se solta e o job é
+retomado (na subida da API ou na próxima verificação de qualquer worker)
+refazendo só as partes que faltam. O resultado pode ser baixado durante
+a execução: a transmissão envia as partes já concluídas e acompanha as
+seguintes até o fim do job.
+
+Uso (a partir de CreditAI_Back/):
+    python jobs.py                     # lista os jobs
+    python jobs.py <id>                # estado de um job
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+import uuid
+import warnings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+import database
+import snapshot
+from analise import FEATURES, VERSAO_REGRAS, analisar_matriz, montar_matriz
+from modelo import ModeloCredito
+from registro import RegistroModelos
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+JOBS_PARTE = int(os.getenv("JOBS_PARTE", 20000))
+JOBS_BLOCO = int(os.getenv("JOBS_BLOCO", 5000))
+JOBS_SNAPSHOT = database.env_bool("JOBS_SNAPSHOT", False)
+
+COLUNAS_RESULTADO = ("cpf", "situacao", "aprovado", "limite", "probabilidade", "motivos")
+ESTADOS_FINAIS = ("concluido", "falhou")
+
+# Filtro do job (camelCase, como a API) -> coluna, operador em SQL e no NumPy
+_FILTROS = {
+    "scoreMin": ("score", ">=", np.greater_equal),
+    "scoreMax": ("score", "<=", np.less_equal),
+    "rendaMin": ("renda_mensal", ">=", np.greater_equal),
+    "rendaMax": ("renda_mensal", "<=", np.less_equal),
+    "possuiRestricoes": ("possui_restricoes", "=", np.equal),
+}
+
+_LARGURA_CPF = 12  # 11 dígitos e a quebra de linha
+
+
+def condicoes_filtro(filtro: Dict) -> Tuple[List[str], List]:
+    condicoes, params = [], []
+    for campo, (coluna, operador, _) in _FILTROS.items():
+        if filtro.get(campo) is not None:
+            condicoes.append(f"{coluna} {operador} %s")
+            params.append(filtro[campo])
+    return condicoes, params
+
+
+def filtrar_snapshot(dados: snapshot.Snapshot, linhas: slice, filtro: Dict) -> np.ndarray:
+    """As mesmas condições de condicoes_filtro, vetorizadas sobre um trecho do snapshot"""
+    mascara = np.ones(linhas.stop - linhas.start, dtype=bool)
+    for campo, (coluna, _, operador) in _FILTROS.items():
+        if filtro.get(campo) is not None:
+            mascara &= operador(dados.coluna(coluna, linhas), float(filtro[campo]))
+    return mascara
+
+
+# ==============================================
+# ARQUIVOS DO JOB
+# ==============================================
+
+def _ler_manifesto(pasta: Path) -> Dict:
+    return json.loads((pasta / "manifesto.json").read_text(encoding="utf-8"))
+
+
+def _gravar_manifesto(pasta: Path, manifesto: Dict):
+    manifesto["atualizado_em"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    temporario = pasta / f"manifesto.{os.getpid()}.tmp"
+    temporario.write_text(json.dumps(manifesto, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(temporario, pasta / "manifesto.json")
+
+
+def _arquivo_parte(pasta: Path, parte: int) -> Path:
+    return pasta / f"parte_{parte:06d}.csv"
+
+
+def _travar(pasta: Path):
+    """Trava exclusiva do job, solta quando o processo termina; None se outro a tiver"""
+    arquivo = open(pasta / ".trava", "a+b")
+    try:
+        if fcntl:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        arquivo.close()
+        return None
+    return arquivo
+
+
+def progresso(manifesto: Dict) -> Dict:
+    """Manifesto no formato da API, com o percentual concluído"""
+    partes = manifesto["partes"]
+    return {
+        **{chave: valor for chave, valor in manifesto.items() if chave != "concluidas"},
+        "partes_concluidas": len(manifesto["concluidas"]),
+        "percentual": round(100 * len(manifesto["concluidas"]) / partes, 2) if partes else 100.0,
+    }
+
+
+def criar_job(pasta_base, cpfs: Optional[List[str]] = None, filtro: Optional[Dict] = None,
+              versao_registro: Optional[str] = None, tamanho_parte: int = JOBS_PARTE) -> Tuple[Dict, object]:
+    """
+    Grava a pasta e o manifesto de um job novo, ainda pendente, e devolve
+    o manifesto e a trava do job, já tomada por quem o criou. Com filtro,
+    as faixas de id cobrem os clientes existentes na criação.
+    """
+    id_job = uuid.uuid4().hex
+    pasta = Path(pasta_base) / id_job
+    pasta.mkdir(parents=True)
+    trava = _travar(pasta)
+    manifesto = {
+        "id": id_job,
+        "estado": "pendente",
+        "origem": "cpfs" if cpfs is not None else "filtro",
+        "filtro": filtro,
+        "versao_registro": versao_registro,
+        "versao_modelo": None,
+        "versao_regras": VERSAO_REGRAS,
+        "tamanho_parte": tamanho_parte,
+        "concluidas": [],
+        "clientes": 0,
+        "aprovados": 0,
+        "nao_encontrados": 0,
+        "retomadas": 0,
+        "erro": None,
+        "criado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "concluido_em": None,
+    }
+    if cpfs is not None:
+        with open(pasta / "cpfs.txt", "w", encoding="ascii", newline="\n") as arquivo:
+            arquivo.writelines(f"{cpf}\n" for cpf in cpfs)
+        manifesto["total_cpfs"] = len(cpfs)
+        manifesto["partes"] = -(-len(cpfs) // tamanho_parte)
+    else:
+        with database.conexao_leitura() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT COALESCE(MIN(id), 1) - 1, COALESCE(MAX(id), 0) FROM clientes")
+            primeiro, ultimo = cursor.fetchone()
+        manifesto["primeiro_id"] = primeiro
+        manifesto["ultimo_id"] = ultimo
+        manifesto["partes"] = -(-(ultimo - primeiro) // tamanho_parte)
+    _gravar_manifesto(pasta, manifesto)
+    return manifesto, trava
+
+
+# ==============================================
+# PARTES (PROCESSOS FILHOS)
+# ==============================================
+
+_modelos: Dict[Optional[str], ModeloCredito] = {}
+_snapshot: Optional[snapshot.Snapshot] = None
+
+
+def _iniciar_processo():
+    # Cada processo já é um dos trabalhadores paralelos (ver decisoes.py)
+    warnings.filterwarnings("ignore", message="Loky-backed parallel loops")
+    if database.leituras.replicas:
+        database.leituras.verificar()
+
+
+def _modelo(versao_registro: Optional[str]) -> ModeloCredito:
+    """A versão do registro fixada na criação do job (ou credit_model.joblib), carregada uma vez por processo"""
+    if versao_registro not in _modelos:
+        _modelos[versao_registro] = RegistroModelos().modelo(versao_registro) \
+            if versao_registro else ModeloCredito()
+    modelo = _modelos[versao_registro]
+    if modelo.obter() is None:
+        raise RuntimeError("Modelo de crédito indisponível")
+    return modelo
+
+
+def _geracao(pasta_geracao: str) -> snapshot.Snapshot:
+    """A geração do snapshot fixada no job; só a última usada fica mapeada no processo"""
+    global _snapshot
+    if _snapshot is None or str(_snapshot.pasta) != pasta_geracao:
+        _snapshot = snapshot.abrir(pasta_geracao)
+    return _snapshot
+
+
+def _blocos_da_parte(pasta: Path, manifesto: Dict, parte: int):
+    """
+    Gera blocos (cpfs, X, encontrados) da parte: X traz, na ordem de
+    `cpfs`, as features só dos encontrados (máscara alinhada a `cpfs`)
+    """
+    tamanho = manifesto["tamanho_parte"]
+    dados = _geracao(manifesto["snapshot"]) if manifesto.get("snapshot") else None
+    if manifesto["origem"] == "cpfs":
+        with open(pasta / "cpfs.txt", "rb") as arquivo:
+            arquivo.seek(parte * tamanho * _LARGURA_CPF)
+            cpfs = arquivo.read(tamanho * _LARGURA_CPF).decode("ascii").split()
+        for inicio in range(0, len(cpfs), JOBS_BLOCO):
+            bloco = cpfs[inicio:inicio + JOBS_BLOCO]
+            if dados is None:
+                encontrados = database.buscar_clientes_por_cpfs(bloco)
+                clientes_db = [encontrados[cpf] for cpf in bloco if cpf in encontrados]
+                yield bloco, montar_matriz(clientes_db), [cpf in encontrados for cpf in bloco]
+                continue
+            linhas = dados.linhas_por_cpf(bloco)
+            achados = linhas >= 0
+            X = np.zeros((len(bloco), len(FEATURES)))
+            X[achados] = dados.matriz(linhas[achados])
+            # Cadastrados depois da geração do snapshot
+            faltam = [cpf for cpf, achado in zip(bloco, achados) if not achado]
+            extras = database.buscar_clientes_por_cpfs(faltam) if faltam else {}
+            for i in np.flatnonzero(~achados):
+                if bloco[i] in extras:
+                    X[i] = montar_matriz([extras[bloco[i]]])[0]
+                    achados[i] = True
+            yield bloco, X[achados], achados
+        return
+
+    inicio = manifesto["primeiro_id"] + parte * tamanho
+    fim = min(inicio + tamanho, manifesto["ultimo_id"])
+    filtro = manifesto["filtro"] or {}
+    if dados is not None:
+        faixa = dados.faixa(inicio, fim)
+        for comeco in range(faixa.start, faixa.stop, JOBS_BLOCO):
+            trecho = slice(comeco, min(comeco + JOBS_BLOCO, faixa.stop))
+            linhas = np.arange(trecho.start, trecho.stop)[filtrar_snapshot(dados, trecho, filtro)]
+            if len(linhas):
+                cpfs = np.char.decode(dados.cpfs[linhas], "ascii").tolist()
+                yield cpfs, dados.matriz(linhas), [True] * len(cpfs)
+        return
+
+    condicoes, params = condicoes_filtro(filtro)
+    where = " AND ".join(["id > %s", "id <= %s"] + condicoes)
+    with database.conexao_leitura() as connection:
+        cursor = connection.cursor(dictionary=True)
+        while True:
+            cursor.execute(
+                f"SELECT * FROM clientes WHERE {where} ORDER BY id LIMIT %s",
+                [inicio, fim] + params + [JOBS_BLOCO]
+            )
+            clientes_db = cursor.fetchall()
+            if not clientes_db:
+                break
+            yield [cliente_db["cpf"] for cliente_db in clientes_db], montar_matriz(clientes_db), \
+                [True] * len(clientes_db)
+            inicio = clientes_db[-1]["id"]
+
+
+def analisar_parte(tarefa: Tuple[str, int]) -> Dict:
+    """Processo filho: analisa uma parte e grava o CSV dela; devolve os contadores"""
+    caminho, parte = tarefa
+    pasta = Path(caminho)
+    manifesto = _ler_manifesto(pasta)
+    modelo = _modelo(manifesto["versao_registro"])
+
+    contadores = {"parte": parte, "versao_modelo": modelo.versao,
+                  "clientes": 0, "aprovados": 0, "nao_encontrados": 0}
+    # Nome único: uma parte refeita após uma queda pode coincidir com a execução antiga
+    temporario = pasta / f"parte_{parte:06d}.{uuid.uuid4().hex}.tmp"
+    with open(temporario, "w", encoding="utf-8", newline="") as arquivo:
+        escritor = csv.writer(arquivo)
+        for cpfs, X, encontrados in _blocos_da_parte(pasta, manifesto, parte):
+            resultados = iter(analisar_matriz(X, modelo.obter()))
+            for cpf, encontrado in zip(cpfs, encontrados):
+                if not encontrado:
+                    contadores["nao_encontrados"] += 1
+                    escritor.writerow((cpf, "nao_encontrado", "", "", "", ""))
+                    continue
+                resultado = next(resultados)
+                contadores["clientes"] += 1
+                contadores["aprovados"] += resultado["aprovado"]
+                escritor.writerow((
+                    cpf, "analisado", int(resultado["aprovado"]), resultado["limite"],
+                    resultado["probabilidade"], " | ".join(resultado["motivos"]),
+                ))
+    os.replace(temporario, _arquivo_parte(pasta, parte))
+    return contadores
+
+
+# ==============================================
+# EXECUÇÃO NA API
+# ==============================================
+
+class ExecutorJobs:
+    """
+    Cria, executa, retoma e transmite jobs a partir de um processo da API.
+    As partes de todos os jobs deste processo dividem um pool de `processos`
+    processos; cada job mantém no máximo `processos` partes em andamento.
+    Com `processos=0`, as partes rodam uma a uma numa thread deste processo
+    (máquinas de um núcleo e desenvolvimento). Com `usar_snapshot`, cada
+    job lê as features da geração do snapshot fixada ao começar.
+    """
+
+    def __init__(self, pasta=JOBS_DIR, processos: int = 2, intervalo: float = 0.5,
+                 usar_snapshot: bool = JOBS_SNAPSHOT):
+        self.pasta = Path(pasta)
+        self.processos = processos
+        self.intervalo = intervalo
+        self.usar_snapshot = usar_snapshot
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tarefas: Dict[str, asyncio.Task] = {}
+        self._travas: Dict[str, object] = {}
+
+    def _pasta_job(self, id_job: str) -> Path:
+        pasta = self.pasta / id_job
+        if not id_job.isalnum() or not (pasta / "manifesto.json").exists():
+            raise KeyError(f"Job {id_job} não encontrado")
+        return pasta
+
+    def criar(self, cpfs: Optional[List[str]] = None, filtro: Optional[Dict] = None,
+              versao_registro: Optional[str] = None) -> Dict:
+        """Bloqueante (arquivos e uma consulta): chame em executar_db; depois, iniciar()"""
+        manifesto, trava = criar_job(self.pasta, cpfs, filtro, versao_registro)
+        self._travas[manifesto["id"]] = trava
+        return progresso(manifesto)
+
+    def estado(self, id_job: str) -> Dict:
+        return progresso(_ler_manifesto(self._pasta_job(id_job)))
+
+    def iniciar(self, id_job: str) -> bool:
+        """Executa o job neste processo se nenhum outro o estiver executando"""
+        if id_job in self._tarefas:
+            return False
+        pasta = self._pasta_job(id_job)
+        trava = self._travas.pop(id_job, None) or _travar(pasta)
+        if trava is None:
+            return False
+        tarefa = asyncio.get_running_loop().create_task(self._executar(pasta, trava))
+        self._tarefas[id_job] = tarefa
+        tarefa.add_done_callback(lambda _: self._tarefas.pop(id_job, None))
+        return True
+
+    async def retomar(self) -> int:
+        """Inicia os jobs não terminados que nenhum processo está executando"""
+        if not self.pasta.exists():
+            return 0
+        retomados = 0
+        for manifesto in self.pasta.glob("*/manifesto.json"):
+            try:
+                estado = json.loads(manifesto.read_text(encoding="utf-8"))["estado"]
+            except (OSError, ValueError, KeyError):
+                continue
+            id_job = manifesto.parent.name
+            # Jobs criados aqui e ainda não iniciados já têm a trava deste processo
+            if estado not in ESTADOS_FINAIS and id_job not in self._travas and self.iniciar(id_job):
+                retomados += 1
+        return retomados
+
+    def _obter_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.processos <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.processos, mp_context=get_context("spawn"), initializer=_iniciar_processo
+            )
+        return self._pool
+
+    def _fixar_snapshot(self, manifesto: Dict):
+        """
+        Na primeira execução do job, atualiza o snapshot e fixa a geração
+        atual no manifesto; devolve a reserva da geração, mantida enquanto o
+        job roda (None: as partes leem do banco). Se a geração fixada já
+        foi removida, a retomada passa para a atual.
+        """
+        fixada = manifesto.get("snapshot")
+        if fixada:
+            reserva = snapshot.reservar(fixada)
+            if reserva is not None:
+                return reserva
+            logger.warning(f"Job {manifesto['id']}: geração {fixada} do snapshot removida; "
+                           f"as partes restantes usam a atual")
+        elif "snapshot" in manifesto or not self.usar_snapshot:
+            return None
+        try:
+            fixada = snapshot.atualizar()["pasta"]
+            reserva = snapshot.reservar(fixada)
+        except Exception as e:
+            logger.warning(f"Snapshot de features indisponível ({e}); job {manifesto['id']} lê do banco")
+            reserva = None
+        manifesto["snapshot"] = fixada if reserva is not None else None
+        return reserva
+
+    async def _executar(self, pasta: Path, trava):
+        loop = asyncio.get_running_loop()
+        manifesto = await asyncio.to_thread(_ler_manifesto, pasta)
+        em_andamento = set()
+        reserva = None
+        try:
+            if manifesto["estado"] == "executando":
+                manifesto["retomadas"] += 1
+                logger.info(f"Job {manifesto['id']} retomado: "
+                            f"{len(manifesto['concluidas'])}/{manifesto['partes']} partes concluídas")
+            manifesto["estado"] = "executando"
+            reserva = await asyncio.to_thread(self._fixar_snapshot, manifesto)
+            await asyncio.to_thread(_gravar_manifesto, pasta, manifesto)
+
+            feitas = set(manifesto["concluidas"])
+            pendentes = [parte for parte in range(manifesto["partes"]) if parte not in feitas]
+            while pendentes or em_andamento:
+                while pendentes and len(em_andamento) < max(1, self.processos):
+                    em_andamento.add(loop.run_in_executor(
+                        self._obter_pool(), analisar_parte, (str(pasta), pendentes.pop(0))
+                    ))
+                prontas, em_andamento = await asyncio.wait(em_andamento, return_when=asyncio.FIRST_COMPLETED)
+                for pronta in prontas:
+                    contadores = pronta.result()
+                    versao = contadores.pop("versao_modelo")
+                    if manifesto["versao_modelo"] is None:
+                        manifesto["versao_modelo"] = versao
+                    elif versao != manifesto["versao_modelo"]:
+                        raise RuntimeError(
+                            f"Modelo mudou durante o job ({manifesto['versao_modelo']} -> {versao})"
+                        )
+                    manifesto["concluidas"].append(contadores.pop("parte"))
+                    for chave, valor in contadores.items():
+                        manifesto[chave] += valor
+                await asyncio.to_thread(_gravar_manifesto, pasta, manifesto)
+
+            manifesto["estado"] = "concluido"
+            manifesto["concluido_em"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            for temporario in pasta.glob("parte_*.tmp"):
+                temporario.unlink(missing_ok=True)
+            logger.info(f"Job {manifesto['id']} concluído: {manifesto['clientes']} clientes")
+        except asyncio.CancelledError:
+            # Desligamento: o job continua "executando" e será retomado; as
+            # partes em andamento terminam sem ninguém à espera
+            for futuro in em_andamento:
+                futuro.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise
+        except Exception as e:
+            logger.error(f"Job {manifesto['id']} falhou: {e}")
+            manifesto["estado"] = "falhou"
+            manifesto["erro"] = str(e)
+        finally:
+            if manifesto["estado"] in ESTADOS_FINAIS:
+                await asyncio.to_thread(_gravar_manifesto, pasta, manifesto)
+            if reserva is not None:
+                reserva.close()
+            trava.close()
+
+    async def transmitir(self, id_job: str, aguardar: bool = True) -> AsyncIterator[bytes]:
+        """
+        CSV com cabeçalho e as partes concluídas, na ordem em que terminaram;
+        com `aguardar`, acompanha o job até ele terminar
+        """
+        pasta = self._pasta_job(id_job)
+        yield (",".join(COLUNAS_RESULTADO) + "\r\n").encode("utf-8")
+        enviadas = 0
+        while True:
+            manifesto = await asyncio.to_thread(_ler_manifesto, pasta)
+            for parte in manifesto["concluidas"][enviadas:]:
+                with open(_arquivo_parte(pasta, parte), "rb") as arquivo:
+                    while True:
+                        bloco = await asyncio.to_thread(arquivo.read, 1 << 20)
+                        if not bloco:
+                            break
+                        yield bloco
+            enviadas = len(manifesto["concluidas"])
+            if manifesto["estado"] in ESTADOS_FINAIS or not aguardar:
+                return
+            await asyncio.sleep(self.intervalo)
+
+    async def parar(self):
+        """Interrompe os jobs deste processo (retomados na próxima subida)"""
+        for tarefa in list(self._tarefas.values()):
+            tarefa.cancel()
+        if self._tarefas:
+            await asyncio.gather(*self._tarefas.values(), return_exceptions=True)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def estatisticas(self) -> Dict:
+        return {
+            "processos": self.processos,
+            "snapshot": self.usar_snapshot,
+            "jobs_em_execucao": len(self._tarefas),
+            "pool_iniciado": self._pool is not None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jobs de reanálise da carteira")
+    parser.add_argument("id", nargs="?", help="Job a consultar; sem id, lista todos")
+    args = parser.parse_args()
+
+    pasta = Path(JOBS_DIR)
+    if args.id:
+        print(json.dumps(progresso(_ler_manifesto(pasta / args.id)), indent=2, ensure_ascii=False))
+        return
+    for caminho in sorted(pasta.glob("*/manifesto.json"), key=lambda c: c.stat().st_mtime):
+        job = progresso(_ler_manifesto(caminho.parent))
+        print(f"{job['id']}  {job['estado']:<11} {job['percentual']:>6.1f}%  "
+              f"{job['clientes']} clientes  (criado em {job['criado_em']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,20 +4,37 @@ Módulo principal da API Credit.AI - Sistema de análise de crédito
 Versão Corrigida
 """
 
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, Header, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, validator
-import mysql.connector
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, model_validator
 from mysql.connector import Error
-import joblib
-import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from pathlib import Path
-from typing import Dict, List, Optional
-import os
+from typing import Annotated, Any, Dict, List, Optional
+import asyncio
+import hashlib
 import logging
-from fastapi import status
+import os
+import time
+
+import admissao
+import database
+import metricas
+import portfolio
+from admissao import GrupoAdmissao, MiddlewareAdmissao, SobrecargaError
+from agendador import AgendadorAnalise
+from busca import IndiceNomes
+from analise import MOTIVO_ERRO_MODELO, MOTIVO_SEM_MODELO, REGRAS, VERSAO_REGRAS
+from cache import criar_cache
+from condicional import MiddlewareCompressao, calcular_etag, etag_correspondente, marcar, nao_modificado
+from decisoes import DecisoesPrecalculadas
+from jobs import ExecutorJobs
+from database import IdempotenciaError, POLITICAS_CONFLITO, PoolEsgotadoError, env_bool, executar_db
+from schemas import Cliente, validar_cliente, valores_cliente
+from modelo import ModeloCredito
+from registro import AvaliacaoSombra, GerenciadorModelos, RegistroModelos
+from respostas import RespostaJSON, serializar
 
 # Configuração básica de logging
 logging.basicConfig(level=logging.INFO)
@@ -25,15 +42,89 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Início da importação, para o relatório de inicialização
+INICIO_IMPORTACAO = time.perf_counter()
+inicializacao: Dict = {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida da aplicação: na subida, modelo (em segundo plano) e
+    índice de nomes, e as vigias do registro de modelos, das réplicas e dos
+    jobs; na descida, jobs, agendador e pool
+    """
+    inicializacao["importacao_ms"] = round(1000 * (time.perf_counter() - INICIO_IMPORTACAO), 1)
+    logger.info(f"API pronta para conexões em {inicializacao['importacao_ms']} ms")
+    # A subida não espera o modelo: /ready responde 503 até ele ficar pronto
+    precarga = asyncio.create_task(
+        asyncio.to_thread(modelos.obter)
+    ) if env_bool("MODELO_PRECARREGAR", True) else None
+    vigia = asyncio.create_task(vigiar_registro())
+    vigia_replicas = asyncio.create_task(vigiar_replicas()) if database.leituras.replicas else None
+    vigia_jobs = asyncio.create_task(vigiar_jobs())
+    indexador = asyncio.create_task(manter_indice_nomes()) if indice_nomes else None
+    yield
+    vigia.cancel()
+    if vigia_replicas:
+        vigia_replicas.cancel()
+    vigia_jobs.cancel()
+    await executor_jobs.parar()
+    if indexador:
+        indexador.cancel()
+    if precarga:
+        await asyncio.gather(precarga, return_exceptions=True)
+    await agendador.parar()
+    database.encerrar()
+
 # Inicialização da aplicação
 app = FastAPI(
     title="Credit.AI | API",
     description="API para análise de crédito utilizando machine learning",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url=None
+    redoc_url=None,
+    default_response_class=RespostaJSON,
+    lifespan=lifespan
 )
 
+# Limites de concorrência por grupo de rotas, com fila limitada e prazo por
+# requisição (ver admissao.py). Fica dentro do CORS, para que o 503 chegue ao
+# navegador com os cabeçalhos, e das métricas, que contam as recusas
+def grupo_admissao(nome: str, limite: int, fila: int, espera_s: float, timeout_s: float) -> GrupoAdmissao:
+    prefixo = f"ADMISSAO_{nome.upper()}"
+    return GrupoAdmissao(
+        nome,
+        limite=int(os.getenv(f"{prefixo}_LIMITE", limite)),
+        fila_max=int(os.getenv(f"{prefixo}_FILA", fila)),
+        espera_max=float(os.getenv(f"{prefixo}_ESPERA_S", espera_s)),
+        timeout=float(os.getenv(f"{prefixo}_TIMEOUT_S", timeout_s)),
+    )
+
+def classificar_rota(metodo: str, caminho: str) -> Optional[str]:
+    """Grupo de admissão da requisição; None para raiz, monitoramento, métricas e administração"""
+    if caminho.startswith("/analise-credito"):
+        return "analise"
+    if caminho.startswith(("/clientes", "/portfolio")):
+        return "escrita" if metodo in ("POST", "PUT", "PATCH", "DELETE") else "listagem"
+    return None
+
+ADMISSAO_ATIVO = env_bool("ADMISSAO_ATIVO", True)
+ADMISSAO_RETRY_AFTER_S = int(os.getenv("ADMISSAO_RETRY_AFTER_S", 1))
+grupos_admissao = {
+    grupo.nome: grupo for grupo in (
+        grupo_admissao("analise", limite=32, fila=128, espera_s=1.0, timeout_s=3.0),
+        grupo_admissao("listagem", limite=8, fila=32, espera_s=2.0, timeout_s=10.0),
+        grupo_admissao("escrita", limite=4, fila=16, espera_s=5.0, timeout_s=60.0),
+    )
+} if ADMISSAO_ATIVO else {}
+if grupos_admissao:
+    app.add_middleware(
+        MiddlewareAdmissao,
+        grupos=grupos_admissao,
+        classificar=classificar_rota,
+        retry_after=ADMISSAO_RETRY_AFTER_S
+    )
+
 # Configuração do CORS
 app.add_middleware(
     CORSMiddleware,
@@ -41,112 +132,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=["ETag"],
 )
 
-# ==============================================
-# MODELOS PYDANTIC
-# ==============================================
-
-class HistoricoPagamentos(BaseModel):
-    """Modelo para histórico de pagamentos do cliente"""
-    atrasos_30_dias: int = Field(
-        default=0,
-        ge=0,
-        alias="atrasos30Dias",
-        description="Quantidade de atrasos entre 1-30 dias"
-    )
-    atrasos_60_dias: int = Field(
-        default=0,
-        ge=0,
-        alias="atrasos60Dias", 
-        description="Quantidade de atrasos entre 31-60 dias"
-    )
-    atrasos_90_dias: int = Field(
-        default=0,
-        ge=0,
-        alias="atrasos90Dias",
-        description="Quantidade de atrasos acima de 60 dias"
+# gzip/brotli negociado pelo Accept-Encoding a partir de um tamanho mínimo
+# (ver condicional.py). Dentro das métricas, que contam o tempo da compressão
+if env_bool("COMPRESSAO_ATIVO", True):
+    app.add_middleware(
+        MiddlewareCompressao,
+        minimo=int(os.getenv("COMPRESSAO_MINIMO_BYTES", 1024)),
+        nivel_gzip=int(os.getenv("COMPRESSAO_NIVEL_GZIP", 1)),
+        qualidade_brotli=int(os.getenv("COMPRESSAO_QUALIDADE_BROTLI", 4))
     )
-    
-    model_config = {
-        "populate_by_name": True,
-        "json_schema_extra": {
-            "example": {
-                "atrasos30Dias": 1,
-                "atrasos60Dias": 0,
-                "atrasos90Dias": 0
-            }
-        }
-    }
 
-class Cliente(BaseModel):
-    """Modelo principal para dados do cliente"""
-    cpf: str = Field(
-        ...,
-        min_length=11,
-        max_length=11,
-        pattern=r'^\d+$',
-        alias="cpf",
-        description="CPF do cliente (apenas números)"
-    )
-    nome: str = Field(
-        ...,
-        min_length=3,
-        max_length=100,
-        alias="nome",
-        description="Nome completo do cliente"
-    )
-    score: int = Field(
-        ...,
-        ge=300,
-        le=1000,
-        alias="score",
-        description="Score de crédito (300-1000)"
-    )
-    possui_restricoes: bool = Field(
-        ...,
-        alias="possuiRestricoes",
-        description="Indica se possui restrições no SPC/Serasa"
-    )
-    renda_mensal: float = Field(
-        ...,
-        gt=0,
-        alias="rendaMensal",
-        description="Renda mensal em reais (maior que zero)"
-    )
-    historico_pagamentos: HistoricoPagamentos = Field(
-        ...,
-        alias="historicoPagamentos",
-        description="Histórico de pagamentos do cliente"
-    )
-
-    @validator('cpf')
-    def cpf_deve_ter_11_numeros(cls, v):
-        if not v.isdigit() or len(v) != 11:
-            raise ValueError('CPF deve conter exatamente 11 dígitos numéricos')
-        return v
-
-    @validator('renda_mensal')
-    def arredondar_renda(cls, v):
-        return round(v, 2)
+# Contagem e duração por rota, Server-Timing e perfil das requisições lentas
+app.add_middleware(
+    metricas.MiddlewareMetricas,
+    server_timing=env_bool("SERVER_TIMING", True),
+    amostrador=metricas.criar_amostrador()
+)
 
-    model_config = {
-        "populate_by_name": True,
-        "json_schema_extra": {
-            "example": {
-                "cpf": "12345678901",
-                "nome": "Fulano de Tal",
-                "score": 700,
-                "possuiRestricoes": False,
-                "rendaMensal": 5000.50,
-                "historicoPagamentos": {
-                    "atrasos30Dias": 1,
-                    "atrasos60Dias": 0,
-                    "atrasos90Dias": 0
-                }
-            }
-        }
-    }
+# ==============================================
+# MODELOS PYDANTIC
+# ==============================================
 
 class AnaliseRequest(BaseModel):
     """Modelo para requisição de análise de crédito"""
@@ -172,6 +180,7 @@ class AnaliseResponse(BaseModel):
     limite: float
     probabilidade: float
     motivos: List[str]
+    codigos: List[str] = Field(default_factory=list, description="Códigos dos motivos (ver GET /regras)")
     cliente: Cliente
     
     model_config = {
@@ -181,6 +190,7 @@ class AnaliseResponse(BaseModel):
                 "limite": 12500.00,
                 "probabilidade": 0.95,
                 "motivos": [],
+                "codigos": [],
                 "cliente": {
                     "cpf": "12345678901",
                     "nome": "Fulano de Tal",
@@ -197,86 +207,322 @@ class AnaliseResponse(BaseModel):
         }
     }
 
+class ListaClientesResponse(BaseModel):
+    """Página de clientes ordenada pelo id, com o cursor da próxima página"""
+    clientes: List[Cliente]
+    total: int = Field(..., description="Quantidade de clientes nesta página")
+    proximo: Optional[int] = Field(
+        None,
+        description="Valor para o parâmetro `after` da próxima página (nulo na última)"
+    )
+
+class ClienteEncontrado(BaseModel):
+    """Resultado de busca por nome"""
+    relevancia: float
+    cliente: Cliente
+
+class BuscaClientesResponse(BaseModel):
+    """Clientes encontrados, do mais para o menos relevante"""
+    resultados: List[ClienteEncontrado]
+    total: int
+
+CpfStr = Annotated[str, Field(min_length=11, max_length=11, pattern=r'^\d+$')]
+
+ANALISE_LOTE_MAX = int(os.getenv("ANALISE_LOTE_MAX", 10000))
+
+class AnaliseLoteRequest(BaseModel):
+    """Modelo para requisição de análise de crédito em lote"""
+    cpfs: List[CpfStr] = Field(
+        ...,
+        min_length=1,
+        max_length=ANALISE_LOTE_MAX,
+        description="CPFs a serem analisados (apenas números)"
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "cpfs": ["12345678901", "98765432100"]
+            }
+        }
+    }
+
+class AnaliseLoteResponse(BaseModel):
+    """Modelo para resposta da análise de crédito em lote"""
+    resultados: List[AnaliseResponse]
+    nao_encontrados: List[str]
+
+CLIENTES_LOTE_MAX = int(os.getenv("CLIENTES_LOTE_MAX", 5000))
+CLIENTES_LOTE_BLOCO = int(os.getenv("CLIENTES_LOTE_BLOCO", 500))
+
+class CadastroLoteRequest(BaseModel):
+    """Modelo para cadastro de clientes em lote"""
+    clientes: List[Dict[str, Any]] = Field(
+        ...,
+        min_length=1,
+        max_length=CLIENTES_LOTE_MAX,
+        description="Clientes no formato de POST /clientes, validados um a um"
+    )
+
+class ResultadoCadastro(BaseModel):
+    """Resultado de um item do cadastro em lote"""
+    indice: int = Field(..., description="Posição do item na lista enviada")
+    cpf: Optional[str] = None
+    status: str = Field(..., description="inserido, atualizado, ignorado, rejeitado ou invalido")
+    erro: Optional[str] = None
+
+class CadastroLoteResponse(BaseModel):
+    """Modelo para resposta do cadastro em lote"""
+    resultados: List[ResultadoCadastro]
+    resumo: Dict[str, int]
+    repetido: bool = Field(
+        ...,
+        description="Algum bloco já tinha sido gravado com esta Idempotency-Key"
+    )
+
+class FaixaScore(BaseModel):
+    """Clientes, atrasos e aprovação de uma faixa de score"""
+    de: int
+    ate: int
+    clientes: int
+    comRestricoes: int
+    atrasos30Dias: int
+    atrasos60Dias: int
+    atrasos90Dias: int
+    decisoes: int
+    aprovados: int
+    taxaAprovacao: Optional[float]
+
+class FaixaRenda(BaseModel):
+    """Clientes com renda mensal em [de, ate); a última faixa não tem limite"""
+    de: int
+    ate: Optional[int]
+    clientes: int
+
+class PortfolioResumo(BaseModel):
+    """Resumo da carteira, lido das tabelas de contadores (ver portfolio.py)"""
+    clientes: int
+    comRestricoes: int
+    taxaRestricoes: Optional[float]
+    rendaMedia: Optional[float]
+    atrasos: Dict[str, int]
+    aprovacao: Dict[str, Any]
+    score: List[FaixaScore]
+    rendaMensal: List[FaixaRenda]
+
+JOBS_MAX_CPFS = int(os.getenv("JOBS_MAX_CPFS", 2000000))
+
+class FiltroClientes(BaseModel):
+    """Filtro sobre a tabela clientes; campos ausentes não filtram"""
+    scoreMin: Optional[int] = Field(None, ge=0, le=1000)
+    scoreMax: Optional[int] = Field(None, ge=0, le=1000)
+    rendaMin: Optional[float] = Field(None, ge=0)
+    rendaMax: Optional[float] = Field(None, ge=0)
+    possuiRestricoes: Optional[bool] = None
+
+class JobAnaliseRequest(BaseModel):
+    """Job de análise: uma lista de CPFs ou um filtro sobre a carteira (`{}` analisa todos)"""
+    cpfs: Optional[List[CpfStr]] = Field(None, min_length=1, max_length=JOBS_MAX_CPFS)
+    filtro: Optional[FiltroClientes] = None
+
+    @model_validator(mode="after")
+    def cpfs_ou_filtro(self):
+        if (self.cpfs is None) == (self.filtro is None):
+            raise ValueError("Informe `cpfs` ou `filtro`, não ambos")
+        return self
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "filtro": {"scoreMin": 600, "possuiRestricoes": False}
+            }
+        }
+    }
+
+class JobEstado(BaseModel):
+    """Estado e progresso de um job de análise"""
+    id: str
+    estado: str = Field(..., description="pendente, executando, concluido ou falhou")
+    origem: str
+    partes: int
+    partes_concluidas: int
+    percentual: float
+    clientes: int
+    aprovados: int
+    nao_encontrados: int
+    versao_modelo: Optional[str]
+    versao_regras: str
+    retomadas: int
+    erro: Optional[str]
+    criado_em: str
+    concluido_em: Optional[str]
+
 # ==============================================
 # CONFIGURAÇÃO DO BANCO DE DADOS
 # ==============================================
 
-def get_db_connection():
-    """Estabelece conexão com o banco de dados MySQL"""
-    try:
-        connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            database=os.getenv("DB_NAME", "credito_db"),
-            user=os.getenv("DB_USER", "root"),
-            password=os.getenv("DB_PASSWORD", ""),
-            port=os.getenv("DB_PORT", 3306)
-        )
-        logger.info("Conexão com o banco de dados estabelecida")
-        return connection
-    except Error as e:
-        logger.error(f"Erro ao conectar ao MySQL: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro de conexão com o banco de dados"
-        )
+@app.exception_handler(SobrecargaError)
+async def erro_sobrecarga(request, e: SobrecargaError):
+    """Prazo esgotado no pool, na consulta ou antes da inferência: 503 com Retry-After"""
+    logger.warning(f"Requisição recusada ({e.motivo}): {e}")
+    admissao.registrar_rejeicao(e)
+    return admissao.resposta_sobrecarga(e, ADMISSAO_RETRY_AFTER_S)
+
+def erro_pool(e: PoolEsgotadoError) -> HTTPException:
+    """Converte o esgotamento do pool em resposta 503"""
+    logger.error(f"Pool de conexões esgotado: {e}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Banco de dados sobrecarregado, tente novamente"
+    )
+
+async def vigiar_replicas():
+    """Verifica saúde e atraso das réplicas de leitura (ver replicas.py)"""
+    intervalo = float(os.getenv("DB_REPLICA_VERIFICAR_S", 5))
+    while True:
+        try:
+            await executar_db(database.leituras.verificar)
+        except Exception as e:
+            logger.error(f"Erro ao verificar as réplicas: {e}")
+        await asyncio.sleep(intervalo)
 
 # ==============================================
 # MODELO DE MACHINE LEARNING (ATUALIZADO)
 # ==============================================
 
-MODEL_FILE = 'credit_model.joblib'
+# Resultados de análise por CPF, válidos enquanto modelo e regras não mudarem
+cache_analises = criar_cache(versao_regras=VERSAO_REGRAS)
 
-def inicializar_modelo() -> Optional[RandomForestClassifier]:
-    """Inicializa ou carrega o modelo de machine learning"""
-    try:
-        if not Path(MODEL_FILE).exists():
-            logger.info("Criando modelo básico de crédito...")
-            
-            # Dados de treinamento de exemplo (sem o parâmetro de porcentagem removido)
-            X_train = np.array([
-                [800, 0, 0, 0, 0, 5000],    # Removido o terceiro parâmetro (porcentagem)
-                [300, 1, 5, 3, 2, 1500],
-                [650, 0, 2, 0, 0, 3500],
-                [450, 1, 3, 1, 0, 2500],
-                [720, 0, 1, 0, 0, 4500]
-            ])
-            
-            y_train = np.array([1, 0, 1, 0, 1])  # 1 = Aprovado, 0 = Reprovado
-            
-            model = RandomForestClassifier(n_estimators=100, random_state=42)
-            model.fit(X_train, y_train)
-            
-            joblib.dump(model, MODEL_FILE)
-            logger.info(f"Modelo básico salvo em {MODEL_FILE}")
-            return model
-        
-        model = joblib.load(MODEL_FILE)
-        logger.info("Modelo de crédito carregado com sucesso!")
-        return model
-    except Exception as e:
-        logger.error(f"Erro ao carregar modelo: {e}")
-        return None
+def versao_modelo_carregado(modelo: ModeloCredito):
+    """Entradas de cache de outra versão do modelo deixam de valer"""
+    cache_analises.definir_versao_modelo(modelo.versao)
+
+# Carregado sob demanda (ou em segundo plano na subida) a partir do artefato
+# compilado mapeado em memória, compartilhado por todos os workers (ver modelo.py).
+# A versão em serviço vem do registro (ver registro.py) e é trocada a quente
+OPCOES_MODELO = {
+    "mmap": env_bool("MODELO_MMAP", True),
+    "sklearn_lotes": env_bool("MODELO_SKLEARN_LOTES", True),
+}
+modelos = GerenciadorModelos(
+    RegistroModelos(),
+    padrao=ModeloCredito(ao_carregar=versao_modelo_carregado, **OPCOES_MODELO),
+    ao_trocar=versao_modelo_carregado,
+    opcoes_modelo=OPCOES_MODELO,
+    sombra=AvaliacaoSombra(max_pendentes=int(os.getenv("SOMBRA_MAX_PENDENTES", 64)))
+)
+
+# Jobs de reanálise da carteira em processos separados (ver jobs.py)
+executor_jobs = ExecutorJobs(processos=int(os.getenv("JOBS_PROCESSOS", max(1, (os.cpu_count() or 2) // 2))))
+
+async def vigiar_jobs():
+    """Retoma jobs interrompidos: na subida e, depois, os de workers que caíram"""
+    intervalo = float(os.getenv("JOBS_VERIFICAR_S", 10))
+    while True:
+        try:
+            retomados = await executor_jobs.retomar()
+            if retomados:
+                logger.info(f"{retomados} job(s) retomado(s) neste worker")
+        except Exception as e:
+            logger.error(f"Erro ao retomar jobs: {e}")
+        await asyncio.sleep(intervalo)
+
+async def vigiar_registro():
+    """Aplica promoções e candidatas gravadas no manifesto (por este ou outro worker)"""
+    intervalo = float(os.getenv("MODELOS_VERIFICAR_S", 5))
+    while True:
+        try:
+            await asyncio.to_thread(modelos.sincronizar)
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar o registro de modelos: {e}")
+        await asyncio.sleep(intervalo)
+
+# Busca por nome: FULLTEXT no MySQL (padrão) ou índice de palavras em memória
+BUSCA_BACKEND = os.getenv("BUSCA_BACKEND", "fulltext").lower()
+indice_nomes = IndiceNomes() if BUSCA_BACKEND == "memoria" else None
+
+async def incorporar_novos_nomes():
+    """Adiciona ao índice os clientes com id acima do maior já indexado"""
+    while True:
+        linhas = await executar_db(database.novos_nomes, indice_nomes.maior_id)
+        if not linhas:
+            break
+        indice_nomes.adicionar_muitos(linhas)
 
-credit_model = inicializar_modelo()
+async def manter_indice_nomes():
+    """Carrega o índice de nomes e incorpora periodicamente clientes novos"""
+    intervalo = float(os.getenv("BUSCA_ATUALIZACAO_S", 30))
+    while True:
+        try:
+            await incorporar_novos_nomes()
+            if not indice_nomes.pronto:
+                indice_nomes.pronto = True
+                logger.info(f"Índice de nomes carregado: {len(indice_nomes)} clientes")
+        except (PoolEsgotadoError, Error) as e:
+            logger.error(f"Erro ao atualizar o índice de nomes: {e}")
+        await asyncio.sleep(intervalo)
+
+# Decisões pré-calculadas pelo reprocessamento em segundo plano (ver decisoes.py):
+# lidas junto com o cliente e usadas enquanto valerem para a linha e o modelo atuais
+DECISOES_ATIVO = env_bool("DECISOES_ATIVO", False)
+decisoes = DecisoesPrecalculadas(modelos.analisar, lambda: modelos.versao) if DECISOES_ATIVO else None
+buscar_clientes = decisoes.buscar if decisoes else database.buscar_clientes_por_cpfs
+analisar_clientes = decisoes.analisar if decisoes else modelos.analisar
+
+# Análises individuais concorrentes são agrupadas em micro-lotes (ver agendador.py)
+AGENDADOR_ATIVO = env_bool("AGENDADOR_ATIVO", True)
+agendador = AgendadorAnalise(
+    analisar=analisar_clientes,
+    buscar=buscar_clientes,
+    janela_ms=float(os.getenv("AGENDADOR_JANELA_MS", 2)),
+    lote_max=int(os.getenv("AGENDADOR_LOTE_MAX", 64)),
+    adaptativo=env_bool("AGENDADOR_ADAPTATIVO", True)
+)
+
+# Medidores lidos a cada coleta de /metrics
+metricas.Medidor("creditai_modelo_pronto", "Modelo de crédito carregado e disponível",
+                 lambda: float(modelos.pronto))
+metricas.Medidor("creditai_modelo_trocas", "Trocas a quente do modelo ativo neste worker",
+                 lambda: float(modelos.trocas))
+metricas.Medidor("creditai_modelo_info", "Versão do modelo ativo", lambda: [((modelos.versao or "nenhuma",), 1)],
+                 rotulos=("versao",))
+metricas.medidores_de_estatisticas("creditai_pool", "Pool de conexões", lambda: database.pool.estatisticas())
+metricas.medidores_de_estatisticas("creditai_cache", "Cache de análises", cache_analises.estatisticas)
+metricas.medidores_de_estatisticas("creditai_agendador", "Micro-lotes de análise", agendador.estatisticas)
+if decisoes:
+    metricas.medidores_de_estatisticas("creditai_decisoes", "Decisões pré-calculadas", decisoes.estatisticas)
+metricas.Medidor("creditai_replica_saudavel", "Réplica de leitura em circulação",
+                 lambda: [((r.nome,), float(r.saudavel)) for r in database.leituras.replicas],
+                 rotulos=("replica",))
+metricas.Medidor("creditai_replica_atraso_segundos", "Atraso de replicação na última verificação",
+                 lambda: [((r.nome,), r.atraso) for r in database.leituras.replicas if r.atraso is not None],
+                 rotulos=("replica",))
+metricas.Medidor("creditai_replica_leituras", "Leituras atendidas por réplica desde a subida",
+                 lambda: [((r.nome,), r.leituras) for r in database.leituras.replicas],
+                 rotulos=("replica",))
+metricas.Medidor("creditai_admissao_fila", "Requisições aguardando vaga por grupo de rotas",
+                 lambda: [((nome,), grupo.estatisticas()["fila"]) for nome, grupo in grupos_admissao.items()],
+                 rotulos=("grupo",))
+metricas.Medidor("creditai_admissao_ativas", "Requisições em atendimento por grupo de rotas",
+                 lambda: [((nome,), grupo.estatisticas()["ativas"]) for nome, grupo in grupos_admissao.items()],
+                 rotulos=("grupo",))
 
 # ==============================================
 # FUNÇÕES AUXILIARES
 # ==============================================
 
-def calcular_limite(score: int, renda: float) -> float:
-    """Calcula o limite de crédito com base no score e renda"""
-    limite_base = renda * 0.5  # Até 50% da renda
-    fator_score = score / 1000  # Fator de 0.3 a 1.0
-    return round(limite_base * fator_score, 2)
-
 def formatar_cliente_db(cliente_db: Dict) -> Dict:
-    """Formata os dados do cliente do banco para o frontend"""
+    """
+    Formata os dados do cliente do banco para o frontend, já nos tipos do
+    JSON final (o banco devolve TINYINT e DECIMAL), sem passar pelo modelo
+    Cliente: as linhas do banco foram validadas no cadastro
+    """
     return {
         "cpf": cliente_db['cpf'],
         "nome": cliente_db['nome'],
         "score": cliente_db['score'],
-        "possuiRestricoes": cliente_db['possui_restricoes'],
-        "rendaMensal": cliente_db['renda_mensal'],
+        "possuiRestricoes": bool(cliente_db['possui_restricoes']),
+        "rendaMensal": round(float(cliente_db['renda_mensal']), 2),
         "historicoPagamentos": {
             'atrasos30Dias': cliente_db['atrasos_30_dias'],
             'atrasos60Dias': cliente_db['atrasos_60_dias'],
@@ -284,6 +530,45 @@ def formatar_cliente_db(cliente_db: Dict) -> Dict:
         }
     }
 
+def formatar_analise(resultado: Dict, cliente_db: Dict) -> Dict:
+    """Análise no formato de AnaliseResponse, sem revalidação"""
+    return {
+        "aprovado": resultado["aprovado"],
+        "limite": resultado["limite"],
+        "probabilidade": resultado["probabilidade"],
+        "motivos": resultado["motivos"],
+        "codigos": resultado["codigos"],
+        "cliente": formatar_cliente_db(cliente_db),
+    }
+
+# Campos da API e as colunas do banco de onde vêm
+CAMPOS_CLIENTE = {
+    "cpf": ("cpf",),
+    "nome": ("nome",),
+    "score": ("score",),
+    "possuiRestricoes": ("possui_restricoes",),
+    "rendaMensal": ("renda_mensal",),
+    "historicoPagamentos": ("atrasos_30_dias", "atrasos_60_dias", "atrasos_90_dias"),
+}
+
+def projetar_cliente_db(cliente_db: Dict, campos: List[str]) -> Dict:
+    """Formata apenas os campos pedidos, com os mesmos nomes e tipos de formatar_cliente_db"""
+    projetado = {}
+    for campo in campos:
+        if campo == "historicoPagamentos":
+            projetado[campo] = {
+                'atrasos30Dias': cliente_db['atrasos_30_dias'],
+                'atrasos60Dias': cliente_db['atrasos_60_dias'],
+                'atrasos90Dias': cliente_db['atrasos_90_dias']
+            }
+        elif campo == "possuiRestricoes":
+            projetado[campo] = bool(cliente_db['possui_restricoes'])
+        elif campo == "rendaMensal":
+            projetado[campo] = round(float(cliente_db['renda_mensal']), 2)
+        else:
+            projetado[campo] = cliente_db[CAMPOS_CLIENTE[campo][0]]
+    return projetado
+
 # ==============================================
 # ROTAS DA API (ATUALIZADAS PARA O NOVO MODELO)
 # ==============================================
@@ -297,190 +582,480 @@ async def root():
         "endpoints": {
             "documentação": "/docs",
             "listar_clientes": "/clientes",
-            "analise_credito": "/analise-credito"
+            "analise_credito": "/analise-credito",
+            "regras": "/regras"
         }
     }
 
+@app.get("/regras", tags=["Análise de Crédito"])
+async def regras_credito():
+    """
+    Regras de decisão em serviço (regras.json), com versão, critérios,
+    textos dos motivos e sugestões. O frontend avalia as mesmas condições
+    e traduz os códigos das análises em sugestões a partir daqui.
+    """
+    return RespostaJSON(REGRAS.dados)
+
+@app.get("/ready", tags=["Monitoramento"])
+async def pronto():
+    """Prontidão: modelo carregado e banco acessível (503 enquanto não estiver)"""
+    motivos = []
+    if not modelos.pronto:
+        motivos.append("modelo carregando" if not modelos.carregado else "modelo indisponível")
+    try:
+        await executar_db(database.ping)
+    except Exception as e:
+        motivos.append(f"banco indisponível: {e}")
+
+    corpo = {
+        "pronto": not motivos,
+        "motivos": motivos,
+        "inicializacao": {**inicializacao, "modelo": modelos.relatorio}
+    }
+    return JSONResponse(
+        corpo,
+        status_code=status.HTTP_200_OK if not motivos else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Monitoramento"])
+async def metricas_prometheus():
+    """Métricas deste worker no formato texto do Prometheus"""
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/monitoramento/pool", tags=["Monitoramento"])
+async def estatisticas_pool():
+    """Estado do pool de conexões (em uso, aguardando, latência de aquisição)"""
+    return database.pool.estatisticas()
+
+@app.get("/monitoramento/replicas", tags=["Monitoramento"])
+async def estatisticas_replicas():
+    """Réplicas de leitura: saúde, atraso, leituras e leituras desviadas ao primário"""
+    return database.leituras.estatisticas()
+
+@app.get("/monitoramento/jobs", tags=["Monitoramento"])
+async def estatisticas_jobs():
+    """Processos e jobs em execução neste worker"""
+    return executor_jobs.estatisticas()
+
+@app.get("/monitoramento/agendador", tags=["Monitoramento"])
+async def estatisticas_agendador():
+    """Micro-lotes de análise: tamanho dos lotes e atraso de fila"""
+    return agendador.estatisticas()
+
+@app.get("/monitoramento/admissao", tags=["Monitoramento"])
+async def estatisticas_admissao():
+    """Vagas, fila e recusas de cada grupo de rotas"""
+    return {nome: grupo.estatisticas() for nome, grupo in grupos_admissao.items()}
+
+@app.get("/monitoramento/cache", tags=["Monitoramento"])
+async def estatisticas_cache():
+    """Cache de análises: acertos, falhas, remoções e invalidações"""
+    return cache_analises.estatisticas()
+
+@app.get("/monitoramento/decisoes", tags=["Monitoramento"])
+async def estatisticas_decisoes():
+    """Análises servidas por decisões pré-calculadas e calculadas na hora"""
+    return decisoes.estatisticas() if decisoes else {"ativo": False}
+
+# ==============================================
+# ADMINISTRAÇÃO DE MODELOS
+# ==============================================
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def verificar_admin(token: Optional[str]):
+    """Com ADMIN_TOKEN definido, exige o mesmo valor no cabeçalho X-Admin-Token"""
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de administração inválido")
+
+async def aplicar_registro(operacao, *args):
+    """Grava no manifesto e sincroniza este worker; os demais seguem pela vigia"""
+    try:
+        await asyncio.to_thread(operacao, *args)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    await asyncio.to_thread(modelos.sincronizar)
+    return await listar_modelos_estado()
+
+async def listar_modelos_estado() -> Dict:
+    manifesto = await asyncio.to_thread(modelos.registro.manifesto)
+    return {
+        "registro": manifesto,
+        "worker": modelos.estado(),
+        "sombra": modelos.sombra.estatisticas()
+    }
+
+@app.get("/admin/modelos", tags=["Administração"])
+async def listar_modelos(x_admin_token: Annotated[Optional[str], Header()] = None):
+    """Versões registradas, modelo em serviço neste worker e comparação em sombra"""
+    verificar_admin(x_admin_token)
+    return await listar_modelos_estado()
+
+@app.post("/admin/modelos/{versao}/promover", tags=["Administração"])
+async def promover_modelo(versao: str, x_admin_token: Annotated[Optional[str], Header()] = None):
+    """Torna `versao` o modelo ativo, sem reiniciar (rollback: promover a anterior)"""
+    verificar_admin(x_admin_token)
+    return await aplicar_registro(modelos.registro.promover, versao)
+
+@app.post("/admin/modelos/{versao}/sombra", tags=["Administração"])
+async def definir_sombra(
+    versao: str,
+    fracao: Annotated[float, Query(gt=0, le=1, description="Fração das análises avaliadas pela candidata")] = 0.1,
+    x_admin_token: Annotated[Optional[str], Header()] = None
+):
+    """Avalia `versao` em sombra, sem afetar as respostas"""
+    verificar_admin(x_admin_token)
+    return await aplicar_registro(modelos.registro.definir_candidato, versao, fracao)
+
+@app.delete("/admin/modelos/sombra", tags=["Administração"])
+async def remover_sombra(x_admin_token: Annotated[Optional[str], Header()] = None):
+    """Desliga a avaliação em sombra"""
+    verificar_admin(x_admin_token)
+    return await aplicar_registro(modelos.registro.definir_candidato, None)
+
 @app.post("/clientes", status_code=status.HTTP_201_CREATED, tags=["Clientes"])
 async def adicionar_cliente(cliente: Cliente):
     """Adiciona um novo cliente ao sistema"""
-    connection = None
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        # Verifica se CPF já existe
-        cursor.execute("SELECT 1 FROM clientes WHERE cpf = %s", (cliente.cpf,))
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"CPF {cliente.cpf} já cadastrado"
-            )
-        
-        # Se não existir, procede com inserção
-        cursor = connection.cursor()
-        query = """
-        INSERT INTO clientes (
-            cpf, nome, score, possui_restricoes, renda_mensal,
-            atrasos_30_dias, atrasos_60_dias, atrasos_90_dias
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        values = (
-            cliente.cpf,
-            cliente.nome,
-            cliente.score,
-            cliente.possui_restricoes,
-            cliente.renda_mensal,
-            cliente.historico_pagamentos.atrasos_30_dias,
-            cliente.historico_pagamentos.atrasos_60_dias,
-            cliente.historico_pagamentos.atrasos_90_dias 
-        )
-        
-        cursor.execute(query, values)
-        connection.commit()
-        
-        return {
-            "message": "Cliente adicionado com sucesso",
-            "cpf": cliente.cpf,
-            "nome": cliente.nome
-        }
-        
+        id_cliente = await executar_db(database.inserir_cliente, valores_cliente(cliente))
+    except PoolEsgotadoError as e:
+        raise erro_pool(e)
     except Error as e:
-        if connection:
-            connection.rollback()
-        
-        # Tratamento específico para erro de duplicidade
-        if e.errno == 1062:  # MySQL error code for duplicate entry
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"CPF {cliente.cpf} já está cadastrado no sistema"
-            )
-        
         logger.error(f"Erro ao adicionar cliente: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Erro ao cadastrar cliente: {str(e)}"
         )
-        
-    finally:
-        if connection and connection.is_connected():
-            connection.close()
 
-@app.get("/clientes", response_model=Dict[str, List[Cliente]], tags=["Clientes"])
-async def listar_clientes(nome: Optional[str] = None, cpf: Optional[str] = None):
-    """Retorna lista de clientes com filtros opcionais"""
-    connection = None
+    if id_cliente is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"CPF {cliente.cpf} já cadastrado"
+        )
+    cache_analises.invalidar(cliente.cpf)
+    if indice_nomes:
+        indice_nomes.adicionar(id_cliente, cliente.nome)
+
+    return {
+        "message": "Cliente adicionado com sucesso",
+        "cpf": cliente.cpf,
+        "nome": cliente.nome
+    }
+
+@app.post("/clientes/lote", response_model=CadastroLoteResponse, tags=["Clientes"])
+async def adicionar_clientes_lote(
+    request: CadastroLoteRequest,
+    conflito: str = Query(
+        "rejeitar",
+        pattern=f"^({'|'.join(POLITICAS_CONFLITO)})$",
+        description="CPF já cadastrado: `rejeitar` (item com erro), `ignorar` ou `atualizar`"
+    ),
+    idempotency_key: Annotated[Optional[str], Header(max_length=100)] = None
+):
+    """
+    Cadastra vários clientes: todos são validados antes de qualquer escrita
+    e os válidos são gravados com inserts multi-linha, em blocos com commit
+    próprio. Com o cabeçalho Idempotency-Key, repetir a requisição (por
+    exemplo, após um timeout) devolve o resultado original dos blocos já
+    gravados e grava só os que faltavam.
+    """
+    resultados: List[Optional[Dict]] = [None] * len(request.clientes)
+    linhas, posicoes = [], []
+    primeiro_indice: Dict[str, int] = {}
+    for indice, registro in enumerate(request.clientes):
+        try:
+            valores = validar_cliente(registro)
+        except ValueError as e:
+            cpf = registro.get("cpf")
+            resultados[indice] = {"indice": indice, "cpf": cpf if isinstance(cpf, str) else None,
+                                  "status": "invalido", "erro": str(e)}
+            continue
+        cpf = valores[0]
+        if cpf in primeiro_indice:
+            resultados[indice] = {"indice": indice, "cpf": cpf, "status": "invalido",
+                                  "erro": f"CPF repetido no lote (item {primeiro_indice[cpf]})"}
+            continue
+        primeiro_indice[cpf] = indice
+        linhas.append(valores)
+        posicoes.append(indice)
+
+    hash_corpo = None
+    if idempotency_key:
+        hash_corpo = hashlib.sha256(serializar([conflito, request.clientes])).hexdigest()
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        query = "SELECT * FROM clientes"
-        params = []
-        
-        # Adiciona filtros se fornecidos
-        filters = []
-        if nome:
-            filters.append("nome LIKE %s")
-            params.append(f"%{nome}%")
-        if cpf:
-            filters.append("cpf = %s")
-            params.append(cpf)
-            
-        if filters:
-            query += " WHERE " + " AND ".join(filters)
-            
-        cursor.execute(query, tuple(params))
-        clientes = cursor.fetchall()
-        
-        return {
-            "clientes": [formatar_cliente_db(cliente) for cliente in clientes],
-            "total": len(clientes)
-        }
-        
+        gravados, repetidos = await executar_db(
+            database.cadastrar_clientes, linhas, conflito,
+            tamanho_bloco=CLIENTES_LOTE_BLOCO, chave=idempotency_key, hash_corpo=hash_corpo
+        )
+    except IdempotenciaError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except PoolEsgotadoError as e:
+        raise erro_pool(e)
+    except Error as e:
+        logger.error(f"Erro no cadastro em lote: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro ao cadastrar clientes"
+        )
+
+    for indice, valores, situacao in zip(posicoes, linhas, gravados):
+        resultados[indice] = {"indice": indice, "cpf": valores[0], "status": situacao}
+        if situacao == "rejeitado":
+            resultados[indice]["erro"] = "CPF já cadastrado"
+
+    gravados_cpfs = [valores[0] for valores, situacao in zip(linhas, gravados)
+                     if situacao in ("inserido", "atualizado")]
+    if gravados_cpfs:
+        cache_analises.invalidar(*gravados_cpfs)
+        if indice_nomes and indice_nomes.pronto:
+            try:
+                await incorporar_novos_nomes()
+            except (PoolEsgotadoError, Error) as e:
+                # A atualização periódica do índice incorpora depois
+                logger.error(f"Erro ao atualizar o índice de nomes: {e}")
+
+    resumo = dict.fromkeys(("inserido", "atualizado", "ignorado", "rejeitado", "invalido"), 0)
+    for resultado in resultados:
+        resumo[resultado["status"]] += 1
+    with metricas.etapa("serializacao"):
+        return RespostaJSON({"resultados": resultados, "resumo": resumo, "repetido": repetidos > 0})
+
+@app.get("/clientes", response_model=ListaClientesResponse, tags=["Clientes"])
+async def listar_clientes(
+    nome: Optional[str] = None,
+    cpf: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000, description="Clientes por página"),
+    after: Optional[int] = Query(None, description="Cursor: o `proximo` da página anterior"),
+    campos: Optional[str] = Query(
+        None,
+        description="Projeção: campos separados por vírgula (ex.: cpf,nome,score)"
+    ),
+    formato: str = Query(
+        "json",
+        pattern="^(json|ndjson)$",
+        description="`ndjson` transmite todos os clientes (um JSON por linha) sem paginar"
+    ),
+    if_none_match: Annotated[Optional[str], Header()] = None
+):
+    """
+    Retorna lista de clientes com filtros opcionais, paginada pelo id.
+    A página traz um ETag das linhas lidas (id e atualizado_em). Com
+    If-None-Match, a página é antes lida só com essas duas colunas: se o
+    ETag coincidir, a resposta é 304, sem ler o restante nem serializar
+    """
+    selecionados = list(CAMPOS_CLIENTE)
+    if campos:
+        selecionados = [campo.strip() for campo in campos.split(",") if campo.strip()]
+        desconhecidos = [campo for campo in selecionados if campo not in CAMPOS_CLIENTE]
+        if desconhecidos or not selecionados:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Campos inválidos: {', '.join(desconhecidos)}. "
+                       f"Disponíveis: {', '.join(CAMPOS_CLIENTE)}"
+            )
+    colunas = [coluna for campo in selecionados for coluna in CAMPOS_CLIENTE[campo]]
+
+    # Com o índice em memória, o filtro de nome vira uma lista de ids
+    ids = None
+    if nome and indice_nomes and indice_nomes.pronto:
+        ids = indice_nomes.filtrar(nome, apos=after)
+        nome = None
+        if formato != "ndjson":
+            ids = ids[:limit + 1]
+
+    if formato == "ndjson":
+        return StreamingResponse(
+            transmitir_clientes(colunas, selecionados, nome, cpf, after, ids),
+            media_type="application/x-ndjson"
+        )
+
+    def etag_pagina(linhas: List[Dict]) -> str:
+        # A linha a mais (se houver) define `proximo`, então entra no ETag
+        return calcular_etag(
+            "clientes", app.version, ",".join(selecionados), limit,
+            linhas=((linha['id'], linha['atualizado_em']) for linha in linhas)
+        )
+
+    try:
+        if if_none_match:
+            versoes = await executar_db(
+                database.listar_pagina_clientes, ["atualizado_em"],
+                nome=nome, cpf=cpf, after=after, limit=limit, ids=ids
+            )
+            correspondente = etag_correspondente(if_none_match, etag_pagina(versoes))
+            if correspondente:
+                return nao_modificado(correspondente)
+        linhas = await executar_db(
+            database.listar_pagina_clientes, colunas + ["atualizado_em"],
+            nome=nome, cpf=cpf, after=after, limit=limit, ids=ids
+        )
+    except PoolEsgotadoError as e:
+        raise erro_pool(e)
     except Error as e:
         logger.error(f"Erro ao consultar clientes: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro ao buscar clientes"
         )
+
+    etag = etag_pagina(linhas)
+    proximo = linhas[limit - 1]['id'] if len(linhas) > limit else None
+    linhas = linhas[:limit]
+
+    # Resposta montada direto das linhas do banco, sem revalidar cada Cliente
+    with metricas.etapa("serializacao"):
+        if campos:
+            clientes = [projetar_cliente_db(cliente, selecionados) for cliente in linhas]
+        else:
+            clientes = [formatar_cliente_db(cliente) for cliente in linhas]
+        return marcar(RespostaJSON({
+            "clientes": clientes,
+            "total": len(linhas),
+            "proximo": proximo
+        }), etag)
+
+async def transmitir_clientes(colunas, campos, nome, cpf, after, ids=None):
+    """Converte os blocos do cursor não bufferizado em linhas NDJSON"""
+    blocos = database.iterar_clientes(colunas, nome=nome, cpf=cpf, after=after, ids=ids)
+    try:
+        while True:
+            bloco = await executar_db(next, blocos, None)
+            if bloco is None:
+                break
+            yield b"".join(
+                serializar(projetar_cliente_db(cliente, campos)) + b"\n"
+                for cliente in bloco
+            )
+    except (PoolEsgotadoError, Error) as e:
+        # Os cabeçalhos já foram enviados: só resta interromper o fluxo
+        logger.error(f"Erro ao transmitir clientes: {str(e)}")
+        raise
     finally:
-        if connection and connection.is_connected():
-            connection.close()
+        await executar_db(blocos.close)
+
+@app.get("/clientes/busca", response_model=BuscaClientesResponse, tags=["Clientes"])
+async def buscar_clientes_nome(
+    q: str = Query(..., min_length=1, max_length=100, description="Nome ou partes do nome"),
+    limite: int = Query(20, ge=1, le=100)
+):
+    """Busca por nome sem acentos/maiúsculas, por prefixo de cada palavra, ranqueada"""
+    try:
+        if indice_nomes and indice_nomes.pronto:
+            ranking = indice_nomes.buscar(q, limite)
+            linhas = await executar_db(database.buscar_clientes_por_ids, [i for i, _ in ranking])
+            encontrados = [
+                (linhas[i], relevancia) for i, relevancia in ranking if i in linhas
+            ]
+        else:
+            linhas = await executar_db(database.buscar_clientes_por_nome, q, limite)
+            encontrados = [(linha, float(linha['relevancia'])) for linha in linhas]
+    except PoolEsgotadoError as e:
+        raise erro_pool(e)
+    except Error as e:
+        logger.error(f"Erro ao buscar clientes: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro ao buscar clientes"
+        )
+
+    return RespostaJSON({
+        "resultados": [
+            {"relevancia": relevancia, "cliente": formatar_cliente_db(linha)}
+            for linha, relevancia in encontrados
+        ],
+        "total": len(encontrados)
+    })
+
+@app.get("/portfolio/resumo", response_model=PortfolioResumo, tags=["Portfólio"])
+async def resumo_portfolio():
+    """
+    Totais da carteira, histogramas de score e renda e aprovação por faixa
+    de score, lidos das tabelas de contadores mantidas por gatilhos: o custo
+    não depende do número de clientes
+    """
+    try:
+        resumo = await executar_db(portfolio.ler_resumo, modelos.versao, VERSAO_REGRAS)
+    except PoolEsgotadoError as e:
+        raise erro_pool(e)
+    except Error as e:
+        logger.error(f"Erro ao ler o resumo da carteira: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro ao ler o resumo da carteira"
+        )
+    return RespostaJSON(resumo)
 
 @app.get("/analise-credito/{cpf}", response_model=AnaliseResponse, tags=["Análise de Crédito"])
-async def analisar_credito_get(cpf: str):
-    """Endpoint GET para análise de crédito por CPF"""
-    return await analisar_credito(AnaliseRequest(cpf=cpf))
+async def analisar_credito_get(cpf: str, if_none_match: Annotated[Optional[str], Header()] = None):
+    """Endpoint GET para análise de crédito por CPF, com ETag (If-None-Match válido recebe 304)"""
+    return await responder_analise(AnaliseRequest(cpf=cpf).cpf, if_none_match, condicional=True)
 
 @app.post("/analise-credito", response_model=AnaliseResponse, tags=["Análise de Crédito"])
 async def analisar_credito(request: AnaliseRequest):
     """Realiza análise de crédito para um cliente"""
-    connection = None
+    return await responder_analise(request.cpf)
+
+def etag_analise(cpf: str, atualizado_em) -> str:
+    """A análise só muda com a linha do cliente, o modelo em serviço ou as regras"""
+    return calcular_etag("analise", app.version, cpf, atualizado_em, modelos.versao, VERSAO_REGRAS)
+
+async def responder_analise(cpf: str, if_none_match: Optional[str] = None,
+                            condicional: bool = False) -> Response:
+    """
+    Análise do cache ou, na falta, do agendador. Uma entrada do cache só é
+    servida se o atualizado_em da linha, relido a cada consulta, for o que
+    ela guardou. Com `condicional` (GET) a resposta leva o ETag, calculado
+    sempre desse atualizado_em e das versões do modelo e das regras; um
+    If-None-Match que corresponde a ele recebe 304 sem inferência
+    """
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM clientes WHERE cpf = %s", (request.cpf,))
-        cliente_db = cursor.fetchone()
+        entrada = cache_analises.obter_entrada(cpf)
+        atualizado_em = etag = None
+        if entrada is not None or (condicional and if_none_match):
+            atualizado_em = await executar_db(database.buscar_atualizado_em, cpf)
+        if entrada is not None:
+            entrada = cache_analises.confirmar(cpf, entrada, atualizado_em)
+        if atualizado_em is not None:
+            etag = etag_analise(cpf, atualizado_em)
+            correspondente = etag_correspondente(if_none_match, etag) if condicional else None
+            if correspondente:
+                return nao_modificado(correspondente)
+        # A entrada é servida só se foi gravada com esse mesmo ETag; divergente, refaz a análise
+        if entrada is not None and entrada.get("etag") == etag:
+            with metricas.etapa("serializacao"):
+                resposta = RespostaJSON(entrada["resposta"])
+            return marcar(resposta, etag) if condicional else resposta
+
+        if AGENDADOR_ATIVO:
+            analise = await agendador.analisar(cpf)
+        else:
+            cliente_db = (await executar_db(buscar_clientes, [cpf])).get(cpf)
+            admissao.verificar_prazo("inferência")
+            analise = (cliente_db, (await asyncio.to_thread(analisar_clientes, [cliente_db]))[0]) if cliente_db else None
         
-        if not cliente_db:
+        if not analise:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Cliente com CPF {request.cpf} não encontrado"
+                detail=f"Cliente com CPF {cpf} não encontrado"
             )
+        cliente_db, resultado = analise
         
-        # Prepara dados para análise
-        input_data = np.array([
-            cliente_db['score'],
-            int(cliente_db['possui_restricoes']),
-            cliente_db['atrasos_30_dias'],
-            cliente_db['atrasos_60_dias'],
-            cliente_db['atrasos_90_dias'],
-            cliente_db['renda_mensal']
-        ]).reshape(1, -1)
-        
-        # Realiza a análise
-        motivos = []
-        if credit_model:
-            try:
-                aprovado = bool(credit_model.predict(input_data)[0])
-                probabilidade = float(credit_model.predict_proba(input_data)[0][1])
-                
-                if not aprovado:
-                    motivos.append("Reprovado pelo modelo de análise")
-            except Exception as e:
-                logger.error(f"Erro no modelo de ML: {str(e)}")
-                aprovado = False
-                probabilidade = 0.0
-                motivos.append("Erro na análise automatizada")
-        else:
-            logger.warning("Modelo de ML não carregado, usando fallback")
-            aprovado = False
-            probabilidade = 0.0
-            motivos.append("Sistema de análise indisponível")
-        
-        # Adiciona motivos específicos
-        if cliente_db['score'] < 400:
-            motivos.append("Score abaixo do mínimo (400)")
-        if cliente_db['possui_restricoes']:
-            motivos.append("Possui restrições cadastrais")
-        if cliente_db['atrasos_90_dias'] > 0:
-            motivos.append(f"{cliente_db['atrasos_90_dias']} atrasos graves")
-        
-        # Se não houver motivos, aprova
-        if not motivos:
-            aprovado = True
-            probabilidade = 0.95 if probabilidade == 0 else probabilidade
-        
-        limite = calcular_limite(cliente_db['score'], cliente_db['renda_mensal']) if aprovado else 0.0
-        
-        return AnaliseResponse(
-            aprovado=aprovado,
-            limite=limite,
-            probabilidade=probabilidade,
-            motivos=motivos,
-            cliente=formatar_cliente_db(cliente_db)
-        )
+        resposta = formatar_analise(resultado, cliente_db)
+        # Falhas do modelo são transitórias: não vão para o cache nem levam ETag
+        etag = None
+        if not {MOTIVO_ERRO_MODELO, MOTIVO_SEM_MODELO} & set(resultado["motivos"]):
+            etag = etag_analise(cpf, cliente_db["atualizado_em"])
+            cache_analises.gravar(cpf, resposta, cliente_db["atualizado_em"], etag)
+        with metricas.etapa("serializacao"):
+            resposta = RespostaJSON(resposta)
+        return marcar(resposta, etag) if condicional and etag else resposta
         
+    except (HTTPException, SobrecargaError):
+        raise
+    except PoolEsgotadoError as e:
+        raise erro_pool(e)
     except Error as e:
         logger.error(f"Erro no banco de dados: {str(e)}")
         raise HTTPException(
@@ -493,10 +1068,87 @@ async def analisar_credito(request: AnaliseRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro interno no servidor"
         )
-    finally:
-        if connection and connection.is_connected():
-            connection.close()
             
+@app.post("/analise-credito/lote", response_model=AnaliseLoteResponse, tags=["Análise de Crédito"])
+async def analisar_credito_lote(request: AnaliseLoteRequest):
+    """Analisa vários CPFs com uma consulta e uma inferência vetorizada"""
+    cpfs = list(dict.fromkeys(request.cpfs))  # remove repetidos mantendo a ordem
+    try:
+        encontrados = await executar_db(buscar_clientes, cpfs)
+    except PoolEsgotadoError as e:
+        raise erro_pool(e)
+    except Error as e:
+        logger.error(f"Erro no banco de dados: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro ao processar análise"
+        )
+
+    clientes_db = [encontrados[cpf] for cpf in cpfs if cpf in encontrados]
+    admissao.verificar_prazo("inferência")
+    # Inferência de lotes grandes é CPU-bound: roda fora do event loop
+    resultados = await asyncio.to_thread(analisar_clientes, clientes_db)
+
+    with metricas.etapa("serializacao"):
+        return RespostaJSON({
+            "resultados": [
+                formatar_analise(resultado, cliente_db)
+                for resultado, cliente_db in zip(resultados, clientes_db)
+            ],
+            "nao_encontrados": [cpf for cpf in cpfs if cpf not in encontrados]
+        })
+
+@app.post("/analise-credito/jobs", response_model=JobEstado, status_code=status.HTTP_202_ACCEPTED,
+          tags=["Análise de Crédito"])
+async def criar_job_analise(request: JobAnaliseRequest):
+    """
+    Agenda a análise de uma lista de CPFs ou dos clientes que atendem a um
+    filtro, em partes processadas em paralelo. Acompanhe por GET /jobs/{id}
+    e baixe o CSV (mesmo durante a execução) em GET /jobs/{id}/resultado.
+    """
+    cpfs = list(dict.fromkeys(request.cpfs)) if request.cpfs is not None else None
+    filtro = request.filtro.model_dump(exclude_none=True) if request.filtro is not None else None
+    try:
+        job = await executar_db(executor_jobs.criar, cpfs, filtro, modelos.versao_ativa)
+    except PoolEsgotadoError as e:
+        raise erro_pool(e)
+    except Error as e:
+        logger.error(f"Erro ao criar job: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro ao criar job"
+        )
+    executor_jobs.iniciar(job["id"])
+    return RespostaJSON(job, status_code=status.HTTP_202_ACCEPTED,
+                        headers={"Location": f"/jobs/{job['id']}"})
+
+@app.get("/jobs/{id_job}", response_model=JobEstado, tags=["Análise de Crédito"])
+async def estado_job(id_job: str):
+    """Estado e progresso de um job de análise"""
+    try:
+        return RespostaJSON(await asyncio.to_thread(executor_jobs.estado, id_job))
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {id_job} não encontrado")
+
+@app.get("/jobs/{id_job}/resultado", tags=["Análise de Crédito"])
+async def resultado_job(
+    id_job: str,
+    aguardar: bool = Query(True, description="Acompanha o job até o fim; `false` envia só o que já terminou")
+):
+    """
+    Resultado em CSV (cpf, situacao, aprovado, limite, probabilidade, motivos),
+    transmitido à medida que as partes terminam
+    """
+    try:
+        await asyncio.to_thread(executor_jobs.estado, id_job)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {id_job} não encontrado")
+    return StreamingResponse(
+        executor_jobs.transmitir(id_job, aguardar),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="analise_{id_job}.csv"'}
+    )
+
 # Ponto de entrada da aplicação
 if __name__ == "__main__":
     import uvicorn
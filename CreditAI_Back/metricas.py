@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentação da API: métricas no formato texto do Prometheus e tempos por etapa
+
+Histogramas por etapa do atendimento (aquisição de conexão, consulta,
+inferência, regras, serialização), contadores de requisições por rota e
+status e medidores lidos no momento da coleta (modelo, cache, pool). As
+etapas medidas durante uma requisição também vão para o cabeçalho
+Server-Timing da resposta. Sem dependências externas: cada worker expõe
+os próprios números em /metrics.
+
+Com PERFIL_LIMIAR_MS, um amostrador registra periodicamente as pilhas de
+todas as threads e grava as amostras do intervalo de cada requisição mais
+lenta que o limiar em PERFIL_DIR, no formato de pilhas colapsadas
+(flamegraph.pl, speedscope).
+"""
+
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores dos baldes de duração, em segundos
+BALDES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_METRICAS: List = []
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes: Tuple[str, ...], valores: Tuple, extra: Tuple = ()) -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes + extra[:1], valores + extra[1:])]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+# ==============================================
+# TIPOS DE MÉTRICA
+# ==============================================
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self._valores: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        _METRICAS.append(self)
+
+    def incrementar(self, *valores_rotulos, valor: float = 1.0):
+        with self._lock:
+            self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0.0) + valor
+
+    def linhas(self) -> Iterable[str]:
+        with self._lock:
+            valores = list(self._valores.items())
+        for chave, valor in valores:
+            yield f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}"
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (),
+                 baldes: Tuple[float, ...] = BALDES_SEGUNDOS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self.baldes = baldes
+        # Por série: contagem por balde (o último é +Inf), soma e total
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+        _METRICAS.append(self)
+
+    def observar(self, valor: float, *valores_rotulos):
+        indice = bisect_left(self.baldes, valor)
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [[0] * (len(self.baldes) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def linhas(self) -> Iterable[str]:
+        with self._lock:
+            series = [(chave, list(contagens), soma, total)
+                      for chave, (contagens, soma, total) in self._series.items()]
+        for chave, contagens, soma, total in series:
+            acumulado = 0
+            for limite, contagem in zip(self.baldes + (float("inf"),), contagens):
+                acumulado += contagem
+                le = "+Inf" if limite == float("inf") else _numero(limite)
+                yield f"{self.nome}_bucket{_rotulos(self.rotulos, chave, ('le', le))} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(soma)}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, chave)} {total}"
+
+
+class Medidor:
+    """Valor lido na hora da coleta: `ler` devolve um número ou pares (rótulos, valor)"""
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, ler: Callable, rotulos: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.ler = ler
+        self.rotulos = rotulos
+        _METRICAS.append(self)
+
+    def linhas(self) -> Iterable[str]:
+        valor = self.ler()
+        pares = [((), valor)] if isinstance(valor, (int, float)) else valor
+        for chave, numero in pares:
+            yield f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(numero)}"
+
+
+def medidores_de_estatisticas(prefixo: str, descricao: str, estatisticas: Callable[[], Dict]):
+    """
+    Um medidor `<prefixo>_<campo>` para cada campo numérico do dicionário de
+    estatisticas() de um componente (pool, cache, agendador...), lido a cada coleta
+    """
+    campos = [campo for campo, valor in estatisticas().items()
+              if isinstance(valor, (int, float)) and re.fullmatch(r"[a-z_][a-z0-9_]*", campo)]
+    for campo in campos:
+        Medidor(f"{prefixo}_{campo}", f"{descricao}: {campo}",
+                lambda campo=campo: float(estatisticas().get(campo) or 0))
+
+
+def exportar() -> str:
+    """Todas as métricas no formato texto de exposição do Prometheus (0.0.4)"""
+    saida = []
+    for metrica in _METRICAS:
+        try:
+            linhas = list(metrica.linhas())
+        except Exception as e:
+            logger.warning(f"Métrica {metrica.nome} indisponível: {e}")
+            continue
+        saida.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        saida.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        saida.extend(linhas)
+    return "\n".join(saida) + "\n"
+
+
+# ==============================================
+# ETAPAS DO ATENDIMENTO
+# ==============================================
+
+ETAPAS = Histograma(
+    "creditai_etapa_segundos",
+    "Duração de cada etapa do atendimento (pool, consulta, inferencia, regras, serializacao)",
+    ("etapa",),
+)
+REQUISICOES = Contador(
+    "creditai_requisicoes_total", "Requisições atendidas por rota e status", ("metodo", "rota", "status")
+)
+DURACAO = Histograma(
+    "creditai_requisicao_segundos", "Duração das requisições por rota", ("metodo", "rota")
+)
+
+# Etapas da requisição em andamento; as threads do banco recebem uma cópia
+# do contexto (database.executar_db), então somam no mesmo dicionário
+_etapas: ContextVar[Optional[Dict[str, float]]] = ContextVar("etapas", default=None)
+
+
+def registrar_etapa(nome: str, segundos: float):
+    ETAPAS.observar(segundos, nome)
+    atuais = _etapas.get()
+    if atuais is not None:
+        atuais[nome] = atuais.get(nome, 0.0) + segundos
+
+
+@contextmanager
+def etapa(nome: str):
+    """Mede o bloco como uma etapa do atendimento"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_etapa(nome, time.perf_counter() - inicio)
+
+
+def iniciar_etapas() -> Dict[str, float]:
+    """Novo acumulador de etapas para o contexto atual (requisição ou lote)"""
+    etapas: Dict[str, float] = {}
+    _etapas.set(etapas)
+    return etapas
+
+
+def somar_etapas(etapas: Dict[str, float]):
+    """Atribui à requisição atual etapas já registradas em outro contexto (ex.: um micro-lote)"""
+    atuais = _etapas.get()
+    if atuais is not None:
+        for nome, segundos in etapas.items():
+            atuais[nome] = atuais.get(nome, 0.0) + segundos
+
+
+def server_timing(etapas: Dict[str, float], total: float) -> str:
+    partes = [f"{nome};dur={1000 * segundos:.3f}" for nome, segundos in etapas.items()]
+    partes.append(f"total;dur={1000 * total:.3f}")
+    return ", ".join(partes)
+
+
+# ==============================================
+# PERFIL DE REQUISIÇÕES LENTAS
+# ==============================================
+
+class Amostrador:
+    """
+    Thread que registra a pilha de todas as threads a cada `intervalo`
+    segundos e guarda as amostras dos últimos `janela` segundos. Custa uma
+    leitura de sys._current_frames() por intervalo, por isso é opcional.
+    """
+
+    def __init__(self, pasta, limiar: float, intervalo: float = 0.005, janela: float = 60.0):
+        self.pasta = Path(pasta)
+        self.limiar = limiar
+        self.intervalo = intervalo
+        self._amostras = deque(maxlen=max(1, int(janela / intervalo)))
+        self._thread = threading.Thread(target=self._amostrar, name="amostrador", daemon=True)
+        self._thread.start()
+        self.perfis_gravados = 0
+
+    @staticmethod
+    def _pilha(quadro) -> str:
+        nomes = []
+        while quadro is not None:
+            codigo = quadro.f_code
+            nomes.append(f"{Path(codigo.co_filename).name}:{codigo.co_name}")
+            quadro = quadro.f_back
+        return ";".join(reversed(nomes))
+
+    def _amostrar(self):
+        proprio = threading.get_ident()
+        nomes = {}
+        while True:
+            agora = time.perf_counter()
+            for ident, quadro in sys._current_frames().items():
+                if ident == proprio:
+                    continue
+                if ident not in nomes:
+                    nomes = {thread.ident: thread.name for thread in threading.enumerate()}
+                self._amostras.append((agora, f"{nomes.get(ident, ident)};{self._pilha(quadro)}"))
+            time.sleep(self.intervalo)
+
+    def gravar(self, metodo: str, rota: str, inicio: float, fim: float):
+        """Pilhas colapsadas (`pilha contagem`) amostradas entre `inicio` e `fim`"""
+        contagem = Counter(pilha for instante, pilha in list(self._amostras) if inicio <= instante <= fim)
+        if not contagem:
+            return
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        nome = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{metodo}_{rota}").strip("_")
+        arquivo = self.pasta / f"{time.strftime('%Y%m%dT%H%M%S')}_{nome}_{1000 * (fim - inicio):.0f}ms.txt"
+        arquivo.write_text(
+            "".join(f"{pilha} {n}\n" for pilha, n in contagem.most_common()), encoding="utf-8"
+        )
+        self.perfis_gravados += 1
+        logger.warning(f"Requisição lenta {metodo} {rota} ({1000 * (fim - inicio):.0f} ms): perfil em {arquivo}")
+
+
+def criar_amostrador() -> Optional[Amostrador]:
+    """Amostrador configurado por PERFIL_LIMIAR_MS (desligado se ausente)"""
+    limiar = os.getenv("PERFIL_LIMIAR_MS")
+    if not limiar:
+        return None
+    return Amostrador(
+        os.getenv("PERFIL_DIR", "perfis"),
+        limiar=float(limiar) / 1000,
+        intervalo=float(os.getenv("PERFIL_INTERVALO_MS", 5)) / 1000,
+    )
+
+
+# ==============================================
+# MIDDLEWARE
+# ==============================================
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI: conta e cronometra cada requisição pela rota
+    (o modelo do caminho, não a URL), acrescenta Server-Timing com as
+    etapas medidas e, com um amostrador, grava o perfil das lentas.
+    """
+
+    def __init__(self, app, server_timing: bool = True, amostrador: Optional[Amostrador] = None):
+        self.app = app
+        self.server_timing = server_timing
+        self.amostrador = amostrador
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        etapas = iniciar_etapas()
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                if self.server_timing:
+                    cabecalho = server_timing(etapas, time.perf_counter() - inicio)
+                    mensagem = {**mensagem, "headers": [
+                        *mensagem.get("headers", []), (b"server-timing", cabecalho.encode("latin-1"))
+                    ]}
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            fim = time.perf_counter()
+            rota = getattr(scope.get("route"), "path", None) or "nao_encontrada"
+            metodo = scope["method"]
+            REQUISICOES.incrementar(metodo, rota, str(status))
+            DURACAO.observar(fim - inicio, metodo, rota)
+            if self.amostrador and fim - inicio >= self.amostrador.limiar:
+                asyncio.get_running_loop().run_in_executor(
+                    None, self.amostrador.gravar, metodo, rota, inicio, fim
+                )
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Migrações do esquema (migrations/NNN_nome.sql), as mesmas para os dois backends
+
+Os arquivos estão no dialeto do MySQL e continuam aplicáveis direto pelo
+cliente mysql. Para o SQLite (banco_sqlite.py) cada comando passa por uma
+tradução de DDL (AUTO_INCREMENT, índices declarados no CREATE TABLE,
+CURRENT_TIMESTAMP(6), ON UPDATE), com três marcações no próprio arquivo:
+- comandos precedidos pela linha `-- somente mysql` e os blocos entre
+  DELIMITER (gatilhos) ficam só no MySQL;
+- blocos `/* sqlite: ... */`, comentários para o MySQL, trazem os
+  equivalentes do SQLite (gatilhos, tabela FTS5), aplicados na posição em
+  que aparecem.
+
+As versões aplicadas ficam em esquema_migracoes. No SQLite cada migração
+roda numa única transação (o DDL é transacional) e o backend aplica as
+pendentes sozinho na primeira conexão; no MySQL os comandos rodam um a um.
+
+Uso (a partir de CreditAI_Back/):
+    python migracoes.py                # aplica as pendentes no banco do .env
+    python migracoes.py --status
+    python migracoes.py --marcar 004   # banco já migrado à mão até a 004
+"""
+
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import re
+import sqlite3
+
+PASTA = Path(__file__).parent / "migrations"
+
+MARCA_MYSQL = "-- somente mysql"
+
+_TABELA = (
+    "CREATE TABLE IF NOT EXISTS esquema_migracoes ("
+    "versao VARCHAR(64) PRIMARY KEY, "
+    "aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+)
+
+_BLOCO_SQLITE = re.compile(r"/\* sqlite:\n(.*?)\*/", re.S)
+_AUTO_INCREMENTO = re.compile(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY KEY")
+_ON_UPDATE = re.compile(r"\s+ON UPDATE CURRENT_TIMESTAMP(?:\(6\))?")
+_CRIAR_TABELA = re.compile(r"CREATE TABLE (?:IF NOT EXISTS )?(\w+)")
+_INDICE_NA_TABELA = re.compile(r",\s*INDEX (\w+) \(([^)]*)\)")
+
+
+def listar(pasta: Path = PASTA) -> List[Path]:
+    return sorted(pasta.glob("[0-9][0-9][0-9]_*.sql"))
+
+
+def versao(arquivo: Path) -> str:
+    return arquivo.stem
+
+
+# ==============================================
+# LEITURA DOS ARQUIVOS
+# ==============================================
+
+def _so_comentarios(comando: str) -> bool:
+    return all(not linha.strip() or linha.strip().startswith("--") for linha in comando.splitlines())
+
+
+def _comandos_mysql(texto: str, dialeto: str) -> List[str]:
+    """Comandos terminados pelo delimitador corrente (`;` ou o de DELIMITER)"""
+    comandos = []
+    delimitador = ";"
+    atual: List[str] = []
+    for linha in texto.splitlines():
+        limpa = linha.strip()
+        if limpa.upper().startswith("DELIMITER "):
+            delimitador = limpa.split()[1]
+            continue
+        atual.append(linha)
+        if limpa.startswith("--") or not limpa.endswith(delimitador):
+            continue
+        comando = "\n".join(atual).strip()[:-len(delimitador)].rstrip()
+        atual = []
+        somente_mysql = delimitador != ";" or MARCA_MYSQL in comando.splitlines()
+        if dialeto == "mysql":
+            comandos.append(comando)
+        elif not somente_mysql:
+            comandos.extend(_ddl_sqlite(comando))
+    return comandos
+
+
+def _comandos_sqlite(texto: str) -> List[str]:
+    """Comandos de um bloco /* sqlite: */, inclusive gatilhos com BEGIN ... END;"""
+    comandos = []
+    atual = ""
+    for linha in texto.splitlines(keepends=True):
+        atual += linha
+        if sqlite3.complete_statement(atual):
+            if not _so_comentarios(atual):
+                comandos.append(atual.strip())
+            atual = ""
+    return comandos
+
+
+def _ddl_sqlite(comando: str) -> List[str]:
+    """Um comando compartilhado no dialeto do SQLite (mais os índices que ele declarava)"""
+    from banco_sqlite import INSTANTE_SQL
+
+    comando = _AUTO_INCREMENTO.sub("INTEGER PRIMARY KEY AUTOINCREMENT", comando)
+    comando = _ON_UPDATE.sub("", comando)
+    comando = comando.replace("CURRENT_TIMESTAMP(6)", f"({INSTANTE_SQL})")
+    indices = []
+    tabela = _CRIAR_TABELA.search(comando)
+    if tabela:
+        for indice in _INDICE_NA_TABELA.finditer(comando):
+            indices.append(f"CREATE INDEX {indice.group(1)} ON {tabela.group(1)} ({indice.group(2)})")
+        comando = _INDICE_NA_TABELA.sub("", comando)
+    return [comando] + indices
+
+
+def comandos(arquivo: Path, dialeto: str) -> List[str]:
+    """Comandos do arquivo para o dialeto ('mysql' ou 'sqlite'), na ordem em que aparecem"""
+    texto = arquivo.read_text(encoding="utf-8")
+    saida = []
+    posicao = 0
+    for bloco in _BLOCO_SQLITE.finditer(texto):
+        saida.extend(_comandos_mysql(texto[posicao:bloco.start()], dialeto))
+        if dialeto == "sqlite":
+            saida.extend(_comandos_sqlite(bloco.group(1)))
+        posicao = bloco.end()
+    saida.extend(_comandos_mysql(texto[posicao:], dialeto))
+    return [comando for comando in saida if not _so_comentarios(comando)]
+
+
+# ==============================================
+# APLICAÇÃO
+# ==============================================
+
+def aplicadas(connection) -> List[str]:
+    cursor = connection.cursor()
+    cursor.execute(_TABELA)
+    cursor.execute("SELECT versao FROM esquema_migracoes ORDER BY versao")
+    return [versao for (versao,) in cursor.fetchall()]
+
+
+def aplicar(connection, dialeto: str, ate: Optional[str] = None,
+            marcar: bool = False, pasta: Path = PASTA) -> List[str]:
+    """
+    Aplica as migrações pendentes até `ate` (inclusive) e retorna as
+    versões aplicadas. Com `marcar`, só as registra, sem executar nada.
+    """
+    ja_aplicadas = set(aplicadas(connection))
+    connection.commit()
+    feitas = []
+    for arquivo in listar(pasta):
+        nome = versao(arquivo)
+        if ate is not None and nome[:3] > ate[:3]:
+            break
+        if nome in ja_aplicadas:
+            continue
+        cursor = connection.cursor()
+        if dialeto == "sqlite":
+            # Trava de escrita antes de conferir de novo: outro processo pode ter aplicado a mesma
+            cursor.execute("BEGIN IMMEDIATE")
+            if nome in aplicadas(connection):
+                connection.rollback()
+                continue
+        if not marcar:
+            for comando in comandos(arquivo, dialeto):
+                cursor.execute(comando)
+        cursor.execute("INSERT INTO esquema_migracoes (versao) VALUES (%s)", (nome,))
+        connection.commit()
+        feitas.append(nome)
+    return feitas
+
+
+def main():
+    import database
+
+    parser = argparse.ArgumentParser(description="Migrações do esquema do banco")
+    parser.add_argument("--ate", help="Última versão a aplicar (ex.: 003)")
+    parser.add_argument("--marcar", metavar="VERSAO",
+                        help="Registra as migrações até VERSAO como aplicadas, sem executá-las")
+    parser.add_argument("--status", action="store_true", help="Lista as migrações e se já foram aplicadas")
+    args = parser.parse_args()
+
+    conn = database.abrir_conexao()
+    try:
+        if args.status:
+            feitas = set(aplicadas(conn))
+            for arquivo in listar():
+                print(f"{'✅' if versao(arquivo) in feitas else '⏳'} {versao(arquivo)}")
+            return
+        feitas = aplicar(conn, database.backend.nome, ate=args.marcar or args.ate, marcar=bool(args.marcar))
+    finally:
+        conn.close()
+    acao = "registradas" if args.marcar else "aplicadas"
+    print(f"✅ Migrações {acao}: {', '.join(feitas)}" if feitas else "Nenhuma migração pendente")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+-- Tabela de clientes
+-- Esquema base da API. Num banco MySQL criado antes das migrações
+-- (tabela feita à mão), registre as já aplicadas sem executá-las:
+--   python migracoes.py --marcar 004
+
+CREATE TABLE clientes (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    cpf VARCHAR(14) UNIQUE NOT NULL,
+    nome VARCHAR(100) NOT NULL,
+    score INT NOT NULL,
+    possui_restricoes BOOLEAN NOT NULL,
+    renda_mensal DECIMAL(10,2) NOT NULL,
+    percentual_pagamentos_em_dia DECIMAL(3,2) NOT NULL DEFAULT 1,
+    atrasos_30_dias INT NOT NULL,
+    atrasos_60_dias INT NOT NULL,
+    atrasos_90_dias INT NOT NULL,
+    data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,49 @@
+-- Busca indexada por nome de cliente
+-- Substitui o LIKE '%nome%' (varredura completa) por um índice FULLTEXT
+-- consultado em BOOLEAN MODE com prefixo em cada termo, e por um índice
+-- B-tree para buscas de prefixo do nome inteiro.
+--
+-- A collation utf8mb4_0900_ai_ci torna comparações e o FULLTEXT insensíveis
+-- a acentos e maiúsculas ("joao" encontra "João").
+--
+-- Termos com menos de innodb_ft_min_token_size (padrão 3) caracteres não
+-- são indexados; a API usa o índice B-tree nesses casos.
+--
+-- No SQLite, o FULLTEXT é uma tabela FTS5 sobre clientes.nome (conteúdo
+-- externo, sem duplicar os nomes), mantida por gatilhos, com o tokenizador
+-- unicode61 sem acentos.
+
+-- somente mysql
+ALTER TABLE clientes
+    MODIFY nome VARCHAR(100)
+        CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL;
+
+CREATE INDEX idx_clientes_nome ON clientes (nome);
+
+-- somente mysql
+CREATE FULLTEXT INDEX ft_clientes_nome ON clientes (nome);
+
+/* sqlite:
+CREATE VIRTUAL TABLE clientes_nome_fts USING fts5(
+    nome, content='clientes', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER clientes_nome_fts_insert AFTER INSERT ON clientes
+BEGIN
+    INSERT INTO clientes_nome_fts (rowid, nome) VALUES (NEW.id, NEW.nome);
+END;
+
+CREATE TRIGGER clientes_nome_fts_delete AFTER DELETE ON clientes
+BEGIN
+    INSERT INTO clientes_nome_fts (clientes_nome_fts, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+END;
+
+CREATE TRIGGER clientes_nome_fts_update AFTER UPDATE OF nome ON clientes
+WHEN NEW.nome IS NOT OLD.nome
+BEGIN
+    INSERT INTO clientes_nome_fts (clientes_nome_fts, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+    INSERT INTO clientes_nome_fts (rowid, nome) VALUES (NEW.id, NEW.nome);
+END;
+
+INSERT INTO clientes_nome_fts (clientes_nome_fts) VALUES ('rebuild');
+*/
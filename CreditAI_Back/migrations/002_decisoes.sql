@@ -0,0 +1,71 @@
+-- Decisões de crédito pré-calculadas
+-- O reprocessamento em segundo plano (decisoes.py) grava em `decisoes` o
+-- resultado da análise de cada cliente, marcado com a versão do modelo, a
+-- versão das regras e o instante da última alteração da linha do cliente.
+-- A API usa a decisão apenas se as três coincidirem com as atuais; caso
+-- contrário, analisa na hora.
+--
+-- `atualizado_em` muda sozinho a cada UPDATE que altera a linha (inclusive
+-- o upsert da carga em lote) e, com o índice (atualizado_em, id), permite
+-- ao reprocessamento ler só os clientes alterados desde a última execução.
+-- O SQLite não tem ON UPDATE nem aceita um valor padrão calculado em ADD
+-- COLUMN: lá atualizado_em é preenchido por gatilhos, na inserção e a cada
+-- UPDATE que altera a linha sem informar atualizado_em.
+
+-- somente mysql
+ALTER TABLE clientes
+    ADD COLUMN atualizado_em TIMESTAMP(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_clientes_atualizado (atualizado_em, id);
+
+/* sqlite:
+ALTER TABLE clientes ADD COLUMN atualizado_em TIMESTAMP(6) NOT NULL
+    DEFAULT '1970-01-01 00:00:00.000000';
+
+UPDATE clientes SET atualizado_em = strftime('%Y-%m-%d %H:%M:%f000', 'now');
+
+CREATE INDEX idx_clientes_atualizado ON clientes (atualizado_em, id);
+
+CREATE TRIGGER clientes_atualizado_insert AFTER INSERT ON clientes
+BEGIN
+    UPDATE clientes SET atualizado_em = strftime('%Y-%m-%d %H:%M:%f000', 'now') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER clientes_atualizado_update AFTER UPDATE ON clientes
+WHEN NEW.atualizado_em IS OLD.atualizado_em AND NOT (
+    NEW.cpf IS OLD.cpf AND NEW.nome IS OLD.nome AND NEW.score IS OLD.score
+    AND NEW.possui_restricoes IS OLD.possui_restricoes AND NEW.renda_mensal IS OLD.renda_mensal
+    AND NEW.percentual_pagamentos_em_dia IS OLD.percentual_pagamentos_em_dia
+    AND NEW.atrasos_30_dias IS OLD.atrasos_30_dias AND NEW.atrasos_60_dias IS OLD.atrasos_60_dias
+    AND NEW.atrasos_90_dias IS OLD.atrasos_90_dias AND NEW.data_cadastro IS OLD.data_cadastro)
+BEGIN
+    UPDATE clientes SET atualizado_em = strftime('%Y-%m-%d %H:%M:%f000', 'now') WHERE id = NEW.id;
+END;
+*/
+
+CREATE TABLE decisoes (
+    cliente_id INT PRIMARY KEY,
+    versao_modelo VARCHAR(32) NOT NULL,
+    versao_regras VARCHAR(16) NOT NULL,
+    cliente_atualizado_em TIMESTAMP(6) NOT NULL,
+    aprovado BOOLEAN NOT NULL,
+    probabilidade DOUBLE NOT NULL,
+    limite DECIMAL(12,2) NOT NULL,
+    motivos JSON NOT NULL,
+    calculado_em TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+        ON UPDATE CURRENT_TIMESTAMP(6),
+    CONSTRAINT fk_decisoes_cliente FOREIGN KEY (cliente_id)
+        REFERENCES clientes (id) ON DELETE CASCADE
+);
+
+-- Até onde o reprocessamento chegou para cada par de versões; sem linha
+-- para as versões atuais, o próximo ciclo reprocessa a tabela inteira
+CREATE TABLE decisoes_progresso (
+    versao_modelo VARCHAR(32) NOT NULL,
+    versao_regras VARCHAR(16) NOT NULL,
+    ultimo_atualizado_em TIMESTAMP(6) NOT NULL,
+    ultimo_id INT NOT NULL,
+    atualizado_em TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+        ON UPDATE CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (versao_modelo, versao_regras)
+);
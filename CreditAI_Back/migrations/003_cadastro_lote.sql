@@ -0,0 +1,20 @@
+-- Idempotência do cadastro em lote (POST /clientes/lote)
+-- Cada bloco gravado registra aqui, na mesma transação, a chave enviada no
+-- cabeçalho Idempotency-Key, o hash do corpo e o resultado de cada item.
+-- Ao repetir a requisição, a gravação do bloco já confirmado esbarra na
+-- chave primária e a API devolve o resultado guardado em vez de gravar de
+-- novo; blocos que não chegaram a ser confirmados são gravados normalmente.
+--
+-- As linhas só servem enquanto o cliente puder repetir a requisição; apague
+-- as antigas periodicamente, por exemplo:
+--   DELETE FROM clientes_lote_idempotencia WHERE criado_em < NOW() - INTERVAL 7 DAY;
+
+CREATE TABLE clientes_lote_idempotencia (
+    chave VARCHAR(100) NOT NULL,
+    bloco INT NOT NULL,
+    hash_corpo CHAR(64) NOT NULL,
+    resultados JSON NOT NULL,
+    criado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (chave, bloco),
+    INDEX idx_lote_idempotencia_criado (criado_em)
+);
@@ -0,0 +1,294 @@
+-- Resumo da carteira mantido incrementalmente (GET /portfolio/resumo)
+-- Gatilhos em clientes e decisoes aplicam a cada escrita a diferença que
+-- ela causa em três tabelas pequenas de contadores; a API lê só essas
+-- tabelas, nunca a de clientes. Valem para qualquer caminho de escrita:
+-- cadastro, cadastro e carga em lote (inclusive LOAD DATA), reprocessamento
+-- das decisões e alterações feitas direto no banco.
+--
+-- Faixas (iguais às constantes de portfolio.py):
+--   score: 50 pontos, a última (950) inclui o 1000
+--   renda_mensal: 1000 reais, a última (20000) inclui tudo acima
+--
+-- Requer migrations/002_decisoes.sql. Aplique com as escritas paradas e,
+-- em seguida, preencha os contadores com a carteira existente:
+--   python migracoes.py
+--   python portfolio.py reconstruir
+--
+-- No SQLite os gatilhos são os do bloco no fim do arquivo: sem SET NEW em
+-- BEFORE, a faixa da decisão é gravada por um UPDATE no gatilho AFTER, e a
+-- exclusão em cascata de decisoes dispara os gatilhos daquela tabela (por
+-- isso a exclusão do cliente não desconta a decisão).
+
+CREATE TABLE portfolio_score (
+    faixa INT PRIMARY KEY,
+    clientes BIGINT NOT NULL DEFAULT 0,
+    com_restricoes BIGINT NOT NULL DEFAULT 0,
+    atrasos_30_dias BIGINT NOT NULL DEFAULT 0,
+    atrasos_60_dias BIGINT NOT NULL DEFAULT 0,
+    atrasos_90_dias BIGINT NOT NULL DEFAULT 0,
+    renda_total DECIMAL(20,2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE portfolio_renda (
+    faixa INT PRIMARY KEY,
+    clientes BIGINT NOT NULL DEFAULT 0
+);
+
+-- Decisões por versão: a API lê só as linhas das versões em serviço e, à
+-- medida que o reprocessamento regrava as decisões, as contagens migram
+-- das versões antigas para as novas
+CREATE TABLE portfolio_aprovacao (
+    versao_modelo VARCHAR(32) NOT NULL,
+    versao_regras VARCHAR(16) NOT NULL,
+    faixa INT NOT NULL,
+    decisoes BIGINT NOT NULL DEFAULT 0,
+    aprovados BIGINT NOT NULL DEFAULT 0,
+    limite_total DECIMAL(20,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (versao_modelo, versao_regras, faixa)
+);
+
+-- Faixa de score do cliente no momento da decisão, para que a contagem
+-- saia da faixa certa quando a decisão for regravada ou apagada
+ALTER TABLE decisoes ADD COLUMN faixa_score INT NOT NULL DEFAULT 0;
+
+-- somente mysql
+UPDATE decisoes d JOIN clientes c ON c.id = d.cliente_id
+SET d.faixa_score = LEAST(FLOOR(c.score / 50) * 50, 950);
+
+/* sqlite:
+UPDATE decisoes SET faixa_score =
+    (SELECT MIN(score / 50 * 50, 950) FROM clientes WHERE clientes.id = decisoes.cliente_id);
+*/
+
+DELIMITER //
+
+CREATE TRIGGER clientes_portfolio_insert AFTER INSERT ON clientes
+FOR EACH ROW
+BEGIN
+    INSERT INTO portfolio_score (faixa, clientes, com_restricoes, atrasos_30_dias,
+                                 atrasos_60_dias, atrasos_90_dias, renda_total)
+    VALUES (LEAST(FLOOR(NEW.score / 50) * 50, 950), 1, NEW.possui_restricoes, NEW.atrasos_30_dias,
+            NEW.atrasos_60_dias, NEW.atrasos_90_dias, NEW.renda_mensal)
+    ON DUPLICATE KEY UPDATE
+        clientes = clientes + VALUES(clientes),
+        com_restricoes = com_restricoes + VALUES(com_restricoes),
+        atrasos_30_dias = atrasos_30_dias + VALUES(atrasos_30_dias),
+        atrasos_60_dias = atrasos_60_dias + VALUES(atrasos_60_dias),
+        atrasos_90_dias = atrasos_90_dias + VALUES(atrasos_90_dias),
+        renda_total = renda_total + VALUES(renda_total);
+
+    INSERT INTO portfolio_renda (faixa, clientes)
+    VALUES (LEAST(FLOOR(NEW.renda_mensal / 1000) * 1000, 20000), 1)
+    ON DUPLICATE KEY UPDATE clientes = clientes + VALUES(clientes);
+END//
+
+-- O upsert da carga em lote chega aqui quando o CPF já existe
+CREATE TRIGGER clientes_portfolio_update AFTER UPDATE ON clientes
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.score <=> NEW.score AND OLD.possui_restricoes <=> NEW.possui_restricoes
+            AND OLD.renda_mensal <=> NEW.renda_mensal AND OLD.atrasos_30_dias <=> NEW.atrasos_30_dias
+            AND OLD.atrasos_60_dias <=> NEW.atrasos_60_dias
+            AND OLD.atrasos_90_dias <=> NEW.atrasos_90_dias) THEN
+        INSERT INTO portfolio_score (faixa, clientes, com_restricoes, atrasos_30_dias,
+                                     atrasos_60_dias, atrasos_90_dias, renda_total)
+        VALUES (LEAST(FLOOR(OLD.score / 50) * 50, 950), -1, -OLD.possui_restricoes,
+                -OLD.atrasos_30_dias, -OLD.atrasos_60_dias, -OLD.atrasos_90_dias, -OLD.renda_mensal),
+               (LEAST(FLOOR(NEW.score / 50) * 50, 950), 1, NEW.possui_restricoes,
+                NEW.atrasos_30_dias, NEW.atrasos_60_dias, NEW.atrasos_90_dias, NEW.renda_mensal)
+        ON DUPLICATE KEY UPDATE
+            clientes = clientes + VALUES(clientes),
+            com_restricoes = com_restricoes + VALUES(com_restricoes),
+            atrasos_30_dias = atrasos_30_dias + VALUES(atrasos_30_dias),
+            atrasos_60_dias = atrasos_60_dias + VALUES(atrasos_60_dias),
+            atrasos_90_dias = atrasos_90_dias + VALUES(atrasos_90_dias),
+            renda_total = renda_total + VALUES(renda_total);
+
+        INSERT INTO portfolio_renda (faixa, clientes)
+        VALUES (LEAST(FLOOR(OLD.renda_mensal / 1000) * 1000, 20000), -1),
+               (LEAST(FLOOR(NEW.renda_mensal / 1000) * 1000, 20000), 1)
+        ON DUPLICATE KEY UPDATE clientes = clientes + VALUES(clientes);
+    END IF;
+END//
+
+-- BEFORE: a decisão do cliente ainda existe (a exclusão em cascata de
+-- decisoes não dispara os gatilhos daquela tabela)
+CREATE TRIGGER clientes_portfolio_delete BEFORE DELETE ON clientes
+FOR EACH ROW
+BEGIN
+    INSERT INTO portfolio_score (faixa, clientes, com_restricoes, atrasos_30_dias,
+                                 atrasos_60_dias, atrasos_90_dias, renda_total)
+    VALUES (LEAST(FLOOR(OLD.score / 50) * 50, 950), -1, -OLD.possui_restricoes,
+            -OLD.atrasos_30_dias, -OLD.atrasos_60_dias, -OLD.atrasos_90_dias, -OLD.renda_mensal)
+    ON DUPLICATE KEY UPDATE
+        clientes = clientes + VALUES(clientes),
+        com_restricoes = com_restricoes + VALUES(com_restricoes),
+        atrasos_30_dias = atrasos_30_dias + VALUES(atrasos_30_dias),
+        atrasos_60_dias = atrasos_60_dias + VALUES(atrasos_60_dias),
+        atrasos_90_dias = atrasos_90_dias + VALUES(atrasos_90_dias),
+        renda_total = renda_total + VALUES(renda_total);
+
+    INSERT INTO portfolio_renda (faixa, clientes)
+    VALUES (LEAST(FLOOR(OLD.renda_mensal / 1000) * 1000, 20000), -1)
+    ON DUPLICATE KEY UPDATE clientes = clientes + VALUES(clientes);
+
+    INSERT INTO portfolio_aprovacao (versao_modelo, versao_regras, faixa, decisoes, aprovados, limite_total)
+    SELECT versao_modelo, versao_regras, faixa_score, -1, -aprovado, -limite
+    FROM decisoes WHERE cliente_id = OLD.id
+    ON DUPLICATE KEY UPDATE
+        decisoes = decisoes + VALUES(decisoes),
+        aprovados = aprovados + VALUES(aprovados),
+        limite_total = limite_total + VALUES(limite_total);
+END//
+
+CREATE TRIGGER decisoes_faixa_insert BEFORE INSERT ON decisoes
+FOR EACH ROW
+SET NEW.faixa_score = (SELECT LEAST(FLOOR(score / 50) * 50, 950) FROM clientes WHERE id = NEW.cliente_id)//
+
+CREATE TRIGGER decisoes_faixa_update BEFORE UPDATE ON decisoes
+FOR EACH ROW
+SET NEW.faixa_score = (SELECT LEAST(FLOOR(score / 50) * 50, 950) FROM clientes WHERE id = NEW.cliente_id)//
+
+CREATE TRIGGER decisoes_portfolio_insert AFTER INSERT ON decisoes
+FOR EACH ROW
+INSERT INTO portfolio_aprovacao (versao_modelo, versao_regras, faixa, decisoes, aprovados, limite_total)
+VALUES (NEW.versao_modelo, NEW.versao_regras, NEW.faixa_score, 1, NEW.aprovado, NEW.limite)
+ON DUPLICATE KEY UPDATE
+    decisoes = decisoes + VALUES(decisoes),
+    aprovados = aprovados + VALUES(aprovados),
+    limite_total = limite_total + VALUES(limite_total)//
+
+-- O reprocessamento regrava a decisão com ON DUPLICATE KEY UPDATE
+CREATE TRIGGER decisoes_portfolio_update AFTER UPDATE ON decisoes
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.versao_modelo <=> NEW.versao_modelo AND OLD.versao_regras <=> NEW.versao_regras
+            AND OLD.faixa_score <=> NEW.faixa_score AND OLD.aprovado <=> NEW.aprovado
+            AND OLD.limite <=> NEW.limite) THEN
+        INSERT INTO portfolio_aprovacao (versao_modelo, versao_regras, faixa, decisoes, aprovados, limite_total)
+        VALUES (OLD.versao_modelo, OLD.versao_regras, OLD.faixa_score, -1, -OLD.aprovado, -OLD.limite),
+               (NEW.versao_modelo, NEW.versao_regras, NEW.faixa_score, 1, NEW.aprovado, NEW.limite)
+        ON DUPLICATE KEY UPDATE
+            decisoes = decisoes + VALUES(decisoes),
+            aprovados = aprovados + VALUES(aprovados),
+            limite_total = limite_total + VALUES(limite_total);
+    END IF;
+END//
+
+CREATE TRIGGER decisoes_portfolio_delete AFTER DELETE ON decisoes
+FOR EACH ROW
+INSERT INTO portfolio_aprovacao (versao_modelo, versao_regras, faixa, decisoes, aprovados, limite_total)
+VALUES (OLD.versao_modelo, OLD.versao_regras, OLD.faixa_score, -1, -OLD.aprovado, -OLD.limite)
+ON DUPLICATE KEY UPDATE
+    decisoes = decisoes + VALUES(decisoes),
+    aprovados = aprovados + VALUES(aprovados),
+    limite_total = limite_total + VALUES(limite_total)//
+
+DELIMITER ;
+
+/* sqlite:
+CREATE TRIGGER clientes_portfolio_insert AFTER INSERT ON clientes
+BEGIN
+    INSERT INTO portfolio_score (faixa, clientes, com_restricoes, atrasos_30_dias,
+                                 atrasos_60_dias, atrasos_90_dias, renda_total)
+    VALUES (MIN(NEW.score / 50 * 50, 950), 1, NEW.possui_restricoes, NEW.atrasos_30_dias,
+            NEW.atrasos_60_dias, NEW.atrasos_90_dias, NEW.renda_mensal)
+        ON CONFLICT (faixa) DO UPDATE SET
+            clientes = clientes + excluded.clientes,
+            com_restricoes = com_restricoes + excluded.com_restricoes,
+            atrasos_30_dias = atrasos_30_dias + excluded.atrasos_30_dias,
+            atrasos_60_dias = atrasos_60_dias + excluded.atrasos_60_dias,
+            atrasos_90_dias = atrasos_90_dias + excluded.atrasos_90_dias,
+            renda_total = renda_total + excluded.renda_total;
+
+    INSERT INTO portfolio_renda (faixa, clientes)
+    VALUES (MIN(CAST(NEW.renda_mensal / 1000 AS INTEGER) * 1000, 20000), 1)
+        ON CONFLICT (faixa) DO UPDATE SET clientes = clientes + excluded.clientes;
+END;
+
+CREATE TRIGGER clientes_portfolio_update AFTER UPDATE ON clientes
+WHEN NOT (OLD.score IS NEW.score AND OLD.possui_restricoes IS NEW.possui_restricoes
+          AND OLD.renda_mensal IS NEW.renda_mensal AND OLD.atrasos_30_dias IS NEW.atrasos_30_dias
+          AND OLD.atrasos_60_dias IS NEW.atrasos_60_dias
+          AND OLD.atrasos_90_dias IS NEW.atrasos_90_dias)
+BEGIN
+    INSERT INTO portfolio_score (faixa, clientes, com_restricoes, atrasos_30_dias,
+                                 atrasos_60_dias, atrasos_90_dias, renda_total)
+    VALUES (MIN(OLD.score / 50 * 50, 950), -1, -OLD.possui_restricoes,
+            -OLD.atrasos_30_dias, -OLD.atrasos_60_dias, -OLD.atrasos_90_dias, -OLD.renda_mensal),
+           (MIN(NEW.score / 50 * 50, 950), 1, NEW.possui_restricoes,
+            NEW.atrasos_30_dias, NEW.atrasos_60_dias, NEW.atrasos_90_dias, NEW.renda_mensal)
+        ON CONFLICT (faixa) DO UPDATE SET
+            clientes = clientes + excluded.clientes,
+            com_restricoes = com_restricoes + excluded.com_restricoes,
+            atrasos_30_dias = atrasos_30_dias + excluded.atrasos_30_dias,
+            atrasos_60_dias = atrasos_60_dias + excluded.atrasos_60_dias,
+            atrasos_90_dias = atrasos_90_dias + excluded.atrasos_90_dias,
+            renda_total = renda_total + excluded.renda_total;
+
+    INSERT INTO portfolio_renda (faixa, clientes)
+    VALUES (MIN(CAST(OLD.renda_mensal / 1000 AS INTEGER) * 1000, 20000), -1),
+           (MIN(CAST(NEW.renda_mensal / 1000 AS INTEGER) * 1000, 20000), 1)
+        ON CONFLICT (faixa) DO UPDATE SET clientes = clientes + excluded.clientes;
+END;
+
+CREATE TRIGGER clientes_portfolio_delete AFTER DELETE ON clientes
+BEGIN
+    INSERT INTO portfolio_score (faixa, clientes, com_restricoes, atrasos_30_dias,
+                                 atrasos_60_dias, atrasos_90_dias, renda_total)
+    VALUES (MIN(OLD.score / 50 * 50, 950), -1, -OLD.possui_restricoes,
+            -OLD.atrasos_30_dias, -OLD.atrasos_60_dias, -OLD.atrasos_90_dias, -OLD.renda_mensal)
+        ON CONFLICT (faixa) DO UPDATE SET
+            clientes = clientes + excluded.clientes,
+            com_restricoes = com_restricoes + excluded.com_restricoes,
+            atrasos_30_dias = atrasos_30_dias + excluded.atrasos_30_dias,
+            atrasos_60_dias = atrasos_60_dias + excluded.atrasos_60_dias,
+            atrasos_90_dias = atrasos_90_dias + excluded.atrasos_90_dias,
+            renda_total = renda_total + excluded.renda_total;
+
+    INSERT INTO portfolio_renda (faixa, clientes)
+    VALUES (MIN(CAST(OLD.renda_mensal / 1000 AS INTEGER) * 1000, 20000), -1)
+        ON CONFLICT (faixa) DO UPDATE SET clientes = clientes + excluded.clientes;
+END;
+
+CREATE TRIGGER decisoes_portfolio_insert AFTER INSERT ON decisoes
+BEGIN
+    UPDATE decisoes SET faixa_score = (SELECT MIN(score / 50 * 50, 950) FROM clientes WHERE id = NEW.cliente_id) WHERE cliente_id = NEW.cliente_id;
+
+    INSERT INTO portfolio_aprovacao (versao_modelo, versao_regras, faixa, decisoes, aprovados, limite_total)
+    VALUES (NEW.versao_modelo, NEW.versao_regras, (SELECT MIN(score / 50 * 50, 950) FROM clientes WHERE id = NEW.cliente_id), 1, NEW.aprovado, NEW.limite)
+        ON CONFLICT (versao_modelo, versao_regras, faixa) DO UPDATE SET
+            decisoes = decisoes + excluded.decisoes,
+            aprovados = aprovados + excluded.aprovados,
+            limite_total = limite_total + excluded.limite_total;
+END;
+
+-- Dispara no upsert do reprocessamento, que regrava essas colunas, e não
+-- no UPDATE da faixa feito pelos próprios gatilhos
+CREATE TRIGGER decisoes_portfolio_update AFTER UPDATE OF versao_modelo, versao_regras, aprovado, limite
+ON decisoes
+WHEN NOT (OLD.versao_modelo IS NEW.versao_modelo AND OLD.versao_regras IS NEW.versao_regras
+          AND OLD.faixa_score IS (SELECT MIN(score / 50 * 50, 950) FROM clientes WHERE id = NEW.cliente_id)
+          AND OLD.aprovado IS NEW.aprovado AND OLD.limite IS NEW.limite)
+BEGIN
+    UPDATE decisoes SET faixa_score = (SELECT MIN(score / 50 * 50, 950) FROM clientes WHERE id = NEW.cliente_id) WHERE cliente_id = NEW.cliente_id;
+
+    INSERT INTO portfolio_aprovacao (versao_modelo, versao_regras, faixa, decisoes, aprovados, limite_total)
+    VALUES (OLD.versao_modelo, OLD.versao_regras, OLD.faixa_score, -1, -OLD.aprovado, -OLD.limite),
+           (NEW.versao_modelo, NEW.versao_regras, (SELECT MIN(score / 50 * 50, 950) FROM clientes WHERE id = NEW.cliente_id), 1, NEW.aprovado, NEW.limite)
+        ON CONFLICT (versao_modelo, versao_regras, faixa) DO UPDATE SET
+            decisoes = decisoes + excluded.decisoes,
+            aprovados = aprovados + excluded.aprovados,
+            limite_total = limite_total + excluded.limite_total;
+END;
+
+CREATE TRIGGER decisoes_portfolio_delete AFTER DELETE ON decisoes
+BEGIN
+    INSERT INTO portfolio_aprovacao (versao_modelo, versao_regras, faixa, decisoes, aprovados, limite_total)
+    VALUES (OLD.versao_modelo, OLD.versao_regras, OLD.faixa_score, -1, -OLD.aprovado, -OLD.limite)
+        ON CONFLICT (versao_modelo, versao_regras, faixa) DO UPDATE SET
+            decisoes = decisoes + excluded.decisoes,
+            aprovados = aprovados + excluded.aprovados,
+            limite_total = limite_total + excluded.limite_total;
+END;
+*/
@@ -0,0 +1,7 @@
+-- Códigos dos motivos (regras.json) gravados ao lado dos textos
+-- A API devolve os códigos com cada análise; o frontend os traduz em
+-- sugestões pelas regras de GET /regras. Decisões gravadas antes desta
+-- migração têm a versão de regras anterior e nunca são lidas com a atual,
+-- então a coluna pode ficar nula nelas até o próximo reprocessamento.
+
+ALTER TABLE decisoes ADD COLUMN codigos JSON NULL;
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Carregamento do modelo de crédito pela API
+Artefato compilado mapeado em memória, compartilhado por todos os workers,
+carregado uma única vez sob demanda e sem nenhum treino na importação
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import joblib
+
+from scoring import FlorestaCompilada, compilar_modelo
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = 'credit_model.joblib'
+MODELO_COMPILADO = os.getenv("MODELO_COMPILADO", 'credit_model.compilado')
+
+
+def versao_artefato(caminho) -> str:
+    """Identifica a versão do modelo pelo hash do artefato"""
+    try:
+        resumo = hashlib.sha256()
+        with open(caminho, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+                resumo.update(bloco)
+        return resumo.hexdigest()[:12]
+    except OSError:
+        return "indisponivel"
+
+
+def _assinatura(caminho: Path) -> Dict:
+    info = caminho.stat()
+    return {"tamanho": info.st_size, "modificado_em": info.st_mtime_ns}
+
+
+def exportar_modelo(modelo, caminho_joblib=MODEL_FILE,
+                    pasta=MODELO_COMPILADO) -> Optional[FlorestaCompilada]:
+    """
+    Compila o modelo salvo em `caminho_joblib` e grava o artefato mapeável
+    em `pasta`, com a versão e a assinatura do joblib de origem. Retorna
+    None se o modelo não puder ser compilado com paridade exata.
+    """
+    compilado = compilar_modelo(modelo)
+    if not isinstance(compilado, FlorestaCompilada):
+        return None
+    caminho = Path(caminho_joblib)
+    compilado.salvar(pasta, versao=versao_artefato(caminho), fonte=_assinatura(caminho))
+    return compilado
+
+
+class ModeloCredito:
+    """
+    Modelo usado pela API, carregado na primeira chamada a obter().
+
+    O formato de serviço é o artefato compilado (scoring.FlorestaCompilada)
+    aberto com mmap_mode='r': os workers mapeiam os mesmos arquivos e o
+    sistema mantém uma única cópia física no cache de páginas. Se o
+    artefato não existir ou for mais antigo que o joblib, ele é gerado a
+    partir do joblib uma vez. Nada é treinado aqui; sem modelo, obter()
+    retorna None e a análise usa o fallback.
+
+    Com `sklearn_lotes`, o estimador do joblib só é carregado (em memória
+    privada do worker) no primeiro lote grande, onde o laço do
+    scikit-learn é mais rápido que a travessia em NumPy.
+    """
+
+    def __init__(self, caminho=MODEL_FILE, pasta=MODELO_COMPILADO, mmap: bool = True,
+                 sklearn_lotes: bool = True, ao_carregar: Optional[Callable] = None):
+        self.caminho = Path(caminho)
+        self.pasta = Path(pasta)
+        self.mmap = mmap
+        self.sklearn_lotes = sklearn_lotes
+        self.ao_carregar = ao_carregar
+
+        self._modelo = None
+        self._carregado = False
+        self._lock = threading.Lock()
+        self.versao = ""
+        self.relatorio: Dict = {"formato": "nao_carregado"}
+
+    @property
+    def carregado(self) -> bool:
+        return self._carregado
+
+    @property
+    def pronto(self) -> bool:
+        return self._carregado and self._modelo is not None
+
+    def obter(self):
+        """O modelo (FlorestaCompilada ou estimador), ou None se indisponível"""
+        if not self._carregado:
+            with self._lock:
+                if not self._carregado:
+                    self._carregar()
+        return self._modelo
+
+    # ---------- carga ----------
+
+    def _artefato_atual(self) -> Optional[Dict]:
+        try:
+            meta = json.loads((self.pasta / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if self.caminho.exists() and meta.get("fonte") != _assinatura(self.caminho):
+            return None
+        return meta
+
+    def _carregar_joblib(self):
+        inicio = time.perf_counter()
+        modelo = joblib.load(self.caminho)
+        logger.info(f"Estimador scikit-learn carregado em {1000 * (time.perf_counter() - inicio):.0f} ms")
+        return modelo
+
+    def _abrir(self, relatorio: Dict):
+        if self._artefato_atual() is None:
+            if not self.caminho.exists():
+                logger.error(
+                    f"Nenhum modelo encontrado ({self.caminho}); treine com `python credit_model.py`"
+                )
+                return None, "indisponivel"
+            etapa = time.perf_counter()
+            estimador = self._carregar_joblib()
+            compilado = exportar_modelo(estimador, self.caminho, self.pasta)
+            relatorio["exportacao_ms"] = round(1000 * (time.perf_counter() - etapa), 1)
+            if compilado is None:
+                relatorio["formato"] = "joblib"
+                return estimador, versao_artefato(self.caminho)
+
+        carregar_origem = self._carregar_joblib if self.sklearn_lotes and self.caminho.exists() else None
+        floresta, meta = FlorestaCompilada.carregar(
+            self.pasta, mmap=self.mmap, carregar_origem=carregar_origem
+        )
+        relatorio.update({
+            "formato": "compilado_mmap" if self.mmap else "compilado",
+            "arvores": floresta.n_arvores,
+            "nos": floresta.n_nos,
+            "bytes_vetores": floresta.bytes,
+        })
+        return floresta, meta.get("versao", "")
+
+    def _carregar(self):
+        inicio = time.perf_counter()
+        relatorio = {"joblib": str(self.caminho), "artefato": str(self.pasta)}
+        modelo, versao = None, "indisponivel"
+        for tentativa in range(2):
+            try:
+                modelo, versao = self._abrir(relatorio)
+                break
+            except Exception as e:
+                # Outro worker pode estar trocando a pasta do artefato neste instante
+                logger.error(f"Erro ao carregar modelo (tentativa {tentativa + 1}): {e}")
+                time.sleep(0.5)
+        relatorio.setdefault("formato", "indisponivel")
+        relatorio["versao"] = versao
+        relatorio["carga_ms"] = round(1000 * (time.perf_counter() - inicio), 1)
+
+        self._modelo = modelo
+        self.versao = versao
+        self.relatorio = relatorio
+        self._carregado = True
+        logger.info(
+            f"Modelo de crédito pronto em {relatorio['carga_ms']} ms "
+            f"(formato {relatorio['formato']}, versão {versao})"
+        )
+        if self.ao_carregar:
+            self.ao_carregar(self)
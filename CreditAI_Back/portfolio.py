@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Resumo da carteira de clientes (GET /portfolio/resumo)
+
+Os contadores ficam em portfolio_score, portfolio_renda e
+portfolio_aprovacao e são mantidos por gatilhos a cada escrita em clientes
+e decisoes (migrations/004_portfolio.sql). Ler o resumo custa algumas
+dezenas de linhas, qualquer que seja o tamanho da carteira; a tabela de
+clientes só é varrida em `reconstruir`, para preencher os contadores na
+implantação ou corrigi-los depois de uma alteração feita com os gatilhos
+desligados.
+
+As taxas de aprovação vêm das decisões pré-calculadas (decisoes.py) das
+versões de modelo e de regras em serviço: sem o reprocessamento rodando,
+elas ficam vazias.
+
+Uso (a partir de CreditAI_Back/):
+    python portfolio.py                # imprime o resumo
+    python portfolio.py reconstruir    # recalcula os contadores a partir das tabelas
+"""
+
+from decimal import Decimal
+from typing import Dict, List, Optional
+import argparse
+import json
+
+import database
+
+# Larguras das faixas; precisam ser as mesmas dos gatilhos da migração 004
+FAIXA_SCORE = 50
+SCORE_ULTIMA_FAIXA = 950
+FAIXA_RENDA = 1000
+RENDA_ULTIMA_FAIXA = 20000
+
+_FAIXA_SCORE_SQL = f"LEAST(FLOOR(score / {FAIXA_SCORE}) * {FAIXA_SCORE}, {SCORE_ULTIMA_FAIXA})"
+_FAIXA_RENDA_SQL = f"LEAST(FLOOR(renda_mensal / {FAIXA_RENDA}) * {FAIXA_RENDA}, {RENDA_ULTIMA_FAIXA})"
+
+_TABELAS = ("portfolio_score", "portfolio_renda", "portfolio_aprovacao")
+
+
+# ==============================================
+# LEITURA
+# ==============================================
+
+def _taxa(parte, total) -> Optional[float]:
+    return round(parte / total, 4) if total else None
+
+
+def _numero(valor):
+    return float(valor) if isinstance(valor, Decimal) else valor
+
+
+def ler_resumo(versao_modelo: str, versao_regras: str) -> Dict:
+    """Resumo da carteira a partir das tabelas de contadores, no formato da API"""
+    with database.conexao_leitura() as connection:
+        cursor = connection.cursor(dictionary=True)
+        select = database.select_com_prazo()
+        cursor.execute(f"{select} * FROM portfolio_score WHERE clientes <> 0 ORDER BY faixa")
+        faixas_score = cursor.fetchall()
+        cursor.execute(f"{select} faixa, clientes FROM portfolio_renda WHERE clientes <> 0 ORDER BY faixa")
+        faixas_renda = cursor.fetchall()
+        cursor.execute(
+            f"{select} faixa, decisoes, aprovados, limite_total FROM portfolio_aprovacao "
+            "WHERE versao_modelo = %s AND versao_regras = %s AND decisoes <> 0",
+            (versao_modelo, versao_regras)
+        )
+        aprovacoes = {linha["faixa"]: linha for linha in cursor.fetchall()}
+    return montar_resumo(faixas_score, faixas_renda, aprovacoes, versao_modelo, versao_regras)
+
+
+def montar_resumo(faixas_score: List[Dict], faixas_renda: List[Dict], aprovacoes: Dict[int, Dict],
+                  versao_modelo: str, versao_regras: str) -> Dict:
+    """Totais, histogramas e aprovação por faixa de score (camelCase, como o resto da API)"""
+    clientes = sum(linha["clientes"] for linha in faixas_score)
+    com_restricoes = sum(linha["com_restricoes"] for linha in faixas_score)
+    renda_total = sum(linha["renda_total"] for linha in faixas_score)
+    decisoes = sum(linha["decisoes"] for linha in aprovacoes.values())
+    aprovados = sum(linha["aprovados"] for linha in aprovacoes.values())
+
+    score = []
+    for linha in faixas_score:
+        aprovacao = aprovacoes.get(linha["faixa"], {})
+        score.append({
+            "de": linha["faixa"],
+            "ate": 1000 if linha["faixa"] == SCORE_ULTIMA_FAIXA else linha["faixa"] + FAIXA_SCORE - 1,
+            "clientes": linha["clientes"],
+            "comRestricoes": linha["com_restricoes"],
+            "atrasos30Dias": linha["atrasos_30_dias"],
+            "atrasos60Dias": linha["atrasos_60_dias"],
+            "atrasos90Dias": linha["atrasos_90_dias"],
+            "decisoes": aprovacao.get("decisoes", 0),
+            "aprovados": aprovacao.get("aprovados", 0),
+            "taxaAprovacao": _taxa(aprovacao.get("aprovados", 0), aprovacao.get("decisoes", 0)),
+        })
+
+    renda = [
+        {
+            "de": linha["faixa"],
+            "ate": None if linha["faixa"] == RENDA_ULTIMA_FAIXA else linha["faixa"] + FAIXA_RENDA,
+            "clientes": linha["clientes"],
+        }
+        for linha in faixas_renda
+    ]
+
+    return {
+        "clientes": clientes,
+        "comRestricoes": com_restricoes,
+        "taxaRestricoes": _taxa(com_restricoes, clientes),
+        "rendaMedia": round(_numero(renda_total) / clientes, 2) if clientes else None,
+        "atrasos": {
+            "atrasos30Dias": sum(linha["atrasos_30_dias"] for linha in faixas_score),
+            "atrasos60Dias": sum(linha["atrasos_60_dias"] for linha in faixas_score),
+            "atrasos90Dias": sum(linha["atrasos_90_dias"] for linha in faixas_score),
+        },
+        "aprovacao": {
+            "versaoModelo": versao_modelo,
+            "versaoRegras": versao_regras,
+            "decisoes": decisoes,
+            "aprovados": aprovados,
+            "taxa": _taxa(aprovados, decisoes),
+            "limiteMedio": round(
+                _numero(sum(linha["limite_total"] for linha in aprovacoes.values())) / aprovados, 2
+            ) if aprovados else None,
+        },
+        "score": score,
+        "rendaMensal": renda,
+    }
+
+
+# ==============================================
+# RECONSTRUÇÃO
+# ==============================================
+
+def reconstruir(connection) -> Dict:
+    """
+    Recalcula os contadores a partir de clientes e decisoes. As tabelas de
+    origem ficam travadas para escrita durante o cálculo, para que nenhuma
+    alteração seja contada duas vezes ou perdida.
+    """
+    cursor = connection.cursor()
+    cursor.execute(
+        "LOCK TABLES clientes READ, decisoes READ, "
+        + ", ".join(f"{tabela} WRITE" for tabela in _TABELAS)
+    )
+    try:
+        for tabela in _TABELAS:
+            cursor.execute(f"DELETE FROM {tabela}")
+        cursor.execute(f"""
+            INSERT INTO portfolio_score (faixa, clientes, com_restricoes, atrasos_30_dias,
+                                         atrasos_60_dias, atrasos_90_dias, renda_total)
+            SELECT {_FAIXA_SCORE_SQL}, COUNT(*), SUM(possui_restricoes), SUM(atrasos_30_dias),
+                   SUM(atrasos_60_dias), SUM(atrasos_90_dias), SUM(renda_mensal)
+            FROM clientes GROUP BY 1
+        """)
+        cursor.execute(f"""
+            INSERT INTO portfolio_renda (faixa, clientes)
+            SELECT {_FAIXA_RENDA_SQL}, COUNT(*) FROM clientes GROUP BY 1
+        """)
+        cursor.execute("""
+            INSERT INTO portfolio_aprovacao (versao_modelo, versao_regras, faixa,
+                                             decisoes, aprovados, limite_total)
+            SELECT versao_modelo, versao_regras, faixa_score, COUNT(*), SUM(aprovado), SUM(limite)
+            FROM decisoes GROUP BY 1, 2, 3
+        """)
+        connection.commit()
+    finally:
+        cursor.execute("UNLOCK TABLES")
+
+    contagens = {}
+    for tabela in _TABELAS:
+        cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
+        contagens[tabela] = cursor.fetchone()[0]
+    return contagens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumo da carteira de clientes")
+    parser.add_argument("acao", nargs="?", choices=("resumo", "reconstruir"), default="resumo")
+    args = parser.parse_args()
+
+    if args.acao == "reconstruir":
+        conn = database.abrir_conexao()
+        try:
+            contagens = reconstruir(conn)
+        finally:
+            conn.close()
+        print("✅ Contadores recalculados: "
+              + ", ".join(f"{tabela} ({linhas} linhas)" for tabela, linhas in contagens.items()))
+        return
+
+    from analise import VERSAO_REGRAS
+    from modelo import MODEL_FILE, versao_artefato
+    from registro import RegistroModelos
+
+    versao = RegistroModelos().manifesto().get("ativo") or versao_artefato(MODEL_FILE)
+    print(json.dumps(ler_resumo(versao, VERSAO_REGRAS), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
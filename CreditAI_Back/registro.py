@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+Registro versionado de modelos, troca a quente e avaliação em sombra
+
+Cada versão fica em modelos/<versao>/ (joblib e artefato compilado) e o
+manifesto modelos/manifesto.json indica a versão ativa e a candidata em
+sombra. Os workers acompanham o manifesto e trocam o modelo sem reiniciar.
+
+Uso em linha de comando (a partir de CreditAI_Back/):
+    python registro.py listar
+    python registro.py importar credit_model.joblib --promover
+    python registro.py promover <versao>
+    python registro.py sombra <versao> 0.1      # ou: python registro.py sombra - 0
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import joblib
+
+from analise import analisar_lote
+from modelo import ModeloCredito, exportar_modelo, versao_artefato
+
+logger = logging.getLogger(__name__)
+
+MODELOS_DIR = os.getenv("MODELOS_DIR", 'modelos')
+
+
+# ==============================================
+# REGISTRO
+# ==============================================
+
+class RegistroModelos:
+    """Pasta de versões imutáveis e um manifesto com a ativa e a candidata"""
+
+    def __init__(self, pasta=MODELOS_DIR):
+        self.pasta = Path(pasta)
+        self.caminho_manifesto = self.pasta / "manifesto.json"
+
+    def manifesto(self) -> Dict:
+        try:
+            return json.loads(self.caminho_manifesto.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {"ativo": None, "candidato": None, "sombra_fracao": 0.0, "versoes": {}}
+
+    def assinatura(self) -> Optional[int]:
+        """Muda a cada gravação do manifesto; usada pelos workers para detectar trocas"""
+        try:
+            return self.caminho_manifesto.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _alterando(self):
+        """
+        Manifesto lido sob trava exclusiva e gravado ao sair do bloco: o
+        treino em linha de comando e as chamadas administrativas da API
+        (em threads) não perdem as alterações umas das outras
+        """
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        with open(self.pasta / ".manifesto.trava", "a+b") as trava:
+            if fcntl:
+                fcntl.flock(trava.fileno(), fcntl.LOCK_EX)
+            else:
+                trava.seek(0)
+                msvcrt.locking(trava.fileno(), msvcrt.LK_LOCK, 1)
+            manifesto = self.manifesto()
+            yield manifesto
+            self._gravar(manifesto)
+
+    def _gravar(self, manifesto: Dict):
+        manifesto["atualizado_em"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        temporario = self.caminho_manifesto.with_name(f"manifesto.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+        temporario.write_text(json.dumps(manifesto, indent=2, ensure_ascii=False), encoding="utf-8")
+        os.replace(temporario, self.caminho_manifesto)
+
+    def _verificar(self, manifesto: Dict, versao: str):
+        if versao not in manifesto["versoes"]:
+            raise KeyError(f"Versão {versao} não registrada")
+
+    def modelo(self, versao: str, **kwargs) -> ModeloCredito:
+        """ModeloCredito (carga preguiçosa, mmap) de uma versão registrada"""
+        return ModeloCredito(
+            caminho=self.pasta / versao / "modelo.joblib",
+            pasta=self.pasta / versao / "compilado",
+            **kwargs,
+        )
+
+    def registrar(self, modelo, metricas: Optional[Dict] = None, origem: str = "treino",
+                  ultimo_id: Optional[int] = None) -> str:
+        """
+        Salva o modelo como uma nova versão (o hash do joblib) com seu
+        artefato compilado e o acrescenta ao manifesto, sem ativá-lo.
+        `ultimo_id` é o maior id de cliente visto no treino: o incremental
+        que estender esta versão parte dele.
+        """
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        temporario = self.pasta / f"registro.{os.getpid()}.{uuid.uuid4().hex}.joblib"
+        joblib.dump(modelo, temporario)
+        versao = versao_artefato(temporario)
+
+        destino = self.pasta / versao
+        destino.mkdir(exist_ok=True)
+        os.replace(temporario, destino / "modelo.joblib")
+        exportar_modelo(modelo, destino / "modelo.joblib", destino / "compilado")
+
+        with self._alterando() as manifesto:
+            manifesto["versoes"][versao] = {
+                "criado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "origem": origem,
+                "metricas": metricas or {},
+            }
+            if ultimo_id is not None:
+                manifesto["versoes"][versao]["ultimo_id"] = int(ultimo_id)
+        logger.info(f"Modelo registrado: versão {versao}")
+        return versao
+
+    def promover(self, versao: str):
+        with self._alterando() as manifesto:
+            self._verificar(manifesto, versao)
+            manifesto["ativo"] = versao
+            if manifesto.get("candidato") == versao:
+                manifesto["candidato"] = None
+                manifesto["sombra_fracao"] = 0.0
+
+    def definir_candidato(self, versao: Optional[str], fracao: float = 0.0):
+        """Candidata avaliada em sombra em `fracao` das análises (None desliga)"""
+        with self._alterando() as manifesto:
+            if versao is not None:
+                self._verificar(manifesto, versao)
+            manifesto["candidato"] = versao
+            manifesto["sombra_fracao"] = fracao if versao is not None else 0.0
+
+    def remover(self, versao: str):
+        with self._alterando() as manifesto:
+            if versao in (manifesto.get("ativo"), manifesto.get("candidato")):
+                raise ValueError(f"Versão {versao} está em uso")
+            manifesto["versoes"].pop(versao, None)
+        shutil.rmtree(self.pasta / versao, ignore_errors=True)
+
+
+# ==============================================
+# AVALIAÇÃO EM SOMBRA
+# ==============================================
+
+class AvaliacaoSombra:
+    """
+    Executa o modelo candidato sobre análises já respondidas, em uma
+    thread própria e fora do caminho da requisição, e acumula a
+    concordância com o modelo ativo e as latências de ambos. Com mais de
+    `max_pendentes` comparações na fila, novas amostras são descartadas.
+    """
+
+    def __init__(self, max_pendentes: int = 64):
+        self.max_pendentes = max_pendentes
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sombra")
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self.reiniciar(None)
+
+    def reiniciar(self, versao: Optional[str]):
+        with self._lock:
+            self.versao = versao
+            self.amostras = 0
+            self.linhas = 0
+            self.decisoes_iguais = 0
+            self.diferenca_probabilidade = 0.0
+            self.descartadas = 0
+            self.erros = 0
+            self._latencias_ativo = deque(maxlen=1000)
+            self._latencias_candidato = deque(maxlen=1000)
+
+    def agendar(self, versao: str, modelo, clientes_db: List[Dict],
+                resultados: List[Dict], duracao: float):
+        with self._lock:
+            if self._pendentes >= self.max_pendentes:
+                self.descartadas += 1
+                return
+            self._pendentes += 1
+        self._executor.submit(self._comparar, versao, modelo, clientes_db, resultados, duracao)
+
+    def _comparar(self, versao, modelo, clientes_db, resultados, duracao):
+        try:
+            inicio = time.perf_counter()
+            # Fora das etapas de produção: a latência da candidata fica só nestas estatísticas
+            candidatos = analisar_lote(clientes_db, modelo, medir=False)
+            duracao_candidato = time.perf_counter() - inicio
+            iguais = sum(a["aprovado"] == c["aprovado"] for a, c in zip(resultados, candidatos))
+            diferenca = sum(abs(a["probabilidade"] - c["probabilidade"])
+                            for a, c in zip(resultados, candidatos))
+            with self._lock:
+                if versao != self.versao:
+                    return  # candidata trocada enquanto a comparação esperava
+                self.amostras += 1
+                self.linhas += len(resultados)
+                self.decisoes_iguais += iguais
+                self.diferenca_probabilidade += diferenca
+                self._latencias_ativo.append(duracao)
+                self._latencias_candidato.append(duracao_candidato)
+        except Exception as e:
+            logger.warning(f"Falha na avaliação em sombra: {e}")
+            with self._lock:
+                self.erros += 1
+        finally:
+            with self._lock:
+                self._pendentes -= 1
+
+    def estatisticas(self) -> Dict:
+        def resumo(latencias) -> Dict:
+            ordenadas = sorted(latencias)
+            if not ordenadas:
+                return {"media_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0}
+            return {
+                "media_ms": round(1000 * sum(ordenadas) / len(ordenadas), 3),
+                "p50_ms": round(1000 * ordenadas[len(ordenadas) // 2], 3),
+                "p99_ms": round(1000 * ordenadas[min(len(ordenadas) - 1, int(0.99 * len(ordenadas)))], 3),
+            }
+
+        with self._lock:
+            ativo = resumo(self._latencias_ativo)
+            candidato = resumo(self._latencias_candidato)
+            return {
+                "candidato": self.versao,
+                "amostras": self.amostras,
+                "linhas": self.linhas,
+                "concordancia": round(self.decisoes_iguais / self.linhas, 4) if self.linhas else None,
+                "diferenca_media_probabilidade": round(
+                    self.diferenca_probabilidade / self.linhas, 6
+                ) if self.linhas else None,
+                "latencia_ativo": ativo,
+                "latencia_candidato": candidato,
+                "delta_media_ms": round(candidato["media_ms"] - ativo["media_ms"], 3),
+                "delta_p99_ms": round(candidato["p99_ms"] - ativo["p99_ms"], 3),
+                "pendentes": self._pendentes,
+                "descartadas": self.descartadas,
+                "erros": self.erros,
+            }
+
+
+# ==============================================
+# MODELO EM SERVIÇO
+# ==============================================
+
+class GerenciadorModelos:
+    """
+    Modelo ativo (e candidato em sombra) de um worker, sincronizado com o
+    manifesto do registro.
+
+    Uma troca carrega a nova versão por completo e só então substitui a
+    referência; análises em andamento terminam com o modelo que já
+    obtiveram, e os arquivos de versões antigas não são apagados. Sem
+    versão ativa no registro, usa o modelo `padrao` (credit_model.joblib).
+    """
+
+    def __init__(self, registro: RegistroModelos, padrao: ModeloCredito,
+                 ao_trocar: Optional[Callable] = None, opcoes_modelo: Optional[Dict] = None,
+                 sombra: Optional[AvaliacaoSombra] = None):
+        self.registro = registro
+        self.padrao = padrao
+        self.ao_trocar = ao_trocar
+        self.opcoes_modelo = opcoes_modelo or {}
+        self.sombra = sombra or AvaliacaoSombra()
+        self._lock = threading.Lock()
+        self._assinatura = None
+
+        manifesto = registro.manifesto()
+        self.versao_ativa = manifesto.get("ativo")
+        self.ativo = registro.modelo(
+            self.versao_ativa, ao_carregar=ao_trocar, **self.opcoes_modelo
+        ) if self.versao_ativa else padrao
+        self.versao_candidata = None
+        self.candidato: Optional[ModeloCredito] = None
+        self.sombra_fracao = 0.0
+        self.trocas = 0
+
+    # ---------- interface do modelo ativo ----------
+
+    def obter(self):
+        return self.ativo.obter()
+
+    @property
+    def carregado(self) -> bool:
+        return self.ativo.carregado
+
+    @property
+    def pronto(self) -> bool:
+        return self.ativo.pronto
+
+    @property
+    def relatorio(self) -> Dict:
+        return self.ativo.relatorio
+
+    @property
+    def versao(self) -> str:
+        return self.ativo.versao
+
+    # ---------- sincronização com o registro ----------
+
+    def sincronizar(self, forcar: bool = False) -> bool:
+        """
+        Aplica o manifesto se ele mudou desde a última leitura. Bloqueante
+        (carrega artefatos): chame fora do event loop. Retorna True se o
+        modelo ativo foi trocado.
+        """
+        with self._lock:
+            assinatura = self.registro.assinatura()
+            if assinatura == self._assinatura and not forcar:
+                return False
+            self._assinatura = assinatura
+            manifesto = self.registro.manifesto()
+
+            trocou = False
+            alvo = manifesto.get("ativo")
+            if alvo and alvo != self.versao_ativa:
+                novo = self.registro.modelo(alvo, **self.opcoes_modelo)
+                if novo.obter() is not None:
+                    anterior, self.ativo, self.versao_ativa = self.versao_ativa, novo, alvo
+                    self.trocas += 1
+                    trocou = True
+                    logger.info(f"Modelo ativo trocado: {anterior or 'padrão'} -> {alvo}")
+                    if self.ao_trocar:
+                        self.ao_trocar(novo)
+                else:
+                    logger.error(f"Versão {alvo} não pôde ser carregada; mantendo {self.versao_ativa}")
+
+            candidata = manifesto.get("candidato")
+            if candidata != self.versao_candidata:
+                candidato = None
+                if candidata:
+                    candidato = self.registro.modelo(candidata, **self.opcoes_modelo)
+                    if candidato.obter() is None:
+                        logger.error(f"Candidata {candidata} não pôde ser carregada")
+                        candidato = None
+                self.sombra.reiniciar(candidata if candidato else None)
+                self.candidato = candidato
+                self.versao_candidata = candidata if candidato else None
+            self.sombra_fracao = float(manifesto.get("sombra_fracao", 0.0)) if self.candidato else 0.0
+            return trocou
+
+    # ---------- análise ----------
+
+    def analisar(self, clientes_db: List[Dict]) -> List[Dict]:
+        """analise.analisar_lote com o modelo ativo, amostrando a candidata em sombra"""
+        modelo = self.obter()
+        inicio = time.perf_counter()
+        resultados = analisar_lote(clientes_db, modelo)
+        duracao = time.perf_counter() - inicio
+
+        candidato = self.candidato
+        if candidato is not None and clientes_db and random.random() < self.sombra_fracao:
+            self.sombra.agendar(self.versao_candidata, candidato.obter(),
+                                clientes_db, resultados, duracao)
+        return resultados
+
+    def estado(self) -> Dict:
+        return {
+            "ativo": self.versao_ativa or "padrao",
+            "versao_modelo": self.ativo.versao,
+            "candidato": self.versao_candidata,
+            "sombra_fracao": self.sombra_fracao,
+            "trocas": self.trocas,
+            "pid": os.getpid(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registro de modelos de crédito")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    comandos.add_parser("listar")
+    importar = comandos.add_parser("importar", help="Registra um joblib existente")
+    importar.add_argument("arquivo")
+    importar.add_argument("--promover", action="store_true")
+    comandos.add_parser("promover").add_argument("versao")
+    sombra = comandos.add_parser("sombra", help="Define a candidata ('-' desliga)")
+    sombra.add_argument("versao")
+    sombra.add_argument("fracao", type=float)
+    args = parser.parse_args()
+
+    registro = RegistroModelos()
+    if args.comando == "importar":
+        versao = registro.registrar(joblib.load(args.arquivo), origem=f"importado de {args.arquivo}")
+        if args.promover:
+            registro.promover(versao)
+        print(f"Versão registrada: {versao}")
+    elif args.comando == "promover":
+        registro.promover(args.versao)
+    elif args.comando == "sombra":
+        registro.definir_candidato(None if args.versao == "-" else args.versao, args.fracao)
+    print(json.dumps(registro.manifesto(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
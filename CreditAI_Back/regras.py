@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Regras de decisão de crédito em forma declarativa
+
+As regras ficam em regras.json (REGRAS_ARQUIVO), versionadas pelo campo
+"versao": cada critério tem um código, uma condição sobre as features, o
+texto do motivo e a sugestão ao cliente; o arquivo traz também os motivos
+ligados ao modelo e o cálculo do limite. Condições são comparações
+{"campo", "op", "valor"} combináveis com {"qualquer": [...]} e
+{"todas": [...]}; textos podem citar `{valor}` (o limiar da condição) e
+`{campo}` (o valor inteiro da feature na linha).
+
+Ao carregar, as condições viram funções de máscaras NumPy, e avaliar()
+calcula de uma vez, para o lote inteiro, aprovação, limite e um
+inteiro por linha com um bit por código de motivo. Os textos são montados
+uma vez por combinação distinta de códigos (e valores citados), não por
+linha. A mesma instância (analise.REGRAS) serve a análise individual, o
+lote, os jobs e as decisões pré-calculadas; GET /regras entrega o arquivo
+ao frontend, que avalia as mesmas condições em vez de manter uma cópia.
+"""
+
+from pathlib import Path
+from string import Formatter
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import gc
+import json
+import os
+
+import numpy as np
+
+REGRAS_ARQUIVO = os.getenv("REGRAS_ARQUIVO", str(Path(__file__).parent / "regras.json"))
+
+_OPERADORES = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+# Motivos do modelo ocupam os primeiros bits, então aparecem antes dos critérios
+FALHAS_MODELO = ("erro", "indisponivel")
+_MOTIVOS_MODELO = ("reprovado",) + FALHAS_MODELO
+
+# Até este tamanho os textos são montados por linha, sem agrupar
+_LOTE_PEQUENO = 16
+
+
+class Criterio(NamedTuple):
+    codigo: str
+    motivo: str
+    sugestao: str
+    condicao: Optional[Callable[[np.ndarray], np.ndarray]]
+    citados: Tuple[int, ...]
+
+
+class Avaliacao(NamedTuple):
+    """Resultado colunar de um lote: uma posição por linha da matriz"""
+    aprovado: np.ndarray
+    limite: np.ndarray
+    probabilidade: np.ndarray
+    codigos: np.ndarray
+
+
+# ==============================================
+# COMPILAÇÃO
+# ==============================================
+
+def _numero(valor) -> str:
+    return f"{valor:g}" if isinstance(valor, float) else str(valor)
+
+
+def _compilar_condicao(condicao: Dict, colunas: Sequence[str]) -> Callable[[np.ndarray], np.ndarray]:
+    for chave, juntar in (("qualquer", np.logical_or), ("todas", np.logical_and)):
+        if chave in condicao:
+            partes = [_compilar_condicao(parte, colunas) for parte in condicao[chave]]
+            if not partes:
+                raise ValueError(f"Condição '{chave}' sem partes")
+
+            def combinada(X, partes=partes, juntar=juntar):
+                mascara = partes[0](X)
+                for parte in partes[1:]:
+                    mascara = juntar(mascara, parte(X))
+                return mascara
+            return combinada
+
+    campo, operador = condicao.get("campo"), condicao.get("op")
+    if campo not in colunas:
+        raise ValueError(f"Campo desconhecido na regra: {campo}")
+    if operador not in _OPERADORES:
+        raise ValueError(f"Operador desconhecido na regra: {operador}")
+    indice, comparar, valor = colunas.index(campo), _OPERADORES[operador], float(condicao["valor"])
+    return lambda X: comparar(X[:, indice], valor)
+
+
+def _preparar_texto(texto: str, condicao: Optional[Dict], colunas: Sequence[str]) -> Tuple[str, Tuple[int, ...]]:
+    """Substitui {valor} pelo limiar da condição e devolve os índices das features citadas"""
+    if condicao is not None and "valor" in condicao:
+        texto = texto.replace("{valor}", _numero(condicao["valor"]))
+    citados = []
+    for _, campo, _, _ in Formatter().parse(texto):
+        if campo is None:
+            continue
+        if campo not in colunas:
+            raise ValueError(f"Campo desconhecido no texto da regra: {campo}")
+        citados.append(colunas.index(campo))
+    return texto, tuple(dict.fromkeys(citados))
+
+
+class Regras:
+    """
+    Conjunto de regras compilado para matrizes com as colunas `colunas`
+    (analise.FEATURES). `dados` é o conteúdo do arquivo, como carregado.
+    """
+
+    def __init__(self, dados: Dict, colunas: Sequence[str]):
+        self.dados = dados
+        self.colunas = tuple(colunas)
+        self.versao = str(dados["versao"])
+        self.probabilidade_padrao = float(dados.get("probabilidade_padrao", 0.95))
+        limite = dados["limite"]
+        self.fracao_renda = float(limite["fracao_renda"])
+        self.escala_score = float(limite["escala_score"])
+        self._score = self.colunas.index("score")
+        self._renda = self.colunas.index("renda_mensal")
+
+        self.criterios: List[Criterio] = []
+        for nome in _MOTIVOS_MODELO:
+            motivo = dados["modelo"][nome]
+            self.criterios.append(Criterio(motivo["codigo"], motivo["motivo"],
+                                           motivo.get("sugestao", ""), None, ()))
+        for criterio in dados["criterios"]:
+            texto, citados = _preparar_texto(criterio["motivo"], criterio["quando"], self.colunas)
+            self.criterios.append(Criterio(
+                criterio["codigo"], texto, criterio.get("sugestao", ""),
+                _compilar_condicao(criterio["quando"], self.colunas), citados,
+            ))
+        codigos = [criterio.codigo for criterio in self.criterios]
+        if len(set(codigos)) != len(codigos):
+            raise ValueError("Códigos de motivo repetidos nas regras")
+        if len(codigos) > 32:
+            raise ValueError("No máximo 32 códigos de motivo")
+
+        self.bits = {criterio.codigo: np.uint32(1 << i) for i, criterio in enumerate(self.criterios)}
+        self._bits = [1 << i for i in range(len(self.criterios))]
+        # Por feature citada em algum texto, os bits dos critérios que a citam
+        self._citados: Dict[int, np.uint32] = {}
+        for i, criterio in enumerate(self.criterios):
+            for coluna in criterio.citados:
+                self._citados[coluna] = np.uint32(self._citados.get(coluna, 0) | (1 << i))
+
+    def motivo_modelo(self, nome: str) -> str:
+        return self.dados["modelo"][nome]["motivo"]
+
+    def bit_modelo(self, nome: str) -> np.uint32:
+        return self.bits[self.dados["modelo"][nome]["codigo"]]
+
+    # ---------- avaliação vetorizada ----------
+
+    def limites(self, X: np.ndarray) -> np.ndarray:
+        """Fração da renda ponderada pelo score"""
+        return X[:, self._renda] * self.fracao_renda * (X[:, self._score] / self.escala_score)
+
+    def avaliar(self, X: np.ndarray, aprovado_modelo: np.ndarray, probabilidade: np.ndarray,
+                falha_modelo: Optional[str] = None) -> Avaliacao:
+        """
+        Aplica os critérios ao lote. Sem nenhum motivo (e sem falha do
+        modelo, em `falha_modelo`), a linha é aprovada; a aprovação do
+        modelo prevalece sobre os critérios, como sempre foi.
+        """
+        if falha_modelo is not None:
+            codigos = np.full(len(X), self.bit_modelo(falha_modelo), dtype=np.uint32)
+        else:
+            codigos = np.where(aprovado_modelo, np.uint32(0), self.bit_modelo("reprovado"))
+        for criterio in self.criterios:
+            if criterio.condicao is not None:
+                np.bitwise_or(codigos, self.bits[criterio.codigo], out=codigos, where=criterio.condicao(X))
+
+        sem_motivos = codigos == 0
+        aprovado = aprovado_modelo | sem_motivos
+        probabilidade = np.where(sem_motivos & (probabilidade == 0), self.probabilidade_padrao, probabilidade)
+        limite = np.where(aprovado, self.limites(X), 0.0)
+        return Avaliacao(aprovado, limite, probabilidade, codigos)
+
+    # ---------- motivos ----------
+
+    def _textos(self, linha: np.ndarray, codigos: int) -> Tuple[List[str], List[str]]:
+        ativos = [criterio for criterio, bit in zip(self.criterios, self._bits) if codigos & bit]
+        valores = None
+        motivos = []
+        for criterio in ativos:
+            if criterio.citados:
+                if valores is None:
+                    valores = {campo: int(valor) for campo, valor in zip(self.colunas, linha.tolist())}
+                motivos.append(criterio.motivo.format_map(valores))
+            else:
+                motivos.append(criterio.motivo)
+        return [criterio.codigo for criterio in ativos], motivos
+
+    def agrupar(self, X: np.ndarray, codigos: np.ndarray) -> Tuple[List[Tuple[List[str], List[str]]], np.ndarray]:
+        """
+        Códigos e textos de cada combinação distinta do lote e, por linha,
+        o índice da sua combinação. A chave de uma linha junta os bits e,
+        para cada feature citada em texto de um critério ativo, a posição
+        do seu valor entre os distintos (numeração mista, sem colisão).
+        """
+        if len(X) <= _LOTE_PEQUENO:
+            # Agrupar custa mais que montar os textos de poucas linhas
+            return [self._textos(linha, int(bits)) for linha, bits in zip(X, codigos)], np.arange(len(X))
+        chave = codigos.astype(np.int64)
+        for coluna, bits in self._citados.items():
+            valores = np.where(codigos & bits, X[:, coluna], 0)
+            distintos, posicao = np.unique(valores, return_inverse=True)
+            chave = chave * len(distintos) + posicao
+        _, exemplos, grupos = np.unique(chave, return_index=True, return_inverse=True)
+        return [self._textos(X[i], int(codigos[i])) for i in exemplos], grupos.ravel()
+
+    def resultados(self, X: np.ndarray, avaliacao: Avaliacao) -> List[Dict]:
+        """
+        Um dicionário por linha (aprovado, limite, probabilidade, motivos,
+        codigos). As listas de motivos e códigos são compartilhadas pelas
+        linhas da mesma combinação: quem as recebe não deve alterá-las.
+        """
+        combinacoes, grupos = self.agrupar(X, avaliacao.codigos)
+        # Milhões de dicionários novos disparariam coletas completas repetidas
+        # sobre objetos que ainda estão sendo criados
+        coletor_ativo = gc.isenabled()
+        gc.disable()
+        try:
+            return [
+                {
+                    "aprovado": aprovado,
+                    "limite": round(limite, 2),
+                    "probabilidade": probabilidade,
+                    "motivos": combinacoes[grupo][1],
+                    "codigos": combinacoes[grupo][0],
+                }
+                for aprovado, limite, probabilidade, grupo in zip(
+                    avaliacao.aprovado.tolist(), avaliacao.limite.tolist(),
+                    avaliacao.probabilidade.tolist(), grupos.tolist(),
+                )
+            ]
+        finally:
+            if coletor_ativo:
+                gc.enable()
+
+
+def carregar(colunas: Sequence[str], caminho: str = REGRAS_ARQUIVO) -> Regras:
+    with open(caminho, encoding="utf-8") as arquivo:
+        return Regras(json.load(arquivo), colunas)
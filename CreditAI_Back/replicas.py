@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Roteamento de leituras para réplicas do MySQL
+
+As escritas vão sempre ao primário (DB_HOST). As leituras da API
+(listagem, busca, análise, resumo da carteira) vão a uma das réplicas de
+DB_REPLICAS, a com menos conexões em uso, e voltam ao primário quando:
+
+- nenhuma réplica está saudável: a verificação periódica (`verificar`)
+  tira de circulação a réplica que não responde, cuja replicação parou ou
+  cujo atraso passou de DB_REPLICA_ATRASO_MAX_S, e a devolve quando ela se
+  recupera; uma falha ao conectar também a tira na hora;
+- a leitura cai na janela de leitura-após-escrita: por DB_LEITURA_APOS_ESCRITA_S
+  segundos depois de gravar um CPF, as leituras desse CPF vão ao primário
+  (um cliente recém-cadastrado pode ser analisado em seguida), e as
+  leituras sem chave (listagens) vão ao primário depois de qualquer escrita
+  deste processo.
+
+Uma instância que não é réplica (SHOW REPLICA STATUS vazio) conta como
+réplica sem atraso, o que permite testar o roteamento com dois bancos
+locais independentes.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional
+import logging
+import threading
+import time
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    """Pool de uma réplica e o resultado da última verificação"""
+
+    def __init__(self, nome: str, pool):
+        self.nome = nome
+        self.pool = pool
+        self.saudavel = False
+        self.atraso: Optional[float] = None
+        self.erro: Optional[str] = None
+        self.verificada_em: Optional[float] = None
+        self.leituras = 0
+
+
+def atraso_replicacao(connection) -> Optional[float]:
+    """
+    Segundos de atraso da réplica; 0 se a instância não for réplica e None
+    se a replicação estiver parada. SHOW SLAVE STATUS cobre o MySQL < 8.0.22.
+    """
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SHOW REPLICA STATUS")
+        chave = "Seconds_Behind_Source"
+    except mysql.connector.Error:
+        cursor.execute("SHOW SLAVE STATUS")
+        chave = "Seconds_Behind_Master"
+    linha = cursor.fetchone()
+    cursor.fetchall()
+    if linha is None:
+        return 0.0
+    atraso = linha.get(chave)
+    return None if atraso is None else float(atraso)
+
+
+class RoteadorLeituras:
+    """
+    Escolhe a réplica de cada leitura (None: use o primário). Thread-safe:
+    as consultas rodam nas threads de database.executar_db.
+    """
+
+    def __init__(self, replicas: List[Replica], janela: float = 5.0, atraso_max: float = 5.0,
+                 medir_atraso: Callable = atraso_replicacao):
+        self.replicas = replicas
+        self.janela = janela
+        self.atraso_max = atraso_max
+        self.medir_atraso = medir_atraso
+
+        self._lock = threading.Lock()
+        self._escritas: Dict[str, float] = {}
+        self._ultima_escrita = float("-inf")
+        self._proximo = 0
+        self._leituras_primario = 0
+        self._leituras_janela = 0
+
+    # ---------- leitura-após-escrita ----------
+
+    def registrar_escrita(self, chaves: Iterable[str] = ()):
+        """Chamado depois de gravar: as próximas leituras dessas chaves vão ao primário"""
+        if not self.replicas or self.janela <= 0:
+            return
+        agora = time.monotonic()
+        with self._lock:
+            self._ultima_escrita = agora
+            for chave in chaves:
+                self._escritas[chave] = agora + self.janela
+            if len(self._escritas) > 100000:
+                self._escritas = {c: expira for c, expira in self._escritas.items() if expira > agora}
+
+    def _na_janela(self, chaves: Optional[Iterable[str]], agora: float) -> bool:
+        if chaves is None:
+            return agora - self._ultima_escrita < self.janela
+        for chave in chaves:
+            expira = self._escritas.get(chave)
+            if expira is not None:
+                if expira > agora:
+                    return True
+                del self._escritas[chave]
+        return False
+
+    # ---------- escolha ----------
+
+    def escolher(self, chaves: Optional[Iterable[str]] = None) -> Optional[Replica]:
+        """
+        Réplica saudável com menos conexões em uso (empates em rodízio), ou
+        None se a leitura deve ir ao primário. `chaves` são os CPFs lidos;
+        None para leituras sem chave.
+        """
+        if not self.replicas:
+            return None
+        agora = time.monotonic()
+        with self._lock:
+            if self._na_janela(chaves, agora):
+                self._leituras_janela += 1
+                return None
+            candidatas = [replica for replica in self.replicas if replica.saudavel]
+            if not candidatas:
+                self._leituras_primario += 1
+                return None
+            self._proximo = (self._proximo + 1) % len(candidatas)
+            candidatas = candidatas[self._proximo:] + candidatas[:self._proximo]
+            replica = min(candidatas, key=lambda r: r.pool.estatisticas()["em_uso"])
+            replica.leituras += 1
+            return replica
+
+    def falhou(self, replica: Replica, erro: Exception):
+        """Tira a réplica de circulação até a próxima verificação bem-sucedida"""
+        with self._lock:
+            if replica.saudavel:
+                logger.warning(f"Réplica {replica.nome} fora de circulação: {erro}")
+            replica.saudavel = False
+            replica.erro = str(erro)
+
+    # ---------- verificação ----------
+
+    def verificar(self):
+        """Mede o atraso de cada réplica e atualiza quais podem receber leituras"""
+        for replica in self.replicas:
+            try:
+                with replica.pool.conexao(timeout=1.0) as connection:
+                    atraso = self.medir_atraso(connection)
+                erro = None if atraso is not None else "replicação parada"
+                if atraso is not None and atraso > self.atraso_max:
+                    erro = f"atraso de {atraso:.0f}s (máximo {self.atraso_max:.0f}s)"
+            except Exception as e:
+                atraso, erro = None, str(e)
+            with self._lock:
+                if erro and replica.saudavel:
+                    logger.warning(f"Réplica {replica.nome} fora de circulação: {erro}")
+                elif not erro and not replica.saudavel:
+                    logger.info(f"Réplica {replica.nome} em circulação (atraso {atraso:.0f}s)")
+                replica.saudavel = erro is None
+                replica.atraso = atraso
+                replica.erro = erro
+                replica.verificada_em = time.time()
+
+    def estatisticas(self) -> Dict:
+        with self._lock:
+            return {
+                "janela_leitura_apos_escrita_s": self.janela,
+                "atraso_max_s": self.atraso_max,
+                "leituras_primario_sem_replica": self._leituras_primario,
+                "leituras_primario_janela": self._leituras_janela,
+                "replicas": {
+                    replica.nome: {
+                        "saudavel": replica.saudavel,
+                        "atraso_s": replica.atraso,
+                        "erro": replica.erro,
+                        "leituras": replica.leituras,
+                        "verificada_em": replica.verificada_em,
+                        "pool": replica.pool.estatisticas(),
+                    }
+                    for replica in self.replicas
+                },
+            }
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Serialização rápida das respostas JSON
+
+Os clientes lidos do banco já respeitam as restrições do schema (a tabela
+só recebe linhas validadas no cadastro), então as rotas quentes montam os
+dicionários no formato final (chaves camelCase, tipos JSON) e devolvem um
+RespostaJSON diretamente: o FastAPI não revalida um Response retornado pela
+rota, e a validação do Cliente (incluindo os @validator legados) mais o
+jsonable_encoder deixam de rodar por linha.
+
+Com o orjson instalado a codificação é feita por ele; sem o pacote, cai no
+json da biblioteca padrão com a mesma saída.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+import json
+import logging
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logger.warning("Pacote orjson não instalado; serializando respostas com o json padrão")
+
+
+def _padrao(valor: Any):
+    """Tipos que vêm do mysql.connector e não são JSON nativos"""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, (set, frozenset, tuple)):
+        return list(valor)
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+
+def serializar(conteudo: Any) -> bytes:
+    """JSON compacto em UTF-8, igual ao que o JSONResponse produz"""
+    if orjson is not None:
+        return orjson.dumps(conteudo, default=_padrao)
+    return json.dumps(
+        conteudo,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_padrao,
+    ).encode("utf-8")
+
+
+class RespostaJSON(JSONResponse):
+    """JSONResponse que codifica com orjson (quando instalado) e aceita Decimal"""
+
+    def render(self, content: Any) -> bytes:
+        return serializar(content)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Modelos de dados de clientes compartilhados pela API e pela carga em lote
+As mesmas regras de validação valem para o cadastro e para os arquivos
+"""
+
+from pydantic import BaseModel, Field, ValidationError, validator
+
+# Colunas da tabela clientes na ordem de valores_cliente()
+COLUNAS_CLIENTE = (
+    "cpf",
+    "nome",
+    "score",
+    "possui_restricoes",
+    "renda_mensal",
+    "atrasos_30_dias",
+    "atrasos_60_dias",
+    "atrasos_90_dias",
+)
+
+
+class HistoricoPagamentos(BaseModel):
+    """Modelo para histórico de pagamentos do cliente"""
+    atrasos_30_dias: int = Field(
+        default=0,
+        ge=0,
+        alias="atrasos30Dias",
+        description="Quantidade de atrasos entre 1-30 dias"
+    )
+    atrasos_60_dias: int = Field(
+        default=0,
+        ge=0,
+        alias="atrasos60Dias", 
+        description="Quantidade de atrasos entre 31-60 dias"
+    )
+    atrasos_90_dias: int = Field(
+        default=0,
+        ge=0,
+        alias="atrasos90Dias",
+        description="Quantidade de atrasos acima de 60 dias"
+    )
+    
+    model_config = {
+        "populate_by_name": True,
+        "json_schema_extra": {
+            "example": {
+                "atrasos30Dias": 1,
+                "atrasos60Dias": 0,
+                "atrasos90Dias": 0
+            }
+        }
+    }
+
+class Cliente(BaseModel):
+    """Modelo principal para dados do cliente"""
+    cpf: str = Field(
+        ...,
+        min_length=11,
+        max_length=11,
+        pattern=r'^\d+$',
+        alias="cpf",
+        description="CPF do cliente (apenas números)"
+    )
+    nome: str = Field(
+        ...,
+        min_length=3,
+        max_length=100,
+        alias="nome",
+        description="Nome completo do cliente"
+    )
+    score: int = Field(
+        ...,
+        ge=300,
+        le=1000,
+        alias="score",
+        description="Score de crédito (300-1000)"
+    )
+    possui_restricoes: bool = Field(
+        ...,
+        alias="possuiRestricoes",
+        description="Indica se possui restrições no SPC/Serasa"
+    )
+    renda_mensal: float = Field(
+        ...,
+        gt=0,
+        alias="rendaMensal",
+        description="Renda mensal em reais (maior que zero)"
+    )
+    historico_pagamentos: HistoricoPagamentos = Field(
+        ...,
+        alias="historicoPagamentos",
+        description="Histórico de pagamentos do cliente"
+    )
+
+    @validator('cpf')
+    def cpf_deve_ter_11_numeros(cls, v):
+        if not v.isdigit() or len(v) != 11:
+            raise ValueError('CPF deve conter exatamente 11 dígitos numéricos')
+        return v
+
+    @validator('renda_mensal')
+    def arredondar_renda(cls, v):
+        return round(v, 2)
+
+    model_config = {
+        "populate_by_name": True,
+        "json_schema_extra": {
+            "example": {
+                "cpf": "12345678901",
+                "nome": "Fulano de Tal",
+                "score": 700,
+                "possuiRestricoes": False,
+                "rendaMensal": 5000.50,
+                "historicoPagamentos": {
+                    "atrasos30Dias": 1,
+                    "atrasos60Dias": 0,
+                    "atrasos90Dias": 0
+                }
+            }
+        }
+    }
+
+
+def valores_cliente(cliente: Cliente) -> tuple:
+    """Valores do cliente na ordem de COLUNAS_CLIENTE, para INSERT"""
+    return (
+        cliente.cpf,
+        cliente.nome,
+        cliente.score,
+        cliente.possui_restricoes,
+        cliente.renda_mensal,
+        cliente.historico_pagamentos.atrasos_30_dias,
+        cliente.historico_pagamentos.atrasos_60_dias,
+        cliente.historico_pagamentos.atrasos_90_dias,
+    )
+
+
+def validar_cliente(registro) -> tuple:
+    """Valores prontos para o banco; ValueError com o motivo se inválido"""
+    try:
+        return valores_cliente(Cliente.model_validate(registro))
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(parte) for parte in erro['loc']) or 'registro'}: {erro['msg']}"
+            for erro in e.errors()
+        ))
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de scoring compilado para florestas de árvores de decisão
+Achata as árvores do scikit-learn em vetores NumPy contíguos e avalia
+linhas e lotes com uma única travessia
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Marcador de folha usado pelo scikit-learn em tree_.children_left
+_FOLHA = -1
+
+# Vetores gravados no artefato, um .npy sem compressão para cada
+_VETORES = ("feature", "threshold", "filhos", "valores", "raizes", "profundidades")
+
+
+class FlorestaCompilada:
+    """
+    Floresta achatada em vetores contíguos.
+
+    Todos os nós de todas as árvores ficam nos mesmos vetores `feature`,
+    `threshold` e `filhos` (esquerda/direita intercalados), e `valores`
+    guarda a probabilidade por classe de cada nó; `raizes` indica o primeiro
+    nó de cada árvore. Folhas apontam para si mesmas, de modo que a
+    travessia é um laço de poucos passos sobre a matriz (linhas × árvores)
+    de nós correntes, sem desvios por árvore.
+
+    Os limiares são guardados em float32 arredondados para baixo: como o
+    scikit-learn converte X para float32, `x <= limiar64` equivale a
+    `x <= limiar32` e a paridade é exata com metade da memória.
+
+    A travessia simultânea de todas as árvores é ideal para linhas únicas e
+    lotes pequenos. Acima de `limiar_lote` linhas o laço C do scikit-learn é
+    mais rápido que qualquer travessia em NumPy puro, então o lote é
+    delegado ao estimador de origem quando ele está disponível (ou é
+    carregado por `carregar_origem` no primeiro lote grande).
+
+    Expõe `predict_proba`, `predict` e `classes_` com a mesma semântica do
+    RandomForestClassifier, e pode substituí-lo em analise.analisar_lote.
+    """
+
+    def __init__(self, feature, threshold, filhos, valores, raizes,
+                 profundidades, classes, n_features, origem=None, limiar_lote=64,
+                 carregar_origem: Optional[Callable] = None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float32)
+        self.filhos = np.ascontiguousarray(filhos, dtype=np.int32)
+        self.valores = np.ascontiguousarray(valores, dtype=np.float64)
+        self.raizes = np.ascontiguousarray(raizes, dtype=np.int32)
+        self.profundidades = np.ascontiguousarray(profundidades, dtype=np.int32)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = int(n_features)
+        self.origem = origem
+        self.limiar_lote = limiar_lote
+        self.carregar_origem = carregar_origem
+
+    @property
+    def n_arvores(self) -> int:
+        return len(self.raizes)
+
+    @property
+    def n_nos(self) -> int:
+        return len(self.feature)
+
+    @property
+    def profundidade(self) -> int:
+        return int(self.profundidades.max()) if len(self.profundidades) else 0
+
+    @classmethod
+    def compilar(cls, modelo, **kwargs) -> "FlorestaCompilada":
+        """Achata um RandomForestClassifier treinado (saída única)"""
+        if not hasattr(modelo, "estimators_") or getattr(modelo, "n_outputs_", 1) != 1:
+            raise ValueError(f"Modelo não suportado pelo motor compilado: {type(modelo).__name__}")
+
+        features, thresholds, filhos, valores, raizes, profundidades = [], [], [], [], [], []
+        deslocamento = 0
+        for estimador in modelo.estimators_:
+            arvore = estimador.tree_
+            indices = np.arange(arvore.node_count, dtype=np.int64)
+            folha = arvore.children_left == _FOLHA
+
+            # Folhas: comparação inócua e filhos apontando para o próprio nó
+            features.append(np.where(folha, 0, arvore.feature))
+            thresholds.append(np.where(folha, 0.0, arvore.threshold))
+            esquerda = np.where(folha, indices, arvore.children_left) + deslocamento
+            direita = np.where(folha, indices, arvore.children_right) + deslocamento
+            filhos.append(np.column_stack([esquerda, direita]).ravel())
+
+            # Probabilidade por classe em cada nó, como em DecisionTreeClassifier.predict_proba
+            valor = arvore.value[:, 0, :].astype(np.float64)
+            soma = valor.sum(axis=1, keepdims=True)
+            soma[soma == 0] = 1.0
+            valores.append(valor / soma)
+
+            raizes.append(deslocamento)
+            profundidades.append(arvore.max_depth)
+            deslocamento += arvore.node_count
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=limiares_float32(np.concatenate(thresholds)),
+            filhos=np.concatenate(filhos),
+            valores=np.concatenate(valores),
+            raizes=np.asarray(raizes),
+            profundidades=np.asarray(profundidades),
+            classes=modelo.classes_,
+            n_features=modelo.n_features_in_,
+            origem=modelo,
+            **kwargs,
+        )
+
+    def _validar(self, X) -> np.ndarray:
+        # O scikit-learn compara as features em float32
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[1]} features, but FlorestaCompilada is "
+                f"expecting {self.n_features_in_} features as input."
+            )
+        return X
+
+    def _passo(self, Xf, base, nos):
+        """Avança cada nó corrente um nível: filho direito se x > limiar"""
+        direita = np.take(Xf, base + np.take(self.feature, nos)) > np.take(self.threshold, nos)
+        return np.take(self.filhos, (nos << 1) | direita)
+
+    def folhas(self, X) -> np.ndarray:
+        """Índice da folha alcançada por cada linha em cada árvore (n × árvores)"""
+        X = self._validar(X)
+        n, n_features = X.shape
+        Xf = X.ravel()
+        base = np.repeat(np.arange(n, dtype=np.int32) * n_features, self.n_arvores)
+        nos = np.tile(self.raizes, n)
+        for _ in range(self.profundidade):
+            proximos = self._passo(Xf, base, nos)
+            # Todas as linhas chegaram a folhas (filhos apontam para o próprio nó)
+            if np.array_equal(proximos, nos):
+                break
+            nos = proximos
+        return nos.reshape(n, self.n_arvores)
+
+    def _proba_por_arvore(self, X) -> np.ndarray:
+        """Travessia árvore a árvore, que mantém cada árvore no cache em lotes grandes"""
+        n, n_features = X.shape
+        Xf = X.ravel()
+        base = np.arange(n, dtype=np.int32) * n_features
+        soma = np.zeros((n, self.valores.shape[1]))
+        for raiz, profundidade in zip(self.raizes, self.profundidades):
+            nos = np.full(n, raiz, dtype=np.int32)
+            for _ in range(profundidade):
+                nos = self._passo(Xf, base, nos)
+            soma += np.take(self.valores, nos, axis=0)
+        return soma / self.n_arvores
+
+    def _obter_origem(self):
+        if self.origem is None and self.carregar_origem is not None:
+            carregar, self.carregar_origem = self.carregar_origem, None
+            try:
+                self.origem = carregar()
+            except Exception as e:
+                logger.warning(f"Estimador de origem indisponível para lotes: {e}")
+        return self.origem
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = self._validar(X)
+        if X.shape[0] > self.limiar_lote:
+            origem = self._obter_origem()
+            if origem is not None:
+                return origem.predict_proba(X)
+            return self._proba_por_arvore(X)
+        nos = self.folhas(X)
+        return np.take(self.valores, nos, axis=0).sum(axis=1) / self.n_arvores
+
+    # ---------- artefato mapeável ----------
+
+    def salvar(self, pasta, **meta):
+        """
+        Grava os vetores como .npy sem compressão e os metadados (mais os
+        campos extras de `meta`) em meta.json. A pasta é montada ao lado e
+        trocada no fim, então leitores nunca veem um artefato incompleto.
+        """
+        pasta = Path(pasta)
+        temporaria = pasta.with_name(f"{pasta.name}.tmp{os.getpid()}")
+        shutil.rmtree(temporaria, ignore_errors=True)
+        temporaria.mkdir(parents=True)
+        for nome in _VETORES:
+            np.save(temporaria / f"{nome}.npy", getattr(self, nome))
+        (temporaria / "meta.json").write_text(json.dumps({
+            "classes": self.classes_.tolist(),
+            "n_features": self.n_features_in_,
+            **meta,
+        }), encoding="utf-8")
+
+        antiga = pasta.with_name(f"{pasta.name}.old{os.getpid()}")
+        if pasta.exists():
+            os.replace(pasta, antiga)
+        try:
+            os.replace(temporaria, pasta)
+        except OSError:
+            # Outro processo publicou o artefato entre as duas trocas
+            if not pasta.exists():
+                raise
+            shutil.rmtree(temporaria, ignore_errors=True)
+        # Processos que mapearam os arquivos antigos continuam lendo-os até reabrir
+        shutil.rmtree(antiga, ignore_errors=True)
+
+    @classmethod
+    def carregar(cls, pasta, mmap: bool = True, **kwargs) -> Tuple["FlorestaCompilada", Dict]:
+        """
+        Abre um artefato gravado por salvar(). Com `mmap`, os vetores são
+        mapeados somente leitura: todos os processos que abrem o mesmo
+        artefato compartilham uma cópia física pelo cache de páginas.
+        Retorna (floresta, metadados).
+        """
+        pasta = Path(pasta)
+        meta = json.loads((pasta / "meta.json").read_text(encoding="utf-8"))
+        vetores = {
+            nome: np.load(pasta / f"{nome}.npy", mmap_mode="r" if mmap else None)
+            for nome in _VETORES
+        }
+        floresta = cls(classes=meta["classes"], n_features=meta["n_features"], **vetores, **kwargs)
+        return floresta, meta
+
+    @property
+    def bytes(self) -> int:
+        return sum(getattr(self, nome).nbytes for nome in _VETORES)
+
+    def avaliar(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """Uma travessia: retorna (probabilidades por classe, classe prevista)"""
+        proba = self.predict_proba(X)
+        return proba, self.classes_[np.argmax(proba, axis=1)]
+
+    def predict(self, X) -> np.ndarray:
+        return self.avaliar(X)[1]
+
+
+def limiares_float32(threshold: np.ndarray) -> np.ndarray:
+    """Converte limiares float64 para o maior float32 que não os ultrapassa"""
+    limiar32 = threshold.astype(np.float32)
+    acima = limiar32.astype(np.float64) > threshold
+    limiar32[acima] = np.nextafter(limiar32[acima], np.float32(-np.inf))
+    return limiar32
+
+
+def verificar_paridade(modelo, compilado: FlorestaCompilada, X, tolerancia: float = 1e-9) -> float:
+    """
+    Compara o motor compilado com o scikit-learn sobre X.
+
+    Lança ValueError se alguma decisão divergir ou se a diferença de
+    probabilidade passar da tolerância; retorna a maior diferença encontrada.
+    """
+    esperado = modelo.predict_proba(X)
+    obtido, decisao = compilado.avaliar(X)
+    diferenca = float(np.max(np.abs(esperado - obtido))) if len(X) else 0.0
+    if diferenca > tolerancia:
+        raise ValueError(f"Probabilidades divergem do scikit-learn (máx {diferenca:.3g})")
+    if not np.array_equal(modelo.predict(X), decisao):
+        raise ValueError("Decisões divergem do scikit-learn")
+    return diferenca
+
+
+def compilar_modelo(modelo):
+    """
+    Compila o modelo para o motor de scoring, conferindo a paridade em
+    linhas sintéticas. Em caso de falha, mantém o modelo original.
+    """
+    if modelo is None:
+        return None
+    try:
+        compilado = FlorestaCompilada.compilar(modelo)
+        amostra = np.random.default_rng(0).uniform(
+            0, 10000, size=(256, compilado.n_features_in_)
+        )
+        verificar_paridade(modelo, compilado, amostra)
+        logger.info(
+            f"Modelo compilado: {compilado.n_arvores} árvores, "
+            f"{compilado.n_nos} nós, profundidade {compilado.profundidade}"
+        )
+        return compilado
+    except Exception as e:
+        logger.warning(f"Motor compilado indisponível, usando scikit-learn: {e}")
+        return modelo
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot colunar das features dos clientes
+
+O treino (credit_model.py --snapshot) e os jobs de reanálise (jobs.py)
+leem as seis features de arquivos .npy mapeados em memória, em vez de
+percorrer a tabela clientes pelo driver do MySQL a cada execução. Cada
+geração do snapshot é uma pasta imutável em SNAPSHOT_DIR:
+
+    ids.npy           int64, crescente: a linha i é o cliente de id ids[i]
+    cpfs.npy          CPF de cada linha (bytes de largura fixa)
+    cpf_ordem.npy     linhas em ordem de CPF, para a busca binária por CPF
+    X.npy             float32 N×6 na ordem de analise.FEATURES, gravada por
+                      coluna (ordem Fortran): cada feature é um trecho
+                      contíguo e a matriz é a entrada do RandomForest sem cópia
+    renda_mensal.npy  float64, a renda exata para o cálculo do limite
+    meta.json         linhas e marca d'água (atualizado_em, id)
+
+O manifesto.json da pasta aponta a geração atual. A atualização é
+incremental pela coluna atualizado_em (migrations/002_decisoes.sql), como
+no reprocessamento das decisões: lê do primário só os clientes alterados
+desde a marca d'água, aplica-os sobre uma cópia da geração atual e troca
+o manifesto. A API não exclui clientes, então inclusões e alterações
+bastam. Quem já mapeou uma geração continua a lê-la; as antigas são
+removidas quando nenhum job as reserva.
+
+Uso (a partir de CreditAI_Back/):
+    python snapshot.py                 # atualiza (completo na primeira vez)
+    python snapshot.py --completo      # refaz do zero
+    python snapshot.py --info          # geração atual
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+import database
+from analise import FEATURES
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "dados/snapshot")
+SNAPSHOT_BLOCO = int(os.getenv("SNAPSHOT_BLOCO", 50000))
+SNAPSHOT_GERACOES = int(os.getenv("SNAPSHOT_GERACOES", 2))
+# Mesmo cuidado de DECISOES_ATRASO_S: uma transação ainda aberta pode
+# confirmar um atualizado_em anterior à marca d'água
+SNAPSHOT_ATRASO_S = float(os.getenv("SNAPSHOT_ATRASO_S", 2))
+
+_CPF = np.dtype("S14")  # cpf VARCHAR(14)
+_RENDA = FEATURES.index("renda_mensal")
+_COLUNAS = ", ".join(("id", "cpf") + FEATURES)
+
+
+# ==============================================
+# TRAVAS
+# ==============================================
+
+def _travar(caminho: Path, compartilhada: bool = False, esperar: bool = True):
+    """
+    Trava de arquivo, solta ao fechar o arquivo devolvido; None se outro a
+    tiver e `esperar` for falso. Sem fcntl (Windows) não há trava
+    compartilhada, mas lá um arquivo mapeado também não pode ser removido.
+    """
+    try:
+        arquivo = open(caminho, "a+b" if not compartilhada else "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        if fcntl:
+            modo = fcntl.LOCK_SH if compartilhada else fcntl.LOCK_EX
+            fcntl.flock(arquivo.fileno(), modo if esperar else modo | fcntl.LOCK_NB)
+        elif not compartilhada:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_LOCK if esperar else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        arquivo.close()
+        return None
+    return arquivo
+
+
+def reservar(pasta_geracao) -> Optional[object]:
+    """
+    Impede a remoção da geração enquanto a trava devolvida estiver aberta
+    (um job cujas partes ainda vão abri-la); None se ela já foi removida
+    """
+    pasta = Path(pasta_geracao)
+    trava = _travar(pasta / ".uso", compartilhada=True, esperar=False)
+    if trava is not None and not (pasta / "meta.json").exists():
+        trava.close()
+        return None
+    return trava
+
+
+# ==============================================
+# LEITURA
+# ==============================================
+
+class Snapshot:
+    """Uma geração do snapshot, mapeada em memória e somente leitura"""
+
+    def __init__(self, pasta_geracao):
+        self.pasta = Path(pasta_geracao)
+        self.meta = json.loads((self.pasta / "meta.json").read_text(encoding="utf-8"))
+        self.ids = np.load(self.pasta / "ids.npy", mmap_mode="r")
+        self.cpfs = np.load(self.pasta / "cpfs.npy", mmap_mode="r")
+        self.X = np.load(self.pasta / "X.npy", mmap_mode="r")
+        self.renda = np.load(self.pasta / "renda_mensal.npy", mmap_mode="r")
+        self._cpf_ordem = np.load(self.pasta / "cpf_ordem.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def faixa(self, apos_id: int = 0, ate_id: Optional[int] = None) -> slice:
+        """Linhas dos clientes com id em (apos_id, ate_id]: um trecho contíguo"""
+        inicio = int(np.searchsorted(self.ids, apos_id, side="right"))
+        fim = len(self) if ate_id is None else int(np.searchsorted(self.ids, ate_id, side="right"))
+        return slice(inicio, max(inicio, fim))
+
+    def linhas_por_cpf(self, cpfs: Sequence[str]) -> np.ndarray:
+        """Linha de cada CPF; -1 para os que não estão no snapshot"""
+        chaves = np.asarray(cpfs, dtype=_CPF)
+        if len(self) == 0:
+            return np.full(len(chaves), -1, dtype=np.int64)
+        posicoes = np.searchsorted(self.cpfs, chaves, sorter=self._cpf_ordem)
+        linhas = self._cpf_ordem[np.minimum(posicoes, len(self) - 1)]
+        return np.where(self.cpfs[linhas] == chaves, linhas, -1)
+
+    def coluna(self, nome: str, linhas) -> np.ndarray:
+        """Uma feature das linhas (índices ou slice; slice é uma visão do arquivo)"""
+        if nome == "renda_mensal":
+            return self.renda[linhas]
+        return self.X[linhas, FEATURES.index(nome)]
+
+    def matriz(self, linhas) -> np.ndarray:
+        """Matriz float64 das linhas para analise.analisar_matriz, com a renda exata"""
+        X = np.array(self.X[linhas], dtype=np.float64, order="C")
+        X[:, _RENDA] = self.renda[linhas]
+        return X
+
+
+def _ler_manifesto(pasta: Path) -> Optional[Dict]:
+    try:
+        return json.loads((pasta / "manifesto.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def abrir(pasta_geracao=None, pasta=SNAPSHOT_DIR) -> Snapshot:
+    """A geração indicada ou, sem ela, a atual; FileNotFoundError se não houver"""
+    if pasta_geracao is None:
+        manifesto = _ler_manifesto(Path(pasta))
+        if manifesto is None:
+            raise FileNotFoundError(f"Nenhum snapshot de features em {pasta}")
+        pasta_geracao = Path(pasta) / manifesto["geracao"]
+    return Snapshot(pasta_geracao)
+
+
+# ==============================================
+# GRAVAÇÃO
+# ==============================================
+
+def _nova_geracao(pasta: Path) -> Tuple[str, Path]:
+    nome = f"g{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    temporario = pasta / f"{nome}.tmp"
+    temporario.mkdir(parents=True)
+    (temporario / ".uso").touch()
+    return nome, temporario
+
+
+def _alocar(temporario: Path, linhas: int) -> Dict[str, np.ndarray]:
+    """Arquivos da geração já no tamanho final, preenchidos no lugar"""
+    def arquivo(nome, dtype, forma, fortran=False):
+        return np.lib.format.open_memmap(temporario / f"{nome}.npy", mode="w+", dtype=dtype,
+                                         shape=forma, fortran_order=fortran)
+    return {
+        "ids": arquivo("ids", np.int64, (linhas,)),
+        "cpfs": arquivo("cpfs", _CPF, (linhas,)),
+        "X": arquivo("X", np.float32, (linhas, len(FEATURES)), fortran=True),
+        "renda": arquivo("renda_mensal", np.float64, (linhas,)),
+    }
+
+
+def _publicar(pasta: Path, nome: str, temporario: Path, colunas: Dict[str, np.ndarray],
+              marca: Tuple[str, int]) -> Dict:
+    """Grava o índice de CPFs e o meta, e torna a geração a atual"""
+    for coluna in colunas.values():
+        coluna.flush()
+    np.save(temporario / "cpf_ordem.npy", np.argsort(colunas["cpfs"], kind="stable"))
+    meta = {
+        "features": list(FEATURES),
+        "linhas": len(colunas["ids"]),
+        "ultimo_id_cliente": int(colunas["ids"][-1]) if len(colunas["ids"]) else 0,
+        "ultimo_atualizado_em": marca[0],
+        "ultimo_id": marca[1],
+        "criado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    (temporario / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(temporario, pasta / nome)
+
+    provisorio = pasta / f"manifesto.{os.getpid()}.tmp"
+    provisorio.write_text(json.dumps({"geracao": nome}, indent=2), encoding="utf-8")
+    os.replace(provisorio, pasta / "manifesto.json")
+    return meta
+
+
+def _limpar(pasta: Path, atual: str):
+    """Remove as gerações além das SNAPSHOT_GERACOES mais novas que ninguém reserva"""
+    for sobra in pasta.glob("g*.tmp"):
+        # Só quem tem a trava de atualização grava: estas são de uma atualização interrompida
+        shutil.rmtree(sobra, ignore_errors=True)
+    geracoes = sorted((p for p in pasta.glob("g*") if p.is_dir() and p.name != atual), reverse=True)
+    for antiga in geracoes[max(0, SNAPSHOT_GERACOES - 1):]:
+        trava = _travar(antiga / ".uso", esperar=False)
+        if trava is None:
+            continue
+        try:
+            (antiga / "meta.json").unlink()
+            shutil.rmtree(antiga)
+        except OSError as e:
+            # Windows: arquivo ainda mapeado por algum processo
+            logger.info(f"Geração {antiga.name} do snapshot mantida: {e}")
+        finally:
+            trava.close()
+
+
+def _agora_banco(cursor):
+    cursor.execute("SELECT NOW(6)")
+    return cursor.fetchone()[0]
+
+
+def _linhas_em_arrays(linhas: Sequence[tuple]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    ids = np.fromiter((linha[0] for linha in linhas), dtype=np.int64, count=len(linhas))
+    cpfs = np.array([linha[1] for linha in linhas], dtype=_CPF)
+    features = np.array([linha[2:2 + len(FEATURES)] for linha in linhas], dtype=np.float64)
+    return ids, cpfs, features
+
+
+def _gravar_completo(connection, pasta: Path, bloco: int, atraso: float) -> Tuple[Dict, int]:
+    cursor = connection.cursor()
+    marca = (_agora_banco(cursor) - timedelta(seconds=atraso), 0)
+    # Fixa o intervalo de ids para que a contagem e a leitura coincidam
+    cursor.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM clientes")
+    total, ultimo_id = cursor.fetchone()
+
+    nome, temporario = _nova_geracao(pasta)
+    colunas = _alocar(temporario, total)
+    cursor = connection.cursor(buffered=False)
+    cursor.execute(f"SELECT {_COLUNAS} FROM clientes WHERE id <= %s ORDER BY id", (ultimo_id,))
+    inicio = 0
+    while True:
+        linhas = cursor.fetchmany(bloco)
+        if not linhas:
+            break
+        if inicio + len(linhas) > total:
+            raise RuntimeError("A tabela clientes mudou durante a leitura; tente de novo")
+        ids, cpfs, features = _linhas_em_arrays(linhas)
+        fim = inicio + len(linhas)
+        colunas["ids"][inicio:fim] = ids
+        colunas["cpfs"][inicio:fim] = cpfs
+        colunas["X"][inicio:fim] = features
+        colunas["renda"][inicio:fim] = features[:, _RENDA]
+        inicio = fim
+    cursor.close()
+    if inicio != total:
+        raise RuntimeError("A tabela clientes mudou durante a leitura; tente de novo")
+    return _publicar(pasta, nome, temporario, colunas, (str(marca[0]), marca[1])), total
+
+
+def _gravar_alterados(connection, pasta: Path, atual: Snapshot, bloco: int,
+                      atraso: float) -> Tuple[Optional[Dict], int]:
+    """
+    Nova geração com os clientes alterados desde a marca d'água da atual,
+    em ordem pelo índice (atualizado_em, id); None se nada mudou
+    """
+    ultimo_em = datetime.fromisoformat(atual.meta["ultimo_atualizado_em"])
+    ultimo_id = atual.meta["ultimo_id"]
+    cursor = connection.cursor()
+    limite_em = _agora_banco(cursor) - timedelta(seconds=atraso)
+    alterados = []
+    while True:
+        cursor.execute(f"""
+            SELECT {_COLUNAS}, atualizado_em FROM clientes
+            WHERE (atualizado_em > %s OR (atualizado_em = %s AND id > %s))
+              AND atualizado_em < %s
+            ORDER BY atualizado_em, id
+            LIMIT %s
+        """, (ultimo_em, ultimo_em, ultimo_id, limite_em, bloco))
+        linhas = cursor.fetchall()
+        if not linhas:
+            break
+        alterados.extend(linhas)
+        ultimo_em, ultimo_id = linhas[-1][-1], linhas[-1][0]
+    if not alterados:
+        return None, 0
+
+    ids, cpfs, features = _linhas_em_arrays(alterados)
+    ordem = np.argsort(ids, kind="stable")
+    ids, cpfs, features = ids[ordem], cpfs[ordem], features[ordem]
+    posicoes = np.minimum(np.searchsorted(atual.ids, ids), max(0, len(atual) - 1))
+    existentes = (atual.ids[posicoes] == ids) if len(atual) else np.zeros(len(ids), dtype=bool)
+    novos = ~existentes
+
+    nome, temporario = _nova_geracao(pasta)
+    colunas = _alocar(temporario, len(atual) + int(novos.sum()))
+    n = len(atual)
+    colunas["ids"][:n] = atual.ids
+    colunas["cpfs"][:n] = atual.cpfs
+    colunas["X"][:n] = atual.X
+    colunas["renda"][:n] = atual.renda
+    # Alterações sobre as linhas existentes, inclusões no fim
+    for destino, valores in ((posicoes[existentes], existentes), (np.arange(n, len(colunas["ids"])), novos)):
+        colunas["ids"][destino] = ids[valores]
+        colunas["cpfs"][destino] = cpfs[valores]
+        colunas["X"][destino] = features[valores]
+        colunas["renda"][destino] = features[valores, _RENDA]
+    if n and novos.any() and ids[novos][0] < atual.ids[-1]:
+        # Id menor que o último do snapshot (transação confirmada com atraso): reordena
+        ordem = np.argsort(colunas["ids"], kind="stable")
+        for coluna in colunas.values():
+            coluna[:] = coluna[ordem]
+    return _publicar(pasta, nome, temporario, colunas, (str(ultimo_em), int(ultimo_id))), len(alterados)
+
+
+def atualizar(pasta=SNAPSHOT_DIR, completo: bool = False, bloco: int = SNAPSHOT_BLOCO,
+              atraso: float = SNAPSHOT_ATRASO_S) -> Dict:
+    """
+    Traz o snapshot até agora menos `atraso` segundos: do zero se não
+    houver geração (ou com `completo`), senão só com os clientes alterados.
+    Uma atualização por vez entre processos. Retorna o resumo, com a
+    pasta da geração atual em "pasta".
+    """
+    inicio = time.perf_counter()
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    trava = _travar(pasta / ".atualizacao")
+    try:
+        manifesto = _ler_manifesto(pasta)
+        completo = completo or manifesto is None
+        connection = database.abrir_conexao()
+        try:
+            if completo:
+                meta, alterados = _gravar_completo(connection, pasta, bloco, atraso)
+            else:
+                meta, alterados = _gravar_alterados(
+                    connection, pasta, abrir(pasta / manifesto["geracao"]), bloco, atraso
+                )
+        finally:
+            connection.close()
+        atual = _ler_manifesto(pasta)["geracao"]
+        if meta is None:
+            meta = json.loads((pasta / atual / "meta.json").read_text(encoding="utf-8"))
+        _limpar(pasta, atual)
+    finally:
+        trava.close()
+
+    resumo = {
+        "geracao": atual,
+        "pasta": str(pasta / atual),
+        "modo": "completo" if completo else "incremental",
+        "linhas": meta["linhas"],
+        "alterados": alterados,
+        "duracao_s": round(time.perf_counter() - inicio, 3),
+    }
+    logger.info(f"Snapshot de features {resumo['modo']}: {alterados} clientes lidos, "
+                f"{meta['linhas']} linhas na geração {atual} ({resumo['duracao_s']}s)")
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot colunar das features dos clientes")
+    parser.add_argument("--pasta", default=SNAPSHOT_DIR)
+    parser.add_argument("--completo", action="store_true", help="Refaz o snapshot do zero")
+    parser.add_argument("--info", action="store_true", help="Mostra a geração atual e sai")
+    args = parser.parse_args()
+
+    if args.info:
+        snapshot = abrir(pasta=args.pasta)
+        print(json.dumps({"geracao": snapshot.pasta.name, **snapshot.meta}, indent=2))
+        return
+    resumo = atualizar(args.pasta, completo=args.completo)
+    print(f"Snapshot {resumo['modo']}: {resumo['alterados']} clientes lidos do banco, "
+          f"{resumo['linhas']} linhas na geração {resumo['geracao']} em {resumo['duracao_s']}s")
+
+
+if __name__ == "__main__":
+    main()
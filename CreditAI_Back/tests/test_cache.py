@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de análises (cache.CacheResultados) sobre os dois backends
+
+Cada teste roda com o LRU do processo (BackendLocal) e com o backend
+compartilhado sobre ClienteMemoria, o substituto local do Redis. O relógio
+do módulo é substituído, então o TTL expira sem esperar.
+
+Uso (a partir de CreditAI_Back/):
+    python -m pytest -q tests
+"""
+
+import types
+
+import pytest
+
+import cache
+from cache import BackendCompartilhado, BackendLocal, CacheResultados, ClienteMemoria
+
+ATUALIZADO_EM = "2024-05-01 10:00:00"
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = {"t": 1000.0}
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(monotonic=lambda: agora["t"]))
+    return agora
+
+
+@pytest.fixture(params=["local", "compartilhado"])
+def resultados(request, relogio):
+    backend = BackendLocal(max_itens=3) if request.param == "local" \
+        else BackendCompartilhado(ClienteMemoria())
+    return CacheResultados(backend, ttl=10.0, versao_modelo="m1", versao_regras="r1")
+
+
+def resposta(cpf: str) -> dict:
+    return {"cpf": cpf, "aprovado": True, "limite": 1500.0, "motivos": []}
+
+
+def ler(resultados: CacheResultados, cpf: str, atualizado_em=ATUALIZADO_EM):
+    """O caminho da API: entrada das versões atuais, confirmada pelo atualizado_em do banco"""
+    entrada = resultados.obter_entrada(cpf)
+    if entrada is None:
+        return None
+    entrada = resultados.confirmar(cpf, entrada, atualizado_em)
+    return entrada["resposta"] if entrada is not None else None
+
+
+def test_acerto_depois_de_gravar(resultados):
+    assert ler(resultados, "1") is None
+    resultados.gravar("1", resposta("1"), ATUALIZADO_EM, etag='"e1"')
+
+    assert ler(resultados, "1") == resposta("1")
+    assert resultados.obter_entrada("1")["etag"] == '"e1"'
+    estatisticas = resultados.estatisticas()
+    assert (estatisticas["hits"], estatisticas["misses"]) == (1, 1)
+    assert estatisticas["taxa_acerto"] == 0.5
+
+
+def test_ttl_expira(resultados, relogio):
+    resultados.gravar("1", resposta("1"), ATUALIZADO_EM)
+    relogio["t"] += 9.9
+    assert ler(resultados, "1") == resposta("1")
+    relogio["t"] += 0.2
+    assert ler(resultados, "1") is None
+
+
+def test_lru_descarta_o_menos_usado(resultados):
+    if not isinstance(resultados.backend, BackendLocal):
+        pytest.skip("No backend compartilhado o LRU é do servidor (maxmemory-policy)")
+    for cpf in "123":
+        resultados.gravar(cpf, resposta(cpf), ATUALIZADO_EM)
+    assert ler(resultados, "1") is not None  # "2" passa a ser o menos usado
+    resultados.gravar("4", resposta("4"), ATUALIZADO_EM)
+
+    assert ler(resultados, "2") is None
+    assert all(ler(resultados, cpf) is not None for cpf in "134")
+    estatisticas = resultados.estatisticas()
+    assert (estatisticas["itens"], estatisticas["evictions"]) == (3, 1)
+
+
+def test_outra_versao_do_modelo_ou_das_regras_nao_acerta(resultados):
+    resultados.gravar("1", resposta("1"), ATUALIZADO_EM)
+
+    resultados.versao_regras = "r2"
+    assert ler(resultados, "1") is None
+    resultados.versao_regras = "r1"
+    assert ler(resultados, "1") == resposta("1")
+
+    resultados.versao_modelo = "m2"
+    assert ler(resultados, "1") is None
+
+
+def test_definir_versao_modelo_descarta_tudo(resultados):
+    for cpf in "12":
+        resultados.gravar(cpf, resposta(cpf), ATUALIZADO_EM)
+    resultados.definir_versao_modelo("m1")  # mesma versão: nada muda
+    assert ler(resultados, "1") is not None
+
+    resultados.definir_versao_modelo("m2")
+    assert ler(resultados, "1") is None and ler(resultados, "2") is None
+    assert resultados.estatisticas()["versao_modelo"] == "m2"
+    if isinstance(resultados.backend, BackendLocal):
+        assert len(resultados.backend) == 0
+
+    resultados.gravar("1", resposta("1"), ATUALIZADO_EM)
+    assert ler(resultados, "1") == resposta("1")
+
+
+def test_invalidar_depois_de_escrita(resultados):
+    for cpf in "12":
+        resultados.gravar(cpf, resposta(cpf), ATUALIZADO_EM)
+    resultados.invalidar("1")
+
+    assert ler(resultados, "1") is None
+    assert ler(resultados, "2") == resposta("2")
+    assert resultados.estatisticas()["invalidacoes"] == 1
+
+
+def test_confirmar_rejeita_atualizado_em_diferente(resultados):
+    resultados.gravar("1", resposta("1"), ATUALIZADO_EM)
+
+    # Linha reescrita por outro processo, sem passar por invalidar()
+    assert ler(resultados, "1", atualizado_em="2024-05-01 10:00:07") is None
+    # A entrada obsoleta foi descartada: nem o atualizado_em antigo a traz de volta
+    assert ler(resultados, "1") is None
+    # Cliente removido (buscar_atualizado_em devolve None)
+    resultados.gravar("2", resposta("2"), ATUALIZADO_EM)
+    assert ler(resultados, "2", atualizado_em=None) is None
+
+    estatisticas = resultados.estatisticas()
+    assert estatisticas["obsoletas"] == 2
+    assert (estatisticas["hits"], estatisticas["misses"]) == (0, 3)
+
+
+def test_desligado_nao_guarda_nem_conta(relogio):
+    resultados = CacheResultados(BackendLocal(), versao_modelo="m1", versao_regras="r1", ativo=False)
+    resultados.gravar("1", resposta("1"), ATUALIZADO_EM)
+    assert resultados.obter_entrada("1") is None
+    assert resultados.estatisticas()["misses"] == 0
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Roteamento de leituras (replicas.RoteadorLeituras) sobre duas réplicas de teste
+
+As réplicas são pools falsos com contagem de conexões em uso ajustável, o
+atraso de replicação vem de um medir_atraso injetado e o relógio do módulo
+é substituído, então a janela de leitura-após-escrita expira sem esperar.
+
+Uso (a partir de CreditAI_Back/):
+    python -m pytest -q tests
+"""
+
+from contextlib import contextmanager
+import types
+
+import mysql.connector
+import pytest
+
+import replicas
+from replicas import Replica, RoteadorLeituras
+
+
+class PoolFalso:
+    """O que o roteador e database.adquirir_leitura usam de database.PoolConexoes"""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.em_uso = 0
+        self.fora_do_ar = False
+
+    @contextmanager
+    def conexao(self, timeout=None):
+        if self.fora_do_ar:
+            raise mysql.connector.Error(msg=f"{self.nome} não responde")
+        yield self
+
+    def adquirir(self, timeout=None):
+        if self.fora_do_ar:
+            raise mysql.connector.Error(msg=f"{self.nome} não responde")
+        return self
+
+    def estatisticas(self):
+        return {"em_uso": self.em_uso}
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = {"t": 1000.0}
+    falso = types.SimpleNamespace(monotonic=lambda: agora["t"], time=lambda: agora["t"])
+    monkeypatch.setattr(replicas, "time", falso)
+    return agora
+
+
+@pytest.fixture
+def atrasos():
+    """Atraso devolvido por medir_atraso para cada réplica (None: replicação parada)"""
+    return {"r1": 0.0, "r2": 0.0}
+
+
+@pytest.fixture
+def roteador(relogio, atrasos):
+    pools = [PoolFalso("r1"), PoolFalso("r2")]
+    roteador = RoteadorLeituras(
+        [Replica(pool.nome, pool) for pool in pools],
+        janela=5.0,
+        atraso_max=5.0,
+        medir_atraso=lambda connection: atrasos[connection.nome],
+    )
+    roteador.verificar()
+    return roteador
+
+
+def nomes(roteador, vezes: int = 10, chaves=("11111111111",)):
+    escolhas = [roteador.escolher(list(chaves) if chaves is not None else None) for _ in range(vezes)]
+    return {replica.nome if replica else None for replica in escolhas}
+
+
+def test_sem_escritas_le_das_replicas(roteador):
+    assert nomes(roteador) == {"r1", "r2"}
+    assert nomes(roteador, chaves=None) == {"r1", "r2"}
+
+
+def test_janela_de_leitura_apos_escrita_por_cpf(roteador, relogio):
+    roteador.registrar_escrita(["11111111111"])
+
+    assert nomes(roteador, chaves=["11111111111"]) == {None}
+    assert nomes(roteador, chaves=["22222222222", "11111111111"]) == {None}
+    assert nomes(roteador, chaves=["22222222222"]) == {"r1", "r2"}
+
+    relogio["t"] += 4.9
+    assert nomes(roteador, chaves=["11111111111"]) == {None}
+    relogio["t"] += 0.2
+    assert nomes(roteador, chaves=["11111111111"]) == {"r1", "r2"}
+    assert roteador.estatisticas()["leituras_primario_janela"] == 30
+
+
+def test_leituras_sem_chave_vao_ao_primario_apos_qualquer_escrita(roteador, relogio):
+    roteador.registrar_escrita(["11111111111"])
+    assert nomes(roteador, chaves=None) == {None}
+
+    relogio["t"] += 5.1
+    assert nomes(roteador, chaves=None) == {"r1", "r2"}
+
+
+def test_replica_atrasada_ou_parada_sai_e_volta(roteador, atrasos):
+    atrasos["r1"] = 30.0
+    atrasos["r2"] = None
+    roteador.verificar()
+    estado = roteador.estatisticas()["replicas"]
+    assert not estado["r1"]["saudavel"] and "atraso" in estado["r1"]["erro"]
+    assert not estado["r2"]["saudavel"] and estado["r2"]["erro"] == "replicação parada"
+    assert nomes(roteador) == {None}
+    assert roteador.estatisticas()["leituras_primario_sem_replica"] == 10
+
+    atrasos["r1"] = 1.0
+    roteador.verificar()
+    assert nomes(roteador) == {"r1"}
+
+    atrasos["r2"] = 0.0
+    roteador.verificar()
+    assert nomes(roteador) == {"r1", "r2"}
+
+
+def test_replica_fora_do_ar_sai_na_verificacao(roteador):
+    roteador.replicas[1].pool.fora_do_ar = True
+    roteador.verificar()
+    assert nomes(roteador) == {"r1"}
+
+    roteador.replicas[1].pool.fora_do_ar = False
+    roteador.verificar()
+    assert nomes(roteador) == {"r1", "r2"}
+
+
+def test_falhou_tira_a_replica_ate_a_proxima_verificacao(roteador):
+    r2 = roteador.replicas[1]
+    roteador.falhou(r2, mysql.connector.Error(msg="Can't connect"))
+    assert not r2.saudavel and "Can't connect" in r2.erro
+    assert nomes(roteador) == {"r1"}
+
+    roteador.verificar()
+    assert r2.saudavel and r2.erro is None
+    assert nomes(roteador) == {"r1", "r2"}
+
+
+def test_erro_de_conexao_na_leitura_cai_no_primario(roteador, monkeypatch):
+    import database
+
+    primario = PoolFalso("primario")
+    monkeypatch.setattr(database, "leituras", roteador)
+    monkeypatch.setattr(database, "pool", primario)
+    r1, r2 = roteador.replicas
+    r1.pool.fora_do_ar = True
+    r2.pool.em_uso = 1  # a leitura escolhe r1
+
+    origem, conexao = database.adquirir_leitura(["22222222222"])
+    assert origem is primario and conexao is primario
+    assert not r1.saudavel and "não responde" in r1.erro
+    assert database.adquirir_leitura(["22222222222"])[0] is r2.pool
+
+
+def test_escolhe_a_replica_com_menos_conexoes_em_uso(roteador):
+    r1, r2 = roteador.replicas
+    r1.pool.em_uso = 3
+    r2.pool.em_uso = 1
+    assert nomes(roteador) == {"r2"}
+
+    r2.pool.em_uso = 5
+    assert nomes(roteador) == {"r1"}
+
+    # Empate: rodízio entre as duas
+    r1.pool.em_uso = r2.pool.em_uso = 2
+    antes = r1.leituras, r2.leituras
+    nomes(roteador, vezes=10)
+    assert (r1.leituras - antes[0], r2.leituras - antes[1]) == (5, 5)
+
+
+def test_sem_replicas_tudo_vai_ao_primario(relogio):
+    roteador = RoteadorLeituras([], medir_atraso=lambda connection: 0.0)
+    roteador.registrar_escrita(["11111111111"])
+    assert roteador.escolher(["11111111111"]) is None
+    assert roteador.escolher() is None
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Paridade do motor compilado (scoring.FlorestaCompilada) com o scikit-learn
+
+Além de linhas aleatórias, cada limiar de cada nó é testado exatamente no
+valor, no float32 vizinho acima e no vizinho abaixo: é onde o
+arredondamento de limiares_float32 poderia mudar o lado da comparação.
+
+Uso (a partir de CreditAI_Back/):
+    python -m pytest -q tests
+"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from benchmarks.sintetico import gerar_features, gerar_rotulos
+from scoring import FlorestaCompilada, limiares_float32
+
+
+@pytest.fixture(scope="module", params=["sintetico", "continuo"])
+def floresta(request):
+    """Floresta nas features sintéticas da API e outra com features contínuas arbitrárias"""
+    if request.param == "sintetico":
+        X = gerar_features(4000, semente=1)
+        y = gerar_rotulos(X, semente=1)
+    else:
+        rng = np.random.default_rng(2)
+        X = rng.normal(0, 1e3, size=(4000, 6)) * rng.random((1, 6))
+        y = (X[:, 0] + X[:, 3] * X[:, 5] / 1e3 + rng.normal(0, 50, 4000) > 0).astype(int)
+    return RandomForestClassifier(n_estimators=15, max_depth=12, random_state=0).fit(X, y)
+
+
+def compilados(modelo):
+    """Travessia simultânea (sem delegar lotes) e travessia árvore a árvore"""
+    compilado = FlorestaCompilada.compilar(modelo)
+    return {
+        "simultanea": FlorestaCompilada(**vetores(compilado), limiar_lote=10 ** 9),
+        "por_arvore": FlorestaCompilada(**vetores(compilado), limiar_lote=0),
+    }
+
+
+def vetores(compilado: FlorestaCompilada):
+    """Mesmos vetores, sem o estimador de origem (força a travessia em NumPy)"""
+    return {
+        "feature": compilado.feature, "threshold": compilado.threshold, "filhos": compilado.filhos,
+        "valores": compilado.valores, "raizes": compilado.raizes,
+        "profundidades": compilado.profundidades, "classes": compilado.classes_,
+        "n_features": compilado.n_features_in_,
+    }
+
+
+def linhas_nos_limiares(modelo, n_features: int) -> np.ndarray:
+    """Uma linha por (nó, deslocamento) com a feature do nó no limiar ou nos float32 vizinhos"""
+    rng = np.random.default_rng(3)
+    linhas = []
+    for estimador in modelo.estimators_:
+        arvore = estimador.tree_
+        internos = arvore.children_left != -1
+        for feature, limiar in zip(arvore.feature[internos], arvore.threshold[internos]):
+            limiar32 = np.float32(limiar)
+            for valor in (limiar, limiar32, np.nextafter(limiar32, np.float32(np.inf)),
+                          np.nextafter(limiar32, np.float32(-np.inf))):
+                linha = rng.normal(0, 1e3, n_features)
+                linha[feature] = valor
+                linhas.append(linha)
+    return np.asarray(linhas)
+
+
+def conferir(modelo, compilado, X):
+    np.testing.assert_allclose(compilado.predict_proba(X), modelo.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(compilado.predict(X), modelo.predict(X))
+
+
+@pytest.mark.parametrize("travessia", ["simultanea", "por_arvore"])
+def test_paridade_linhas_aleatorias(floresta, travessia):
+    compilado = compilados(floresta)[travessia]
+    rng = np.random.default_rng(4)
+    X = np.vstack([
+        gerar_features(500, semente=9),
+        rng.uniform(-1e4, 1e4, size=(500, 6)),
+    ])
+    conferir(floresta, compilado, X)
+
+
+@pytest.mark.parametrize("travessia", ["simultanea", "por_arvore"])
+def test_paridade_nos_limiares(floresta, travessia):
+    compilado = compilados(floresta)[travessia]
+    X = linhas_nos_limiares(floresta, compilado.n_features_in_)
+    for inicio in range(0, len(X), 2000):
+        conferir(floresta, compilado, X[inicio:inicio + 2000])
+
+
+def test_paridade_linha_unica(floresta):
+    compilado = compilados(floresta)["simultanea"]
+    for linha in linhas_nos_limiares(floresta, compilado.n_features_in_)[:200]:
+        conferir(floresta, compilado, linha.reshape(1, -1))
+
+
+def test_limiares_float32_nao_ultrapassam():
+    rng = np.random.default_rng(5)
+    limiares = np.concatenate([rng.normal(0, 1e4, 10000), rng.random(10000), [0.0, 0.5, 1e-40, -1e-40]])
+    limiar32 = limiares_float32(limiares)
+    assert limiar32.dtype == np.float32
+    assert np.all(limiar32.astype(np.float64) <= limiares)
+    # É o maior float32 que não ultrapassa: o vizinho acima já ultrapassa
+    acima = np.nextafter(limiar32, np.float32(np.inf)).astype(np.float64)
+    assert np.all(acima > limiares)
@@ -22,6 +22,6 @@ export class AppComponent {
   constructor(private creditoService: CreditoService) {}
 
   onAnalisar(cliente: Cliente) {
-    this.resultado = this.creditoService.analisar(cliente);
+    this.creditoService.analisar(cliente).subscribe((resultado) => (this.resultado = resultado));
   }
 }
\ No newline at end of file
@@ -5,6 +5,7 @@ import { FormsModule } from '@angular/forms';
 import { Router, RouterModule } from '@angular/router';
 import { NgxMaskDirective } from 'ngx-mask';
 import { ApiService } from '../../services/api.service';
+import { CreditoService } from '../../services/credito.service';
 import { ResultadoAnalise } from '../../models/cliente.model';
 
 @Component({
@@ -25,7 +26,8 @@ export class FormularioComponent {
 
   constructor(
     private router: Router,
-    private apiService: ApiService
+    private apiService: ApiService,
+    private creditoService: CreditoService
   ) { }
 
   cliente: Cliente & { pagamentosEmDia: boolean } = {
@@ -89,7 +91,7 @@ export class FormularioComponent {
     this.apiService.adicionarCliente(clienteParaEnviar).subscribe({
       next: () => {
         // Depois faz a análise de crédito
-        this.apiService.analisarCredito(this.cliente.cpf.replace(/\D/g, '')).subscribe({
+        this.creditoService.analisarNoServidor(this.cliente.cpf.replace(/\D/g, '')).subscribe({
           next: (resultado: ResultadoAnalise) => {
             this.loading = false;
             this.router.navigate(['/resultado'], {
@@ -20,4 +20,36 @@ export interface ResultadoAnalise {
   limiteAprovado?: number;
   motivosNegacao: string[];  // Ex: ["Score baixo", "Restrições SPC"]
   sugestoes: string[];       // Ex: ["Regularize seu nome", "Aumente seu score"]
-}
\ No newline at end of file
+}
+
+// Resposta de POST /analise-credito
+export interface AnaliseCredito {
+  aprovado: boolean;
+  limite: number;
+  probabilidade: number;
+  motivos: string[];
+  codigos: string[];
+}
+
+// Regras de decisão servidas por GET /regras (regras.json do backend)
+export type CondicaoRegra =
+  | { campo: string; op: '<' | '<=' | '>' | '>=' | '==' | '!='; valor: number }
+  | { qualquer: CondicaoRegra[] }
+  | { todas: CondicaoRegra[] };
+
+export interface MotivoRegra {
+  codigo: string;
+  motivo: string;
+  sugestao?: string;
+}
+
+export interface CriterioRegra extends MotivoRegra {
+  quando: CondicaoRegra;
+}
+
+export interface RegrasCredito {
+  versao: string;
+  modelo: Record<'reprovado' | 'erro' | 'indisponivel', MotivoRegra>;
+  criterios: CriterioRegra[];
+  limite: { fracao_renda: number; escala_score: number };
+}
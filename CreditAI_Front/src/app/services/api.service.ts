@@ -1,9 +1,8 @@
 // src/app/services/api.service.ts
 import { Injectable } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
+import { HttpClient, HttpParams } from '@angular/common/http';
 import { Observable } from 'rxjs';
-import { Cliente } from '../models/cliente.model';
-import { ResultadoAnalise } from '../models/cliente.model';
+import { AnaliseCredito, Cliente, RegrasCredito } from '../models/cliente.model';
 import { environment } from '../../environments/environment';
 
 @Injectable({
@@ -47,11 +46,24 @@ export class ApiService {
     return this.http.get<Cliente>(`${this.apiUrl}/clientes/${cpf}`);
   }
 
-  analisarCredito(cpf: string): Observable<ResultadoAnalise> {
-    return this.http.post<ResultadoAnalise>(`${this.apiUrl}analise-credito`, { cpf });
+  // GET para que a análise possa ser revalidada pelo ETag (cache-condicional.interceptor.ts)
+  analisarCredito(cpf: string): Observable<AnaliseCredito> {
+    return this.http.get<AnaliseCredito>(`${this.apiUrl}/analise-credito/${cpf}`);
   }
 
-  listarClientes(): Observable<any> {
-    return this.http.get(`${this.apiUrl}/clientes`);
+  // Regras de decisão em serviço no backend (a mesma fonte da análise)
+  obterRegras(): Observable<RegrasCredito> {
+    return this.http.get<RegrasCredito>(`${this.apiUrl}/regras`);
+  }
+
+  // Paginação por cursor: passe o `proximo` da resposta anterior em `after`
+  listarClientes(filtros: { nome?: string; limit?: number; after?: number; campos?: string } = {}): Observable<any> {
+    let params = new HttpParams();
+    Object.entries(filtros).forEach(([chave, valor]) => {
+      if (valor !== undefined && valor !== null && valor !== '') {
+        params = params.set(chave, String(valor));
+      }
+    });
+    return this.http.get(`${this.apiUrl}/clientes`, { params });
   }
 }
\ No newline at end of file
@@ -0,0 +1,53 @@
+/* tslint:disable:no-unused-variable */
+
+import { TestBed, waitForAsync, inject } from '@angular/core/testing';
+import { HttpClient, provideHttpClient, withInterceptors } from '@angular/common/http';
+import { HttpTestingController, provideHttpClientTesting } from '@angular/common/http/testing';
+import { cacheCondicionalInterceptor } from './cache-condicional.interceptor';
+
+describe('Interceptor: CacheCondicional', () => {
+  beforeEach(() => {
+    TestBed.configureTestingModule({
+      providers: [
+        provideHttpClient(withInterceptors([cacheCondicionalInterceptor])),
+        provideHttpClientTesting(),
+      ]
+    });
+  });
+
+  it('reaproveita a resposta guardada no 304', waitForAsync(inject(
+    [HttpClient, HttpTestingController],
+    (http: HttpClient, controle: HttpTestingController) => {
+      const corpos: unknown[] = [];
+      http.get('/clientes?limit=10').subscribe((corpo) => corpos.push(corpo));
+      const primeira = controle.expectOne('/clientes?limit=10');
+      expect(primeira.request.headers.has('If-None-Match')).toBeFalse();
+      primeira.flush({ clientes: [], total: 0, proximo: null }, { headers: { ETag: '"abc-gzip"' } });
+
+      http.get('/clientes?limit=10').subscribe((corpo) => corpos.push(corpo));
+      const segunda = controle.expectOne('/clientes?limit=10');
+      expect(segunda.request.headers.get('If-None-Match')).toBe('"abc-gzip"');
+      segunda.flush(null, { status: 304, statusText: 'Not Modified' });
+
+      expect(corpos).toEqual([
+        { clientes: [], total: 0, proximo: null },
+        { clientes: [], total: 0, proximo: null },
+      ]);
+      controle.verify();
+    }
+  )));
+
+  it('não guarda respostas sem ETag nem altera outros métodos', waitForAsync(inject(
+    [HttpClient, HttpTestingController],
+    (http: HttpClient, controle: HttpTestingController) => {
+      http.get('/regras').subscribe();
+      controle.expectOne('/regras').flush({});
+      http.get('/regras').subscribe();
+      expect(controle.expectOne('/regras').request.headers.has('If-None-Match')).toBeFalse();
+
+      http.post('/clientes', {}).subscribe();
+      expect(controle.expectOne('/clientes').request.headers.has('If-None-Match')).toBeFalse();
+      controle.verify();
+    }
+  )));
+});
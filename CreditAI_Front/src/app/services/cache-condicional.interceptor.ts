@@ -0,0 +1,61 @@
+import { Injectable, inject } from '@angular/core';
+import { HttpErrorResponse, HttpInterceptorFn, HttpResponse } from '@angular/common/http';
+import { catchError, of, tap, throwError } from 'rxjs';
+
+// Últimas respostas GET com ETag, por URL (com os parâmetros)
+@Injectable({
+  providedIn: 'root',
+})
+export class CacheCondicional {
+  private readonly respostas = new Map<string, HttpResponse<unknown>>();
+  readonly maxItens = 200;
+
+  obter(url: string): HttpResponse<unknown> | undefined {
+    const resposta = this.respostas.get(url);
+    if (resposta) {
+      // Reinsere para manter a ordem de uso (a primeira chave é a menos recente)
+      this.respostas.delete(url);
+      this.respostas.set(url, resposta);
+    }
+    return resposta;
+  }
+
+  guardar(url: string, resposta: HttpResponse<unknown>): void {
+    this.respostas.delete(url);
+    this.respostas.set(url, resposta);
+    if (this.respostas.size > this.maxItens) {
+      this.respostas.delete(this.respostas.keys().next().value!);
+    }
+  }
+
+  limpar(): void {
+    this.respostas.clear();
+  }
+}
+
+// Revalida GETs já respondidos com If-None-Match: no 304 o backend não refaz
+// a análise nem a listagem e o corpo guardado é entregue como se tivesse vindo
+export const cacheCondicionalInterceptor: HttpInterceptorFn = (requisicao, next) => {
+  if (requisicao.method !== 'GET') {
+    return next(requisicao);
+  }
+  const cache = inject(CacheCondicional);
+  const url = requisicao.urlWithParams;
+  const guardada = cache.obter(url);
+  const etag = guardada?.headers.get('ETag');
+  const enviada = etag ? requisicao.clone({ setHeaders: { 'If-None-Match': etag } }) : requisicao;
+
+  return next(enviada).pipe(
+    tap((evento) => {
+      if (evento instanceof HttpResponse && evento.headers.has('ETag')) {
+        cache.guardar(url, evento);
+      }
+    }),
+    catchError((erro) => {
+      if (guardada && erro instanceof HttpErrorResponse && erro.status === 304) {
+        return of(guardada);
+      }
+      return throwError(() => erro);
+    })
+  );
+};
@@ -1,11 +1,49 @@
 /* tslint:disable:no-unused-variable */
 
 import { TestBed, waitForAsync, inject } from '@angular/core/testing';
+import { HttpClientTestingModule, HttpTestingController } from '@angular/common/http/testing';
+import { Cliente, RegrasCredito, ResultadoAnalise } from '../models/cliente.model';
 import { CreditoService } from './credito.service';
 
+const REGRAS: RegrasCredito = {
+  versao: '2',
+  modelo: {
+    reprovado: { codigo: 'MODELO_REPROVOU', motivo: 'Reprovado pelo modelo de análise' },
+    erro: { codigo: 'MODELO_ERRO', motivo: 'Erro na análise automatizada' },
+    indisponivel: { codigo: 'MODELO_INDISPONIVEL', motivo: 'Sistema de análise indisponível' },
+  },
+  criterios: [
+    {
+      codigo: 'SCORE_BAIXO',
+      quando: { campo: 'score', op: '<', valor: 400 },
+      motivo: 'Score abaixo do mínimo ({valor})',
+      sugestao: 'Melhore seu score pagando contas em dia',
+    },
+    {
+      codigo: 'ATRASOS_GRAVES',
+      quando: { campo: 'atrasos_90_dias', op: '>', valor: 0 },
+      motivo: '{atrasos_90_dias} atrasos graves',
+    },
+  ],
+  limite: { fracao_renda: 0.5, escala_score: 1000 },
+};
+
+function cliente(score: number, atrasos30Dias: number, atrasos90Dias: number): Cliente {
+  return {
+    nome: 'Teste',
+    cpf: '12345678901',
+    score,
+    possuiRestricoesSPC: false,
+    historicoPagamentos: { atrasos30Dias, atrasos60Dias: 0, atrasos90Dias },
+    rendaMensal: 5000,
+    solicitacao: { tipo: 'liberacao' },
+  };
+}
+
 describe('Service: Credito', () => {
   beforeEach(() => {
     TestBed.configureTestingModule({
+      imports: [HttpClientTestingModule],
       providers: [CreditoService]
     });
   });
@@ -13,4 +51,41 @@ describe('Service: Credito', () => {
   it('should ...', inject([CreditoService], (service: CreditoService) => {
     expect(service).toBeTruthy();
   }));
+
+  it('aplica as regras do backend', waitForAsync(inject(
+    [CreditoService, HttpTestingController],
+    (service: CreditoService, http: HttpTestingController) => {
+      const resultados: ResultadoAnalise[] = [];
+      service.analisar(cliente(700, 3, 0)).subscribe((resultado) => resultados.push(resultado));
+      service.analisar(cliente(350, 0, 2)).subscribe((resultado) => resultados.push(resultado));
+      http.expectOne((requisicao) => requisicao.url.endsWith('/regras')).flush(REGRAS);
+
+      // Atrasos de 30 dias não reprovam: só os critérios de regras.json contam
+      expect(resultados[0]).toEqual({ aprovado: true, limiteAprovado: 1750, motivosNegacao: [], sugestoes: [] });
+      expect(resultados[1].aprovado).toBeFalse();
+      expect(resultados[1].motivosNegacao).toEqual(['Score abaixo do mínimo (400)', '2 atrasos graves']);
+      expect(resultados[1].sugestoes).toEqual(['Melhore seu score pagando contas em dia']);
+      http.verify();
+    }
+  )));
+
+  it('substitui todas as ocorrências de {valor}, como o backend', waitForAsync(inject(
+    [CreditoService, HttpTestingController],
+    (service: CreditoService, http: HttpTestingController) => {
+      const regras: RegrasCredito = {
+        ...REGRAS,
+        criterios: [{
+          codigo: 'SCORE_BAIXO',
+          quando: { campo: 'score', op: '<', valor: 400 },
+          motivo: 'Score {score} abaixo de {valor}; mínimo exigido: {valor}',
+        }],
+      };
+      const resultados: ResultadoAnalise[] = [];
+      service.analisar(cliente(350, 0, 0)).subscribe((resultado) => resultados.push(resultado));
+      http.expectOne((requisicao) => requisicao.url.endsWith('/regras')).flush(regras);
+
+      expect(resultados[0].motivosNegacao).toEqual(['Score 350 abaixo de 400; mínimo exigido: 400']);
+      http.verify();
+    }
+  )));
 });
@@ -1,54 +1,109 @@
 import { Injectable } from '@angular/core';
-import { Cliente, ResultadoAnalise } from '../models/cliente.model';
+import { Observable, map, shareReplay, switchMap } from 'rxjs';
+import {
+  AnaliseCredito,
+  Cliente,
+  CondicaoRegra,
+  MotivoRegra,
+  RegrasCredito,
+  ResultadoAnalise,
+} from '../models/cliente.model';
+import { ApiService } from './api.service';
 
+// Regras de decisão definidas uma única vez no backend (regras.json, servidas
+// por GET /regras): este serviço só interpreta as condições e os textos de lá
 @Injectable({
   providedIn: 'root',
 })
 export class CreditoService {
-  private readonly SCORE_MINIMO = 400;
-  private readonly PORCENTAGEM_RENDA = 0.5;
+  private readonly regras$: Observable<RegrasCredito>;
 
-  analisar(cliente: Cliente): ResultadoAnalise {
-    const { motivos, sugestoes } = this.avaliarCriticos(cliente);
-    const aprovado = motivos.length === 0;
+  constructor(private apiService: ApiService) {
+    this.regras$ = this.apiService.obterRegras().pipe(shareReplay(1));
+  }
+
+  // Pré-avaliação local pelos critérios do backend (sem o modelo de ML)
+  analisar(cliente: Cliente): Observable<ResultadoAnalise> {
+    return this.regras$.pipe(
+      map((regras) => {
+        const valores = this.features(cliente);
+        const criterios = regras.criterios.filter((criterio) => this.avaliar(criterio.quando, valores));
+        const aprovado = criterios.length === 0;
+        return {
+          aprovado,
+          limiteAprovado: aprovado ? this.calcularLimite(regras, valores) : undefined,
+          motivosNegacao: criterios.map((criterio) => this.texto(criterio.motivo, criterio.quando, valores)),
+          sugestoes: this.sugestoes(criterios),
+        };
+      })
+    );
+  }
 
+  // Análise completa no backend, com as sugestões dos códigos devolvidos
+  analisarNoServidor(cpf: string): Observable<ResultadoAnalise> {
+    return this.apiService.analisarCredito(cpf).pipe(
+      switchMap((analise) => this.regras$.pipe(map((regras) => this.deAnalise(analise, regras))))
+    );
+  }
+
+  deAnalise(analise: AnaliseCredito, regras: RegrasCredito): ResultadoAnalise {
+    const porCodigo = new Map<string, MotivoRegra>(
+      [...Object.values(regras.modelo), ...regras.criterios].map((motivo): [string, MotivoRegra] => [motivo.codigo, motivo])
+    );
     return {
-      aprovado,
-      limiteAprovado: aprovado ? this.calcularLimite(cliente) : undefined,
-      motivosNegacao: motivos,
-      sugestoes,
+      aprovado: analise.aprovado,
+      limiteAprovado: analise.aprovado ? analise.limite : undefined,
+      motivosNegacao: analise.motivos,
+      sugestoes: this.sugestoes(analise.codigos.map((codigo) => porCodigo.get(codigo))),
     };
   }
 
-  private avaliarCriticos(cliente: Cliente): { motivos: string[]; sugestoes: string[] } {
-    const motivos: string[] = [];
-    const sugestoes: string[] = [];
+  // Mesmos nomes e valores das colunas do backend (analise.FEATURES)
+  private features(cliente: Cliente): Record<string, number> {
+    const historico = cliente.historicoPagamentos;
+    return {
+      score: Number(cliente.score),
+      possui_restricoes: cliente.possuiRestricoesSPC ? 1 : 0,
+      atrasos_30_dias: Number(historico.atrasos30Dias) || 0,
+      atrasos_60_dias: Number(historico.atrasos60Dias) || 0,
+      atrasos_90_dias: Number(historico.atrasos90Dias) || 0,
+      renda_mensal: Number(cliente.rendaMensal),
+    };
+  }
 
-    // Avaliação de score
-    if (cliente.score < this.SCORE_MINIMO) {
-      motivos.push(`Score muito baixo (mínimo: ${this.SCORE_MINIMO})`);
-      sugestoes.push('Melhore seu score pagando contas em dia');
+  private avaliar(condicao: CondicaoRegra, valores: Record<string, number>): boolean {
+    if ('qualquer' in condicao) {
+      return condicao.qualquer.some((parte) => this.avaliar(parte, valores));
     }
-
-    // Avaliação de restrições
-    if (cliente.possuiRestricoesSPC) {
-      motivos.push('Restrições no SPC/Serasa');
-      sugestoes.push('Regularize seu nome para liberação');
+    if ('todas' in condicao) {
+      return condicao.todas.every((parte) => this.avaliar(parte, valores));
     }
-
-    // Avaliação de histórico de pagamentos
-    const { atrasos30Dias, atrasos60Dias, atrasos90Dias } = cliente.historicoPagamentos;
-    if (atrasos30Dias > 2 || atrasos60Dias > 0 || atrasos90Dias > 0) {
-      motivos.push('Histórico de pagamentos com atrasos significativos');
-      sugestoes.push('Mantenha seus pagamentos em dia para melhorar sua análise');
+    const valor = valores[condicao.campo];
+    switch (condicao.op) {
+      case '<': return valor < condicao.valor;
+      case '<=': return valor <= condicao.valor;
+      case '>': return valor > condicao.valor;
+      case '>=': return valor >= condicao.valor;
+      case '==': return valor === condicao.valor;
+      case '!=': return valor !== condicao.valor;
     }
+  }
+
+  // {valor} é o limiar da condição; {campo}, o valor inteiro da feature
+  private texto(modelo: string, condicao: CondicaoRegra, valores: Record<string, number>): string {
+    const limiar = 'valor' in condicao ? String(condicao.valor) : '{valor}';
+    return modelo
+      .replaceAll('{valor}', limiar)
+      .replace(/\{(\w+)\}/g, (trecho, campo) => (campo in valores ? String(Math.trunc(valores[campo])) : trecho));
+  }
 
-    return { motivos, sugestoes };
+  private sugestoes(motivos: (MotivoRegra | undefined)[]): string[] {
+    return [...new Set(motivos.map((motivo) => motivo?.sugestao).filter((sugestao): sugestao is string => !!sugestao))];
   }
 
-  private calcularLimite(cliente: Cliente): number {
-    const base = cliente.rendaMensal * this.PORCENTAGEM_RENDA;
-    const multiplicador = cliente.score / 1000; // Normaliza score para 0-1
-    return Math.round(base * multiplicador);
+  private calcularLimite(regras: RegrasCredito, valores: Record<string, number>): number {
+    const { fracao_renda, escala_score } = regras.limite;
+    const limite = valores['renda_mensal'] * fracao_renda * (valores['score'] / escala_score);
+    return Math.round(limite * 100) / 100;
   }
-}
\ No newline at end of file
+}